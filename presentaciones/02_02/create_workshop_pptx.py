@@ -12,6 +12,8 @@ from pptx.enum.shapes import MSO_SHAPE
 from pptx.dml.color import RGBColor
 import os
 
+from deck_builder import build_deck
+
 # Colores del proyecto (usando RGBColor correctamente)
 COLORS = {
     'governance': RGBColor(0x2E, 0x86, 0xAB),  # Azul
@@ -255,7 +257,7 @@ def add_question_slide(prs, question, options=None):
 
     return slide
 
-def create_presentation():
+def build_presentation():
     """Crea la presentación completa"""
     prs = Presentation()
     prs.slide_width = Inches(13.333)
@@ -585,11 +587,19 @@ def create_presentation():
         "Proyecto en colaboracion entre\nUniversidade de Sao Paulo y University of York\n\nContacto: adrian.gonzalez@usp.br"
     )
 
-    # Guardar
+    return prs
+
+def create_presentation(force=False):
+    """Guarda la presentación si cambió este script (deck_builder)"""
     output_path = os.path.join(os.path.dirname(__file__), "Workshop_SEMIL_USP_Day2_MEJORADO.pptx")
-    prs.save(output_path)
-    print(f"Presentacion guardada en: {output_path}")
-    return output_path
+    result = build_deck("v1", build_presentation, output_path, sources=[__file__], force=force)
+    if result["status"] == "skipped":
+        print(f"Sin cambios, se mantiene: {output_path}")
+    else:
+        print(f"Presentacion guardada en: {output_path}")
+    print(f"Tiempo: {result['seconds']:.1f}s | Tamaño: {result['size_mb']:.1f} MB")
+    return result
 
 if __name__ == "__main__":
-    create_presentation()
+    import sys
+    create_presentation(force="--force" in sys.argv)
@@ -12,6 +12,8 @@ from pptx.enum.shapes import MSO_SHAPE
 from pptx.dml.color import RGBColor
 import os
 
+from deck_builder import add_picture, build_deck, figure_exists
+
 # Rutas
 BASE_DIR = os.path.dirname(__file__)
 ASSETS_DIR = os.path.join(BASE_DIR, "assets")
@@ -43,9 +45,9 @@ def add_title_slide_with_logos(prs, title, subtitle=""):
 
     # Logo USP (izquierda) - usar texto si no hay imagen
     logo_usp = os.path.join(ASSETS_DIR, "logo_usp.png")
-    if os.path.exists(logo_usp):
+    if figure_exists(logo_usp):
         try:
-            slide.shapes.add_picture(logo_usp, Inches(0.5), Inches(0.3), height=Inches(0.8))
+            add_picture(slide, logo_usp, Inches(0.5), Inches(0.3), height=Inches(0.8))
         except:
             pass
 
@@ -60,9 +62,9 @@ def add_title_slide_with_logos(prs, title, subtitle=""):
 
     # Logo York (derecha) - usar texto si no hay imagen
     logo_york = os.path.join(ASSETS_DIR, "logo_york.png")
-    if os.path.exists(logo_york):
+    if figure_exists(logo_york):
         try:
-            slide.shapes.add_picture(logo_york, Inches(12), Inches(0.3), height=Inches(0.8))
+            add_picture(slide, logo_york, Inches(12), Inches(0.3), height=Inches(0.8))
         except:
             pass
 
@@ -187,8 +189,8 @@ def add_content_slide_with_image(prs, title, content_items, image_path, highligh
         p.space_before = Pt(6)
 
     # Imagen a la derecha
-    if os.path.exists(image_path):
-        slide.shapes.add_picture(image_path, Inches(6.8), Inches(1.4), width=Inches(6))
+    if figure_exists(image_path):
+        add_picture(slide, image_path, Inches(6.8), Inches(1.4), width=Inches(6))
 
     return slide
 
@@ -213,8 +215,8 @@ def add_image_slide(prs, title, image_path, caption="", highlight_color=None):
     p.alignment = PP_ALIGN.CENTER
 
     # Imagen centrada
-    if os.path.exists(image_path):
-        slide.shapes.add_picture(image_path, Inches(1.5), Inches(1.1), width=Inches(10.5))
+    if figure_exists(image_path):
+        add_picture(slide, image_path, Inches(1.5), Inches(1.1), width=Inches(10.5))
 
     if caption:
         cap_box = slide.shapes.add_textbox(Inches(0.5), Inches(6.8), Inches(12.5), Inches(0.5))
@@ -248,12 +250,12 @@ def add_two_images_slide(prs, title, image1_path, image2_path, label1="", label2
     p.alignment = PP_ALIGN.CENTER
 
     # Imagen 1 (izquierda)
-    if os.path.exists(image1_path):
-        slide.shapes.add_picture(image1_path, Inches(0.3), Inches(1.2), width=Inches(6.3))
+    if figure_exists(image1_path):
+        add_picture(slide, image1_path, Inches(0.3), Inches(1.2), width=Inches(6.3))
 
     # Imagen 2 (derecha)
-    if os.path.exists(image2_path):
-        slide.shapes.add_picture(image2_path, Inches(6.8), Inches(1.2), width=Inches(6.3))
+    if figure_exists(image2_path):
+        add_picture(slide, image2_path, Inches(6.8), Inches(1.2), width=Inches(6.3))
 
     # Labels
     if label1:
@@ -408,7 +410,7 @@ def add_question_slide(prs, question, options=None):
 
     return slide
 
-def create_presentation():
+def build_presentation():
     """Crea la presentación completa con imágenes"""
     prs = Presentation()
     prs.slide_width = Inches(13.333)
@@ -765,12 +767,19 @@ def create_presentation():
         "Projeto em colaboracao entre\nUniversidade de Sao Paulo & University of York\n\nContato: adrian.gonzalez@usp.br\n\nDados e codigo: github.com/adgch86/saopaulo-biodiversity-health"
     )
 
-    # Guardar
+    return prs
+
+def create_presentation(force=False):
+    """Guarda la presentación si cambió este script o alguna figura (deck_builder)"""
     output_path = os.path.join(BASE_DIR, "Workshop_SEMIL_USP_Day2_v2_con_mapas.pptx")
-    prs.save(output_path)
-    print(f"Presentacion guardada en: {output_path}")
-    print(f"Total slides: {len(prs.slides)}")
-    return output_path
+    result = build_deck("v2", build_presentation, output_path, sources=[__file__], force=force)
+    if result["status"] == "skipped":
+        print(f"Sin cambios, se mantiene: {output_path}")
+    else:
+        print(f"Presentacion guardada en: {output_path}")
+    print(f"Tiempo: {result['seconds']:.1f}s | Tamaño: {result['size_mb']:.1f} MB")
+    return result
 
 if __name__ == "__main__":
-    create_presentation()
+    import sys
+    create_presentation(force="--force" in sys.argv)
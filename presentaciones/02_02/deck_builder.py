@@ -0,0 +1,366 @@
+"""
+Construcción de las presentaciones del Workshop SEMIL-USP con caché
+==================================================================
+
+Usado por create_workshop_pptx.py y create_workshop_pptx_v2.py.
+
+- add_picture(slide, ruta, left, top, width=..., height=...) reemplaza a
+  slide.shapes.add_picture: la imagen se reduce al tamaño que ocupa en la
+  slide (TARGET_DPI) y se recomprime una sola vez; el resultado queda en
+  outputs/cache/pptx/media con el hash del archivo original como clave.
+  El ancho se redondea a pulgadas enteras, así una misma figura usada en
+  varias slides produce los mismos bytes y python-pptx guarda una sola
+  copia en el .pptx (reutiliza partes de imagen con el mismo SHA1).
+- build_deck() solo reconstruye si cambió el script que define las slides
+  o alguna figura usada (o buscada con figure_exists) en la construcción
+  anterior; si no, se salta.
+- main() construye las presentaciones independientes en paralelo e informa
+  tiempo y tamaño de cada una.
+
+Uso:
+    python deck_builder.py [--force] [--jobs N] [--only v2]
+    python deck_builder.py --selfcheck
+
+Autor: Science Team
+Fecha: 02/02/2026
+"""
+
+import hashlib
+import io
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pptx.util import Emu, Inches
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = r"C:\Users\arlex\Documents\Adrian David"
+CACHE_DIR = os.path.join(PROJECT_DIR, "outputs", "cache", "pptx")
+
+TARGET_DPI = 150        # Suficiente para proyectar a 1920 px de ancho (13.33")
+MEDIA_VERSION = 1       # Cambiar si cambia la forma de preparar las imágenes
+
+# Presentaciones independientes: nombre -> (script, archivo de salida)
+DECKS = {
+    'v1': ("create_workshop_pptx.py", "Workshop_SEMIL_USP_Day2_MEJORADO.pptx"),
+    'v2': ("create_workshop_pptx_v2.py", "Workshop_SEMIL_USP_Day2_v2_con_mapas.pptx"),
+}
+
+# Imágenes usadas durante la construcción en curso: [(ruta, ancho_px)]
+_USED = []
+# Figuras consultadas (existan o no) durante la construcción en curso
+_CHECKED = set()
+
+
+# =============================================================================
+# IMÁGENES
+# =============================================================================
+
+def file_hash(path):
+    """SHA-256 del contenido del archivo."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def target_width_px(image_size, width=None, height=None, dpi=TARGET_DPI):
+    """
+    Ancho en píxeles para el recuadro de la slide (width/height en EMU),
+    redondeado hacia arriba a pulgadas enteras y sin ampliar nunca la imagen.
+    """
+    w, h = image_size
+    if width is not None:
+        inches = Emu(width).inches
+    elif height is not None:
+        inches = Emu(height).inches * w / h
+    else:
+        return w
+    return min(w, int(math.ceil(inches)) * dpi)
+
+
+def _encode(img):
+    """PNG (zlib 6); sin canal alfa si es opaco y con paleta solo si no se pierde nada."""
+    from PIL import Image
+
+    if img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        img = img.convert("RGBA")
+    if img.mode == "RGBA" and img.getchannel("A").getextrema() == (255, 255):
+        img = img.convert("RGB")
+    if img.mode == "RGB" and img.getcolors(256) is not None:
+        img = img.convert("P", palette=Image.Palette.ADAPTIVE, colors=256)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=6, dpi=(TARGET_DPI, TARGET_DPI))
+    return buf.getvalue()
+
+
+def prepare_image(image_path, width=None, height=None, dpi=TARGET_DPI, cache_dir=CACHE_DIR):
+    """
+    Devuelve la ruta de una copia reducida y recomprimida de la imagen para
+    un recuadro de width x height (EMU). Se genera una vez por (contenido,
+    ancho) y se reutiliza desde la caché.
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        size = img.size
+    px = target_width_px(size, width, height, dpi)
+    _USED.append((os.path.abspath(image_path), px))
+
+    key = hashlib.sha256(f"{file_hash(image_path)}|{px}|{MEDIA_VERSION}".encode()).hexdigest()[:20]
+    media_dir = os.path.join(cache_dir, "media")
+    out_path = os.path.join(media_dir, f"{key}.png")
+    if os.path.exists(out_path):
+        return out_path
+
+    with Image.open(image_path) as img:
+        img.load()
+        if px < img.width:
+            img = img.resize((px, max(1, round(img.height * px / img.width))), Image.LANCZOS)
+        data = _encode(img)
+    # Figuras de colores planos pueden crecer al reducirlas: quedarse con el menor
+    if len(data) >= os.path.getsize(image_path):
+        with open(image_path, "rb") as f:
+            data = f.read()
+
+    os.makedirs(media_dir, exist_ok=True)
+    tmp = out_path + f".{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def add_picture(slide, image_path, left, top, width=None, height=None):
+    """slide.shapes.add_picture con la imagen preparada para su tamaño en la slide."""
+    return slide.shapes.add_picture(prepare_image(image_path, width, height), left, top, width, height)
+
+
+def figure_exists(image_path):
+    """os.path.exists que además registra la figura como entrada de la presentación."""
+    _CHECKED.add(os.path.abspath(image_path))
+    return os.path.exists(image_path)
+
+
+def warm_cache(used, n_threads=4, cache_dir=CACHE_DIR):
+    """Prepara en paralelo las imágenes de la construcción anterior."""
+    from PIL import Image
+
+    def one(item):
+        path, px = item
+        if os.path.exists(path):
+            with Image.open(path) as img:
+                w = img.width
+            # Ancho en EMU equivalente a px (prepare_image vuelve a redondear igual)
+            prepare_image(path, width=Inches(px / TARGET_DPI) if px < w else None, cache_dir=cache_dir)
+
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        list(pool.map(one, used))
+
+
+# =============================================================================
+# CONSTRUCCIÓN INCREMENTAL
+# =============================================================================
+
+def _manifest_path(name, cache_dir):
+    return os.path.join(cache_dir, f"{name}.json")
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime]
+    except OSError:
+        return None
+
+
+def build_deck(name, build_fn, output_path, sources=(), force=False, cache_dir=CACHE_DIR):
+    """
+    Construye y guarda una presentación solo si está desactualizada.
+
+    Args:
+        name: nombre de la presentación (clave del manifiesto)
+        build_fn: función sin argumentos que devuelve el objeto Presentation
+        output_path: ruta del .pptx
+        sources: archivos que definen las slides (scripts); su contenido
+                 forma parte de la huella
+        force: reconstruir siempre
+
+    Returns:
+        dict con name, status ('built' o 'skipped'), seconds, size_mb,
+        images (figuras usadas) y media_mb (figuras originales)
+    """
+    t0 = time.perf_counter()
+    h = hashlib.sha256(f"{MEDIA_VERSION}|{TARGET_DPI}".encode())
+    for src in sources:
+        h.update(file_hash(src).encode())
+    fingerprint = h.hexdigest()[:20]
+
+    manifest_file = _manifest_path(name, cache_dir)
+    previous = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, encoding="utf-8") as f:
+            previous = json.load(f)
+
+    up_to_date = (
+        not force
+        and previous.get("fingerprint") == fingerprint
+        and _stat(output_path) is not None
+        and _stat(output_path)[0] == previous.get("output_size")
+        and all(_stat(p) == s for p, s in previous.get("inputs", {}).items())
+    )
+    if up_to_date:
+        return {"name": name, "status": "skipped", "seconds": time.perf_counter() - t0,
+                "size_mb": previous["output_size"] / 1e6,
+                "images": sum(1 for s in previous["inputs"].values() if s),
+                "media_mb": previous.get("media_mb", 0)}
+
+    if previous.get("used"):
+        warm_cache([tuple(u) for u in previous["used"]], cache_dir=cache_dir)
+
+    del _USED[:]
+    _CHECKED.clear()
+    prs = build_fn()
+    prs.save(output_path)
+
+    # Una figura que falta también es entrada: si aparece, se reconstruye
+    inputs = {p: _stat(p) for p in sorted(_CHECKED | {p for p, _ in _USED})}
+    entry = {
+        "fingerprint": fingerprint,
+        "inputs": inputs,
+        "used": sorted(set(_USED)),
+        "output_size": os.path.getsize(output_path),
+        "media_mb": round(sum(s[0] for s in inputs.values() if s) / 1e6, 2),
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(entry, f, indent=1)
+
+    return {"name": name, "status": "built", "seconds": time.perf_counter() - t0,
+            "size_mb": entry["output_size"] / 1e6, "images": sum(1 for s in inputs.values() if s),
+            "media_mb": entry["media_mb"]}
+
+
+def _build_named(name, force=False):
+    """Proceso hijo: importa el script de la presentación y la construye."""
+    import importlib.util
+
+    script, _ = DECKS[name]
+    spec = importlib.util.spec_from_file_location(f"deck_{name}", os.path.join(BASE_DIR, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.create_presentation(force=force)
+
+
+def print_report(results):
+    """Tabla de tiempo y tamaño por presentación."""
+    print(f"\n{'Presentación':<14} {'Estado':<8} {'Tiempo':>8} {'Tamaño':>10} {'Figuras':>8} {'Originales':>11}")
+    for r in results:
+        print(f"{r['name']:<14} {r['status']:<8} {r['seconds']:>7.1f}s {r['size_mb']:>8.1f} MB "
+              f"{r['images']:>8} {r['media_mb']:>8.1f} MB")
+
+
+def main(names=None, force=False, n_jobs=None):
+    """Construye las presentaciones en paralelo (una por proceso)."""
+    names = names or list(DECKS)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(names))
+    t0 = time.perf_counter()
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_build_named, names, [force] * len(names)))
+    else:
+        results = [_build_named(n, force) for n in names]
+    print_report(results)
+    print(f"Total: {time.perf_counter() - t0:.1f}s")
+    return results
+
+
+# =============================================================================
+# AUTOCOMPROBACIÓN
+# =============================================================================
+
+def run_selfcheck():
+    """Figuras sintéticas a 200 dpi: tamaño, reutilización, omisión y reconstrucción."""
+    import tempfile
+    import shutil
+    import numpy as np
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from pptx import Presentation
+
+    tmp = tempfile.mkdtemp(prefix="deck_selfcheck_")
+    try:
+        cache = os.path.join(tmp, "cache")
+        figs = []
+        for k in range(3):
+            rng = np.random.default_rng(k)
+            fig, ax = plt.subplots(figsize=(14, 10))
+            ax.scatter(rng.random(3000), rng.random(3000), c=rng.random(3000), s=20, alpha=0.6)
+            ax.set_title(f"Figura {k}")
+            path = os.path.join(tmp, f"fig{k}.png")
+            fig.savefig(path, dpi=200)
+            plt.close(fig)
+            figs.append(path)
+
+        def deck(prepared):
+            prs = Presentation()
+            prs.slide_width, prs.slide_height = Inches(13.333), Inches(7.5)
+            for path in figs + figs[:1]:          # fig0 se repite
+                slide = prs.slides.add_slide(prs.slide_layouts[6])
+                if prepared:
+                    slide.shapes.add_picture(prepare_image(path, Inches(10.5), cache_dir=cache),
+                                             Inches(1.5), Inches(1.1), width=Inches(10.5))
+                else:
+                    slide.shapes.add_picture(path, Inches(1.5), Inches(1.1), width=Inches(10.5))
+            return prs
+
+        raw_path, out_path = os.path.join(tmp, "raw.pptx"), os.path.join(tmp, "deck.pptx")
+        t = time.perf_counter()
+        deck(False).save(raw_path)
+        raw_s = time.perf_counter() - t
+        spec = os.path.join(tmp, "spec.py")
+        with open(spec, "w") as f:
+            f.write("# slides\n")
+
+        r1 = build_deck("check", lambda: deck(True), out_path, [spec], cache_dir=cache)
+        n_media = len([n for n in __import__("zipfile").ZipFile(out_path).namelist() if "/media/" in n])
+        assert r1["status"] == "built" and n_media == 3, (r1, n_media)
+        raw_mb, new_mb = os.path.getsize(raw_path) / 1e6, os.path.getsize(out_path) / 1e6
+        assert new_mb < raw_mb
+        print(f"  [OK] 4 slides, 3 imágenes (la repetida se reutiliza): {raw_mb:.2f} MB -> {new_mb:.2f} MB "
+              f"({raw_s:.2f}s -> {r1['seconds']:.2f}s)")
+
+        r2 = build_deck("check", lambda: deck(True), out_path, [spec], cache_dir=cache)
+        assert r2["status"] == "skipped", r2
+        print(f"  [OK] Sin cambios: se salta ({r2['seconds'] * 1000:.0f} ms)")
+
+        time.sleep(0.01)
+        with open(figs[1], "ab") as f:
+            f.write(b"\0")
+        r3 = build_deck("check", lambda: deck(True), out_path, [spec], cache_dir=cache)
+        with open(spec, "a") as f:
+            f.write("# otra slide\n")
+        r4 = build_deck("check", lambda: deck(True), out_path, [spec], cache_dir=cache)
+        assert r3["status"] == r4["status"] == "built", (r3, r4)
+        print("  [OK] Figura o script modificado: se reconstruye")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print("Autocomprobación OK")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Construir las presentaciones del workshop")
+    parser.add_argument("--force", action="store_true", help="reconstruir aunque no haya cambios")
+    parser.add_argument("--jobs", type=int, default=None, help="presentaciones en paralelo")
+    parser.add_argument("--only", nargs="+", choices=list(DECKS), help="solo estas presentaciones")
+    parser.add_argument("--selfcheck", action="store_true", help="prueba con figuras sintéticas")
+    args = parser.parse_args()
+    if args.selfcheck:
+        run_selfcheck()
+    else:
+        main(args.only, args.force, args.jobs)
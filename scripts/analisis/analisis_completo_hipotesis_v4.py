@@ -49,12 +49,23 @@ import statsmodels.formula.api as smf
 import warnings
 warnings.filterwarnings('ignore')
 
+from correlation_engine import corr_matrix, fdr_bh
+from permutation_engine import correlation_tests, run_permutations, add_permutation_columns
+
 plt.style.use('seaborn-v0_8-whitegrid')
 plt.rcParams['figure.figsize'] = (16, 10)
 plt.rcParams['font.size'] = 9
 
 PROJECT_ROOT = "C:/Users/arlex/Documents/Adrian David"
 
+# Permutaciones dentro de microrregion para las correlaciones generales
+# (p_perm_General / p_maxT_General; 0 = solo p asintoticos). El script no tiene
+# guard __main__, por eso las permutaciones corren en un solo proceso.
+PERMUTACIONES = 0
+
+# Cache de matrices de correlacion (por hash de datos + variables)
+CORR_CACHE_DIR = f"{PROJECT_ROOT}/outputs/cache/correlations"
+
 # =============================================================================
 # 1. CARGAR DATOS
 # =============================================================================
@@ -164,68 +175,58 @@ print("=" * 90)
 
 resultados_corr = []
 
-# Para cada variable de riesgo
-for var_y, (tipo_y, nombre_y) in vars_riesgo_all.items():
-    if var_y not in df.columns:
-        continue
-
-    # Contra cada variable de gobernanza
-    for var_x, nombre_x in vars_gobernanza.items():
-        if var_x not in df.columns:
-            continue
-
-        # Correlacion general
-        valid = df[[var_x, var_y]].dropna()
-        if len(valid) > 50:
-            r, p = stats.spearmanr(valid[var_x], valid[var_y])
-            resultados_corr.append({
-                'Tipo_Riesgo': tipo_y,
-                'Variable_Y': var_y,
-                'Nombre_Y': nombre_y,
-                'Tipo_X': 'Gobernanza',
-                'Variable_X': var_x,
-                'Nombre_X': nombre_x,
-                'r_General': r,
-                'p_General': p,
-                'n_General': len(valid)
-            })
-
-    # Contra cada variable de biodiversidad
-    for var_x, nombre_x in vars_biodiversidad.items():
-        if var_x not in df.columns:
-            continue
-
-        valid = df[[var_x, var_y]].dropna()
-        if len(valid) > 50:
-            r, p = stats.spearmanr(valid[var_x], valid[var_y])
-            resultados_corr.append({
-                'Tipo_Riesgo': tipo_y,
-                'Variable_Y': var_y,
-                'Nombre_Y': nombre_y,
-                'Tipo_X': 'Biodiversidad',
-                'Variable_X': var_x,
-                'Nombre_X': nombre_x,
-                'r_General': r,
-                'p_General': p,
-                'n_General': len(valid)
-            })
+# Matrices completas (vectorizadas, pairwise-complete) en lugar de un
+# spearmanr por par; mismas filas y mismo orden que el loop original
+vars_y = [v for v in vars_riesgo_all if v in df.columns]
+grupos_x = [
+    ('Gobernanza', {k: v for k, v in vars_gobernanza.items() if k in df.columns}),
+    ('Biodiversidad', {k: v for k, v in vars_biodiversidad.items() if k in df.columns}),
+]
+vars_x = [v for _, grupo in grupos_x for v in grupo]
+r_gen, p_gen, n_gen = corr_matrix(df, vars_y, vars_x, method='spearman', cache_dir=CORR_CACHE_DIR)
+
+for var_y in vars_y:
+    tipo_y, nombre_y = vars_riesgo_all[var_y]
+    for tipo_x, grupo in grupos_x:
+        for var_x, nombre_x in grupo.items():
+            if n_gen.at[var_y, var_x] > 50:
+                resultados_corr.append({
+                    'Tipo_Riesgo': tipo_y,
+                    'Variable_Y': var_y,
+                    'Nombre_Y': nombre_y,
+                    'Tipo_X': tipo_x,
+                    'Variable_X': var_x,
+                    'Nombre_X': nombre_x,
+                    'r_General': r_gen.at[var_y, var_x],
+                    'p_General': p_gen.at[var_y, var_x],
+                    'n_General': n_gen.at[var_y, var_x]
+                })
 
 df_corr = pd.DataFrame(resultados_corr)
+# Benjamini-Hochberg sobre toda la familia de correlaciones generales
+df_corr.insert(df_corr.columns.get_loc('p_General') + 1, 'p_fdr_General', fdr_bh(df_corr['p_General'].values))
 
-# Agregar correlaciones estratificadas
-print("\nCalculando correlaciones estratificadas por vulnerabilidad...")
-for idx, row in df_corr.iterrows():
-    var_x = row['Variable_X']
-    var_y = row['Variable_Y']
+if PERMUTACIONES > 0:
+    tests = correlation_tests(df, vars_y, vars_x, method='spearman', min_n=51)
+    print(f"\nPermutaciones dentro de microrregion: {PERMUTACIONES} x {len(tests)} correlaciones (max-T)")
+    perm = run_permutations(tests, permutations=PERMUTACIONES, n_jobs=1)
+    df_corr = add_permutation_columns(df_corr, perm, ['Variable_Y', 'Variable_X'], suffix='General')
 
-    for cat in ['Baja', 'Media', 'Alta']:
-        subset = df[df['cat_vuln'] == cat]
-        valid = subset[[var_x, var_y]].dropna()
-        if len(valid) > 20:
-            r, p = stats.spearmanr(valid[var_x], valid[var_y])
-            df_corr.loc[idx, f'r_{cat}'] = r
-            df_corr.loc[idx, f'p_{cat}'] = p
-            df_corr.loc[idx, f'n_{cat}'] = len(valid)
+# Agregar correlaciones estratificadas (una matriz por categoria)
+print("\nCalculando correlaciones estratificadas por vulnerabilidad...")
+for cat in ['Baja', 'Media', 'Alta']:
+    subset = df[df['cat_vuln'] == cat]
+    r_cat, p_cat, n_cat = corr_matrix(subset, vars_y, vars_x, method='spearman',
+                                      cache_dir=CORR_CACHE_DIR)
+    for idx, row in df_corr.iterrows():
+        var_x = row['Variable_X']
+        var_y = row['Variable_Y']
+        if n_cat.at[var_y, var_x] > 20:
+            df_corr.loc[idx, f'r_{cat}'] = r_cat.at[var_y, var_x]
+            df_corr.loc[idx, f'p_{cat}'] = p_cat.at[var_y, var_x]
+            df_corr.loc[idx, f'n_{cat}'] = n_cat.at[var_y, var_x]
+    if f'p_{cat}' in df_corr.columns:
+        df_corr[f'p_fdr_{cat}'] = fdr_bh(df_corr[f'p_{cat}'].values)
 
 # Guardar correlaciones
 df_corr.to_csv(f"{PROJECT_ROOT}/outputs/correlaciones/correlaciones_completas_v4.csv", index=False)
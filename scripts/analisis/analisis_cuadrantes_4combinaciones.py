@@ -17,13 +17,16 @@ sys.stdout.reconfigure(encoding='utf-8')
 
 import pandas as pd
 import numpy as np
-import geopandas as gpd
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from matplotlib.patches import Patch
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+from geometry_cache import load_sp_geometry
+from quadrants import classify
+
 BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
 CSV_PATH = os.path.join(BASE_DIR, "outputs/dataset/municipios_integrado.csv")
 FIG_DIR = os.path.join(BASE_DIR, "outputs/figures")
@@ -31,8 +34,7 @@ SHP_PATH = os.path.join(BASE_DIR, "data/geo/ibge_sp/SP_Municipios_2022.shp")
 
 # Load data
 df = pd.read_csv(CSV_PATH)
-gdf = gpd.read_file(SHP_PATH)
-gdf['cod_ibge'] = gdf['CD_MUN'].astype(str).str[:6].astype(int)
+gdf = load_sp_geometry(shp_path=SHP_PATH)
 
 print(f"Dataset: {len(df)} municipios")
 print(f"Poblacion total SP: {df['population'].sum():,.0f}")
@@ -87,6 +89,13 @@ cuadrante_colors = {
 
 all_results = []
 
+# Cuadrantes de las 4 combinaciones en una sola pasada vectorizada
+clasificacion = classify(df, [
+    {'name': c['name'], 'var_x': c['var_x'], 'var_y': c['var_y'],
+     'high_x_good': c['high_x_good'], 'high_y_good': c['high_y_good'], 'scheme': 'optimo_es'}
+    for c in analisis
+])
+
 for config in analisis:
     print(f"\n{'='*60}")
     print(f"ANALISIS: {config['label_x']} vs {config['label_y']}")
@@ -95,32 +104,15 @@ for config in analisis:
     var_x = config['var_x']
     var_y = config['var_y']
 
-    # Calcular medianas
-    median_x = df[var_x].median()
-    median_y = df[var_y].median()
+    # Medianas (umbrales del motor de cuadrantes)
+    median_x = clasificacion['thresholds'][var_x][0]
+    median_y = clasificacion['thresholds'][var_y][0]
 
     print(f"Mediana {config['label_x']}: {median_x:.2f}")
     print(f"Mediana {config['label_y']}: {median_y:.2f}")
 
-    # Crear cuadrantes
-    def assign_quadrant(row):
-        x_high = row[var_x] >= median_x
-        y_high = row[var_y] >= median_y
-
-        x_good = x_high if config['high_x_good'] else not x_high
-        y_good = not y_high if not config['high_y_good'] else y_high
-
-        if x_good and y_good:
-            return 'Q1_Optimo'
-        elif x_good and not y_good:
-            return 'Q2_Riesgo'
-        elif not x_good and not y_good:
-            return 'Q3_Critico'
-        else:
-            return 'Q4_Potencial'
-
     col_name = f"cuadrante_{config['name']}"
-    df[col_name] = df.apply(assign_quadrant, axis=1)
+    df[col_name] = clasificacion['quadrants'][config['name']]
 
     # Calcular estadisticas por cuadrante
     stats = df.groupby(col_name).agg({
@@ -16,6 +16,7 @@ Autor: Science Team / AP Digital
 """
 
 import sys
+import argparse
 sys.stdout.reconfigure(encoding='utf-8')
 
 import pandas as pd
@@ -31,6 +32,8 @@ import warnings
 warnings.filterwarnings('ignore')
 import os
 
+from grouped_cv import DEFAULT_FOLDS, cross_validate_pairs, add_cv_columns, best_by_cv
+
 # ============================================================
 # CONFIGURATION
 # ============================================================
@@ -257,11 +260,27 @@ def fit_mixed_model_logit(df, outcome_logit, predictor, structure='best'):
     }
 
 
-def run_model_selection(df, outcome_var, dimension_key):
+def cross_validate_predictors(df, k=DEFAULT_FOLDS, n_jobs=None):
+    """
+    Grouped k-fold CV (by microrregiao) of every outcome x predictor model, in one pool.
+    Held-out microrregioes are new groups, so CV uses the (1|microrregiao)
+    structure and predicts with the fixed effects only.
+    """
+    pairs = [(f'{outcome_var}_logit',
+              f'{predictor}_z' if f'{predictor}_z' in df.columns else predictor,
+              (outcome_var, predictor))
+             for outcome_var in GOVERNANCE_VARS
+             for dim in DIMENSIONS.values()
+             for predictor in dim['vars']]
+    return cross_validate_pairs(df, pairs, k=k, n_jobs=n_jobs)
+
+
+def run_model_selection(df, outcome_var, dimension_key, cv=None):
     """
     Compare all predictors within a dimension for a given outcome.
     Automatically selects best hierarchical structure (micro, crossed, nested) by AIC.
-    Returns sorted results by AIC with delta AIC.
+    Returns sorted results by AIC with delta AIC (and CV columns if `cv` is given,
+    from cross_validate_predictors).
     """
     dim = DIMENSIONS[dimension_key]
     results = []
@@ -300,7 +319,7 @@ def run_model_selection(df, outcome_var, dimension_key):
     results_df['aic_weight'] = np.exp(-0.5 * results_df['delta_aic'])
     results_df['aic_weight'] = results_df['aic_weight'] / results_df['aic_weight'].sum()
 
-    return results_df
+    return add_cv_columns(results_df, cv, outcome_var)
 
 
 def compare_random_structures(df):
@@ -357,13 +376,15 @@ def compare_random_structures(df):
 # MAIN ANALYSIS FOR EACH HYPOTHESIS
 # ============================================================
 
-def run_h1_analysis(df):
-    """Run complete H1 analysis: What predicts governance?"""
+def run_h1_analysis(df, cv_folds=0, n_jobs=None):
+    """Run complete H1 analysis: What predicts governance? (cv_folds > 0 adds grouped CV columns)"""
     print("\n" + "=" * 70)
     print("H1: QUE PREDICE LA GOBERNANZA (UAI)?")
     print("Modelo: logit(UAI) ~ predictor + (1|microrregiao)")
     print("=" * 70)
 
+    cv = cross_validate_predictors(df, cv_folds, n_jobs) if cv_folds else None
+
     all_results = []
     best_by_combo = []
 
@@ -376,7 +397,7 @@ def run_h1_analysis(df):
         print(f"{'='*60}")
 
         for dim_key in DIMENSIONS.keys():
-            results_df = run_model_selection(df, outcome_var, dim_key)
+            results_df = run_model_selection(df, outcome_var, dim_key, cv=cv)
 
             if len(results_df) == 0:
                 continue
@@ -395,6 +416,10 @@ def run_h1_analysis(df):
                       f"{row['coef']:>10.4f}{sig:<3} {row['p_value']:>9.4f} {row['r2_marginal']:>8.4f} "
                       f"{row['aic_weight']:>7.3f}{marker}")
 
+            best_cv = best_by_cv(results_df, label_col='predictor_label')
+            if best_cv:
+                print(f"  Mejor por CV agrupada: {best_cv[0]} (RMSE = {best_cv[1]:.4f})")
+
             # Store best
             best = results_df.iloc[0]
             equivalent = results_df[results_df['delta_aic'] < 2]
@@ -605,6 +630,13 @@ def plot_dimension_summary(best_df, filename):
 # ============================================================
 
 def main():
+    parser = argparse.ArgumentParser(description="Analisis H1 - Que predice la gobernanza (UAI)?")
+    parser.add_argument("--cv-folds", type=int, default=0,
+                        help=f"Validacion cruzada agrupada por microrregiao con k folds (0 = sin CV; sugerido {DEFAULT_FOLDS})")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Procesos en paralelo (por defecto, nucleos disponibles)")
+    args = parser.parse_args()
+
     print("=" * 70)
     print("ANALISIS H1 - QUE PREDICE LA GOBERNANZA?")
     print("Invirtiendo la logica causal del nexus")
@@ -626,7 +658,7 @@ def main():
     print(f"\n  [SAVED] h1_structure_comparison.csv")
 
     # Run analysis (now uses best structure per model)
-    all_results, best_results = run_h1_analysis(df)
+    all_results, best_results = run_h1_analysis(df, cv_folds=args.cv_folds, n_jobs=args.jobs)
 
     # Save results
     all_results.to_csv(os.path.join(OUTPUT_DIR, 'h1_all_models.csv'), index=False)
@@ -25,6 +25,7 @@ Fecha: 2026-01-27
 """
 
 import sys
+import argparse
 sys.stdout.reconfigure(encoding='utf-8')
 
 import pandas as pd
@@ -43,6 +44,10 @@ warnings.filterwarnings('ignore')
 import os
 import json
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+from geometry_cache import SHP_PATH, load_sp_geometry
+from grouped_cv import DEFAULT_FOLDS, cross_validate_pairs, add_cv_columns, best_by_cv
+
 # ============================================================
 # CONFIGURATION
 # ============================================================
@@ -51,7 +56,9 @@ BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
 CSV_PATH = os.path.join(BASE_DIR, "outputs/dataset/municipios_integrado.csv")
 OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
 FIG_DIR = os.path.join(OUTPUT_DIR, "figures")
+MODEL_DIR = os.path.join(OUTPUT_DIR, "modelos")
 os.makedirs(FIG_DIR, exist_ok=True)
+os.makedirs(MODEL_DIR, exist_ok=True)
 
 # --- DIMENSION DEFINITIONS ---
 # Each dimension: composite index vs specific variables
@@ -226,10 +233,23 @@ def fit_mixed_model(df, outcome, predictor, group_var='cod_microrregiao'):
         return None
 
 
-def compare_models_for_dimension(df, outcome, dimension_key):
+def cross_validate_dimensions(df, outcomes, dimension_keys, k=DEFAULT_FOLDS, n_jobs=None):
+    """
+    Grouped k-fold CV (by microrregião) of every outcome × (composite + specific)
+    model of the given dimensions, all folds and predictors in one pool.
+    """
+    pairs = [(outcome, var, (outcome, var))
+             for outcome in outcomes
+             for dim_key in dimension_keys
+             for var in [DIMENSIONS[dim_key]['composite']] + DIMENSIONS[dim_key]['specific']]
+    return cross_validate_pairs(df, pairs, k=k, n_jobs=n_jobs)
+
+
+def compare_models_for_dimension(df, outcome, dimension_key, cv=None):
     """
     Compare composite vs specific variables for one dimension as predictors of outcome.
-    Returns sorted results by AIC with delta AIC.
+    Returns sorted results by AIC with delta AIC (and CV columns if `cv` is given,
+    from cross_validate_dimensions).
     """
     dim = DIMENSIONS[dimension_key]
     results = []
@@ -266,7 +286,7 @@ def compare_models_for_dimension(df, outcome, dimension_key):
     results_df['aic_weight'] = np.exp(-0.5 * results_df['delta_aic'])
     results_df['aic_weight'] = results_df['aic_weight'] / results_df['aic_weight'].sum()
 
-    return results_df
+    return add_cv_columns(results_df, cv, outcome, predictor_col='variable')
 
 
 def run_full_model_selection(df):
@@ -338,10 +358,11 @@ def run_full_model_selection(df):
 # FOCUSED ANALYSIS: Each disease as outcome, each dimension as predictor
 # ============================================================
 
-def run_disease_focused_selection(df):
+def run_disease_focused_selection(df, cv_folds=0, n_jobs=None):
     """
     For each specific disease, compare composite vs specific predictors
     within each dimension. This is what Adrian specifically asked for.
+    cv_folds > 0 adds grouped (by microrregião) cross-validation columns.
     """
     print("\n" + "=" * 70)
     print("SELECCIÓN FOCALIZADA: POR ENFERMEDAD Y DIMENSIÓN")
@@ -349,6 +370,7 @@ def run_disease_focused_selection(df):
 
     diseases = DIMENSIONS['health']['specific']
     predictor_dims = ['governance', 'climate_risk', 'biodiversity', 'vulnerability']
+    cv = cross_validate_dimensions(df, diseases, predictor_dims, cv_folds, n_jobs) if cv_folds else None
 
     all_results = []
     best_per_combo = []
@@ -361,7 +383,7 @@ def run_disease_focused_selection(df):
 
         for dim_key in predictor_dims:
             dim = DIMENSIONS[dim_key]
-            results_df = compare_models_for_dimension(df, disease, dim_key)
+            results_df = compare_models_for_dimension(df, disease, dim_key, cv=cv)
 
             if len(results_df) == 0:
                 continue
@@ -384,6 +406,10 @@ def run_disease_focused_selection(df):
                       f"{row['coef']:>10.4f}{sig} {row['p_value']:>9.4f} {row['r2_marginal']:>8.3f} "
                       f"{row['aic_weight']:>7.3f}{marker}")
 
+            best_cv = best_by_cv(results_df, label_col='label')
+            if best_cv:
+                print(f"  Mejor por CV agrupada: {best_cv[0]} (RMSE = {best_cv[1]:.4f})")
+
             equivalent = results_df[results_df['delta_aic'] < 2]
             best_per_combo.append({
                 'outcome': disease,
@@ -728,8 +754,7 @@ def plot_bivariate_map(df, var1, var2, filename):
     Falls back to scatter if shapefile not available
     """
     try:
-        import geopandas as gpd
-        shp_path = os.path.join(BASE_DIR, "data/geo/ibge_sp/SP_Municipios_2022.shp")
+        shp_path = SHP_PATH
         if not os.path.exists(shp_path):
             # Try alternative paths
             from glob import glob
@@ -740,23 +765,13 @@ def plot_bivariate_map(df, var1, var2, filename):
                 print(f"  [SKIP] No shapefile found for bivariate map")
                 return
 
-        gdf = gpd.read_file(shp_path)
-
-        # Match municipality codes
-        # IBGE shapefile uses 7-digit codes (with verification digit)
-        # CSV uses 6-digit codes (without verification digit)
-        # Solution: truncate shapefile codes to 6 digits
-        if 'CD_MUN' in gdf.columns:
-            gdf['cod_ibge'] = gdf['CD_MUN'].astype(str).str[:6].astype(int)
-        elif 'codigo_ibge' in gdf.columns:
-            gdf['cod_ibge'] = gdf['codigo_ibge'].astype(str).str[:6].astype(int)
-        else:
-            code_col = [c for c in gdf.columns if 'cod' in c.lower() or 'ibge' in c.lower()]
-            if code_col:
-                gdf['cod_ibge'] = gdf[code_col[0]].astype(str).str[:6].astype(int)
-            else:
-                print(f"  [SKIP] Cannot match shapefile codes")
-                return
+        # Cached geometry; cod_ibge already truncated to 6 digits
+        # (IBGE shapefile uses 7-digit codes, CSV uses 6)
+        try:
+            gdf = load_sp_geometry(shp_path=shp_path)
+        except ValueError:
+            print(f"  [SKIP] Cannot match shapefile codes")
+            return
 
         # Merge data
         merged = gdf.merge(df[['cod_ibge', var1, var2]], on='cod_ibge', how='left')
@@ -825,6 +840,13 @@ def plot_bivariate_map(df, var1, var2, filename):
 # ============================================================
 
 def main():
+    parser = argparse.ArgumentParser(description="Análisis H1 - Selección de modelos por AIC")
+    parser.add_argument("--cv-folds", type=int, default=0,
+                        help=f"Validación cruzada agrupada por microrregião con k folds (0 = sin CV; sugerido {DEFAULT_FOLDS})")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Procesos en paralelo (por defecto, núcleos disponibles)")
+    args = parser.parse_args()
+
     print("=" * 70)
     print("ANÁLISIS H1 - SELECCIÓN DE MODELOS Y GOBERNANZA EXPANDIDA")
     print("Solicitud: Dr. Adrian David González Chaves (27/01/2026)")
@@ -836,11 +858,11 @@ def main():
     # ================================================================
     # PART 1: Disease-focused model selection
     # ================================================================
-    all_selection, best_selection = run_disease_focused_selection(df)
+    all_selection, best_selection = run_disease_focused_selection(df, cv_folds=args.cv_folds, n_jobs=args.jobs)
 
     # Save results
-    all_selection.to_csv(os.path.join(OUTPUT_DIR, '../modelos/h1_model_selection_all.csv'), index=False)
-    best_selection.to_csv(os.path.join(OUTPUT_DIR, '../modelos/h1_model_selection_best.csv'), index=False)
+    all_selection.to_csv(os.path.join(MODEL_DIR, 'h1_model_selection_all.csv'), index=False)
+    best_selection.to_csv(os.path.join(MODEL_DIR, 'h1_model_selection_best.csv'), index=False)
     print(f"\n  [SAVED] h1_model_selection_all.csv ({len(all_selection)} comparisons)")
     print(f"  [SAVED] h1_model_selection_best.csv ({len(best_selection)} selections)")
 
@@ -861,7 +883,7 @@ def main():
     # PART 2: Governance → All dimensions
     # ================================================================
     gov_results = analyze_governance_to_all(df)
-    gov_results.to_csv(os.path.join(OUTPUT_DIR, '../modelos/h1_governance_all_dimensions.csv'), index=False)
+    gov_results.to_csv(os.path.join(MODEL_DIR, 'h1_governance_all_dimensions.csv'), index=False)
     print(f"\n  [SAVED] h1_governance_all_dimensions.csv ({len(gov_results)} relationships)")
 
     # Print governance summary
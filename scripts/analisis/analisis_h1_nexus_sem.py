@@ -27,7 +27,7 @@ warnings.filterwarnings('ignore')
 
 # Try semopy, fall back to manual path analysis if not available
 try:
-    import semopy
+    import semopy  # noqa: F401  (el ajuste corre en sem_runner)
     HAS_SEMOPY = True
     print("[OK] semopy available — will use full SEM")
 except ImportError:
@@ -38,6 +38,9 @@ from sklearn.preprocessing import StandardScaler
 import statsmodels.api as sm
 import os
 
+from correlation_engine import corr_matrix, fdr_bh
+from sem_runner import sem_spec, run_sem, timing_table
+
 # ============================================================
 # CONFIGURATION
 # ============================================================
@@ -46,7 +49,10 @@ BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
 CSV_PATH = os.path.join(BASE_DIR, "outputs/dataset/municipios_integrado.csv")
 OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
 FIG_DIR = os.path.join(OUTPUT_DIR, "figures")
+MODEL_DIR = os.path.join(OUTPUT_DIR, "modelos")
+CORR_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "correlations")
 os.makedirs(FIG_DIR, exist_ok=True)
+os.makedirs(MODEL_DIR, exist_ok=True)
 
 # Variables by dimension
 BIODIVERSITY = ['forest_cover', 'mean_species_richness', 'pol_deficit']
@@ -107,67 +113,48 @@ def load_data():
 # ============================================================
 
 def analyze_h1_1(df):
-    """H1.1: Direct chains Forest/Biodiv → Climate Risk → Health"""
+    """
+    H1.1: Direct chains Forest/Biodiv → Climate Risk → Health.
+    p_fdr: Benjamini-Hochberg over all H1.1 pairs (the three paths together).
+    """
     print("\n" + "=" * 70)
     print("H1.1: BIODIVERSITY → CLIMATE RISK → HEALTH IMPACT")
     print("=" * 70)
 
     results = []
 
-    # Path A: Biodiversity → Climate Risk
-    print("\n--- Path A: Biodiversity → Climate Risk ---")
-    for bio in BIODIVERSITY:
-        for clim in CLIMATE_RISK:
-            r, p = stats.spearmanr(df[bio], df[clim])
-            results.append({
-                'hypothesis': 'H1.1',
-                'path': 'Biodiv → Climate',
-                'predictor': bio,
-                'outcome': clim,
-                'r_spearman': r,
-                'p_value': p,
-                'significant': p < 0.05
-            })
-            sig = "***" if p < 0.001 else "**" if p < 0.01 else "*" if p < 0.05 else "ns"
-            print(f"  {bio} → {clim}: r={r:.3f} {sig}")
-
-    # Path B: Climate Risk → Health
-    print("\n--- Path B: Climate Risk → Health ---")
-    for clim in CLIMATE_RISK:
-        for health in HEALTH:
-            r, p = stats.spearmanr(df[clim], df[health])
-            results.append({
-                'hypothesis': 'H1.1',
-                'path': 'Climate → Health',
-                'predictor': clim,
-                'outcome': health,
-                'r_spearman': r,
-                'p_value': p,
-                'significant': p < 0.05
-            })
-            sig = "***" if p < 0.001 else "**" if p < 0.01 else "*" if p < 0.05 else "ns"
-            if abs(r) > 0.1:
-                print(f"  {clim} → {HEALTH_LABELS.get(health, health)}: r={r:.3f} {sig}")
-
-    # Path C: Biodiversity → Health (direct)
-    print("\n--- Path C: Biodiversity → Health (direct) ---")
-    for bio in BIODIVERSITY:
-        for health in HEALTH:
-            r, p = stats.spearmanr(df[bio], df[health])
-            results.append({
-                'hypothesis': 'H1.1',
-                'path': 'Biodiv → Health',
-                'predictor': bio,
-                'outcome': health,
-                'r_spearman': r,
-                'p_value': p,
-                'significant': p < 0.05
-            })
-            sig = "***" if p < 0.001 else "**" if p < 0.01 else "*" if p < 0.05 else "ns"
-            if abs(r) > 0.1:
-                print(f"  {bio} → {HEALTH_LABELS.get(health, health)}: r={r:.3f} {sig}")
+    # One vectorized Spearman matrix per path instead of one spearmanr per pair
+    # (header, path, predictors, outcomes, min |r| to print)
+    paths = [
+        ("Path A: Biodiversity → Climate Risk", 'Biodiv → Climate', BIODIVERSITY, CLIMATE_RISK, None),
+        ("Path B: Climate Risk → Health", 'Climate → Health', CLIMATE_RISK, HEALTH, 0.1),
+        ("Path C: Biodiversity → Health (direct)", 'Biodiv → Health', BIODIVERSITY, HEALTH, 0.1),
+    ]
+    for header, path, predictors, outcomes, min_r_print in paths:
+        print(f"\n--- {header} ---")
+        r_mat, p_mat, _ = corr_matrix(df, predictors, outcomes, method='spearman',
+                                      cache_dir=CORR_CACHE_DIR)
+        for pred in predictors:
+            for outc in outcomes:
+                r, p = r_mat.at[pred, outc], p_mat.at[pred, outc]
+                results.append({
+                    'hypothesis': 'H1.1',
+                    'path': path,
+                    'predictor': pred,
+                    'outcome': outc,
+                    'r_spearman': r,
+                    'p_value': p,
+                    'significant': p < 0.05
+                })
+                sig = "***" if p < 0.001 else "**" if p < 0.01 else "*" if p < 0.05 else "ns"
+                if min_r_print is None or abs(r) > min_r_print:
+                    print(f"  {pred} → {HEALTH_LABELS.get(outc, outc)}: r={r:.3f} {sig}")
 
-    return pd.DataFrame(results)
+    results_df = pd.DataFrame(results)
+    results_df.insert(results_df.columns.get_loc('p_value') + 1, 'p_fdr', fdr_bh(results_df['p_value'].values))
+    results_df['significant_fdr'] = results_df['p_fdr'] < 0.05
+    print(f"\n  Significant after BH-FDR: {results_df['significant_fdr'].sum()}/{len(results_df)}")
+    return results_df
 
 
 # ============================================================
@@ -331,40 +318,54 @@ def analyze_h1_3(df, df_z):
 # H1.4 — GOVERNANCE EFFECTS (SEM OR PATH ANALYSIS)
 # ============================================================
 
-def run_sem_for_health(df_z, health_var):
-    """Run full SEM model for one health outcome"""
+SEM_COLS = ['forest_cover_z', 'mean_species_richness_z', 'pol_deficit_z',
+            'flooding_risks_z', 'fire_risk_index_z', 'idx_gobernanza_100_z']
+SEM_TIMEOUT = 300  # seconds per model (sem_runner)
+SEM_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "sem")
+
+
+def build_sem_spec(df_z, health_var):
+    """Full SEM specification for one health outcome (None if columns are missing)"""
+    h_z = health_var + '_z'
+    cols_needed = SEM_COLS + [h_z]
+    if any(c not in df_z.columns for c in cols_needed):
+        return None
+
+    model_spec = f"""
+    # Biodiversity → Pollination
+    pol_deficit_z ~ forest_cover_z + mean_species_richness_z
+
+    # Governance → Biodiversity
+    forest_cover_z ~ idx_gobernanza_100_z
+
+    # Climate risks
+    flooding_risks_z ~ forest_cover_z + pol_deficit_z
+    fire_risk_index_z ~ forest_cover_z + pol_deficit_z
+
+    # Health outcome
+    {h_z} ~ flooding_risks_z + fire_risk_index_z + forest_cover_z + mean_species_richness_z + pol_deficit_z + idx_gobernanza_100_z
+    """
+    return sem_spec(health_var, model_spec, df_z[cols_needed].dropna())
+
+
+def run_sem_for_health(df_z, health_var, sem_result=None):
+    """
+    Run full SEM model for one health outcome.
+    `sem_result` is the output of sem_runner.run_sem for this outcome; if the
+    SEM timed out or failed, falls back to the manual OLS path analysis.
+    """
     h_z = health_var + '_z'
 
     if HAS_SEMOPY:
-        # Full SEM specification
-        model_spec = f"""
-        # Biodiversity → Pollination
-        pol_deficit_z ~ forest_cover_z + mean_species_richness_z
-
-        # Governance → Biodiversity
-        forest_cover_z ~ idx_gobernanza_100_z
-
-        # Climate risks
-        flooding_risks_z ~ forest_cover_z + pol_deficit_z
-        fire_risk_index_z ~ forest_cover_z + pol_deficit_z
-
-        # Health outcome
-        {h_z} ~ flooding_risks_z + fire_risk_index_z + forest_cover_z + mean_species_richness_z + pol_deficit_z + idx_gobernanza_100_z
-        """
-
-        try:
-            model = semopy.Model(model_spec)
-            cols_needed = [
-                'forest_cover_z', 'mean_species_richness_z', 'pol_deficit_z',
-                'flooding_risks_z', 'fire_risk_index_z', 'idx_gobernanza_100_z', h_z
-            ]
-            data = df_z[cols_needed].dropna()
-            result = model.fit(data)
-            estimates = model.inspect()
-            return estimates, True
-        except Exception as e:
-            print(f"  [WARN] semopy failed for {health_var}: {e}")
+        if sem_result is None:
+            sem_result = run_sem([build_sem_spec(df_z, health_var)],
+                                 timeout=SEM_TIMEOUT, cache_dir=SEM_CACHE_DIR)[0]
+        if sem_result is None:
             return None, False
+        if sem_result['status'] == 'ok':
+            return sem_result['estimates'], True
+        print(f"  [WARN] semopy {sem_result['status']} for {health_var}: "
+              f"{sem_result['error']} — using OLS path analysis")
 
     # Fallback: manual path analysis with OLS
     paths = {}
@@ -404,7 +405,7 @@ def run_sem_for_health(df_z, health_var):
     return paths, False
 
 
-def analyze_h1_4(df_z):
+def analyze_h1_4(df_z, n_jobs=None):
     """H1.4: Full SEM with governance for each health outcome"""
     print("\n" + "=" * 70)
     print("H1.4: FULL PATH ANALYSIS — GOVERNANCE → BIODIV → CLIMATE → HEALTH")
@@ -412,9 +413,22 @@ def analyze_h1_4(df_z):
 
     all_paths = {}
 
+    # Fit all SEM specs in parallel (timeout per model, warm starts, cache)
+    sem_results = {}
+    if HAS_SEMOPY:
+        specs = [build_sem_spec(df_z, health) for health in HEALTH]
+        fitted = run_sem(specs, n_jobs=n_jobs, timeout=SEM_TIMEOUT,
+                         cache_dir=SEM_CACHE_DIR)
+        sem_results = dict(zip(HEALTH, fitted))
+        timing = timing_table(fitted)
+        if len(timing) > 0:
+            print("\n  [SEM] Fit times:")
+            print(timing.drop(columns='error').to_string(index=False))
+            timing.to_csv(os.path.join(MODEL_DIR, 'h1_4_sem_timing.csv'), index=False)
+
     for health in HEALTH:
         print(f"\n--- {HEALTH_LABELS.get(health, health)} ---")
-        result, is_semopy = run_sem_for_health(df_z, health)
+        result, is_semopy = run_sem_for_health(df_z, health, sem_results.get(health))
 
         if result is None:
             print("  [SKIP] Could not fit model")
@@ -690,17 +704,17 @@ def main():
 
     # ---- H1.1 ----
     results_h1_1 = analyze_h1_1(df)
-    results_h1_1.to_csv(os.path.join(OUTPUT_DIR, '../modelos/h1_1_correlations.csv'), index=False)
+    results_h1_1.to_csv(os.path.join(MODEL_DIR, 'h1_1_correlations.csv'), index=False)
     print(f"\n  [SAVED] h1_1_correlations.csv ({len(results_h1_1)} pairs)")
 
     # ---- H1.2 ----
     results_h1_2 = analyze_h1_2(df_z)
-    results_h1_2.to_csv(os.path.join(OUTPUT_DIR, '../modelos/h1_2_mediation.csv'), index=False)
+    results_h1_2.to_csv(os.path.join(MODEL_DIR, 'h1_2_mediation.csv'), index=False)
     print(f"\n  [SAVED] h1_2_mediation.csv ({len(results_h1_2)} chains)")
 
     # ---- H1.3 ----
     results_h1_3 = analyze_h1_3(df, df_z)
-    results_h1_3.to_csv(os.path.join(OUTPUT_DIR, '../modelos/h1_3_moderation.csv'), index=False)
+    results_h1_3.to_csv(os.path.join(MODEL_DIR, 'h1_3_moderation.csv'), index=False)
     print(f"\n  [SAVED] h1_3_moderation.csv ({len(results_h1_3)} interactions)")
 
     # ---- H1.4 (SEM / Path Analysis) ----
@@ -729,7 +743,7 @@ def main():
                 })
 
     df_paths = pd.DataFrame(path_rows)
-    df_paths.to_csv(os.path.join(OUTPUT_DIR, '../modelos/h1_4_sem_paths.csv'), index=False)
+    df_paths.to_csv(os.path.join(MODEL_DIR, 'h1_4_sem_paths.csv'), index=False)
     print(f"\n  [SAVED] h1_4_sem_paths.csv ({len(df_paths)} paths)")
 
     # ---- VISUALIZATIONS ----
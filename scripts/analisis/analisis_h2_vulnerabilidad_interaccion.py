@@ -12,6 +12,7 @@ Autor: Science Team / AP Digital
 """
 
 import sys
+import argparse
 sys.stdout.reconfigure(encoding='utf-8')
 
 import pandas as pd
@@ -20,13 +21,17 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy import stats
-import statsmodels.formula.api as smf
 from sklearn.preprocessing import StandardScaler
 import warnings
 warnings.filterwarnings('ignore')
 import os
 
+from moderation_scan import (prepare_triple, fit_pair, run_scan, interaction_summary,
+                             simple_slopes, johnson_neyman)
+from permutation_engine import DEFAULT_PERMUTATIONS, interaction_test, run_permutations, add_permutation_columns
+from interaction_plots import predict_lines, kde_fft_2d, density_levels, figure_task, render_figures
+import spatial_weights
+
 # ============================================================
 # CONFIGURATION
 # ============================================================
@@ -112,93 +117,53 @@ def load_and_prepare_data():
 # INTERACTION MODEL
 # ============================================================
 
+def prepare_interaction_design(df, outcome, moderator, predictor, group_var='cod_microrregiao'):
+    """Design for logit(outcome) ~ predictor * moderator + (1|group), built once"""
+    return prepare_triple(df, f'{outcome}_logit', f'{predictor}_z', f'{moderator}_z',
+                          group_var=group_var, min_n=100,
+                          key=(outcome, moderator, predictor))
+
+
+def summarize_interaction(fit):
+    """CSV row for one fitted triple (same columns as before)"""
+    outcome, moderator, predictor = fit['key']
+    return {
+        'outcome': outcome,
+        'moderator': moderator,
+        'predictor': predictor,
+        **interaction_summary(fit, x_label='predictor', m_label='moderator')
+    }
+
+
 def fit_interaction_model(df, outcome, moderator, predictor, group_var='cod_microrregiao'):
     """
     Fit: logit(outcome) ~ predictor * moderator + (1|group)
     Returns main effects, interaction, and model stats
     """
-    outcome_logit = f'{outcome}_logit'
-    mod_z = f'{moderator}_z'
-    pred_z = f'{predictor}_z'
+    fit = fit_pair(prepare_interaction_design(df, outcome, moderator, predictor, group_var))
+    return summarize_interaction(fit) if fit is not None else None
 
-    # Check variables exist
-    required = [outcome_logit, mod_z, pred_z, group_var]
-    for v in required:
-        if v not in df.columns:
-            return None
-
-    data = df[[outcome_logit, mod_z, pred_z, group_var]].dropna()
-    if len(data) < 100:
-        return None
-
-    data = data.rename(columns={outcome_logit: 'y', mod_z: 'm', pred_z: 'x'})
-
-    try:
-        # Full model with interaction
-        model_full = smf.mixedlm('y ~ x * m', data, groups=data[group_var])
-        result_full = model_full.fit(reml=False, method='powell')
 
-        if not result_full.converged:
-            return None
-
-        # Model without interaction (for comparison)
-        model_add = smf.mixedlm('y ~ x + m', data, groups=data[group_var])
-        result_add = model_add.fit(reml=False, method='powell')
-
-        # Compute AICs
-        k_full = len(result_full.params) + 1
-        k_add = len(result_add.params) + 1
-        n = len(data)
-        aic_full = -2 * result_full.llf + 2 * k_full
-        aic_add = -2 * result_add.llf + 2 * k_add
-
-        # Marginal R2
-        var_fixed = np.var(result_full.fittedvalues)
-        var_random = float(result_full.cov_re.iloc[0, 0]) if hasattr(result_full.cov_re, 'iloc') else float(result_full.cov_re)
-        var_resid = result_full.scale
-        r2_marginal = var_fixed / (var_fixed + var_random + var_resid)
-
-        # Check for interaction term
-        if 'x:m' in result_full.params:
-            int_coef = result_full.params['x:m']
-            int_se = result_full.bse['x:m']
-            int_p = result_full.pvalues['x:m']
-        else:
-            int_coef = np.nan
-            int_se = np.nan
-            int_p = 1.0
-
-        return {
-            'outcome': outcome,
-            'moderator': moderator,
-            'predictor': predictor,
-            'coef_predictor': result_full.params['x'],
-            'p_predictor': result_full.pvalues['x'],
-            'coef_moderator': result_full.params['m'],
-            'p_moderator': result_full.pvalues['m'],
-            'coef_interaction': int_coef,
-            'se_interaction': int_se,
-            'p_interaction': int_p,
-            'aic_interaction': aic_full,
-            'aic_additive': aic_add,
-            'delta_aic': aic_full - aic_add,  # negative = interaction model better
-            'r2_marginal': r2_marginal,
-            'n': n,
-            'interaction_significant': int_p < 0.05 if pd.notna(int_p) else False,
-            'interaction_improves_fit': aic_full < aic_add
-        }
-
-    except Exception as e:
-        return None
-
-
-def run_h2_analysis(df):
-    """Run all interaction models"""
+def run_h2_analysis(df, n_jobs=None):
+    """
+    Run all interaction models.
+    Designs are built once per triple and the nested pair (x*m, x+m) is fitted
+    in parallel; returns (results_df, fits) so simple slopes and
+    Johnson-Neyman can reuse the fitted covariance without refitting.
+    """
     print("\n" + "=" * 70)
     print("H2: INTERACCION VULNERABILIDAD x OTRAS DIMENSIONES -> GOBERNANZA")
     print("Modelo: logit(Gob) ~ Predictor * Vulnerabilidad + (1|micro)")
     print("=" * 70)
 
+    triples = [(outcome, moderator, predictor)
+               for outcome in GOVERNANCE_OUTCOMES
+               for moderator in VULNERABILITY_VARS
+               for predictors in OTHER_DIM_VARS.values()
+               for predictor in predictors]
+    designs = [prepare_interaction_design(df, *t) for t in triples]
+    fits = dict(zip(triples, run_scan(designs, n_jobs=n_jobs)))
+
     results = []
 
     for outcome in GOVERNANCE_OUTCOMES:
@@ -213,11 +178,12 @@ def run_h2_analysis(df):
 
             for dim_key, predictors in OTHER_DIM_VARS.items():
                 for predictor in predictors:
-                    result = fit_interaction_model(df, outcome, moderator, predictor)
+                    fit = fits[(outcome, moderator, predictor)]
 
-                    if result is None:
+                    if fit is None:
                         continue
 
+                    result = summarize_interaction(fit)
                     results.append(result)
 
                     sig_marker = '***' if result['p_interaction'] < 0.001 else '**' if result['p_interaction'] < 0.01 else '*' if result['p_interaction'] < 0.05 else 'ns'
@@ -228,6 +194,24 @@ def run_h2_analysis(df):
                           f"{result['delta_aic']:>10.2f} {sig_marker:>8} {fit_marker}")
 
     results_df = pd.DataFrame(results)
+    return results_df, {k: v for k, v in fits.items() if v is not None}
+
+
+def add_permutation_pvalues(df, results_df, permutations=DEFAULT_PERMUTATIONS, n_jobs=None, seed=42):
+    """
+    Within-microrregiao permutation p-values for the interaction term of every
+    model in results_df (one joint family, max-T corrected): adds
+    p_perm_interaction and p_maxT_interaction.
+    """
+    key_cols = ['outcome', 'moderator', 'predictor']
+    triples = list(dict.fromkeys(results_df[key_cols].itertuples(index=False, name=None)))
+    designs = [prepare_interaction_design(df, *t) for t in triples]
+    tests = [interaction_test(d) for d in designs if d is not None]
+    print(f"\n  Permutaciones: {permutations} x {len(tests)} interacciones (max-T sobre la familia)")
+    perm = run_permutations(tests, permutations=permutations, seed=seed, n_jobs=n_jobs)
+    results_df = add_permutation_columns(results_df, perm, key_cols)
+    print(f"  Significativas (p_maxT < 0.05): {(results_df['p_maxT_interaction'] < 0.05).sum()} "
+          f"de {len(results_df)}")
     return results_df
 
 
@@ -235,59 +219,70 @@ def run_h2_analysis(df):
 # SIMPLE SLOPES ANALYSIS
 # ============================================================
 
-def compute_simple_slopes(df, outcome, moderator, predictor, levels=[-1, 0, 1]):
+def compute_simple_slopes(df, outcome, moderator, predictor, levels=[-1, 0, 1], fit=None):
     """
-    Compute simple slopes at low (-1 SD), mean (0), high (+1 SD) of moderator
+    Compute simple slopes at low (-1 SD), mean (0), high (+1 SD) of moderator.
+    Uses the covariance of an already fitted triple (`fit` from run_h2_analysis);
+    only fits the model if none is given.
     """
-    outcome_logit = f'{outcome}_logit'
-    mod_z = f'{moderator}_z'
-    pred_z = f'{predictor}_z'
-
-    data = df[[outcome_logit, mod_z, pred_z, 'cod_microrregiao']].dropna()
-    if len(data) < 100:
-        return None
+    if fit is None:
+        fit = fit_pair(prepare_interaction_design(df, outcome, moderator, predictor))
+        if fit is None:
+            return None
+    return simple_slopes(fit, levels=levels)
 
-    data = data.rename(columns={outcome_logit: 'y', mod_z: 'm', pred_z: 'x'})
 
-    try:
-        model = smf.mixedlm('y ~ x * m', data, groups=data['cod_microrregiao'])
-        result = model.fit(reml=False, method='powell')
+def compute_johnson_neyman(sig_results, fits):
+    """Johnson-Neyman regions for significant interactions (no refitting)"""
+    rows = []
+    for _, row in sig_results.iterrows():
+        fit = fits.get((row['outcome'], row['moderator'], row['predictor']))
+        if fit is None:
+            continue
+        rows.append({
+            'outcome': row['outcome'],
+            'moderator': row['moderator'],
+            'predictor': row['predictor'],
+            **johnson_neyman(fit)
+        })
+    return pd.DataFrame(rows)
 
-        if not result.converged:
-            return None
 
-        # Simple slopes: dy/dx = b_x + b_int * m
-        b_x = result.params['x']
-        b_int = result.params.get('x:m', 0)
-        var_bx = result.cov_params().loc['x', 'x']
-        var_bint = result.cov_params().loc['x:m', 'x:m'] if 'x:m' in result.cov_params().index else 0
-        cov_bx_bint = result.cov_params().loc['x', 'x:m'] if 'x:m' in result.cov_params().index else 0
-
-        slopes = []
-        for level in levels:
-            slope = b_x + b_int * level
-            se = np.sqrt(var_bx + (level ** 2) * var_bint + 2 * level * cov_bx_bint)
-            t = slope / se
-            p = 2 * (1 - stats.t.cdf(abs(t), len(data) - 4))
-
-            level_name = 'Low (-1 SD)' if level == -1 else ('Mean' if level == 0 else 'High (+1 SD)')
-            slopes.append({
-                'level': level,
-                'level_name': level_name,
-                'slope': slope,
-                'se': se,
-                't': t,
-                'p': p
-            })
-
-        return pd.DataFrame(slopes)
-
-    except:
+def compute_residual_moran(sig_results, fits, kind='queen', permutations=999):
+    """Moran's I of the interaction-model residuals (None if no shapefile/geopandas)"""
+    try:
+        w = spatial_weights.load_weights(kind)
+    except Exception as e:
+        print(f"  [SKIP] Residual Moran's I: {e}")
         return None
 
-
-def plot_simple_slopes(df, outcome, moderator, predictor, filename):
-    """Plot simple slopes at different levels of moderator"""
+    rows = []
+    for _, row in sig_results.iterrows():
+        fit = fits.get((row['outcome'], row['moderator'], row['predictor']))
+        if fit is None or fit.get('ids') is None:
+            continue
+        res = spatial_weights.moran_residuals(fit['resid'], fit['ids'], w,
+                                              permutations=permutations)
+        rows.append({
+            'outcome': row['outcome'],
+            'moderator': row['moderator'],
+            'predictor': row['predictor'],
+            'moran_i': res['I'],
+            'z_norm': res['z_norm'],
+            'p_norm': res['p_norm'],
+            'p_sim': res.get('p_sim', np.nan),
+            'weights': res['weights'],
+            'n': res['n']
+        })
+    return pd.DataFrame(rows)
+
+
+def plot_simple_slopes(df, outcome, moderator, predictor, filename, fit=None):
+    """
+    Plot simple slopes at different levels of moderator.
+    Lines and 95% bands come from the coefficients and covariance of the
+    scanned triple (`fit` from run_h2_analysis); only fits if none is given.
+    """
     outcome_logit = f'{outcome}_logit'
     mod_z = f'{moderator}_z'
     pred_z = f'{predictor}_z'
@@ -298,28 +293,23 @@ def plot_simple_slopes(df, outcome, moderator, predictor, filename):
 
     data = data.rename(columns={outcome_logit: 'y', mod_z: 'm', pred_z: 'x'})
 
-    try:
-        model = smf.mixedlm('y ~ x * m', data, groups=data['cod_microrregiao'])
-        result = model.fit(reml=False, method='powell')
-
-        if not result.converged:
+    if fit is None:
+        fit = fit_pair(prepare_interaction_design(df, outcome, moderator, predictor))
+        if fit is None:
             return
 
+    try:
         fig, ax = plt.subplots(figsize=(10, 7))
 
         # Plot at 3 levels of moderator
-        x_range = np.linspace(data['x'].min(), data['x'].max(), 100)
+        x_range = np.linspace(*fit['x_range'], 100)
         colors = ['#1a9850', '#fc8d59', '#d73027']  # green, orange, red
-        levels = [data['m'].quantile(0.1), data['m'].median(), data['m'].quantile(0.9)]
+        levels = fit['m_quantiles']
         level_names = ['Low (P10)', 'Medium (P50)', 'High (P90)']
 
-        b0 = result.params['Intercept']
-        b_x = result.params['x']
-        b_m = result.params['m']
-        b_int = result.params.get('x:m', 0)
-
-        for level, name, color in zip(levels, level_names, colors):
-            y_pred = b0 + b_x * x_range + b_m * level + b_int * x_range * level
+        lines = predict_lines(fit, x_range, levels)
+        for (y_pred, lower, upper), name, color in zip(lines, level_names, colors):
+            ax.fill_between(x_range, lower, upper, color=color, alpha=0.15, linewidth=0, zorder=2)
             ax.plot(x_range, y_pred, color=color, linewidth=2.5,
                     label=f'{name} {VAR_LABELS.get(moderator, moderator)}', zorder=3)
 
@@ -332,7 +322,8 @@ def plot_simple_slopes(df, outcome, moderator, predictor, filename):
         cbar.ax.tick_params(labelsize=9)
 
         # Stats
-        int_p = result.pvalues.get('x:m', 1)
+        b_int = fit['params'].get('x:m', 0)
+        int_p = fit['pvalues'].get('x:m', 1)
         sig = '***' if int_p < 0.001 else '**' if int_p < 0.01 else '*' if int_p < 0.05 else 'ns'
         stats_text = (f"Interaccion: b = {b_int:.4f} ({sig})\n"
                      f"p = {int_p:.4f}")
@@ -394,17 +385,19 @@ def plot_heatmap_2d(df, outcome, moderator, predictor, filename):
     # Background scatter
     ax2.scatter(data[pred_z], data[outcome_logit], alpha=0.08, s=5, c='gray', zorder=1)
 
+    # Binned FFT KDE (same bandwidth and contour levels as sns.kdeplot)
     for label in ['Low', 'Medium', 'High']:
         subset = data[terciles == label]
         if len(subset) < 30:
             continue
-        try:
-            sns.kdeplot(x=subset[pred_z], y=subset[outcome_logit],
-                       ax=ax2, color=kde_colors[label], levels=3,
-                       linewidths=1.5, label=f'{label} {VAR_LABELS.get(moderator, moderator)}',
-                       warn_singular=False)
-        except Exception:
-            pass
+        kde = kde_fft_2d(subset[pred_z], subset[outcome_logit])
+        if kde is None:
+            continue
+        xx, yy, density = kde
+        ax2.contour(xx, yy, density.T, levels=density_levels(density, levels=3),
+                    colors=kde_colors[label], linewidths=1.5)
+        ax2.plot([], [], color=kde_colors[label], linewidth=1.5,
+                 label=f'{label} {VAR_LABELS.get(moderator, moderator)}')
 
     ax2.set_xlabel(f'{VAR_LABELS.get(predictor, predictor)} (z)', fontsize=11)
     ax2.set_ylabel(f'logit({VAR_LABELS.get(outcome, outcome)})', fontsize=11)
@@ -507,6 +500,13 @@ def plot_summary_forest(results_df, filename):
 # ============================================================
 
 def main():
+    parser = argparse.ArgumentParser(description="Analisis H2 - Interaccion vulnerabilidad x otras dimensiones")
+    parser.add_argument("--permutations", type=int, default=0,
+                        help=f"Permutaciones dentro de microrregiao para p_perm / p_maxT (0 = sin; sugerido {DEFAULT_PERMUTATIONS})")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Procesos en paralelo (por defecto, nucleos disponibles)")
+    args = parser.parse_args()
+
     print("=" * 70)
     print("ANALISIS H2 - INTERACCION VULNERABILIDAD x OTRAS DIMENSIONES")
     print("Solicitud: Dr. Adrian David Gonzalez Chaves (29/01/2026)")
@@ -516,7 +516,9 @@ def main():
     df = load_and_prepare_data()
 
     # Run analysis
-    results_df = run_h2_analysis(df)
+    results_df, fits = run_h2_analysis(df, n_jobs=args.jobs)
+    if args.permutations:
+        results_df = add_permutation_pvalues(df, results_df, args.permutations, n_jobs=args.jobs)
 
     # Save results
     results_df.to_csv(os.path.join(OUTPUT_DIR, 'h2_interactions.csv'), index=False)
@@ -539,6 +541,18 @@ def main():
                   f"{VAR_LABELS.get(row['predictor'], row['predictor']):<20} "
                   f"{row['coef_interaction']:>10.4f} {row['p_interaction']:>10.4f}")
 
+    # Johnson-Neyman regions (reuse fitted covariance)
+    if len(sig_results) > 0:
+        jn_df = compute_johnson_neyman(sig_results, fits)
+        jn_df.to_csv(os.path.join(OUTPUT_DIR, 'h2_johnson_neyman.csv'), index=False)
+        print(f"\n  [SAVED] h2_johnson_neyman.csv ({len(jn_df)} interactions)")
+
+        # Spatial autocorrelation of residuals (queen contiguity)
+        moran_df = compute_residual_moran(sig_results, fits)
+        if moran_df is not None:
+            moran_df.to_csv(os.path.join(OUTPUT_DIR, 'h2_residual_moran.csv'), index=False)
+            print(f"\n  [SAVED] h2_residual_moran.csv ({len(moran_df)} models)")
+
     # Visualizations
     print("\n" + "=" * 70)
     print("GENERANDO VISUALIZACIONES")
@@ -547,21 +561,18 @@ def main():
     plot_interaction_heatmap(results_df, 'h2_interaction_heatmap.png')
     plot_summary_forest(results_df, 'h2_forest_plot.png')
 
-    # Simple slopes for significant interactions
-    print("\n  Generating simple slopes plots...")
-    for _, row in sig_results.head(6).iterrows():
-        safe_mod = row['moderator'].replace('pct_', '').replace('idx_', '')[:10]
-        safe_pred = row['predictor'].replace('incidence_mean_', '').replace('health_', '')[:10]
-        fname = f"h2_slopes_{safe_pred}_{safe_mod}.png"
-        plot_simple_slopes(df, row['outcome'], row['moderator'], row['predictor'], fname)
-
-    # 2D Heatmaps for significant interactions
-    print("\n  Generating 2D heatmaps...")
+    # Simple slopes and 2D heatmaps for significant interactions, rendered in
+    # parallel from the scanned fits (no refitting)
+    print("\n  Generating simple slopes plots and 2D heatmaps...")
+    tasks = []
     for _, row in sig_results.head(6).iterrows():
+        key = (row['outcome'], row['moderator'], row['predictor'])
         safe_mod = row['moderator'].replace('pct_', '').replace('idx_', '')[:10]
         safe_pred = row['predictor'].replace('incidence_mean_', '').replace('health_', '')[:10]
-        fname = f"h2_heatmap_{safe_pred}_{safe_mod}.png"
-        plot_heatmap_2d(df, row['outcome'], row['moderator'], row['predictor'], fname)
+        tasks.append(figure_task(plot_simple_slopes, *key, f"h2_slopes_{safe_pred}_{safe_mod}.png",
+                                 fit=fits.get(key)))
+        tasks.append(figure_task(plot_heatmap_2d, *key, f"h2_heatmap_{safe_pred}_{safe_mod}.png"))
+    render_figures(tasks, df, n_jobs=args.jobs)
 
     # Key finding
     print("\n" + "=" * 70)
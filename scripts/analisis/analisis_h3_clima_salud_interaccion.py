@@ -13,6 +13,7 @@ Autor: Science Team / AP Digital
 """
 
 import sys
+import argparse
 sys.stdout.reconfigure(encoding='utf-8')
 
 import pandas as pd
@@ -22,12 +23,15 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy import stats
-import statsmodels.formula.api as smf
 from sklearn.preprocessing import StandardScaler
 import warnings
 warnings.filterwarnings('ignore')
 import os
 
+from moderation_scan import prepare_triple, fit_pair, run_scan, interaction_summary
+from permutation_engine import DEFAULT_PERMUTATIONS, interaction_test, run_permutations, add_permutation_columns
+from interaction_plots import predict_lines, figure_task, render_figures
+
 # ============================================================
 # CONFIGURATION
 # ============================================================
@@ -118,85 +122,69 @@ def load_and_prepare_data():
 # INTERACTION MODEL
 # ============================================================
 
+def prepare_climate_health_design(df, outcome, health_var, climate_var, group_var='cod_microrregiao'):
+    """Design for logit(outcome) ~ health * climate + (1|group), built once"""
+    return prepare_triple(df, f'{outcome}_logit', f'{health_var}_z', f'{climate_var}_z',
+                          group_var=group_var, min_n=100,
+                          key=(outcome, health_var, climate_var))
+
+
+def summarize_climate_health(fit):
+    """CSV row for one fitted triple (same columns as before)"""
+    outcome, health_var, climate_var = fit['key']
+    return {
+        'outcome': outcome,
+        'health_var': health_var,
+        'climate_var': climate_var,
+        **interaction_summary(fit, x_label='health', m_label='climate')
+    }
+
+
 def fit_climate_health_interaction(df, outcome, health_var, climate_var, group_var='cod_microrregiao'):
     """
     Fit: logit(outcome) ~ health * climate + (1|group)
     """
-    outcome_logit = f'{outcome}_logit'
-    health_z = f'{health_var}_z'
-    climate_z = f'{climate_var}_z'
-
-    for v in [outcome_logit, health_z, climate_z]:
-        if v not in df.columns:
-            return None
-
-    data = df[[outcome_logit, health_z, climate_z, group_var]].dropna()
-    if len(data) < 100:
-        return None
-
-    data = data.rename(columns={outcome_logit: 'y', health_z: 'h', climate_z: 'c'})
+    fit = fit_pair(prepare_climate_health_design(df, outcome, health_var, climate_var, group_var))
+    return summarize_climate_health(fit) if fit is not None else None
 
-    try:
-        # Full model
-        model_full = smf.mixedlm('y ~ h * c', data, groups=data[group_var])
-        result_full = model_full.fit(reml=False, method='powell')
-
-        if not result_full.converged:
-            return None
-
-        # Additive model
-        model_add = smf.mixedlm('y ~ h + c', data, groups=data[group_var])
-        result_add = model_add.fit(reml=False, method='powell')
-
-        # AICs
-        k_full = len(result_full.params) + 1
-        k_add = len(result_add.params) + 1
-        n = len(data)
-        aic_full = -2 * result_full.llf + 2 * k_full
-        aic_add = -2 * result_add.llf + 2 * k_add
-
-        # R2
-        var_fixed = np.var(result_full.fittedvalues)
-        var_random = float(result_full.cov_re.iloc[0, 0]) if hasattr(result_full.cov_re, 'iloc') else float(result_full.cov_re)
-        var_resid = result_full.scale
-        r2_marginal = var_fixed / (var_fixed + var_random + var_resid)
-
-        # Interaction
-        int_coef = result_full.params.get('h:c', np.nan)
-        int_se = result_full.bse.get('h:c', np.nan)
-        int_p = result_full.pvalues.get('h:c', 1.0)
-
-        return {
-            'outcome': outcome,
-            'health_var': health_var,
-            'climate_var': climate_var,
-            'coef_health': result_full.params['h'],
-            'p_health': result_full.pvalues['h'],
-            'coef_climate': result_full.params['c'],
-            'p_climate': result_full.pvalues['c'],
-            'coef_interaction': int_coef,
-            'se_interaction': int_se,
-            'p_interaction': int_p,
-            'aic_interaction': aic_full,
-            'aic_additive': aic_add,
-            'delta_aic': aic_full - aic_add,
-            'r2_marginal': r2_marginal,
-            'n': n,
-            'interaction_significant': int_p < 0.05 if pd.notna(int_p) else False,
-            'interaction_improves_fit': aic_full < aic_add
-        }
 
-    except Exception as e:
-        return None
+def scan_climate_health(df, triples, n_jobs=None):
+    """Fit the nested pair for every (outcome, health, climate) triple in parallel"""
+    designs = [prepare_climate_health_design(df, *t) for t in triples]
+    return dict(zip(triples, run_scan(designs, n_jobs=n_jobs)))
 
 
-def run_theory_driven_analysis(df):
-    """Run analysis for theoretically linked pairs"""
+def add_permutation_pvalues(df, results_df, permutations=DEFAULT_PERMUTATIONS, n_jobs=None, seed=42):
+    """
+    Within-microrregiao permutation p-values for the interaction term of every
+    model in results_df (one joint family, max-T corrected): adds
+    p_perm_interaction and p_maxT_interaction.
+    """
+    key_cols = ['outcome', 'health_var', 'climate_var']
+    triples = list(dict.fromkeys(results_df[key_cols].itertuples(index=False, name=None)))
+    designs = [prepare_climate_health_design(df, *t) for t in triples]
+    tests = [interaction_test(d) for d in designs if d is not None]
+    print(f"\n  Permutaciones: {permutations} x {len(tests)} interacciones (max-T sobre la familia)")
+    perm = run_permutations(tests, permutations=permutations, seed=seed, n_jobs=n_jobs)
+    results_df = add_permutation_columns(results_df, perm, key_cols)
+    print(f"  Significativas (p_maxT < 0.05): {(results_df['p_maxT_interaction'] < 0.05).sum()} "
+          f"de {len(results_df)}")
+    return results_df
+
+
+def run_theory_driven_analysis(df, n_jobs=None):
+    """
+    Run analysis for theoretically linked pairs.
+    Returns (results_df, fits) so the plots reuse the fitted coefficients.
+    """
     print("\n" + "=" * 70)
     print("H3a: PARES TEORICAMENTE VINCULADOS")
     print("Modelo: logit(Gob) ~ Salud * Clima + (1|micro)")
     print("=" * 70)
 
+    fits = scan_climate_health(df, [(outcome, health_var, climate_var)
+                                    for health_var, climate_var, _ in THEORY_PAIRS
+                                    for outcome in GOVERNANCE_OUTCOMES], n_jobs=n_jobs)
     results = []
 
     for health_var, climate_var, pair_name in THEORY_PAIRS:
@@ -205,11 +193,12 @@ def run_theory_driven_analysis(df):
         print(f"  {'-'*60}")
 
         for outcome in GOVERNANCE_OUTCOMES:
-            result = fit_climate_health_interaction(df, outcome, health_var, climate_var)
+            fit = fits[(outcome, health_var, climate_var)]
 
-            if result is None:
+            if fit is None:
                 continue
 
+            result = summarize_climate_health(fit)
             result['pair_name'] = pair_name
             result['theory_driven'] = True
             results.append(result)
@@ -221,36 +210,36 @@ def run_theory_driven_analysis(df):
                   f"{result['coef_interaction']:>10.4f} {result['p_interaction']:>10.4f} "
                   f"{result['delta_aic']:>10.2f} {sig:>10} {fit_mark}")
 
-    return pd.DataFrame(results)
+    return pd.DataFrame(results), {k: v for k, v in fits.items() if v is not None}
 
 
-def run_exploratory_analysis(df):
-    """Run all climate x health combinations"""
+def run_exploratory_analysis(df, n_jobs=None):
+    """Run all climate x health combinations; returns (results_df, fits)"""
     print("\n" + "=" * 70)
     print("H3b: ANALISIS EXPLORATORIO (TODAS LAS COMBINACIONES)")
     print("=" * 70)
 
-    results = []
-    total = len(HEALTH_VARS) * len(CLIMATE_VARS) * len(GOVERNANCE_OUTCOMES)
-    done = 0
+    triples = [(outcome, health_var, climate_var)
+               for outcome in GOVERNANCE_OUTCOMES
+               for health_var in HEALTH_VARS
+               for climate_var in CLIMATE_VARS]
+    fits = scan_climate_health(df, triples, n_jobs=n_jobs)
 
-    for outcome in GOVERNANCE_OUTCOMES:
-        for health_var in HEALTH_VARS:
-            for climate_var in CLIMATE_VARS:
-                result = fit_climate_health_interaction(df, outcome, health_var, climate_var)
-                done += 1
-
-                if result is None:
-                    continue
+    results = []
+    for outcome, health_var, climate_var in triples:
+        fit = fits[(outcome, health_var, climate_var)]
+        if fit is None:
+            continue
 
-                result['theory_driven'] = False
-                result['pair_name'] = f"{VAR_LABELS.get(health_var, health_var)[:10]}-{VAR_LABELS.get(climate_var, climate_var)[:10]}"
-                results.append(result)
+        result = summarize_climate_health(fit)
+        result['theory_driven'] = False
+        result['pair_name'] = f"{VAR_LABELS.get(health_var, health_var)[:10]}-{VAR_LABELS.get(climate_var, climate_var)[:10]}"
+        results.append(result)
 
-    print(f"  Modelos evaluados: {done}")
+    print(f"  Modelos evaluados: {len(triples)}")
     print(f"  Modelos convergentes: {len(results)}")
 
-    return pd.DataFrame(results)
+    return pd.DataFrame(results), {k: v for k, v in fits.items() if v is not None}
 
 
 # ============================================================
@@ -315,8 +304,69 @@ def plot_interaction_matrix(results_df, filename):
     print(f"  [SAVED] {filename}")
 
 
-def plot_theory_pairs(df, results_df, filename_prefix='h3_theory'):
-    """Plot significant theory-driven pairs"""
+def plot_theory_pair(df, outcome, health_var, climate_var, pair_name, filename, fit=None):
+    """
+    Simple slopes of one theory pair at 3 climate levels (P10/P50/P90).
+    Lines and 95% bands come from the scanned fit; only fits if none is given.
+    """
+    outcome_logit = f'{outcome}_logit'
+    health_z = f'{health_var}_z'
+    climate_z = f'{climate_var}_z'
+
+    data = df[[outcome_logit, health_z, climate_z, 'cod_microrregiao']].dropna()
+    if len(data) < 100:
+        return
+
+    data = data.rename(columns={outcome_logit: 'y', health_z: 'h', climate_z: 'c'})
+
+    if fit is None:
+        fit = fit_pair(prepare_climate_health_design(df, outcome, health_var, climate_var))
+        if fit is None:
+            return
+
+    try:
+        fig, ax = plt.subplots(figsize=(10, 7))
+
+        # Plot at 3 levels of climate
+        h_range = np.linspace(*fit['x_range'], 100)
+        colors = ['#1a9850', '#fc8d59', '#d73027']
+        levels = fit['m_quantiles']
+        level_names = ['Low', 'Med', 'High']
+
+        lines = predict_lines(fit, h_range, levels)
+        for (y_pred, lower, upper), name, color in zip(lines, level_names, colors):
+            ax.fill_between(h_range, lower, upper, color=color, alpha=0.15, linewidth=0)
+            ax.plot(h_range, y_pred, color=color, linewidth=2.5,
+                   label=f'{name} {VAR_LABELS.get(climate_var, climate_var)}')
+
+        ax.scatter(data['h'], data['y'], alpha=0.15, s=10, c='gray')
+
+        b_int = fit['params'].get('x:m', 0)
+        int_p = fit['pvalues'].get('x:m', 1)
+        sig = '***' if int_p < 0.001 else '**' if int_p < 0.01 else '*' if int_p < 0.05 else 'ns'
+        stats_text = f"b_interaccion = {b_int:.4f} ({sig})\np = {int_p:.4f}"
+        ax.text(0.02, 0.98, stats_text, transform=ax.transAxes, fontsize=10,
+               va='top', bbox=dict(boxstyle='round', facecolor='white', alpha=0.9))
+
+        ax.set_xlabel(f'{VAR_LABELS.get(health_var, health_var)} (z)', fontsize=11)
+        ax.set_ylabel(f'logit({VAR_LABELS.get(outcome, outcome)})', fontsize=11)
+        ax.set_title(f'H3: {pair_name}\n{VAR_LABELS.get(health_var, health_var)} x '
+                    f'{VAR_LABELS.get(climate_var, climate_var)} -> '
+                    f'{VAR_LABELS.get(outcome, outcome)}',
+                    fontsize=12, fontweight='bold')
+        ax.legend(loc='lower right')
+
+        plt.tight_layout()
+        plt.savefig(os.path.join(FIG_DIR, filename), dpi=150, bbox_inches='tight')
+        plt.close()
+        print(f"  [SAVED] {filename}")
+
+    except Exception as e:
+        plt.close('all')
+
+
+def plot_theory_pairs(df, results_df, filename_prefix='h3_theory', fits=None, n_jobs=None):
+    """Plot significant theory-driven pairs (in parallel, from the scanned fits)"""
     print(f"\n  Generating theory pair plots...")
 
     theory_results = results_df[results_df['theory_driven'] == True]
@@ -326,72 +376,15 @@ def plot_theory_pairs(df, results_df, filename_prefix='h3_theory'):
         print("  No significant theory-driven interactions")
         return
 
+    fits = fits or {}
+    tasks = []
     for _, row in sig_theory.iterrows():
-        health_var = row['health_var']
-        climate_var = row['climate_var']
-        outcome = row['outcome']
+        key = (row['outcome'], row['health_var'], row['climate_var'])
         pair_name = row['pair_name']
-
-        outcome_logit = f'{outcome}_logit'
-        health_z = f'{health_var}_z'
-        climate_z = f'{climate_var}_z'
-
-        data = df[[outcome_logit, health_z, climate_z, 'cod_microrregiao']].dropna()
-        if len(data) < 100:
-            continue
-
-        data = data.rename(columns={outcome_logit: 'y', health_z: 'h', climate_z: 'c'})
-
-        try:
-            model = smf.mixedlm('y ~ h * c', data, groups=data['cod_microrregiao'])
-            result = model.fit(reml=False, method='powell')
-
-            if not result.converged:
-                continue
-
-            fig, ax = plt.subplots(figsize=(10, 7))
-
-            # Plot at 3 levels of climate
-            h_range = np.linspace(data['h'].min(), data['h'].max(), 100)
-            colors = ['#1a9850', '#fc8d59', '#d73027']
-            levels = [data['c'].quantile(0.1), data['c'].median(), data['c'].quantile(0.9)]
-            level_names = ['Low', 'Med', 'High']
-
-            b0 = result.params['Intercept']
-            b_h = result.params['h']
-            b_c = result.params['c']
-            b_int = result.params.get('h:c', 0)
-
-            for level, name, color in zip(levels, level_names, colors):
-                y_pred = b0 + b_h * h_range + b_c * level + b_int * h_range * level
-                ax.plot(h_range, y_pred, color=color, linewidth=2.5,
-                       label=f'{name} {VAR_LABELS.get(climate_var, climate_var)}')
-
-            ax.scatter(data['h'], data['y'], alpha=0.15, s=10, c='gray')
-
-            int_p = result.pvalues.get('h:c', 1)
-            sig = '***' if int_p < 0.001 else '**' if int_p < 0.01 else '*' if int_p < 0.05 else 'ns'
-            stats_text = f"b_interaccion = {b_int:.4f} ({sig})\np = {int_p:.4f}"
-            ax.text(0.02, 0.98, stats_text, transform=ax.transAxes, fontsize=10,
-                   va='top', bbox=dict(boxstyle='round', facecolor='white', alpha=0.9))
-
-            ax.set_xlabel(f'{VAR_LABELS.get(health_var, health_var)} (z)', fontsize=11)
-            ax.set_ylabel(f'logit({VAR_LABELS.get(outcome, outcome)})', fontsize=11)
-            ax.set_title(f'H3: {pair_name}\n{VAR_LABELS.get(health_var, health_var)} x '
-                        f'{VAR_LABELS.get(climate_var, climate_var)} -> '
-                        f'{VAR_LABELS.get(outcome, outcome)}',
-                        fontsize=12, fontweight='bold')
-            ax.legend(loc='lower right')
-
-            plt.tight_layout()
-            safe_name = pair_name.replace(' ', '_').replace('-', '_')[:20]
-            fname = f"{filename_prefix}_{safe_name}.png"
-            plt.savefig(os.path.join(FIG_DIR, fname), dpi=150, bbox_inches='tight')
-            plt.close()
-            print(f"  [SAVED] {fname}")
-
-        except Exception as e:
-            continue
+        safe_name = pair_name.replace(' ', '_').replace('-', '_')[:20]
+        fname = f"{filename_prefix}_{safe_name}.png"
+        tasks.append(figure_task(plot_theory_pair, *key, pair_name, fname, fit=fits.get(key)))
+    render_figures(tasks, df, n_jobs=n_jobs)
 
 
 def plot_summary_table(results_df, filename):
@@ -452,6 +445,13 @@ def plot_summary_table(results_df, filename):
 # ============================================================
 
 def main():
+    parser = argparse.ArgumentParser(description="Analisis H3 - Interaccion clima x salud -> gobernanza")
+    parser.add_argument("--permutations", type=int, default=0,
+                        help=f"Permutaciones dentro de microrregiao para p_perm / p_maxT (0 = sin; sugerido {DEFAULT_PERMUTATIONS})")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Procesos en paralelo (por defecto, nucleos disponibles)")
+    args = parser.parse_args()
+
     print("=" * 70)
     print("ANALISIS H3 - INTERACCION CLIMA x SALUD -> GOBERNANZA")
     print("Solicitud: Dr. Adrian David Gonzalez Chaves (29/01/2026)")
@@ -461,14 +461,20 @@ def main():
     df = load_and_prepare_data()
 
     # Theory-driven analysis
-    theory_results = run_theory_driven_analysis(df)
+    theory_results, fits = run_theory_driven_analysis(df, n_jobs=args.jobs)
 
     # Exploratory analysis
-    explore_results = run_exploratory_analysis(df)
+    explore_results, explore_fits = run_exploratory_analysis(df, n_jobs=args.jobs)
+    fits.update(explore_fits)
 
     # Combine
     all_results = pd.concat([theory_results, explore_results], ignore_index=True)
 
+    # Permutation p-values (one family: theory + exploratory models)
+    if args.permutations:
+        all_results = add_permutation_pvalues(df, all_results, args.permutations, n_jobs=args.jobs)
+        theory_results = all_results[all_results['theory_driven'].astype(bool)].reset_index(drop=True)
+
     # Save
     all_results.to_csv(os.path.join(OUTPUT_DIR, 'h3_interactions.csv'), index=False)
     theory_results.to_csv(os.path.join(OUTPUT_DIR, 'h3_theory_pairs.csv'), index=False)
@@ -497,7 +503,7 @@ def main():
     print("=" * 70)
 
     plot_interaction_matrix(all_results, 'h3_interaction_matrix.png')
-    plot_theory_pairs(df, all_results)
+    plot_theory_pairs(df, all_results, fits=fits, n_jobs=args.jobs)
     plot_summary_table(all_results, 'h3_summary_table.png')
 
     # Key finding
@@ -51,6 +51,7 @@ try:
 except ImportError:
     HAS_SEMOPY = False
     print("ADVERTENCIA: semopy no disponible. Analisis SEM se omitiran.")
+from sem_runner import sem_spec, run_sem, timing_table
 
 PROJECT_ROOT = Path("C:/Users/arlex/Documents/Adrian David")
 OUTPUTS = PROJECT_ROOT / "outputs"
@@ -83,6 +84,10 @@ CONTROLS = ['pct_rural', 'log_pop', 'idx_vulnerabilidad']
 N_BOOTSTRAP = 5000
 RANDOM_SEED = 42
 
+# SEM (sem_runner): timeout por modelo y cache de modelos ajustados
+SEM_TIMEOUT = 300
+SEM_CACHE_DIR = OUTPUTS / "cache" / "sem"
+
 # =============================================================================
 # FUNCIONES AUXILIARES
 # =============================================================================
@@ -106,6 +111,39 @@ def sig_stars(p):
     return 'ns'
 
 
+def print_sem_result(res, label, csv_path):
+    """Imprime ajuste y trayectorias de un resultado de sem_runner y guarda las estimaciones."""
+    if res['status'] != 'ok':
+        print(f"  Error SEM {label}: {res['error']}")
+        return
+    try:
+        estimates, stats_sem = res['estimates'], res['stats']
+
+        print(f"\n  SEM {label} (N={res['n']}): "
+              f"Chi2={stats_sem.get('chi2', ['N/A'])[0]:.3f}, "
+              f"CFI={stats_sem.get('CFI', ['N/A'])[0]:.3f}, "
+              f"RMSEA={stats_sem.get('RMSEA', ['N/A'])[0]:.3f}")
+
+        paths = estimates[estimates['op'] == '~'].copy()
+        paths['sig'] = paths['p-value'].apply(sig_stars)
+        print(paths[['lval', 'op', 'rval', 'Estimate',
+                     'Std. Err', 'p-value', 'sig']].to_string(index=False))
+
+        estimates.to_csv(csv_path, index=False)
+    except Exception as e:
+        print(f"  Error SEM {label}: {e}")
+
+
+def save_sem_timing(results, prefix):
+    """Tiempos de ajuste por modelo SEM."""
+    timing = timing_table(results)
+    if len(timing) == 0:
+        return
+    print(f"\n  Tiempos de ajuste SEM ({prefix}):")
+    print(timing.drop(columns='error').to_string(index=False))
+    timing.to_csv(OUTPUTS / f"{prefix}_sem_timing.csv", index=False)
+
+
 def safe_log(x, offset=1e-6):
     """Log-transform seguro para valores >= 0."""
     return np.log(x + offset)
@@ -546,10 +584,10 @@ def analisis_h3_2(df):
     if HAS_SEMOPY:
         print("\n--- SEM con semopy (log-z variables) ---")
 
-        # Construir SEM para cada outcome
+        # Construir SEM para cada outcome y ajustarlos en paralelo
+        sem_outcomes, specs = [], []
         for outcome_info in HEALTH_OUTCOMES:
             outcome_z = f"{outcome_info['name']}_z"
-            outcome_label = outcome_info['label']
 
             if outcome_z not in df.columns:
                 continue
@@ -565,28 +603,14 @@ def analisis_h3_2(df):
             fire_risk_index_z ~ fire_incidence_mean_z + forest_cover_z + pct_rural_z
             {outcome_z} ~ fire_risk_index_z + fire_incidence_mean_z + forest_cover_z + idx_vulnerabilidad_z
             """
-            try:
-                model = semopy.Model(model_desc)
-                result = model.fit(df_sem)
-                estimates = model.inspect()
-                stats_sem = semopy.calc_stats(model)
-
-                print(f"\n  SEM Y={outcome_label} (N={len(df_sem)}): "
-                      f"Chi2={stats_sem.get('chi2', ['N/A'])[0]:.3f}, "
-                      f"CFI={stats_sem.get('CFI', ['N/A'])[0]:.3f}, "
-                      f"RMSEA={stats_sem.get('RMSEA', ['N/A'])[0]:.3f}")
+            sem_outcomes.append(outcome_info)
+            specs.append(sem_spec(f"h3_2 {outcome_info['name']}", model_desc, df_sem))
 
-                paths = estimates[estimates['op'] == '~'].copy()
-                paths['sig'] = paths['p-value'].apply(sig_stars)
-                print(paths[['lval', 'op', 'rval', 'Estimate',
-                             'Std. Err', 'p-value', 'sig']].to_string(index=False))
-
-                safe_label = outcome_info['name'].replace('_rate', '')
-                estimates.to_csv(
-                    OUTPUTS / f"h3_2_sem_{safe_label}.csv", index=False)
-
-            except Exception as e:
-                print(f"  Error SEM Y={outcome_label}: {e}")
+        fitted = run_sem(specs, timeout=SEM_TIMEOUT, cache_dir=SEM_CACHE_DIR)
+        for outcome_info, res in zip(sem_outcomes, fitted):
+            print_sem_result(res, f"Y={outcome_info['label']}",
+                             OUTPUTS / f"h3_2_sem_{outcome_info['name'].replace('_rate', '')}.csv")
+        save_sem_timing(fitted, "h3_2")
 
     df_serial.to_csv(OUTPUTS / "h3_2_mediacion_serial.csv", index=False)
     return df_serial
@@ -803,9 +827,9 @@ def analisis_h3_4(df):
     if HAS_SEMOPY:
         print("\n--- SEM Completo H3.4 ---")
 
+        sem_labels, specs = [], []
         for outcome_info in HEALTH_OUTCOMES:
             outcome_z = f"{outcome_info['name']}_z"
-            outcome_label = outcome_info['label']
 
             if outcome_z not in df.columns:
                 continue
@@ -826,28 +850,14 @@ def analisis_h3_4(df):
                 fire_risk_index_z ~ fire_incidence_mean_z + forest_cover_z + pct_rural_z
                 {outcome_z} ~ fire_risk_index_z + fire_incidence_mean_z + forest_cover_z + idx_vulnerabilidad_z + pct_pobreza_z
                 """
-                try:
-                    model = semopy.Model(model_desc)
-                    result = model.fit(df_sem)
-                    estimates = model.inspect()
-                    stats_sem = semopy.calc_stats(model)
-
-                    print(f"\n  SEM {gov_name} -> {outcome_label} (N={len(df_sem)}): "
-                          f"Chi2={stats_sem.get('chi2', ['N/A'])[0]:.3f}, "
-                          f"CFI={stats_sem.get('CFI', ['N/A'])[0]:.3f}, "
-                          f"RMSEA={stats_sem.get('RMSEA', ['N/A'])[0]:.3f}")
-
-                    paths = estimates[estimates['op'] == '~'].copy()
-                    paths['sig'] = paths['p-value'].apply(sig_stars)
-                    print(paths[['lval', 'op', 'rval', 'Estimate',
-                                 'Std. Err', 'p-value', 'sig']].to_string(index=False))
-
-                    safe_name = f"{gov_name}_{outcome_info['name']}".replace('.', '_').replace(' ', '_')
-                    estimates.to_csv(
-                        OUTPUTS / f"h3_4_sem_{safe_name}.csv", index=False)
-
-                except Exception as e:
-                    print(f"  Error SEM {gov_name} -> {outcome_label}: {e}")
+                safe_name = f"{gov_name}_{outcome_info['name']}".replace('.', '_').replace(' ', '_')
+                sem_labels.append((f"{gov_name} -> {outcome_info['label']}", safe_name))
+                specs.append(sem_spec(f"h3_4 {safe_name}", model_desc, df_sem))
+
+        fitted = run_sem(specs, timeout=SEM_TIMEOUT, cache_dir=SEM_CACHE_DIR)
+        for (label, safe_name), res in zip(sem_labels, fitted):
+            print_sem_result(res, label, OUTPUTS / f"h3_4_sem_{safe_name}.csv")
+        save_sem_timing(fitted, "h3_4")
 
     # --- Descomposicion de efectos indirectos de gobernanza ---
     print("\n--- Descomposicion efectos indirectos (por outcome) ---")
@@ -15,6 +15,7 @@ Autor: Science Team / AP Digital
 """
 
 import sys
+import argparse
 sys.stdout.reconfigure(encoding='utf-8')
 
 import pandas as pd
@@ -30,6 +31,9 @@ import warnings
 warnings.filterwarnings('ignore')
 import os
 
+from confounder_sensitivity import NO_CONTROL, prepare_lattice, run_lattices, stability_summary, plot_stability
+from grouped_cv import DEFAULT_FOLDS, cross_validate_pairs, add_cv_columns, best_by_cv
+
 # ============================================================
 # CONFIGURATION
 # ============================================================
@@ -59,6 +63,28 @@ VULN_VARS = ['pct_pobreza', 'pct_rural', 'pct_preta', 'pct_indigena']
 # Urbanization controls (for dilution effect validation)
 URBAN_CONTROLS = ['population', 'pct_rural', 'pct_urbana']
 
+# Modelos de la validacion clasica (subconjuntos de log_population + pct_rural)
+DILUTION_CONTROLS = ['log_population', 'pct_rural']
+DILUTION_MODELS = {
+    NO_CONTROL: 'Sin control',
+    'log_population': '+ log(Poblacion)',
+    'pct_rural': '+ % Rural',
+    'log_population,pct_rural': '+ Ambos',
+}
+
+# Key pairs to validate
+DILUTION_PAIRS = [
+    ('incidence_mean_dengue', 'forest_cover'),
+    ('incidence_mean_malaria', 'forest_cover'),
+    ('incidence_mean_leishmaniose', 'forest_cover'),
+    ('incidence_mean_leptospirose', 'forest_cover'),
+    ('incidence_mean_dengue', 'pct_rural'),
+]
+
+# Candidate controls for the full sensitivity lattice (2^6 = 64 models per pair)
+SENSITIVITY_CONTROLS = ['log_population', 'pct_rural', 'pct_urbana',
+                        'pct_pobreza', 'pct_preta', 'pct_indigena']
+
 VAR_LABELS = {
     'incidence_mean_dengue': 'Dengue',
     'incidence_mean_malaria': 'Malaria',
@@ -78,6 +104,7 @@ VAR_LABELS = {
     'pct_preta': '% Pob. Negra',
     'pct_indigena': '% Pob. Indigena',
     'population': 'Poblacion',
+    'pct_urbana': '% Urbana',
     'log_population': 'log(Poblacion)'
 }
 
@@ -181,44 +208,65 @@ def fit_health_model(df, outcome, predictor, controls=None, group_var='cod_micro
         return None
 
 
+def run_control_lattices(df, pairs, controls, common_sample=True, max_size=None, n_jobs=None):
+    """
+    Fit log(health) ~ predictor + subset(controls) + (1|micro) for every
+    subset of `controls` and every (outcome, predictor) pair, all in one
+    process pool (confounder_sensitivity). Controls are given by raw name and
+    use their _z version when available, as in fit_health_model.
+    Returns one lattice DataFrame per pair (empty if the pair cannot be fit).
+    """
+    designs, col_to_ctrl = [], {}
+    for outcome, predictor in pairs:
+        cols = []
+        for ctrl in controls:
+            col = f'{ctrl}_z' if f'{ctrl}_z' in df.columns else ctrl
+            col_to_ctrl[col] = ctrl
+            cols.append(col)
+        designs.append(prepare_lattice(df, f'{outcome}_log', f'{predictor}_z', cols,
+                                       common_sample=common_sample, max_size=max_size,
+                                       key=(outcome, predictor)))
+
+    lattices = run_lattices(designs, n_jobs=n_jobs)
+    for lattice in lattices:
+        if len(lattice) == 0:
+            continue
+        lattice['controls'] = lattice['controls'].map(
+            lambda s: s if s == NO_CONTROL else ','.join(col_to_ctrl[c] for c in s.split(',')))
+        lattice.rename(columns={f'with_{col}': f'with_{ctrl}' for col, ctrl in col_to_ctrl.items()},
+                       inplace=True)
+    return lattices
+
+
 def validate_dilution_effect(df, outcome='incidence_mean_dengue', predictor='forest_cover'):
     """
     Test if forest-dengue relationship is confounded by urbanization.
     Compare model with and without population control.
     """
     print(f"\n  Validando efecto dilucion: {VAR_LABELS.get(predictor)} -> {VAR_LABELS.get(outcome)}")
+    return _dilution_models(run_control_lattices(df, [(outcome, predictor)], DILUTION_CONTROLS,
+                                                 common_sample=False)[0])
 
-    # Model without control
-    result_no_ctrl = fit_health_model(df, outcome, predictor, controls=None)
 
-    # Model with population control
-    result_pop_ctrl = fit_health_model(df, outcome, predictor, controls=['log_population'])
+def _dilution_models(lattice):
+    """Keep the four classic models (no control, +pop, +rural, +both) with their labels"""
+    if len(lattice) == 0:
+        return pd.DataFrame()
+    results = lattice[lattice['controls'].isin(list(DILUTION_MODELS))].copy()
+    results['model'] = results['controls'].map(DILUTION_MODELS)
+    keep = ['outcome', 'predictor', 'controls', 'coef', 'se', 'p_value', 'aic', 'r2_marginal', 'n', 'model']
+    return results[keep].reset_index(drop=True)
 
-    # Model with rural control
-    result_rural_ctrl = fit_health_model(df, outcome, predictor, controls=['pct_rural'])
 
-    # Model with both
-    result_both_ctrl = fit_health_model(df, outcome, predictor, controls=['log_population', 'pct_rural'])
+def cross_validate_predictors(df, k=DEFAULT_FOLDS, n_jobs=None):
+    """Grouped k-fold CV (by microrregiao) of every outcome x predictor model, in one pool"""
+    pairs = [(f'{outcome}_log', f'{predictor}_z', (outcome, predictor))
+             for outcome in HEALTH_OUTCOMES for predictor in BIODIV_VARS + CLIMATE_VARS + VULN_VARS]
+    return cross_validate_pairs(df, pairs, k=k, n_jobs=n_jobs)
 
-    results = []
-    if result_no_ctrl:
-        result_no_ctrl['model'] = 'Sin control'
-        results.append(result_no_ctrl)
-    if result_pop_ctrl:
-        result_pop_ctrl['model'] = '+ log(Poblacion)'
-        results.append(result_pop_ctrl)
-    if result_rural_ctrl:
-        result_rural_ctrl['model'] = '+ % Rural'
-        results.append(result_rural_ctrl)
-    if result_both_ctrl:
-        result_both_ctrl['model'] = '+ Ambos'
-        results.append(result_both_ctrl)
-
-    return pd.DataFrame(results)
-
-
-def run_model_selection(df, outcome):
-    """Run model selection for one health outcome"""
+
+def run_model_selection(df, outcome, cv=None):
+    """Run model selection for one health outcome (cv: output of cross_validate_predictors)"""
     all_predictors = BIODIV_VARS + CLIMATE_VARS + VULN_VARS
     results = []
 
@@ -243,16 +291,18 @@ def run_model_selection(df, outcome):
     results_df['aic_weight'] = np.exp(-0.5 * results_df['delta_aic'])
     results_df['aic_weight'] = results_df['aic_weight'] / results_df['aic_weight'].sum()
 
-    return results_df
+    return add_cv_columns(results_df, cv, outcome)
 
 
-def run_h4_analysis(df):
-    """Run complete H4 analysis"""
+def run_h4_analysis(df, cv_folds=0, n_jobs=None):
+    """Run complete H4 analysis (cv_folds > 0 adds grouped CV columns)"""
     print("\n" + "=" * 70)
     print("H4: PREDICTORES DE RIESGO DE SALUD")
     print("Modelo: log(salud) ~ predictor + (1|micro)")
     print("=" * 70)
 
+    cv = cross_validate_predictors(df, cv_folds, n_jobs) if cv_folds else None
+
     all_results = []
     best_by_outcome = []
 
@@ -261,7 +311,7 @@ def run_h4_analysis(df):
         print(f"OUTCOME: {HEALTH_OUTCOMES[outcome]}")
         print(f"{'='*60}")
 
-        results_df = run_model_selection(df, outcome)
+        results_df = run_model_selection(df, outcome, cv=cv)
 
         if len(results_df) == 0:
             continue
@@ -279,6 +329,10 @@ def run_h4_analysis(df):
                   f"{row['dimension']:<15} {row['coef']:>10.4f}{sig:<3} "
                   f"{row['p_value']:>9.4f} {row['delta_aic']:>8.2f} {row['r2_marginal']:>8.4f}{marker}")
 
+        best_cv = best_by_cv(results_df)
+        if best_cv:
+            print(f"  Mejor por CV agrupada: {VAR_LABELS.get(best_cv[0], best_cv[0])} (RMSE = {best_cv[1]:.4f})")
+
         # Store best
         best = results_df.iloc[0]
         equiv = results_df[results_df['delta_aic'] < 2]
@@ -306,26 +360,26 @@ def run_h4_analysis(df):
 # DILUTION EFFECT VALIDATION
 # ============================================================
 
-def run_dilution_validation(df):
-    """Validate dilution effect for key relationships"""
+def run_dilution_validation(df, n_jobs=None):
+    """
+    Validate dilution effect for key relationships.
+
+    Returns (validation_df, sensitivity_df): the four classic models per pair
+    and the full lattice over SENSITIVITY_CONTROLS (common sample per pair).
+    """
     print("\n" + "=" * 70)
     print("H4 VALIDACION: EFECTO DILUCION (BOSQUE-ENFERMEDAD)")
     print("Pregunta: La relacion esta confundida por urbanizacion?")
     print("=" * 70)
 
-    # Key pairs to validate
-    pairs = [
-        ('incidence_mean_dengue', 'forest_cover'),
-        ('incidence_mean_malaria', 'forest_cover'),
-        ('incidence_mean_leishmaniose', 'forest_cover'),
-        ('incidence_mean_leptospirose', 'forest_cover'),
-        ('incidence_mean_dengue', 'pct_rural'),
-    ]
+    # Classic models (each with its own complete rows, as fit_health_model)
+    classic = run_control_lattices(df, DILUTION_PAIRS, DILUTION_CONTROLS,
+                                   common_sample=False, n_jobs=n_jobs)
 
     all_validations = []
 
-    for outcome, predictor in pairs:
-        validation_df = validate_dilution_effect(df, outcome, predictor)
+    for (outcome, predictor), lattice in zip(DILUTION_PAIRS, classic):
+        validation_df = _dilution_models(lattice)
         if len(validation_df) > 0:
             validation_df['outcome_label'] = HEALTH_OUTCOMES.get(outcome, outcome)
             validation_df['predictor_label'] = VAR_LABELS.get(predictor, predictor)
@@ -351,7 +405,35 @@ def run_dilution_validation(df):
                 else:
                     print(f"  OK: Coeficiente estable ({pct_change:.1f}% cambio)")
 
-    return pd.concat(all_validations, ignore_index=True) if all_validations else pd.DataFrame()
+    # Full lattice over all candidate controls
+    print("\n" + "-" * 70)
+    print(f"SENSIBILIDAD: reticulo de controles ({', '.join(SENSITIVITY_CONTROLS)})")
+    print("-" * 70)
+
+    sensitivity = run_control_lattices(df, DILUTION_PAIRS, SENSITIVITY_CONTROLS, n_jobs=n_jobs)
+    all_sensitivity = []
+
+    for (outcome, predictor), lattice in zip(DILUTION_PAIRS, sensitivity):
+        if len(lattice) == 0:
+            continue
+        lattice['outcome_label'] = HEALTH_OUTCOMES.get(outcome, outcome)
+        lattice['predictor_label'] = VAR_LABELS.get(predictor, predictor)
+        all_sensitivity.append(lattice)
+
+        by_size, by_control = stability_summary(lattice)
+        print(f"\n  {HEALTH_OUTCOMES.get(outcome, outcome)} ~ {VAR_LABELS.get(predictor, predictor)} "
+              f"({len(lattice)} modelos, n = {lattice['n'].iloc[0]}):")
+        print(f"  {'# ctrl':>6} {'beta min':>10} {'mediana':>10} {'max':>10} {'% sig':>7} {'% signo':>8}")
+        for _, row in by_size.iterrows():
+            print(f"  {int(row['n_controls']):>6} {row['coef_min']:>10.4f} {row['coef_median']:>10.4f} "
+                  f"{row['coef_max']:>10.4f} {row['frac_significant']:>7.0%} {row['frac_same_sign']:>8.0%}")
+        top = by_control.iloc[0]
+        print(f"  Control que mas mueve beta: {VAR_LABELS.get(top['control'], top['control'])} "
+              f"(cambio medio {top['mean_shift']:+.4f}, max |{top['max_abs_shift']:.4f}|)")
+
+    validation_df = pd.concat(all_validations, ignore_index=True) if all_validations else pd.DataFrame()
+    sensitivity_df = pd.concat(all_sensitivity, ignore_index=True) if all_sensitivity else pd.DataFrame()
+    return validation_df, sensitivity_df
 
 
 # ============================================================
@@ -460,6 +542,21 @@ def plot_dilution_comparison(validation_df, filename):
     print(f"  [SAVED] {filename}")
 
 
+def plot_sensitivity_curves(sensitivity_df):
+    """Coefficient stability across the control-set lattice, one figure per pair"""
+    print(f"\n  Generating confounder sensitivity plots...")
+
+    for (outcome, predictor), lattice in sensitivity_df.groupby(['outcome', 'predictor'], sort=False):
+        lattice = lattice.dropna(axis=1, how='all')
+        filename = f'h4_sensitivity_{predictor}_{outcome}.png'
+        plot_stability(lattice, os.path.join(FIG_DIR, filename),
+                       title=f"H4: {VAR_LABELS.get(predictor, predictor)} -> "
+                             f"{HEALTH_OUTCOMES.get(outcome, outcome)}\n"
+                             f"Sensibilidad a controles ({len(lattice)} modelos) | Verde = sig (p<0.05)",
+                       labels=VAR_LABELS)
+        print(f"  [SAVED] {filename}")
+
+
 def plot_best_predictors(best_df, filename):
     """Summary of best predictor per health outcome"""
     print(f"\n  Generating best predictors plot...")
@@ -504,6 +601,13 @@ def plot_best_predictors(best_df, filename):
 # ============================================================
 
 def main():
+    parser = argparse.ArgumentParser(description="Analisis H4 - Predictores de riesgo de salud")
+    parser.add_argument("--cv-folds", type=int, default=0,
+                        help=f"Validacion cruzada agrupada por microrregiao con k folds (0 = sin CV; sugerido {DEFAULT_FOLDS})")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Procesos en paralelo (por defecto, nucleos disponibles)")
+    args = parser.parse_args()
+
     print("=" * 70)
     print("ANALISIS H4 - PREDICTORES DE RIESGO DE SALUD")
     print("Solicitud: Dr. Adrian David Gonzalez Chaves (29/01/2026)")
@@ -513,20 +617,23 @@ def main():
     df = load_and_prepare_data()
 
     # Main analysis
-    all_results, best_results = run_h4_analysis(df)
+    all_results, best_results = run_h4_analysis(df, cv_folds=args.cv_folds, n_jobs=args.jobs)
 
     # Dilution validation
-    validation_results = run_dilution_validation(df)
+    validation_results, sensitivity_results = run_dilution_validation(df, n_jobs=args.jobs)
 
     # Save results
     all_results.to_csv(os.path.join(OUTPUT_DIR, 'h4_all_models.csv'), index=False)
     best_results.to_csv(os.path.join(OUTPUT_DIR, 'h4_best_predictors.csv'), index=False)
     if len(validation_results) > 0:
         validation_results.to_csv(os.path.join(OUTPUT_DIR, 'h4_dilution_validation.csv'), index=False)
+    if len(sensitivity_results) > 0:
+        sensitivity_results.to_csv(os.path.join(OUTPUT_DIR, 'h4_confounder_sensitivity.csv'), index=False)
 
     print(f"\n  [SAVED] h4_all_models.csv ({len(all_results)} models)")
     print(f"  [SAVED] h4_best_predictors.csv ({len(best_results)} selections)")
     print(f"  [SAVED] h4_dilution_validation.csv ({len(validation_results)} tests)")
+    print(f"  [SAVED] h4_confounder_sensitivity.csv ({len(sensitivity_results)} models)")
 
     # Visualizations
     print("\n" + "=" * 70)
@@ -537,6 +644,8 @@ def main():
     plot_best_predictors(best_results, 'h4_best_predictors.png')
     if len(validation_results) > 0:
         plot_dilution_comparison(validation_results, 'h4_dilution_comparison.png')
+    if len(sensitivity_results) > 0:
+        plot_sensitivity_curves(sensitivity_results)
 
     # Summary
     print("\n" + "=" * 70)
@@ -15,6 +15,7 @@ Autor: Science Team / AP Digital
 """
 
 import sys
+import argparse
 sys.stdout.reconfigure(encoding='utf-8')
 
 import pandas as pd
@@ -30,6 +31,13 @@ import warnings
 warnings.filterwarnings('ignore')
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+from geometry_cache import SHP_PATH, load_sp_geometry
+from moderation_scan import prepare_triple, fit_pair, run_scan, interaction_summary
+from permutation_engine import DEFAULT_PERMUTATIONS, interaction_test, run_permutations, add_permutation_columns
+from interaction_plots import figure_task, render_figures
+from grouped_cv import DEFAULT_FOLDS, cross_validate_pairs, add_cv_columns, best_by_cv
+
 # ============================================================
 # CONFIGURATION
 # ============================================================
@@ -147,68 +155,37 @@ def fit_climate_model(df, outcome, predictor, group_var='cod_microrregiao'):
         return None
 
 
-def fit_interaction_model(df, outcome, predictor, moderator, group_var='cod_microrregiao'):
-    """Fit: climate ~ predictor * moderator + (1|group)"""
-    predictor_z = f'{predictor}_z'
-    moderator_z = f'{moderator}_z'
-
-    for v in [outcome, predictor_z, moderator_z]:
-        if v not in df.columns:
-            return None
-
-    data = df[[outcome, predictor_z, moderator_z, group_var]].dropna()
-    if len(data) < 100:
-        return None
-
-    data = data.rename(columns={outcome: 'y', predictor_z: 'x', moderator_z: 'm'})
-
-    try:
-        model_full = smf.mixedlm('y ~ x * m', data, groups=data[group_var])
-        result_full = model_full.fit(reml=False, method='powell')
+def prepare_interaction_design(df, outcome, predictor, moderator, group_var='cod_microrregiao'):
+    """Design for climate ~ predictor * moderator + (1|group), built once"""
+    return prepare_triple(df, outcome, f'{predictor}_z', f'{moderator}_z',
+                          group_var=group_var, min_n=100,
+                          key=(outcome, predictor, moderator))
 
-        if not result_full.converged:
-            return None
-
-        model_add = smf.mixedlm('y ~ x + m', data, groups=data[group_var])
-        result_add = model_add.fit(reml=False, method='powell')
 
-        k_full = len(result_full.params) + 1
-        k_add = len(result_add.params) + 1
-        n = len(data)
-        aic_full = -2 * result_full.llf + 2 * k_full
-        aic_add = -2 * result_add.llf + 2 * k_add
+def summarize_interaction(fit):
+    """CSV row for one fitted triple (same columns as before)"""
+    outcome, predictor, moderator = fit['key']
+    summary = interaction_summary(fit, x_label='predictor', m_label='moderator')
+    for col in ['se_interaction', 'interaction_significant', 'interaction_improves_fit']:
+        summary.pop(col)
+    return {'outcome': outcome, 'predictor': predictor, 'moderator': moderator, **summary}
 
-        int_coef = result_full.params.get('x:m', np.nan)
-        int_p = result_full.pvalues.get('x:m', 1.0)
 
-        var_fixed = np.var(result_full.fittedvalues)
-        var_random = float(result_full.cov_re.iloc[0, 0]) if hasattr(result_full.cov_re, 'iloc') else float(result_full.cov_re)
-        var_resid = result_full.scale
-        r2_marginal = var_fixed / (var_fixed + var_random + var_resid)
+def fit_interaction_model(df, outcome, predictor, moderator, group_var='cod_microrregiao'):
+    """Fit: climate ~ predictor * moderator + (1|group)"""
+    fit = fit_pair(prepare_interaction_design(df, outcome, predictor, moderator, group_var))
+    return summarize_interaction(fit) if fit is not None else None
 
-        return {
-            'outcome': outcome,
-            'predictor': predictor,
-            'moderator': moderator,
-            'coef_predictor': result_full.params['x'],
-            'p_predictor': result_full.pvalues['x'],
-            'coef_moderator': result_full.params['m'],
-            'p_moderator': result_full.pvalues['m'],
-            'coef_interaction': int_coef,
-            'p_interaction': int_p,
-            'aic_interaction': aic_full,
-            'aic_additive': aic_add,
-            'delta_aic': aic_full - aic_add,
-            'r2_marginal': r2_marginal,
-            'n': n
-        }
 
-    except:
-        return None
+def cross_validate_predictors(df, k=DEFAULT_FOLDS, n_jobs=None):
+    """Grouped k-fold CV (by microrregiao) of every outcome x predictor model, in one pool"""
+    pairs = [(outcome, f'{predictor}_z', (outcome, predictor))
+             for outcome in CLIMATE_OUTCOMES for predictor in BIODIV_VARS + VULN_VARS + GOV_VARS]
+    return cross_validate_pairs(df, pairs, k=k, n_jobs=n_jobs)
 
 
-def run_model_selection(df, outcome):
-    """Run model selection for one climate outcome"""
+def run_model_selection(df, outcome, cv=None):
+    """Run model selection for one climate outcome (cv: output of cross_validate_predictors)"""
     all_predictors = BIODIV_VARS + VULN_VARS + GOV_VARS
     results = []
 
@@ -232,16 +209,18 @@ def run_model_selection(df, outcome):
     results_df['aic_weight'] = np.exp(-0.5 * results_df['delta_aic'])
     results_df['aic_weight'] = results_df['aic_weight'] / results_df['aic_weight'].sum()
 
-    return results_df
+    return add_cv_columns(results_df, cv, outcome)
 
 
-def run_h5_analysis(df):
-    """Run complete H5 analysis"""
+def run_h5_analysis(df, cv_folds=0, n_jobs=None):
+    """Run complete H5 analysis (cv_folds > 0 adds grouped CV columns)"""
     print("\n" + "=" * 70)
     print("H5: PREDICTORES DE RIESGO CLIMATICO")
     print("Modelo: clima ~ predictor + (1|micro)")
     print("=" * 70)
 
+    cv = cross_validate_predictors(df, cv_folds, n_jobs) if cv_folds else None
+
     all_results = []
     best_by_outcome = []
 
@@ -250,7 +229,7 @@ def run_h5_analysis(df):
         print(f"OUTCOME: {CLIMATE_OUTCOMES[outcome]}")
         print(f"{'='*60}")
 
-        results_df = run_model_selection(df, outcome)
+        results_df = run_model_selection(df, outcome, cv=cv)
 
         if len(results_df) == 0:
             continue
@@ -267,6 +246,10 @@ def run_h5_analysis(df):
                   f"{row['dimension']:<15} {row['coef']:>10.4f}{sig:<3} "
                   f"{row['p_value']:>9.4f} {row['delta_aic']:>8.2f} {row['r2_marginal']:>8.4f}{marker}")
 
+        best_cv = best_by_cv(results_df)
+        if best_cv:
+            print(f"  Mejor por CV agrupada: {VAR_LABELS.get(best_cv[0], best_cv[0])} (RMSE = {best_cv[1]:.4f})")
+
         best = results_df.iloc[0]
         equiv = results_df[results_df['delta_aic'] < 2]
         best_by_outcome.append({
@@ -289,12 +272,38 @@ def run_h5_analysis(df):
     return all_df, best_df
 
 
+def add_permutation_pvalues(df, results_df, permutations=DEFAULT_PERMUTATIONS, n_jobs=None, seed=42):
+    """
+    Within-microrregiao permutation p-values for the interaction term of every
+    model in results_df (one joint family, max-T corrected): adds
+    p_perm_interaction and p_maxT_interaction.
+    """
+    key_cols = ['outcome', 'predictor', 'moderator']
+    triples = list(dict.fromkeys(results_df[key_cols].itertuples(index=False, name=None)))
+    designs = [prepare_interaction_design(df, *t) for t in triples]
+    tests = [interaction_test(d) for d in designs if d is not None]
+    print(f"\n  Permutaciones: {permutations} x {len(tests)} interacciones (max-T sobre la familia)")
+    perm = run_permutations(tests, permutations=permutations, seed=seed, n_jobs=n_jobs)
+    results_df = add_permutation_columns(results_df, perm, key_cols)
+    print(f"  Significativas (p_maxT < 0.05): {(results_df['p_maxT_interaction'] < 0.05).sum()} "
+          f"de {len(results_df)}")
+    return results_df
+
+
 def run_interaction_analysis(df):
     """Run vulnerability × biodiversity/governance interactions"""
     print("\n" + "=" * 70)
     print("H5b: INTERACCIONES VULNERABILIDAD x (BIODIV/GOB) -> CLIMA")
     print("=" * 70)
 
+    # Designs built once per triple, nested pair fitted in parallel
+    triples = [(outcome, predictor, vuln)
+               for outcome in CLIMATE_OUTCOMES.keys()
+               for vuln in VULN_VARS
+               for predictor in BIODIV_VARS + GOV_VARS]
+    designs = [prepare_interaction_design(df, *t) for t in triples]
+    fits = dict(zip(triples, run_scan(designs)))
+
     results = []
 
     for outcome in CLIMATE_OUTCOMES.keys():
@@ -302,9 +311,9 @@ def run_interaction_analysis(df):
 
         for vuln in VULN_VARS:
             for predictor in BIODIV_VARS + GOV_VARS:
-                result = fit_interaction_model(df, outcome, predictor, vuln)
-                if result:
-                    results.append(result)
+                fit = fits[(outcome, predictor, vuln)]
+                if fit is not None:
+                    results.append(summarize_interaction(fit))
 
     results_df = pd.DataFrame(results)
 
@@ -374,55 +383,62 @@ def plot_selection_heatmap(all_df, filename):
     print(f"  [SAVED] {filename}")
 
 
-def plot_scatter_significant(df, all_df, top_n=6):
-    """Scatter plots for significant relationships"""
-    print(f"\n  Generating scatter plots...")
+def plot_scatter_pair(df, outcome, predictor, model_stats, filename):
+    """Scatter of one significant relationship; mixed-model stats come from the scan row"""
+    if outcome not in df.columns or predictor not in df.columns:
+        return
 
-    sig_df = all_df[all_df['p_value'] < 0.05].sort_values('r2_marginal', ascending=False)
+    data = df[[outcome, predictor, 'cod_mesorregiao', 'nome_mesorregiao']].dropna()
+    if len(data) < 50:
+        return
 
-    for _, row in sig_df.head(top_n).iterrows():
-        outcome = row['outcome']
-        predictor = row['predictor']
+    fig, ax = plt.subplots(figsize=(10, 7))
 
-        if outcome not in df.columns or predictor not in df.columns:
-            continue
+    meso_codes = sorted(data['cod_mesorregiao'].unique())
+    cmap = plt.cm.get_cmap('tab20', len(meso_codes))
 
-        data = df[[outcome, predictor, 'cod_mesorregiao', 'nome_mesorregiao']].dropna()
-        if len(data) < 50:
-            continue
+    for i, meso in enumerate(meso_codes):
+        subset = data[data['cod_mesorregiao'] == meso]
+        ax.scatter(subset[predictor], subset[outcome],
+                  c=[cmap(i)], alpha=0.4, s=15)
 
-        fig, ax = plt.subplots(figsize=(10, 7))
+    slope, intercept, r, p, se = stats.linregress(data[predictor], data[outcome])
+    x_range = np.linspace(data[predictor].min(), data[predictor].max(), 100)
+    ax.plot(x_range, intercept + slope * x_range, 'k-', linewidth=2)
 
-        meso_codes = sorted(data['cod_mesorregiao'].unique())
-        cmap = plt.cm.get_cmap('tab20', len(meso_codes))
+    r_sp, p_sp = stats.spearmanr(data[predictor], data[outcome])
+    stats_text = (f"Mixed model:\nbeta = {model_stats['coef']:.4f}\np = {model_stats['p_value']:.2e}\n"
+                 f"R2m = {model_stats['r2_marginal']:.4f}\n\nSpearman r = {r_sp:.3f}")
+    ax.text(0.02, 0.98, stats_text, transform=ax.transAxes, fontsize=10,
+           va='top', bbox=dict(boxstyle='round', facecolor='white', alpha=0.9))
 
-        for i, meso in enumerate(meso_codes):
-            subset = data[data['cod_mesorregiao'] == meso]
-            ax.scatter(subset[predictor], subset[outcome],
-                      c=[cmap(i)], alpha=0.4, s=15)
+    ax.set_xlabel(VAR_LABELS.get(predictor, predictor), fontsize=11)
+    ax.set_ylabel(CLIMATE_OUTCOMES.get(outcome, outcome), fontsize=11)
+    ax.set_title(f'H5: {VAR_LABELS.get(predictor, predictor)} -> {CLIMATE_OUTCOMES.get(outcome, outcome)}',
+                fontsize=12, fontweight='bold')
 
-        slope, intercept, r, p, se = stats.linregress(data[predictor], data[outcome])
-        x_range = np.linspace(data[predictor].min(), data[predictor].max(), 100)
-        ax.plot(x_range, intercept + slope * x_range, 'k-', linewidth=2)
+    plt.tight_layout()
+    plt.savefig(os.path.join(FIG_DIR, filename), dpi=150, bbox_inches='tight')
+    plt.close()
+    print(f"  [SAVED] {filename}")
 
-        r_sp, p_sp = stats.spearmanr(data[predictor], data[outcome])
-        stats_text = (f"Mixed model:\nbeta = {row['coef']:.4f}\np = {row['p_value']:.2e}\n"
-                     f"R2m = {row['r2_marginal']:.4f}\n\nSpearman r = {r_sp:.3f}")
-        ax.text(0.02, 0.98, stats_text, transform=ax.transAxes, fontsize=10,
-               va='top', bbox=dict(boxstyle='round', facecolor='white', alpha=0.9))
 
-        ax.set_xlabel(VAR_LABELS.get(predictor, predictor), fontsize=11)
-        ax.set_ylabel(CLIMATE_OUTCOMES.get(outcome, outcome), fontsize=11)
-        ax.set_title(f'H5: {VAR_LABELS.get(predictor, predictor)} -> {CLIMATE_OUTCOMES.get(outcome, outcome)}',
-                    fontsize=12, fontweight='bold')
+def plot_scatter_significant(df, all_df, top_n=6, n_jobs=None):
+    """Scatter plots for significant relationships (rendered in parallel)"""
+    print(f"\n  Generating scatter plots...")
 
-        plt.tight_layout()
+    sig_df = all_df[all_df['p_value'] < 0.05].sort_values('r2_marginal', ascending=False)
+
+    tasks = []
+    for _, row in sig_df.head(top_n).iterrows():
+        outcome = row['outcome']
+        predictor = row['predictor']
         safe_pred = predictor.replace('pct_', '').replace('idx_', '')[:15]
         safe_out = outcome.replace('_risk', '').replace('_index', '')[:15]
         fname = f"h5_scatter_{safe_pred}_{safe_out}.png"
-        plt.savefig(os.path.join(FIG_DIR, fname), dpi=150, bbox_inches='tight')
-        plt.close()
-        print(f"  [SAVED] {fname}")
+        model_stats = {c: row[c] for c in ['coef', 'p_value', 'r2_marginal']}
+        tasks.append(figure_task(plot_scatter_pair, outcome, predictor, model_stats, fname))
+    render_figures(tasks, df, n_jobs=n_jobs)
 
 
 def plot_bivariate_map(df, var1, var2, filename):
@@ -430,34 +446,22 @@ def plot_bivariate_map(df, var1, var2, filename):
     print(f"\n  Generating bivariate map: {var1} x {var2}...")
 
     try:
-        import geopandas as gpd
         from glob import glob
 
-        shp_files = glob(os.path.join(BASE_DIR, "data/geo/**/*.shp"), recursive=True)
+        shp_files = [SHP_PATH] if os.path.exists(SHP_PATH) else \
+            glob(os.path.join(BASE_DIR, "data/geo/**/*.shp"), recursive=True)
         if not shp_files:
             print("  [SKIP] No shapefile found")
             return
 
-        gdf = gpd.read_file(shp_files[0])
-
-        # Match codes
-        code_col = None
-        for col in gdf.columns:
-            if 'cod' in col.lower() and ('mun' in col.lower() or 'ibge' in col.lower()):
-                code_col = col
-                break
-        if code_col is None:
-            code_col = [c for c in gdf.columns if c.startswith('CD_')][0] if any(c.startswith('CD_') for c in gdf.columns) else None
-
-        if code_col is None:
+        # Cached geometry; cod_ibge already truncated to 6 digits
+        # (IBGE shapefile uses 7-digit codes, CSV uses 6)
+        try:
+            gdf = load_sp_geometry(shp_path=shp_files[0])
+        except ValueError:
             print("  [SKIP] Cannot find code column in shapefile")
             return
 
-        # IBGE shapefile uses 7-digit codes (with verification digit)
-        # CSV uses 6-digit codes (without verification digit)
-        # Solution: truncate shapefile codes to 6 digits
-        gdf['cod_ibge'] = gdf[code_col].astype(str).str[:6].astype(int)
-
         merged = gdf.merge(df[['cod_ibge', var1, var2]], on='cod_ibge', how='left')
 
         # Bivariate classes
@@ -522,6 +526,15 @@ def plot_bivariate_map(df, var1, var2, filename):
 # ============================================================
 
 def main():
+    parser = argparse.ArgumentParser(description="Analisis H5 - Predictores de riesgo climatico")
+    parser.add_argument("--cv-folds", type=int, default=0,
+                        help=f"Validacion cruzada agrupada por microrregiao con k folds (0 = sin CV; sugerido {DEFAULT_FOLDS})")
+    parser.add_argument("--permutations", type=int, default=0,
+                        help=f"Permutaciones dentro de microrregiao para p_perm / p_maxT (0 = sin; sugerido {DEFAULT_PERMUTATIONS})")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Procesos en paralelo (por defecto, nucleos disponibles)")
+    args = parser.parse_args()
+
     print("=" * 70)
     print("ANALISIS H5 - PREDICTORES DE RIESGO CLIMATICO")
     print("Solicitud: Dr. Adrian David Gonzalez Chaves (29/01/2026)")
@@ -531,10 +544,13 @@ def main():
     df = load_and_prepare_data()
 
     # Main analysis
-    all_results, best_results = run_h5_analysis(df)
+    all_results, best_results = run_h5_analysis(df, cv_folds=args.cv_folds, n_jobs=args.jobs)
 
     # Interaction analysis
     interaction_results = run_interaction_analysis(df)
+    if args.permutations and len(interaction_results) > 0:
+        interaction_results = add_permutation_pvalues(df, interaction_results, args.permutations,
+                                                      n_jobs=args.jobs)
 
     # Save
     all_results.to_csv(os.path.join(OUTPUT_DIR, 'h5_all_models.csv'), index=False)
@@ -551,7 +567,7 @@ def main():
     print("=" * 70)
 
     plot_selection_heatmap(all_results, 'h5_selection_heatmap.png')
-    plot_scatter_significant(df, all_results)
+    plot_scatter_significant(df, all_results, n_jobs=args.jobs)
 
     # Bivariate maps for significant pairs
     print("\n  Generating bivariate maps...")
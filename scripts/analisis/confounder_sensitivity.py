@@ -0,0 +1,374 @@
+"""
+Motor de sensibilidad a confusores (reticulo de conjuntos de controles) para H4
+================================================================================
+`validate_dilution_effect` ajustaba cuatro modelos mixtos por par
+outcome x predictor (sin control, +log_population, +pct_rural, +ambos),
+reconstruyendo el diseno con la formula cada vez, y `run_dilution_validation`
+repetia esto en serie para cada par.
+
+Este modulo:
+- Construye el diseno de un par UNA sola vez (intercepto, predictor y todos
+  los controles candidatos como arrays NumPy); cada modelo del reticulo es
+  una seleccion de columnas (y de filas, si no se usa muestra comun).
+- Enumera el reticulo completo de subconjuntos de controles (2^k modelos;
+  64 para seis controles) o hasta un tamano maximo.
+- Ajusta todos los modelos de todos los pares en un mismo pool de procesos;
+  los disenos se envian una vez a cada worker (initializer) y las tareas son
+  solo (indice de par, columnas).
+- Mismo modelo que `fit_health_model` (MixedLM, REML=False, method='powell',
+  mismo AIC y R2 marginal), con resultados identicos a los de la formula.
+- Reporta las curvas de estabilidad del coeficiente (por numero de
+  controles y efecto de incluir cada control) y una figura tipo
+  "specification curve".
+
+Uso:
+    from confounder_sensitivity import prepare_lattice, run_lattices, stability_summary
+
+    design = prepare_lattice(df, 'incidence_mean_dengue_log', 'forest_cover_z',
+                             ['log_population_z', 'pct_rural_z', 'pct_urbana'])
+    lattice = run_lattices([design])[0]
+    by_size, by_control = stability_summary(lattice)
+
+    python confounder_sensitivity.py --selfcheck
+
+Autor: Science Team
+"""
+
+import argparse
+import time
+import warnings
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+import statsmodels.api as sm
+
+from process_pool import map_tasks
+
+NO_CONTROL = 'none'
+
+
+# ============================================================
+# DESIGN / LATTICE
+# ============================================================
+
+def prepare_lattice(df, y_col, x_col, controls, group_var='cod_microrregiao',
+                    min_n=50, common_sample=True, max_size=None, key=None):
+    """
+    Construye el diseno compartido de un par y la lista de subconjuntos.
+
+    common_sample=True: todos los modelos usan las mismas filas (completas en
+    todos los controles), de modo que el cambio del coeficiente se debe solo
+    a los controles. Con False cada modelo usa sus propias filas completas,
+    como `fit_health_model`.
+    Los controles que no estan en `df` se descartan. Devuelve None si falta
+    el outcome, el predictor o el grupo.
+    """
+    for v in [y_col, x_col, group_var]:
+        if v not in df.columns:
+            return None
+    controls = [c for c in dict.fromkeys(controls) if c in df.columns and c != x_col]
+
+    needed = [y_col, x_col, group_var] + (controls if common_sample else [])
+    data = df[[y_col, x_col, group_var] + controls].dropna(subset=needed)
+    if len(data) < min_n:
+        return None
+
+    max_size = len(controls) if max_size is None else min(max_size, len(controls))
+    subsets = [s for size in range(max_size + 1)
+               for s in combinations(range(len(controls)), size)]
+
+    exog = np.column_stack([np.ones(len(data)), data[[x_col] + controls].to_numpy(dtype=float)])
+    return {
+        'key': key if key is not None else (y_col, x_col),
+        'endog': data[y_col].to_numpy(dtype=float),
+        'exog': exog,
+        'groups': data[group_var].to_numpy(),
+        'complete': ~np.isnan(exog[:, 2:]),
+        'names': ['Intercept', x_col] + controls,
+        'controls': controls,
+        'subsets': subsets,
+        'min_n': min_n,
+    }
+
+
+# ============================================================
+# FITTING
+# ============================================================
+
+def _r2_marginal(result):
+    var_fixed = np.var(result.fittedvalues)
+    var_random = float(result.cov_re.iloc[0, 0]) if hasattr(result.cov_re, 'iloc') else float(result.cov_re)
+    var_resid = result.scale
+    return var_fixed / (var_fixed + var_random + var_resid)
+
+
+def fit_subset(design, subset):
+    """
+    Ajusta log(y) ~ x + controles[subset] + (1|grupo) con las columnas del
+    diseno compartido. Devuelve un dict serializable o None si no converge,
+    falla o tiene menos de `min_n` filas (como `fit_health_model`).
+    """
+    cols = [0, 1] + [2 + i for i in subset]
+    rows = design['complete'][:, list(subset)].all(axis=1)
+    n = int(rows.sum())
+    if n < design['min_n']:
+        return None
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            exog = pd.DataFrame(design['exog'][np.ix_(rows, cols)],
+                                columns=[design['names'][c] for c in cols])
+            model = sm.MixedLM(pd.Series(design['endog'][rows], name='y'), exog,
+                               groups=design['groups'][rows])
+            result = model.fit(reml=False, method='powell')
+            if not result.converged:
+                return None
+
+            x_name = design['names'][1]
+            k = len(result.params) + 1
+            return {
+                'coef': result.params[x_name],
+                'se': result.bse[x_name],
+                'p_value': result.pvalues[x_name],
+                'aic': -2 * result.llf + 2 * k,
+                'r2_marginal': _r2_marginal(result),
+                'n': n,
+            }
+        except Exception:
+            return None
+
+
+def _fit_task(designs, task):
+    i, subset = task
+    return fit_subset(designs[i], subset)
+
+
+def _lattice_frame(design, fits, ci=0.95):
+    z = stats.norm.ppf(0.5 + ci / 2)
+    rows = []
+    for subset, fit in zip(design['subsets'], fits):
+        if fit is None:
+            continue
+        names = [design['controls'][i] for i in subset]
+        rows.append({
+            'outcome': design['key'][0],
+            'predictor': design['key'][1],
+            'controls': ','.join(names) if names else NO_CONTROL,
+            'n_controls': len(names),
+            **fit,
+            'ci_low': fit['coef'] - z * fit['se'],
+            'ci_high': fit['coef'] + z * fit['se'],
+            **{f'with_{c}': c in names for c in design['controls']},
+        })
+
+    lattice = pd.DataFrame(rows)
+    if len(lattice) == 0:
+        return lattice
+    base = lattice.loc[lattice['controls'] == NO_CONTROL, 'coef']
+    base = base.iloc[0] if len(base) else np.nan
+    lattice['pct_change'] = (lattice['coef'] - base).abs() / abs(base) * 100
+    lattice['delta_aic'] = lattice['aic'] - lattice['aic'].min()
+    return lattice
+
+
+def run_lattices(designs, n_jobs=None, chunksize=2):
+    """
+    Ajusta el reticulo completo de cada diseno (de `prepare_lattice`) en un
+    solo pool (`process_pool.map_tasks`). Devuelve una lista de DataFrames
+    (uno por diseno, en orden; vacio si el diseno es None), una fila por
+    modelo convergido.
+    """
+    designs = list(designs)
+    tasks = [(i, s) for i, d in enumerate(designs) if d is not None for s in d['subsets']]
+    fits = map_tasks(_fit_task, tasks, shared=designs, n_jobs=n_jobs, chunksize=chunksize)
+
+    by_design = {}
+    for (i, _), fit in zip(tasks, fits):
+        by_design.setdefault(i, []).append(fit)
+    return [_lattice_frame(d, by_design[i]) if d is not None else pd.DataFrame()
+            for i, d in enumerate(designs)]
+
+
+# ============================================================
+# STABILITY
+# ============================================================
+
+def stability_summary(lattice, alpha=0.05):
+    """
+    Curvas de estabilidad del coeficiente del predictor.
+
+    by_size: por numero de controles, rango (min/mediana/max) del
+    coeficiente, fraccion significativa y fraccion con el signo del modelo
+    sin controles.
+    by_control: para cada control, coeficiente medio con y sin el control
+    (sobre los pares de modelos que solo difieren en el) y el cambio medio.
+    """
+    if len(lattice) == 0:
+        return pd.DataFrame(), pd.DataFrame()
+
+    base = lattice.loc[lattice['controls'] == NO_CONTROL, 'coef']
+    base_sign = np.sign(base.iloc[0]) if len(base) else np.sign(lattice['coef'].median())
+    sig = lattice['p_value'] < alpha
+
+    by_size = lattice.assign(sig=sig, same_sign=np.sign(lattice['coef']) == base_sign) \
+        .groupby('n_controls').agg(
+            models=('coef', 'size'),
+            coef_min=('coef', 'min'),
+            coef_median=('coef', 'median'),
+            coef_max=('coef', 'max'),
+            pct_change_max=('pct_change', 'max'),
+            frac_significant=('sig', 'mean'),
+            frac_same_sign=('same_sign', 'mean'),
+        ).reset_index()
+
+    coef_by_set = lattice.set_index('controls')['coef']
+    rows = []
+    for flag in [c for c in lattice.columns if c.startswith('with_')]:
+        control = flag[len('with_'):]
+        with_c = lattice[lattice[flag]]
+        # modelo "gemelo" sin el control
+        twins = with_c['controls'].map(
+            lambda s: ','.join(c for c in s.split(',') if c != control) or NO_CONTROL)
+        paired = twins.isin(coef_by_set.index)
+        coef_with = with_c.loc[paired.values, 'coef'].to_numpy()
+        coef_without = coef_by_set.loc[twins[paired.values]].to_numpy()
+        rows.append({
+            'control': control,
+            'pairs': int(paired.sum()),
+            'coef_with': coef_with.mean() if len(coef_with) else np.nan,
+            'coef_without': coef_without.mean() if len(coef_without) else np.nan,
+            'mean_shift': (coef_with - coef_without).mean() if len(coef_with) else np.nan,
+            'max_abs_shift': np.abs(coef_with - coef_without).max() if len(coef_with) else np.nan,
+        })
+    by_control = pd.DataFrame(rows).sort_values('max_abs_shift', ascending=False, ignore_index=True)
+    return by_size, by_control
+
+
+def plot_stability(lattice, filename, title='', labels=None, alpha=0.05):
+    """
+    Figura de estabilidad: (arriba) coeficiente e IC de cada modelo, ordenado
+    por coeficiente; (abajo) matriz de controles incluidos en cada modelo.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    labels = labels or {}
+    flags = [c for c in lattice.columns if c.startswith('with_')]
+    ordered = lattice.sort_values('coef', ignore_index=True)
+    xs = np.arange(len(ordered))
+    colors = np.where(ordered['p_value'] < alpha, '#1a9850', '#d73027')
+
+    fig, (ax, ax_m) = plt.subplots(2, 1, figsize=(max(8, len(ordered) * 0.18), 7),
+                                   sharex=True, gridspec_kw={'height_ratios': [3, 1.4]})
+    ax.vlines(xs, ordered['ci_low'], ordered['ci_high'], color=colors, linewidth=1, alpha=0.7)
+    ax.scatter(xs, ordered['coef'], c=colors, s=14, zorder=3)
+    base = ordered.index[ordered['controls'] == NO_CONTROL]
+    if len(base):
+        ax.scatter(base, ordered.loc[base, 'coef'], s=60, facecolors='none',
+                   edgecolors='black', zorder=4, label='Sin control')
+        ax.legend(loc='best', fontsize=9)
+    ax.axhline(0, color='black', linewidth=0.5, linestyle='--')
+    ax.set_ylabel('beta', fontsize=10)
+    ax.set_title(title, fontsize=11, fontweight='bold')
+
+    for j, flag in enumerate(flags):
+        on = ordered[flag].to_numpy(dtype=bool)
+        ax_m.scatter(xs[on], np.full(on.sum(), j), marker='s', s=12, color='#333333')
+    ax_m.set_yticks(range(len(flags)))
+    ax_m.set_yticklabels([labels.get(f[len('with_'):], f[len('with_'):]) for f in flags], fontsize=8)
+    ax_m.set_ylim(-0.5, len(flags) - 0.5)
+    ax_m.set_xlabel('Modelos (ordenados por beta)', fontsize=10)
+
+    plt.tight_layout()
+    plt.savefig(filename, dpi=200, bbox_inches='tight')
+    plt.close()
+
+
+# ============================================================
+# SELFCHECK
+# ============================================================
+
+def run_selfcheck(n=1500, n_groups=150, n_controls=6, n_jobs=None, seed=0):
+    """
+    Datos sinteticos con un confusor conocido:
+    - el reticulo tiene 2^k modelos y el paralelo coincide con el serial;
+    - cada modelo coincide con la formula de statsmodels (fit_health_model);
+    - el coeficiente del predictor solo se recupera al incluir el confusor.
+    """
+    import statsmodels.formula.api as smf
+
+    rng = np.random.default_rng(seed)
+    groups = rng.integers(0, n_groups, n)
+    ctrl = {f'c{i}': rng.normal(size=n) for i in range(n_controls)}
+    x = 0.8 * ctrl['c0'] + rng.normal(size=n)
+    y = 0.3 * x - 1.0 * ctrl['c0'] + rng.normal(size=n_groups)[groups] + rng.normal(size=n)
+    df = pd.DataFrame({'y': y, 'x': x, 'g': groups, **ctrl})
+    df.loc[rng.choice(n, 40, replace=False), 'c3'] = np.nan
+
+    controls = list(ctrl)
+    designs = [prepare_lattice(df, 'y', 'x', controls, group_var='g'),
+               prepare_lattice(df, 'y', 'x', controls[:2], group_var='g', common_sample=False)]
+
+    t0 = time.perf_counter()
+    serial = run_lattices(designs, n_jobs=1)
+    t_serial = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    parallel = run_lattices(designs, n_jobs=n_jobs)
+    t_parallel = time.perf_counter() - t0
+
+    assert len(serial[0]) == 2 ** n_controls, len(serial[0])
+    for a, b in zip(serial, parallel):
+        pd.testing.assert_frame_equal(a, b)
+    print(f"  [OK] {len(serial[0]) + len(serial[1])} modelos; serie {t_serial:.1f}s, "
+          f"paralelo {t_parallel:.1f}s")
+
+    # Contra la formula, con y sin muestra comun
+    for lattice, common in [(serial[0], True), (serial[1], False)]:
+        for _, row in lattice.sample(min(4, len(lattice)), random_state=seed).iterrows():
+            names = [] if row['controls'] == NO_CONTROL else row['controls'].split(',')
+            pool = controls if common else names
+            data = df[['y', 'x', 'g'] + pool].dropna()
+            res = smf.mixedlm(' + '.join(['y ~ x'] + names), data,
+                              groups=data['g']).fit(reml=False, method='powell')
+            assert np.isclose(res.params['x'], row['coef'], rtol=1e-6), (names, row['coef'])
+            assert np.isclose(-2 * res.llf + 2 * (len(res.params) + 1), row['aic'])
+            assert len(data) == row['n']
+    print("  [OK] coeficientes, AIC y n identicos a la formula")
+
+    by_size, by_control = stability_summary(serial[0])
+    assert by_control.iloc[0]['control'] == 'c0', by_control
+    with_c0 = serial[0].loc[serial[0]['with_c0'], 'coef']
+    assert np.allclose(with_c0, 0.3, atol=0.1), with_c0.describe()
+    print("  [OK] el confusor (c0) es el control que mas mueve el coeficiente")
+    print(by_size.to_string(index=False))
+    print("\nSELFCHECK OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sensibilidad del coeficiente a conjuntos de controles (reticulo)"
+    )
+    parser.add_argument(
+        "--selfcheck",
+        action="store_true",
+        help="Validar contra la formula de statsmodels con datos sinteticos"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int, default=None,
+        help="Procesos en paralelo (por defecto, nucleos disponibles)"
+    )
+    args = parser.parse_args()
+
+    if args.selfcheck:
+        run_selfcheck(n_jobs=args.jobs)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
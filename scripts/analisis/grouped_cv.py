@@ -0,0 +1,300 @@
+"""
+Validacion cruzada agrupada (por microrregiao) para la seleccion de modelos
+============================================================================
+Los scans de H1, H4 y H5 ordenan predictores solo por AIC dentro de muestra
+(`run_model_selection`, `compare_models_for_dimension`). Este modulo agrega
+una medida fuera de muestra sin multiplicar por k el tiempo en serie:
+
+- Los folds se asignan por microrregiao completa (ningun grupo aparece en
+  entrenamiento y prueba a la vez) y son los MISMOS para todos los outcomes
+  y predictores de una corrida (asignacion unica, semilla fija).
+- El diseno de cada par outcome x predictor se construye una vez, junto con
+  los indices de entrenamiento/prueba de cada fold; los workers reciben
+  todos los disenos una sola vez (initializer) y las tareas son solo
+  (indice de diseno, fold).
+- Todos los folds de todos los predictores se ajustan en un mismo pool
+  (ProcessPoolExecutor), con el mismo MixedLM de los scripts
+  (y ~ x + (1|micro), REML=False, method='powell').
+- Prediccion para microrregiones nuevas: media marginal X*beta (el efecto
+  aleatorio de un grupo no visto es 0). Se reportan:
+    cv_rmse   = RMSE de esa prediccion sobre todas las filas de prueba
+    cv_loglik = log-verosimilitud predictiva media por observacion, con la
+                covarianza marginal del grupo (sigma2*I + tau2*11')
+
+Uso:
+    from grouped_cv import cross_validate_pairs, add_cv_columns
+
+    pairs = [('incidence_mean_dengue_log', 'forest_cover_z',
+              ('incidence_mean_dengue', 'forest_cover'))]
+    cv = cross_validate_pairs(df, pairs, k=5)     # assign_folds + cv_spec + run_cv
+    results_df = add_cv_columns(results_df, cv, 'incidence_mean_dengue')
+
+    python grouped_cv.py --selfcheck
+
+Autor: Science Team
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+
+from process_pool import map_tasks
+
+DEFAULT_FOLDS = 5
+CV_COLUMNS = ['cv_rmse', 'cv_loglik']
+
+
+# ============================================================
+# FOLDS / DESIGN
+# ============================================================
+
+def assign_folds(groups, k=DEFAULT_FOLDS, seed=42):
+    """
+    Asigna cada grupo (microrregiao) a uno de k folds, en orden aleatorio
+    con semilla fija. Devuelve {grupo: fold}; se calcula una vez por corrida
+    para que todos los modelos se comparen sobre las mismas particiones.
+    """
+    unique = np.sort(pd.unique(pd.Series(groups).dropna()))
+    order = np.random.default_rng(seed).permutation(len(unique))
+    return {g: i % k for i, g in enumerate(unique[order])}
+
+
+def cv_spec(df, y_col, x_col, folds, group_var='cod_microrregiao', min_n=50, key=None):
+    """
+    Diseno de un par (y ~ x) con los indices de cada fold ya calculados.
+    Devuelve None si faltan columnas o hay menos de `min_n` filas completas
+    (mismo criterio que los ajustes de los scripts).
+    """
+    for v in [y_col, x_col, group_var]:
+        if v not in df.columns:
+            return None
+    data = df[[y_col, x_col, group_var]].dropna()
+    if len(data) < min_n:
+        return None
+
+    groups = data[group_var].to_numpy()
+    fold_of_row = np.array([folds.get(g, -1) for g in groups])
+    k = max(folds.values()) + 1 if folds else 0
+    fold_idx = {}
+    for f in range(k):
+        test = np.flatnonzero(fold_of_row == f)
+        train = np.flatnonzero((fold_of_row != f) & (fold_of_row >= 0))
+        if len(test) and len(train) >= min_n:
+            fold_idx[f] = (train, test)
+
+    return {
+        'key': key if key is not None else (y_col, x_col),
+        'endog': data[y_col].to_numpy(dtype=float),
+        'exog': np.column_stack([np.ones(len(data)), data[x_col].to_numpy(dtype=float)]),
+        'groups': groups,
+        'folds': fold_idx,
+    }
+
+
+# ============================================================
+# FITTING
+# ============================================================
+
+def _marginal_loglik(resid, groups, sigma2, tau2):
+    """
+    Log-densidad de los residuos bajo N(0, sigma2*I + tau2*11') por grupo
+    (lema del determinante + Sherman-Morrison, sin formar matrices).
+    """
+    _, codes = np.unique(groups, return_inverse=True)
+    n_g = np.bincount(codes).astype(float)
+    sum_r = np.bincount(codes, weights=resid)
+    ss_r = np.bincount(codes, weights=resid ** 2)
+    logdet = n_g * np.log(sigma2) + np.log1p(n_g * tau2 / sigma2)
+    quad = (ss_r - tau2 / (sigma2 + n_g * tau2) * sum_r ** 2) / sigma2
+    return float(np.sum(-0.5 * (n_g * np.log(2 * np.pi) + logdet + quad)))
+
+
+def fit_fold(spec, fold):
+    """
+    Ajusta el modelo en los grupos de entrenamiento de un fold y evalua en
+    los de prueba. Devuelve {'sse', 'loglik', 'n'} o None si no converge.
+    """
+    train, test = spec['folds'][fold]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            model = sm.MixedLM(spec['endog'][train], spec['exog'][train],
+                               groups=spec['groups'][train])
+            result = model.fit(reml=False, method='powell')
+            if not result.converged:
+                return None
+
+            beta = np.asarray(result.fe_params)
+            tau2 = float(np.asarray(result.cov_re).ravel()[0])
+            sigma2 = float(result.scale)
+            resid = spec['endog'][test] - spec['exog'][test] @ beta
+            return {
+                'sse': float(resid @ resid),
+                'loglik': _marginal_loglik(resid, spec['groups'][test], sigma2, max(tau2, 0.0)),
+                'n': len(test),
+            }
+        except Exception:
+            return None
+
+
+def _fit_task(specs, task):
+    i, fold = task
+    return fit_fold(specs[i], fold)
+
+
+def run_cv(specs, n_jobs=None, chunksize=2):
+    """
+    Ajusta todos los folds de todos los disenos (de `cv_spec`) en un solo
+    pool (`process_pool.map_tasks`). Devuelve un DataFrame con una fila por
+    diseno: key, cv_rmse, cv_loglik, cv_folds (folds que convergieron), cv_n.
+    """
+    specs = list(specs)
+    tasks = [(i, f) for i, s in enumerate(specs) if s is not None for f in s['folds']]
+    fits = map_tasks(_fit_task, tasks, shared=specs, n_jobs=n_jobs, chunksize=chunksize)
+
+    by_spec = {}
+    for (i, _), fit in zip(tasks, fits):
+        if fit is not None:
+            by_spec.setdefault(i, []).append(fit)
+
+    rows = []
+    for i, spec in enumerate(specs):
+        if spec is None or i not in by_spec:
+            continue
+        folds = by_spec[i]
+        n = sum(f['n'] for f in folds)
+        rows.append({
+            'key': spec['key'],
+            'cv_rmse': np.sqrt(sum(f['sse'] for f in folds) / n),
+            'cv_loglik': sum(f['loglik'] for f in folds) / n,
+            'cv_folds': len(folds),
+            'cv_n': n,
+        })
+    return pd.DataFrame(rows, columns=['key'] + CV_COLUMNS + ['cv_folds', 'cv_n'])
+
+
+def cross_validate_pairs(df, pairs, k=DEFAULT_FOLDS, n_jobs=None, group_var='cod_microrregiao',
+                         seed=42):
+    """
+    CV agrupada de una lista de pares (y_col, x_col, key): una sola
+    asignacion de folds, un `cv_spec` por par y todos los folds en un pool
+    (`run_cv`). Base de cross_validate_predictors / cross_validate_dimensions
+    en los scripts de H1, H4 y H5.
+    """
+    folds = assign_folds(df[group_var], k=k, seed=seed)
+    specs = [cv_spec(df, y_col, x_col, folds, group_var=group_var, key=key)
+             for y_col, x_col, key in pairs]
+    print(f"\n  Validacion cruzada agrupada: {k} folds x {sum(s is not None for s in specs)} modelos")
+    return run_cv(specs, n_jobs=n_jobs)
+
+
+def add_cv_columns(results_df, cv, outcome, predictor_col='predictor'):
+    """
+    Agrega cv_rmse / cv_loglik (y cv_folds) a una tabla de seleccion de un
+    outcome, junto a la columna 'aic'. `cv` es la salida de `run_cv` con
+    key=(outcome, predictor). Sin CV (cv None o vacio) devuelve la tabla igual.
+    """
+    if cv is None or len(cv) == 0 or len(results_df) == 0:
+        return results_df
+    scores = cv.set_index('key')
+    results_df = results_df.copy()
+    pos = results_df.columns.get_loc('aic') + 1
+    for i, col in enumerate(CV_COLUMNS + ['cv_folds']):
+        values = [scores[col].get((outcome, p), np.nan) for p in results_df[predictor_col]]
+        results_df.insert(pos + i, col, values)
+    return results_df
+
+
+def best_by_cv(results_df, label_col='predictor'):
+    """Etiqueta y RMSE del predictor con menor cv_rmse (None sin CV)"""
+    if 'cv_rmse' not in results_df.columns or results_df['cv_rmse'].isna().all():
+        return None
+    best = results_df.loc[results_df['cv_rmse'].idxmin()]
+    return best[label_col], best['cv_rmse']
+
+
+# ============================================================
+# SELFCHECK
+# ============================================================
+
+def run_selfcheck(n_groups=200, per_group=8, k=5, n_jobs=None, seed=0):
+    """
+    Datos sinteticos con un predictor real y uno de ruido:
+    - ningun grupo cae en entrenamiento y prueba del mismo fold;
+    - el paralelo coincide con el serial (y con cross_validate_pairs);
+    - la log-verosimilitud marginal coincide con scipy multivariate_normal;
+    - el predictor real gana en cv_rmse y cv_loglik.
+    """
+    from scipy import stats
+
+    rng = np.random.default_rng(seed)
+    groups = np.repeat(np.arange(n_groups), per_group)
+    n = len(groups)
+    x_real, x_noise = rng.normal(size=n), rng.normal(size=n)
+    y = 0.6 * x_real + rng.normal(scale=0.7, size=n_groups)[groups] + rng.normal(size=n)
+    df = pd.DataFrame({'y': y, 'x_real': x_real, 'x_noise': x_noise, 'g': groups})
+    df.loc[rng.choice(n, 30, replace=False), 'x_noise'] = np.nan
+
+    folds = assign_folds(df['g'], k=k, seed=seed)
+    specs = [cv_spec(df, 'y', x, folds, group_var='g', key=('y', x)) for x in ['x_real', 'x_noise']]
+    for spec in specs:
+        for train, test in spec['folds'].values():
+            assert not set(spec['groups'][train]) & set(spec['groups'][test])
+    print(f"  [OK] {k} folds por microrregiao, sin grupos compartidos")
+
+    t0 = time.perf_counter()
+    serial = run_cv(specs, n_jobs=1)
+    t_serial = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    parallel = run_cv(specs, n_jobs=n_jobs)
+    t_parallel = time.perf_counter() - t0
+    pd.testing.assert_frame_equal(serial, parallel)
+    print(f"  [OK] {2 * k} ajustes; serie {t_serial:.1f}s, paralelo {t_parallel:.1f}s")
+
+    pairs = [('y', x, ('y', x)) for x in ['x_real', 'x_noise']]
+    pd.testing.assert_frame_equal(
+        cross_validate_pairs(df, pairs, k=k, n_jobs=n_jobs, group_var='g', seed=seed), serial)
+    print("  [OK] cross_validate_pairs = assign_folds + cv_spec + run_cv")
+
+    resid = rng.normal(size=12)
+    g = np.array([0] * 5 + [1] * 7)
+    expected = sum(stats.multivariate_normal(np.zeros((g == j).sum()),
+                                             0.8 * np.eye((g == j).sum()) + 0.3).logpdf(resid[g == j])
+                   for j in [0, 1])
+    assert np.isclose(_marginal_loglik(resid, g, 0.8, 0.3), expected)
+    print("  [OK] log-verosimilitud marginal = scipy multivariate_normal")
+
+    real, noise = serial.set_index('key').loc[[('y', 'x_real'), ('y', 'x_noise')]].itertuples(index=False)
+    assert real.cv_rmse < noise.cv_rmse and real.cv_loglik > noise.cv_loglik
+    print(serial.to_string(index=False))
+    print("\nSELFCHECK OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validacion cruzada agrupada por microrregiao para seleccion de modelos"
+    )
+    parser.add_argument(
+        "--selfcheck",
+        action="store_true",
+        help="Validar con datos sinteticos"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int, default=None,
+        help="Procesos en paralelo (por defecto, nucleos disponibles)"
+    )
+    args = parser.parse_args()
+
+    if args.selfcheck:
+        run_selfcheck(n_jobs=args.jobs)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
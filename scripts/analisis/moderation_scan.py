@@ -0,0 +1,262 @@
+"""
+Motor de escaneo de moderacion (interacciones) para H2, H3 y H5
+================================================================
+Para cada triple outcome x predictor x moderador los scripts ajustaban dos
+modelos mixtos con formulas (`y ~ x * m` y `y ~ x + m`), reconstruyendo el
+diseno con patsy cada vez, y luego `compute_simple_slopes` volvia a ajustar
+el modelo completo solo para leer su covarianza.
+
+Este modulo:
+- Construye el diseno una sola vez por triple (arrays NumPy; el aditivo es
+  una vista de las 3 primeras columnas del completo).
+- Ajusta el par anidado en la misma tarea (mismo MixedLM, REML=False,
+  method='powell'), con resultados identicos a los de la formula.
+- Guarda coeficientes, errores estandar, p-valores y la covarianza de los
+  efectos fijos, de modo que simple slopes y Johnson-Neyman se calculan
+  sin re-ajustar.
+- Ejecuta los triples en paralelo (ProcessPoolExecutor), preservando el
+  orden de entrada.
+
+Uso:
+    from moderation_scan import prepare_triple, run_scan, simple_slopes, johnson_neyman
+
+    designs = [prepare_triple(df, 'UAI_env_logit', 'forest_cover_z', 'pct_pobreza_z')]
+    fits = run_scan(designs)
+    slopes = simple_slopes(fits[0], levels=[-1, 0, 1])
+    jn = johnson_neyman(fits[0])
+
+Autor: Science Team
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+import statsmodels.api as sm
+
+from process_pool import map_tasks
+
+# Nombres internos de los terminos (iguales a los de la formula 'y ~ x * m')
+TERMS_FULL = ['Intercept', 'x', 'm', 'x:m']
+TERMS_ADD = ['Intercept', 'x', 'm']
+
+
+# ============================================================
+# DESIGN
+# ============================================================
+
+def prepare_triple(df, y_col, x_col, m_col, group_var='cod_microrregiao',
+                   min_n=100, key=None, id_col='cod_ibge'):
+    """
+    Construye el diseno de un triple (una sola vez).
+
+    Devuelve None si falta alguna columna o si hay menos de `min_n`
+    observaciones completas (mismo criterio que los scripts originales).
+    `key` es un identificador libre que se devuelve con el ajuste.
+    Si `id_col` existe, sus valores acompanan a los residuos del ajuste
+    (diagnostico espacial con spatial_weights.moran_residuals).
+    `rows` guarda la posicion de cada fila en `df` (permutaciones conjuntas
+    con permutation_engine).
+    """
+    for v in [y_col, x_col, m_col, group_var]:
+        if v not in df.columns:
+            return None
+
+    complete = df[[y_col, x_col, m_col, group_var]].notna().all(axis=1).to_numpy()
+    data = df[[y_col, x_col, m_col, group_var]][complete]
+    if len(data) < min_n:
+        return None
+
+    x = data[x_col].to_numpy(dtype=float)
+    m = data[m_col].to_numpy(dtype=float)
+    exog = np.column_stack([np.ones(len(data)), x, m, x * m])
+
+    return {
+        'key': key if key is not None else (y_col, x_col, m_col),
+        'endog': data[y_col].to_numpy(dtype=float),
+        'exog': exog,
+        'groups': data[group_var].to_numpy(),
+        'ids': df.loc[data.index, id_col].to_numpy() if id_col in df.columns else None,
+        'rows': np.flatnonzero(complete),
+        'n': len(data),
+    }
+
+
+# ============================================================
+# FITTING
+# ============================================================
+
+def _fit_mixed(endog, exog, groups, names):
+    # DataFrame para que params/bse/cov_params lleven los nombres de la formula
+    exog = pd.DataFrame(exog, columns=names)
+    model = sm.MixedLM(pd.Series(endog, name='y'), exog, groups=groups)
+    return model.fit(reml=False, method='powell')
+
+
+def _r2_marginal(result):
+    var_fixed = np.var(result.fittedvalues)
+    var_random = float(result.cov_re.iloc[0, 0]) if hasattr(result.cov_re, 'iloc') else float(result.cov_re)
+    var_resid = result.scale
+    return var_fixed / (var_fixed + var_random + var_resid)
+
+
+def fit_pair(design):
+    """
+    Ajusta el par anidado (completo con interaccion + aditivo) de un triple.
+
+    Devuelve un dict serializable con todo lo necesario para reportar y para
+    simple slopes / Johnson-Neyman, o None si el modelo completo no converge
+    o falla (mismo comportamiento que los scripts originales).
+    """
+    if design is None:
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            result_full = _fit_mixed(design['endog'], design['exog'],
+                                     design['groups'], TERMS_FULL)
+            if not result_full.converged:
+                return None
+            result_add = _fit_mixed(design['endog'], design['exog'][:, :3],
+                                    design['groups'], TERMS_ADD)
+
+            k_full = len(result_full.params) + 1
+            k_add = len(result_add.params) + 1
+            aic_full = -2 * result_full.llf + 2 * k_full
+            aic_add = -2 * result_add.llf + 2 * k_add
+
+            cov = result_full.cov_params().loc[TERMS_FULL, TERMS_FULL]
+            x_col = design['exog'][:, 1]
+            m_col = design['exog'][:, 2]
+
+            return {
+                'key': design['key'],
+                'params': result_full.params.to_dict(),
+                'bse': result_full.bse.to_dict(),
+                'pvalues': result_full.pvalues.to_dict(),
+                'cov': cov.to_numpy(),
+                'resid': result_full.resid.to_numpy(),
+                'ids': design.get('ids'),
+                'aic_full': aic_full,
+                'aic_add': aic_add,
+                'r2_marginal': _r2_marginal(result_full),
+                'n': design['n'],
+                'x_range': (float(x_col.min()), float(x_col.max())),
+                'm_quantiles': tuple(np.quantile(m_col, [0.1, 0.5, 0.9])),
+                'm_range': (float(m_col.min()), float(m_col.max())),
+            }
+        except Exception:
+            return None
+
+
+def run_scan(designs, n_jobs=None, chunksize=4):
+    """
+    Ajusta una lista de disenos (de `prepare_triple`) en paralelo
+    (`process_pool.map_tasks`). Devuelve la lista de ajustes en el mismo
+    orden (None donde no aplica).
+    """
+    return map_tasks(fit_pair, designs, n_jobs=n_jobs, chunksize=chunksize)
+
+
+def interaction_summary(fit, x_label='predictor', m_label='moderator'):
+    """
+    Columnas comunes de los CSV de interaccion a partir de un ajuste, con los
+    nombres de cada script (p.ej. x_label='health', m_label='climate' en H3).
+    """
+    int_p = fit['pvalues'].get('x:m', 1.0)
+    return {
+        f'coef_{x_label}': fit['params']['x'],
+        f'p_{x_label}': fit['pvalues']['x'],
+        f'coef_{m_label}': fit['params']['m'],
+        f'p_{m_label}': fit['pvalues']['m'],
+        'coef_interaction': fit['params'].get('x:m', np.nan),
+        'se_interaction': fit['bse'].get('x:m', np.nan),
+        'p_interaction': int_p,
+        'aic_interaction': fit['aic_full'],
+        'aic_additive': fit['aic_add'],
+        'delta_aic': fit['aic_full'] - fit['aic_add'],  # negative = interaction model better
+        'r2_marginal': fit['r2_marginal'],
+        'n': fit['n'],
+        'interaction_significant': int_p < 0.05 if pd.notna(int_p) else False,
+        'interaction_improves_fit': fit['aic_full'] < fit['aic_add']
+    }
+
+
+# ============================================================
+# SIMPLE SLOPES / JOHNSON-NEYMAN (sin re-ajustar)
+# ============================================================
+
+def simple_slopes(fit, levels=(-1, 0, 1), dof=None):
+    """
+    Pendiente de x a distintos niveles del moderador: dy/dx = b_x + b_int * m,
+    con SE a partir de la covarianza guardada del ajuste.
+    dof por defecto = n - 4 (como `compute_simple_slopes` de H2).
+    """
+    cov = fit['cov']
+    b_x = fit['params']['x']
+    b_int = fit['params'].get('x:m', 0)
+    var_bx, var_bint, cov_bx_bint = cov[1, 1], cov[3, 3], cov[1, 3]
+    dof = fit['n'] - 4 if dof is None else dof
+
+    slopes = []
+    for level in levels:
+        slope = b_x + b_int * level
+        se = np.sqrt(var_bx + (level ** 2) * var_bint + 2 * level * cov_bx_bint)
+        t = slope / se
+        p = 2 * (1 - stats.t.cdf(abs(t), dof))
+        level_name = 'Low (-1 SD)' if level == -1 else ('Mean' if level == 0 else 'High (+1 SD)')
+        slopes.append({
+            'level': level,
+            'level_name': level_name,
+            'slope': slope,
+            'se': se,
+            't': t,
+            'p': p
+        })
+    return pd.DataFrame(slopes)
+
+
+def johnson_neyman(fit, alpha=0.05, dof=None):
+    """
+    Intervalo de Johnson-Neyman: valores del moderador donde la pendiente de
+    x cambia de significancia. Resuelve (b_x + b_int m)^2 = t^2 Var(slope(m)).
+
+    Devuelve dict con los limites (m_low, m_high) recortados al rango
+    observado del moderador (fit['m_range']), si la region significativa
+    esta 'inside' o 'outside' de [m_low, m_high],
+    y la fraccion de la region observada del moderador donde es significativa.
+    """
+    cov = fit['cov']
+    b_x = fit['params']['x']
+    b_int = fit['params'].get('x:m', 0)
+    dof = fit['n'] - 4 if dof is None else dof
+    t_crit = stats.t.ppf(1 - alpha / 2, dof)
+    t2 = t_crit ** 2
+
+    # a m^2 + b m + c = 0
+    a = b_int ** 2 - t2 * cov[3, 3]
+    b = 2 * (b_x * b_int - t2 * cov[1, 3])
+    c = b_x ** 2 - t2 * cov[1, 1]
+
+    m_min, m_max = fit['m_range']
+    grid = np.linspace(m_min, m_max, 501)
+    sig_grid = (a * grid ** 2 + b * grid + c) > 0
+
+    disc = b ** 2 - 4 * a * c
+    if a == 0 or disc < 0:
+        bounds = (np.nan, np.nan)
+        region = 'all' if sig_grid.all() else ('none' if not sig_grid.any() else 'mixed')
+    else:
+        roots = np.sort([(-b - np.sqrt(disc)) / (2 * a), (-b + np.sqrt(disc)) / (2 * a)])
+        roots = np.clip(roots, m_min, m_max)
+        bounds = (float(roots[0]), float(roots[1]))
+        # a > 0: significativo fuera de las raices; a < 0: dentro
+        region = 'outside' if a > 0 else 'inside'
+
+    return {
+        'jn_low': bounds[0],
+        'jn_high': bounds[1],
+        'jn_region': region,
+        'jn_pct_significant': float(sig_grid.mean()),
+    }
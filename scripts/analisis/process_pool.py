@@ -0,0 +1,61 @@
+"""
+Pool de procesos con datos compartidos por worker
+=================================================
+Patron comun de los motores de analisis (grouped_cv, confounder_sensitivity,
+permutation_engine, moderation_scan, spatial_weights, interaction_plots):
+los datos grandes (disenos, pruebas, DataFrame) se envian UNA vez a cada
+proceso con el initializer del pool y cada tarea lleva solo indices o
+parametros chicos.
+
+Uso:
+    from process_pool import map_tasks
+
+    def _fit_task(specs, task):          # a nivel de modulo (pickle)
+        i, fold = task
+        return fit_fold(specs[i], fold)
+
+    fits = map_tasks(_fit_task, tasks, shared=specs, n_jobs=4, chunksize=2)
+
+Autor: Science Team
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+# Datos compartidos del proceso worker (se fijan en _init_worker)
+_SHARED = None
+
+
+def _init_worker(shared):
+    global _SHARED
+    _SHARED = shared
+
+
+def _apply(fn, task):
+    return fn(_SHARED, task)
+
+
+def map_tasks(fn, tasks, shared=None, n_jobs=None, chunksize=1):
+    """
+    Aplica `fn` a cada tarea y devuelve los resultados en el mismo orden.
+    Con `shared` la llamada es fn(shared, task) y `shared` viaja una sola vez
+    a cada proceso; sin `shared`, fn(task). `fn` debe estar definida a nivel
+    de modulo.
+
+    n_jobs=None usa min(tareas, nucleos); n_jobs=1 (o una sola tarea)
+    ejecuta en serie en este proceso (util para depurar).
+    """
+    tasks = list(tasks)
+    n_jobs = n_jobs or min(len(tasks), os.cpu_count() or 1)
+    if n_jobs <= 1 or len(tasks) <= 1:
+        if shared is None:
+            return [fn(t) for t in tasks]
+        return [fn(shared, t) for t in tasks]
+
+    if shared is None:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            return list(pool.map(fn, tasks, chunksize=chunksize))
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(shared,)) as pool:
+        return list(pool.map(partial(_apply, fn), tasks, chunksize=chunksize))
@@ -0,0 +1,323 @@
+"""
+Ejecucion paralela de modelos SEM (semopy) con timeout y warm starts
+====================================================================
+`analisis_h1_nexus_sem` y `analisis_h3_heat_stress_v2` ajustaban las
+especificaciones SEM una por una, en serie; un modelo que no converge podia
+bloquear toda la corrida.
+
+Este modulo:
+- Ajusta cada especificacion en su propio proceso, con varios en paralelo,
+  y termina (terminate) los que superan el timeout.
+- Warm starts: la primera especificacion de la lista (donante) se ajusta
+  primero y sus estimaciones de regresiones (lval ~ rval) se usan como
+  valores iniciales (START) en las demas que comparten esas trayectorias.
+  Los START de cada modelo dependen solo de la lista de specs (y del `bank`
+  externo), no del orden en que terminan los procesos. Si el ajuste con
+  warm start falla, se reintenta en frio dentro del mismo proceso.
+- Cache de modelos ajustados por hash de la especificacion + datos +
+  objetivo/solver + valores iniciales usados (en memoria y opcional en
+  disco).
+- Reporta el tiempo de ajuste de cada modelo (`timing_table`).
+
+Uso:
+    from sem_runner import sem_spec, run_sem, timing_table
+
+    specs = [sem_spec('mort_circ', model_desc, df_sem)]
+    results = run_sem(specs, timeout=120, cache_dir='outputs/cache/sem')
+    if results[0]['status'] == 'ok':
+        estimates = results[0]['estimates']   # = model.inspect()
+        stats_sem = results[0]['stats']       # = semopy.calc_stats(model)
+
+Autor: Science Team
+"""
+
+import hashlib
+import os
+import pickle
+import re
+import time
+import multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+
+import pandas as pd
+
+try:
+    import semopy
+    HAS_SEMOPY = True
+except ImportError:
+    HAS_SEMOPY = False
+
+DEFAULT_TIMEOUT = 300  # segundos por modelo
+
+_MEMORY_CACHE = {}
+
+
+# ============================================================
+# SPECS
+# ============================================================
+
+def _normalize_desc(desc):
+    lines = [re.sub(r'\s+', ' ', l.split('#')[0]).strip() for l in desc.splitlines()]
+    return '\n'.join(l for l in lines if l)
+
+
+def _data_hash(data):
+    h = hashlib.sha256()
+    h.update('\0'.join(map(str, data.columns)).encode())
+    h.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def sem_spec(key, desc, data, obj='MLW', solver='SLSQP'):
+    """
+    Describe un modelo a ajustar. `data` ya debe estar filtrado (dropna).
+    La clave de cache depende de la especificacion normalizada, los datos y
+    el objetivo/solver, no de `key` (que es solo una etiqueta).
+    """
+    desc = _normalize_desc(desc)
+    h = hashlib.sha256()
+    h.update(f"{desc}\0{obj}\0{solver}\0".encode())
+    h.update(_data_hash(data).encode())
+    return {
+        'key': key,
+        'desc': desc,
+        'data': data,
+        'obj': obj,
+        'solver': solver,
+        'hash': h.hexdigest(),
+    }
+
+
+def _with_starts(desc, bank):
+    """
+    Anade valores iniciales a las regresiones presentes en `bank`
+    ({(lval, rval): estimate}). Cada coeficiente recibe un nombre unico
+    (sin restricciones de igualdad) y una linea START(valor) nombre.
+    Los terminos que ya tienen multiplicador se dejan como estan.
+    """
+    out, starts = [], []
+    for line in desc.splitlines():
+        if '~' not in line or '=~' in line or '~~' in line:
+            out.append(line)
+            continue
+        lhs, rhs = [s.strip() for s in line.split('~', 1)]
+        terms = []
+        for term in [t.strip() for t in rhs.split('+')]:
+            if '*' not in term and (lhs, term) in bank:
+                name = f"ws{len(starts) + 1}"
+                starts.append((name, bank[(lhs, term)]))
+                term = f"{name}*{term}"
+            terms.append(term)
+        out.append(f"{lhs} ~ {' + '.join(terms)}")
+    if not starts:
+        return None
+    out.extend(f"START({value:.6g}) {name}" for name, value in starts)
+    return '\n'.join(out)
+
+
+def _update_bank(bank, estimates):
+    paths = estimates[estimates['op'] == '~']
+    for _, row in paths.iterrows():
+        if pd.notna(row['Estimate']):
+            bank[(row['lval'], row['rval'])] = float(row['Estimate'])
+
+
+# ============================================================
+# WORKER
+# ============================================================
+
+def _fit_worker(conn, descs, data, obj, solver):
+    """Corre en un proceso aparte: prueba cada descripcion hasta que una ajuste."""
+    t0 = time.perf_counter()
+    message = None
+    for i, desc in enumerate(descs):
+        try:
+            model = semopy.Model(desc)
+            res = model.fit(data, obj=obj, solver=solver)
+            message = {
+                'status': 'ok',
+                'estimates': model.inspect(),
+                'stats': semopy.calc_stats(model),
+                'converged': bool(getattr(res, 'success', True)),
+                'warm_start': i == 0 and len(descs) > 1,
+                'error': '',
+            }
+            break
+        except Exception as e:
+            message = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+    message['fit_time'] = time.perf_counter() - t0
+    conn.send(message)
+    conn.close()
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+
+def _base_result(spec):
+    return {
+        'key': spec['key'], 'status': None, 'estimates': None, 'stats': None,
+        'converged': False, 'warm_start': False, 'cached': False,
+        'n': len(spec['data']), 'fit_time': float('nan'), 'error': '',
+    }
+
+
+def _fit_key(spec, warm_desc):
+    """Clave de cache: spec (desc + datos + obj/solver) + valores iniciales usados."""
+    return hashlib.sha256(f"{spec['hash']}\0{warm_desc or ''}".encode()).hexdigest()
+
+
+def _cache_file(cache_dir, fit_key):
+    return os.path.join(cache_dir, f"sem_{fit_key[:24]}.pkl") if cache_dir else None
+
+
+def _load_cached(fit_key, cache_dir):
+    if fit_key in _MEMORY_CACHE:
+        return _MEMORY_CACHE[fit_key]
+    cache_file = _cache_file(cache_dir, fit_key)
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, 'rb') as f:
+            cached = pickle.load(f)
+        _MEMORY_CACHE[fit_key] = cached
+        return cached
+    return None
+
+
+def _store_cached(fit_key, cache_dir, result):
+    stored = {k: result[k] for k in ['estimates', 'stats', 'converged',
+                                     'warm_start', 'fit_time']}
+    _MEMORY_CACHE[fit_key] = stored
+    cache_file = _cache_file(cache_dir, fit_key)
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, 'wb') as f:
+            pickle.dump(stored, f)
+
+
+def _run_wave(specs, indices, results, bank, n_jobs, timeout, cache_dir, warm_start):
+    """
+    Ajusta specs[i] para i en `indices` con los START tomados de `bank`
+    (fijo durante toda la ola), usando la cache cuando existe.
+    """
+    ctx = mp.get_context()
+    pending = deque()
+    warm_descs = {}
+
+    for i in indices:
+        spec = specs[i]
+        warm = _with_starts(spec['desc'], bank) if warm_start else None
+        warm_descs[i] = warm
+        cached = _load_cached(_fit_key(spec, warm), cache_dir)
+        if cached is not None:
+            results[i] = {**_base_result(spec), **cached, 'status': 'ok', 'cached': True}
+        else:
+            pending.append(i)
+
+    n_jobs = max(n_jobs or min(len(pending), os.cpu_count() or 1), 1)
+    running = {}  # conn -> (indice, proceso, inicio)
+
+    while pending or running:
+        while pending and len(running) < n_jobs:
+            i = pending.popleft()
+            spec = specs[i]
+            descs = [spec['desc']]
+            if warm_descs[i]:
+                descs.insert(0, warm_descs[i])
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_fit_worker, daemon=True,
+                               args=(child_conn, descs, spec['data'],
+                                     spec['obj'], spec['solver']))
+            proc.start()
+            child_conn.close()
+            running[parent_conn] = (i, proc, time.perf_counter())
+
+        now = time.perf_counter()
+        next_deadline = min(start + timeout for _, _, start in running.values())
+        ready = wait(list(running), timeout=max(next_deadline - now, 0))
+
+        for conn in ready:
+            i, proc, start = running.pop(conn)
+            spec = specs[i]
+            try:
+                message = conn.recv()
+            except EOFError:
+                message = {'status': 'error', 'fit_time': time.perf_counter() - start,
+                           'error': f"worker termino sin resultado (exitcode={proc.exitcode})"}
+            conn.close()
+            proc.join()
+            results[i] = {**_base_result(spec), **message}
+            if message['status'] == 'ok':
+                _store_cached(_fit_key(spec, warm_descs[i]), cache_dir, results[i])
+
+        now = time.perf_counter()
+        for conn, (i, proc, start) in list(running.items()):
+            if now - start >= timeout:
+                proc.terminate()
+                proc.join()
+                conn.close()
+                del running[conn]
+                results[i] = {**_base_result(specs[i]), 'status': 'timeout',
+                              'fit_time': now - start,
+                              'error': f"timeout ({timeout}s)"}
+
+
+def run_sem(specs, n_jobs=None, timeout=DEFAULT_TIMEOUT, cache_dir=None,
+            warm_start=True, bank=None):
+    """
+    Ajusta una lista de specs (de `sem_spec`) y devuelve una lista de dicts
+    en el mismo orden, con:
+        status     'ok' | 'timeout' | 'error'  (None si la spec es None)
+        estimates  DataFrame de model.inspect()
+        stats      DataFrame de semopy.calc_stats(model)
+        converged, warm_start, cached, n, fit_time (s), error
+
+    Cada modelo corre en su propio proceso (n_jobs en paralelo) y se termina
+    si pasa `timeout` segundos. Con warm_start, la primera spec (donante) se
+    ajusta en una ola previa solo con el `bank` externo ({(lval, rval):
+    estimate}); las demas reciben los START del bank + el donante, de modo
+    que los resultados son reproducibles. Los modelos en cache no se
+    re-ajustan; los timeouts y errores no se guardan en cache.
+    """
+    if not HAS_SEMOPY:
+        raise ImportError("semopy no esta instalado: run_sem no disponible")
+
+    specs = list(specs)
+    results = [None] * len(specs)
+    bank = dict(bank or {})
+    indices = [i for i, spec in enumerate(specs) if spec is not None]
+
+    if warm_start and len(indices) > 1:
+        donor, rest = indices[:1], indices[1:]
+        _run_wave(specs, donor, results, bank, n_jobs, timeout, cache_dir, warm_start)
+        if results[donor[0]]['status'] == 'ok':
+            _update_bank(bank, results[donor[0]]['estimates'])
+    else:
+        rest = indices
+    _run_wave(specs, rest, results, bank, n_jobs, timeout, cache_dir, warm_start)
+
+    return results
+
+
+def timing_table(results):
+    """Tabla con el tiempo de ajuste y el estado de cada modelo."""
+    rows = []
+    for r in results:
+        if r is None:
+            continue
+        rows.append({
+            'model': r['key'],
+            'status': r['status'],
+            'cached': r['cached'],
+            'warm_start': r['warm_start'],
+            'converged': r['converged'],
+            'n': r['n'],
+            'fit_time_s': r['fit_time'],
+            'error': r['error'],
+        })
+    return pd.DataFrame(rows)
+
+
+def clear_cache():
+    """Vacia la cache en memoria."""
+    _MEMORY_CACHE.clear()
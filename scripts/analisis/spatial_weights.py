@@ -0,0 +1,403 @@
+"""
+Matrices de pesos espaciales (sparse) y autocorrelacion espacial (Moran)
+=========================================================================
+Ninguno de los modelos H1-H5 revisaba la autocorrelacion espacial de los
+residuos entre los 645 municipios. Este modulo:
+
+- Construye pesos de contiguidad queen / rook y k vecinos mas cercanos
+  (kNN) a partir del shapefile IBGE, una sola vez. La contiguidad se obtiene
+  con matrices de incidencia poligono-vertice / poligono-arista
+  (A = V V^T), sin comparar pares de poligonos.
+- Guarda la matriz binaria como CSR (scipy.sparse) en disco, con clave =
+  hash de las geometrias + tipo de pesos, junto con el orden de cod_ibge.
+- I de Moran global y local (LISA) vectorizados, con inferencia por
+  permutaciones en bloques de tamano fijo (BLOCK) repartidos entre procesos;
+  cada bloque tiene su semilla (SeedSequence.spawn por indice de bloque),
+  asi el resultado depende solo de `seed`, no de n_jobs ni de la maquina.
+- `moran_residuals` alinea un vector de residuos (indexado por cod_ibge)
+  con la matriz de pesos y devuelve el diagnostico global.
+
+Uso:
+    from spatial_weights import load_weights, moran_global, moran_local, moran_residuals
+
+    w = load_weights('queen')                      # dict: W (CSR binaria), ids, kind, hash
+    res = moran_global(values, w['W'], permutations=999)
+    lisa = moran_local(values, w['W'], permutations=999)
+    diag = moran_residuals(fit['resid'], fit['ids'], w)
+
+CLI:
+    python scripts/analisis/spatial_weights.py --kind queen --csv tabla.csv --column resid
+
+Autor: Science Team
+"""
+
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+
+import argparse
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+from scipy.spatial import cKDTree
+
+from process_pool import map_tasks
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+
+BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
+SHP_PATH = os.path.join(BASE_DIR, "data/geo/ibge_sp/SP_Municipios_2022.shp")
+CACHE_DIR = os.path.join(BASE_DIR, "outputs", "cache", "weights")
+
+KINDS = ['queen', 'rook', 'knn']
+KNN_CRS = 5880  # SIRGAS 2000 / Brazil Polyconic (distancias en metros)
+COORD_DECIMALS = 7  # redondeo de vertices para detectar fronteras compartidas
+BLOCK = 250  # permutaciones por bloque (unidad de semilla y de trabajo)
+
+_MEMORY_CACHE = {}
+
+
+# ============================================================
+# GEOMETRY
+# ============================================================
+
+def read_municipios(shp_path=SHP_PATH):
+    """Municipios (cache GeoParquet compartida, CRS original) ordenados por cod_ibge de 6 digitos."""
+    from geometry_cache import load_sp_geometry
+    gdf = load_sp_geometry(shp_path=shp_path)
+    return gdf.sort_values('cod_ibge').reset_index(drop=True)
+
+
+def geometry_hash(gdf, id_col='cod_ibge'):
+    """Hash de las geometrias (WKB) y sus ids, en el orden dado."""
+    import shapely
+    h = hashlib.sha256()
+    h.update(str(gdf.crs).encode())
+    h.update(np.asarray(gdf[id_col]).astype(np.int64).tobytes())
+    for wkb in shapely.to_wkb(np.asarray(gdf.geometry.values)):
+        h.update(wkb)
+    return h.hexdigest()
+
+
+# ============================================================
+# WEIGHTS
+# ============================================================
+
+def _boundary_coords(geoms):
+    """Coordenadas de los bordes y el poligono al que pertenece cada linea."""
+    import shapely
+    lines = shapely.boundary(geoms)
+    parts, part_owner = shapely.get_parts(lines, return_index=True)
+    coords, line_idx = shapely.get_coordinates(parts, return_index=True)
+    return np.round(coords, COORD_DECIMALS), line_idx, part_owner
+
+
+def _incidence(owner, item, n_poly, n_item):
+    ones = np.ones(len(owner), dtype=np.int32)
+    return sparse.csr_matrix((ones, (owner, item)), shape=(n_poly, n_item))
+
+
+def _adjacency_from_incidence(inc):
+    adj = (inc @ inc.T).tocsr()
+    adj.setdiag(0)
+    adj.eliminate_zeros()
+    adj.data[:] = 1
+    return adj.astype(np.float64)
+
+
+def contiguity_weights(geoms, kind='queen'):
+    """
+    Contiguidad queen (comparten al menos un vertice) o rook (comparten al
+    menos una arista) como CSR binaria n x n.
+    """
+    geoms = np.asarray(geoms)
+    n = len(geoms)
+    coords, line_idx, part_owner = _boundary_coords(geoms)
+    _, vertex_id = np.unique(coords, axis=0, return_inverse=True)
+    vertex_id = vertex_id.ravel()
+    owner = part_owner[line_idx]
+
+    if kind == 'queen':
+        inc = _incidence(owner, vertex_id, n, vertex_id.max() + 1)
+    elif kind == 'rook':
+        same_line = line_idx[1:] == line_idx[:-1]
+        a, b = vertex_id[:-1][same_line], vertex_id[1:][same_line]
+        edges = np.column_stack([np.minimum(a, b), np.maximum(a, b)])
+        edges_keep = edges[:, 0] != edges[:, 1]
+        _, edge_id = np.unique(edges[edges_keep], axis=0, return_inverse=True)
+        edge_id = edge_id.ravel()
+        inc = _incidence(owner[:-1][same_line][edges_keep], edge_id, n, edge_id.max() + 1)
+    else:
+        raise ValueError(f"kind de contiguidad desconocido: {kind}")
+    return _adjacency_from_incidence(inc)
+
+
+def knn_weights(points, k=8):
+    """k vecinos mas cercanos (sin el propio punto) como CSR binaria n x n."""
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    _, idx = cKDTree(points).query(points, k=k + 1)
+    rows = np.repeat(np.arange(n), k)
+    # Se descarta la primera columna solo si es el propio punto (duplicados)
+    neighbors = np.array([r[r != i][:k] for i, r in enumerate(idx)])
+    data = np.ones(n * k)
+    return sparse.csr_matrix((data, (rows, neighbors.ravel())), shape=(n, n))
+
+
+def row_standardize(W):
+    """W con filas que suman 1 (las filas sin vecinos quedan en cero)."""
+    W = sparse.csr_matrix(W, dtype=float)
+    rs = np.asarray(W.sum(axis=1)).ravel()
+    inv = np.divide(1.0, rs, out=np.zeros_like(rs), where=rs > 0)
+    return sparse.diags(inv) @ W
+
+
+def _cache_file(cache_dir, kind, k, geo_hash):
+    suffix = f"{kind}{k}" if kind == 'knn' else kind
+    return os.path.join(cache_dir, f"w_{suffix}_{geo_hash[:24]}.npz")
+
+
+def build_weights(gdf, kind='queen', k=8, id_col='cod_ibge', cache_dir=CACHE_DIR):
+    """
+    Pesos binarios para `gdf` (orden de filas = orden de ids). Si existe en
+    cache (memoria o disco) para el mismo hash de geometrias, no se recalcula.
+
+    Devuelve dict: W (CSR binaria), ids (ndarray), kind, k, hash.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind debe ser uno de {KINDS}")
+    geo_hash = geometry_hash(gdf, id_col)
+    mem_key = (geo_hash, kind, k if kind == 'knn' else None)
+    if mem_key in _MEMORY_CACHE:
+        return _MEMORY_CACHE[mem_key]
+
+    cache_file = _cache_file(cache_dir, kind, k, geo_hash) if cache_dir else None
+    if cache_file and os.path.exists(cache_file):
+        z = np.load(cache_file)
+        W = sparse.csr_matrix((z['data'], z['indices'], z['indptr']), shape=tuple(z['shape']))
+        ids = z['ids']
+    else:
+        ids = np.asarray(gdf[id_col]).astype(np.int64)
+        if kind == 'knn':
+            pts = gdf.to_crs(KNN_CRS) if gdf.crs is not None and gdf.crs.is_geographic else gdf
+            centroids = pts.geometry.centroid
+            W = knn_weights(np.column_stack([centroids.x, centroids.y]), k=k)
+        else:
+            W = contiguity_weights(gdf.geometry.values, kind=kind)
+        if cache_file:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez_compressed(cache_file, data=W.data, indices=W.indices,
+                                indptr=W.indptr, shape=np.array(W.shape), ids=ids)
+
+    w = {'W': W, 'ids': ids, 'kind': kind, 'k': k if kind == 'knn' else None,
+         'hash': geo_hash}
+    _MEMORY_CACHE[mem_key] = w
+    return w
+
+
+def load_weights(kind='queen', k=8, shp_path=SHP_PATH, cache_dir=CACHE_DIR):
+    """Atajo: lee el shapefile de SP y devuelve `build_weights(...)`."""
+    return build_weights(read_municipios(shp_path), kind=kind, k=k, cache_dir=cache_dir)
+
+
+def align_weights(w, ids):
+    """
+    Submatriz de W para los `ids` dados (en ese orden). Los ids ausentes del
+    shapefile se descartan; devuelve (W_sub, posiciones validas en `ids`).
+    """
+    ids = np.asarray(ids).astype(np.int64)
+    pos = pd.Index(w['ids']).get_indexer(ids)
+    valid = np.flatnonzero(pos >= 0)
+    sel = pos[valid]
+    return w['W'][sel][:, sel].tocsr(), valid
+
+
+# ============================================================
+# MORAN'S I
+# ============================================================
+
+def _blocks(permutations, seed, block=BLOCK):
+    """
+    Bloques de tamano fijo con una semilla por indice de bloque: las mismas
+    permutaciones para un `seed` dado, con cualquier numero de procesos.
+    """
+    sizes = [min(block, permutations - start) for start in range(0, permutations, block)]
+    return list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+
+
+def _global_perm_chunk(zw, task, block=500):
+    z, W = zw
+    size, seed_seq = task
+    rng = np.random.default_rng(seed_seq)
+    out = []
+    for start in range(0, size, block):
+        b = min(block, size - start)
+        Z = rng.permuted(np.broadcast_to(z[:, None], (len(z), b)), axis=0)
+        out.append(np.einsum('ij,ij->j', Z, W @ Z))
+    return np.concatenate(out) if out else np.empty(0)
+
+
+def _p_sim(observed, simulated):
+    """p pseudo-simulado unilateral, en la direccion del valor observado (como esda)."""
+    larger = (simulated >= observed).sum(axis=0)
+    P = simulated.shape[0]
+    larger = np.where(P - larger < larger, P - larger, larger)
+    return (larger + 1.0) / (P + 1.0)
+
+
+def moran_global(values, W, permutations=999, transform='r', seed=42, n_jobs=None):
+    """
+    I de Moran global.
+
+    Devuelve dict con I, E[I], z y p bajo normalidad, y (si permutations > 0)
+    p_sim, z_sim y la media de las permutaciones.
+    """
+    y = np.asarray(values, dtype=float)
+    if np.isnan(y).any():
+        raise ValueError("values contiene NaN: alinear primero (align_weights)")
+    W = row_standardize(W) if transform == 'r' else sparse.csr_matrix(W, dtype=float)
+    n = len(y)
+    z = y - y.mean()
+    s0 = W.sum()
+    zz = z @ z
+    scale = n / (s0 * zz)
+    I = scale * (z @ (W @ z))
+
+    # Momentos bajo normalidad
+    EI = -1.0 / (n - 1)
+    Wt = W + W.T
+    s1 = 0.5 * Wt.multiply(Wt).sum()
+    s2 = ((np.asarray(W.sum(axis=1)).ravel() + np.asarray(W.sum(axis=0)).ravel()) ** 2).sum()
+    VI = (n * n * s1 - n * s2 + 3 * s0 * s0) / ((n * n - 1) * s0 * s0) - EI ** 2
+    z_norm = (I - EI) / np.sqrt(VI)
+
+    result = {
+        'I': I, 'EI': EI, 'VI_norm': VI, 'z_norm': z_norm,
+        'p_norm': 2 * stats.norm.sf(abs(z_norm)), 'n': n,
+    }
+
+    if permutations > 0:
+        parts = map_tasks(_global_perm_chunk, _blocks(permutations, seed),
+                          shared=(z, W), n_jobs=n_jobs)
+        sim = scale * np.concatenate(parts)
+        result.update({
+            'p_sim': float(_p_sim(I, sim[:, None])[0]),
+            'EI_sim': sim.mean(),
+            'z_sim': (I - sim.mean()) / sim.std(ddof=1),
+            'permutations': permutations,
+        })
+    return result
+
+
+def _local_perm_chunk(zw, task):
+    """
+    Permutacion condicional: para cada i, los valores de sus vecinos se
+    sortean entre los otros n-1 municipios. Se sortea una matriz de ids por
+    bloque (size x k_max) y se reutiliza para todos los i (como esda).
+    """
+    z, W = zw
+    size, seed_seq = task
+    rng = np.random.default_rng(seed_seq)
+    n = len(z)
+    k = np.diff(W.indptr)
+    k_max = int(k.max()) if n else 0
+    ids = np.stack([rng.choice(n - 1, size=k_max, replace=False) for _ in range(size)])
+    lag = np.zeros((size, n))
+    for i in np.flatnonzero(k):
+        w_i = W.data[W.indptr[i]:W.indptr[i + 1]]
+        draw = ids[:, :k[i]]
+        draw = draw + (draw >= i)  # salta el propio i
+        lag[:, i] = z[draw] @ w_i
+    return lag
+
+
+def moran_local(values, W, permutations=999, transform='r', seed=42, n_jobs=None):
+    """
+    I de Moran local (LISA) con permutacion condicional.
+
+    Devuelve DataFrame (una fila por observacion) con Is, quadrant
+    (1=HH, 2=LH, 3=LL, 4=HL), p_sim y z_sim.
+    """
+    y = np.asarray(values, dtype=float)
+    if np.isnan(y).any():
+        raise ValueError("values contiene NaN: alinear primero (align_weights)")
+    W = row_standardize(W) if transform == 'r' else sparse.csr_matrix(W, dtype=float)
+    n = len(y)
+    z = y - y.mean()
+    m2 = (z @ z) / n
+    lag = W @ z
+    Is = z * lag / m2
+
+    quadrant = np.select(
+        [(z > 0) & (lag > 0), (z <= 0) & (lag > 0), (z <= 0) & (lag <= 0)],
+        [1, 2, 3], default=4)
+    out = pd.DataFrame({'Is': Is, 'quadrant': quadrant})
+
+    if permutations > 0:
+        parts = map_tasks(_local_perm_chunk, _blocks(permutations, seed),
+                          shared=(z, W), n_jobs=n_jobs)
+        sim = z[None, :] * np.concatenate(parts) / m2
+        out['p_sim'] = _p_sim(Is[None, :], sim)
+        out['z_sim'] = (Is - sim.mean(axis=0)) / sim.std(axis=0, ddof=1)
+    return out
+
+
+def moran_residuals(resid, ids, w, permutations=999, seed=42, n_jobs=None):
+    """
+    Diagnostico de autocorrelacion espacial de residuos de un modelo.
+    `resid` y `ids` (cod_ibge) en el mismo orden; se alinean con la matriz de
+    pesos `w` (de `build_weights`/`load_weights`) y se descartan municipios
+    sin geometria.
+    """
+    resid = np.asarray(resid, dtype=float)
+    ids = np.asarray(ids)
+    keep = ~np.isnan(resid)
+    W_sub, valid = align_weights(w, ids[keep])
+    result = moran_global(resid[keep][valid], W_sub, permutations=permutations,
+                          seed=seed, n_jobs=n_jobs)
+    result['weights'] = w['kind'] if w['kind'] != 'knn' else f"knn{w['k']}"
+    result['n_islands'] = int((np.diff(W_sub.indptr) == 0).sum())
+    return result
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Pesos espaciales y I de Moran")
+    parser.add_argument('--kind', choices=KINDS, default='queen')
+    parser.add_argument('--k', type=int, default=8, help="vecinos para kind=knn")
+    parser.add_argument('--csv', help="tabla con cod_ibge y la columna a diagnosticar")
+    parser.add_argument('--column', help="columna (p.ej. residuos)")
+    parser.add_argument('--permutations', type=int, default=999)
+    parser.add_argument('--local-out', help="CSV de salida para LISA (opcional)")
+    args = parser.parse_args()
+
+    w = load_weights(args.kind, k=args.k)
+    n_links = w['W'].nnz
+    print(f"[OK] Pesos {args.kind}: n={w['W'].shape[0]}, enlaces={n_links}, "
+          f"vecinos medios={n_links / w['W'].shape[0]:.2f}")
+
+    if args.csv and args.column:
+        df = pd.read_csv(args.csv)
+        res = moran_residuals(df[args.column], df['cod_ibge'], w,
+                              permutations=args.permutations)
+        print(f"  Moran I = {res['I']:.4f} (E[I]={res['EI']:.4f}), "
+              f"z={res['z_norm']:.2f}, p_norm={res['p_norm']:.4f}, "
+              f"p_sim={res.get('p_sim', np.nan):.4f}")
+
+        if args.local_out:
+            data = df[['cod_ibge', args.column]].dropna()
+            W_sub, valid = align_weights(w, data['cod_ibge'])
+            lisa = moran_local(data[args.column].to_numpy()[valid], W_sub,
+                               permutations=args.permutations)
+            lisa.insert(0, 'cod_ibge', data['cod_ibge'].to_numpy()[valid])
+            lisa.to_csv(args.local_out, index=False)
+            print(f"  [SAVED] {args.local_out}")
+
+
+if __name__ == "__main__":
+    main()
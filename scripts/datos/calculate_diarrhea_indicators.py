@@ -7,16 +7,19 @@
 # 1) Incidencia media de hospitalizaciones (2010-2019)
 # 2) Incidencia maxima de hospitalizaciones
 # 3) Persistencia: numero de anos con casos (0-10)
+# 4) Tendencia (pendiente anual) y CV interanual de la incidencia
 #
 # Autor: Science Team
 # Fecha: 2026-01-23
 # =============================================================================
 
 import pandas as pd
-import numpy as np
 from pathlib import Path
 from datetime import datetime
 
+from incidence_indicators import (YEARS, INDICATOR_SETS, load_population, load_municipalities,
+                                  wide_to_long, build_grid, compute_indicators, grid_frame)
+
 # Configuracion de paths
 PROJECT_ROOT = Path("C:/Users/arlex/Documents/Adrian David")
 DATA_RAW = Path("G:/My Drive/Adrian David/Datos/to check health data + prompts for new data")
@@ -38,95 +41,24 @@ def load_health_data():
 
     return df
 
-def load_population():
-    """Carga datos de poblacion para calcular incidencia."""
-    pop_file = DATA_PROCESSED / "populacao_SP_2010_2019.csv"
-    df = pd.read_csv(pop_file)
-    df['cod_ibge'] = df['cod_ibge'].astype(str)
-
-    # Convertir de wide a long format (solo columnas pop_20XX, excluir pop_mean)
-    pop_cols = [c for c in df.columns if c.startswith('pop_20')]
-    id_cols = ['cod_ibge']
-
-    pop_long = pd.melt(
-        df[id_cols + pop_cols],
-        id_vars=id_cols,
-        var_name='year',
-        value_name='population'
-    )
-    pop_long['year'] = pop_long['year'].str.replace('pop_', '').astype(int)
-
-    return pop_long
-
-def load_municipalities():
-    """Carga lista de municipios de SP."""
-    mun_file = DATA_PROCESSED / "municipios_regioes_SP.csv"
-    df = pd.read_csv(mun_file)
-    df['cod_ibge'] = df['cod_ibge'].astype(str)
-    return df[['cod_ibge', 'nome_municipio']]
-
 def calculate_diarrhea_indicators(health_df, pop_df, municipalities):
-    """Calcula indicadores de diarrea por municipio."""
-
-    # Filtrar solo columnas relevantes
-    diarrhea_df = health_df[['cod_ibge', 'municipality', 'year', 'diarrhea']].copy()
+    """Calcula indicadores de diarrea por municipio (motor incidence_indicators)."""
 
-    # Crear grid completo de municipios x anos (645 x 10 = 6450)
-    all_mun = municipalities['cod_ibge'].unique()
-    anos = list(range(2010, 2020))
+    # Grid completo de municipios x anos (645 x 10 = 6450); sin registro = 0 casos
+    cases = wide_to_long(health_df, {'diarrhea': 'diarrhea'})
+    grid = build_grid(cases, pop_df, municipalities['cod_ibge'], years=YEARS)
 
-    grid = pd.DataFrame([(m, y) for m in all_mun for y in anos],
-                       columns=['cod_ibge', 'year'])
-
-    # Merge con datos de diarrea
-    grid = grid.merge(
-        diarrhea_df[['cod_ibge', 'year', 'diarrhea']],
-        on=['cod_ibge', 'year'],
-        how='left'
-    )
-
-    # Llenar NA con 0 (no hubo casos reportados)
-    grid['diarrhea'] = grid['diarrhea'].fillna(0)
-
-    # Merge con poblacion
-    grid = grid.merge(pop_df, on=['cod_ibge', 'year'], how='left')
-
-    # Calcular incidencia (por 100,000 habitantes)
-    grid['incidence_diarrhea'] = np.where(
-        grid['population'] > 0,
-        grid['diarrhea'] / grid['population'] * 100000,
-        0
-    )
+    # Incidencia (por 100,000 habitantes); sin poblacion = 0, media, maxima,
+    # casos totales, persistencia (anos con casos), tendencia y CV
+    spec = next(s for s in INDICATOR_SETS if s['name'] == 'diarrhea')
+    indicators, inc = compute_indicators(grid, per=spec['per'], missing=spec['missing'],
+                                         names=spec['names'])
+    grid = grid_frame(grid, inc)
 
     print(f"\nGrid completo: {len(grid)} registros")
     print(f"Municipios: {grid['cod_ibge'].nunique()}")
     print(f"Anos: {sorted(grid['year'].unique())}")
 
-    # =========================================================================
-    # Calcular indicadores por municipio
-    # =========================================================================
-
-    indicators = grid.groupby('cod_ibge').agg(
-        # Incidencia media (por 100,000 hab)
-        incidence_diarrhea_mean=('incidence_diarrhea', 'mean'),
-        # Incidencia maxima
-        incidence_diarrhea_max=('incidence_diarrhea', 'max'),
-        # Casos totales
-        total_cases_diarrhea=('diarrhea', 'sum'),
-        # Anos con casos (persistencia)
-        persist_diarrhea=('diarrhea', lambda x: (x > 0).sum())
-    ).reset_index()
-
-    # Completar con todos los municipios
-    indicators = municipalities[['cod_ibge']].merge(
-        indicators, on='cod_ibge', how='left'
-    )
-
-    # Llenar NA con 0
-    for col in ['incidence_diarrhea_mean', 'incidence_diarrhea_max',
-                'total_cases_diarrhea', 'persist_diarrhea']:
-        indicators[col] = indicators[col].fillna(0)
-
     return indicators, grid
 
 def main():
@@ -14,6 +14,7 @@
 # Fecha: 2026-01-23
 # =============================================================================
 
+import argparse
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -49,178 +50,270 @@ def load_municipalities():
     df['nome_normalizado'] = df['nome_municipio'].apply(normalize_name)
     return df[['cod_ibge', 'nome_municipio', 'nome_normalizado']]
 
-def load_fire_data():
-    """Carga todos los archivos de focos de quemadas."""
-    all_files = list(DATA_RAW.glob("bdqueimadas_*.csv"))
-
-    print(f"Archivos encontrados: {len(all_files)}")
-
-    dfs = []
-    for f in sorted(all_files):
-        print(f"  Procesando: {f.name}")
-        try:
-            df = pd.read_csv(f, encoding='utf-8')
-            dfs.append(df)
-        except Exception as e:
-            print(f"    Error: {e}")
-
-    if dfs:
-        combined = pd.concat(dfs, ignore_index=True)
-        print(f"\nRegistros totales: {len(combined):,}")
-        return combined
-    return None
-
-def process_fire_data(fire_df, municipalities):
-    """Procesa datos de focos y hace matching con municipios."""
+def _match_codes(names, mun_dict, memo):
+    """
+    cod_ibge para un array de nombres BDQueimadas. Solo se normalizan los
+    nombres unicos todavia no vistos (memo: nombre crudo -> cod_ibge o NaN);
+    el resultado vuelve a las filas por los codigos del factorize.
+    """
+    codes, uniques = pd.factorize(names)
+    for name in uniques:
+        if name not in memo:
+            memo[name] = mun_dict.get(normalize_name(name), np.nan)
+    lookup = np.array([memo[name] for name in uniques] + [np.nan], dtype=float)
+    return lookup[codes]  # codes == -1 (NaN) -> ultimo elemento
+
+
+def _aggregate_chunk(chunk, cod):
+    """Agrega un bloque de focos por (cod_ibge, ano, mes)."""
+    fecha = chunk['DataHora'].astype(str)
+    frp = chunk['FRP'].astype(float)
+    agg = pd.DataFrame({
+        'cod_ibge': cod,
+        'ano': fecha.str[:4].astype(int).to_numpy(),
+        'mes': fecha.str[5:7].astype(int).to_numpy(),
+        'n_registros': 1,
+        'n_frp': frp.notna().astype(int).to_numpy(),
+        'frp_sum': frp.fillna(0).to_numpy(),
+        'frp_sumsq': (frp ** 2).fillna(0).to_numpy(),
+        'frp_max': frp.to_numpy(),
+    })
+    return _combine_monthly(agg)
+
+
+def _combine_monthly(parts):
+    """Combina agregados parciales (sumas y maximos son asociativos)."""
+    df = pd.concat(parts, ignore_index=True) if isinstance(parts, list) else parts
+    return df.groupby(['cod_ibge', 'ano', 'mes'], as_index=False).agg(
+        n_registros=('n_registros', 'sum'),
+        n_frp=('n_frp', 'sum'),
+        frp_sum=('frp_sum', 'sum'),
+        frp_sumsq=('frp_sumsq', 'sum'),
+        frp_max=('frp_max', 'max'),
+    )
 
-    # Filtrar solo Sao Paulo
-    fire_df = fire_df[fire_df['Estado'] == 'SÃO PAULO'].copy()
-    print(f"Registros de Sao Paulo: {len(fire_df):,}")
 
-    # Extraer año
-    fire_df['DataHora'] = pd.to_datetime(fire_df['DataHora'], format='%Y/%m/%d %H:%M:%S')
-    fire_df['ano'] = fire_df['DataHora'].dt.year
-    fire_df['mes'] = fire_df['DataHora'].dt.month
+def stream_fire_data(municipalities, files=None, chunksize=500_000, estado='SÃO PAULO'):
+    """
+    Lee los archivos bdqueimadas_*.csv por bloques (solo las columnas
+    necesarias), filtra `Estado` durante la lectura, asigna cod_ibge por
+    nombre normalizado y acumula conteos y sumas FRP por
+    (cod_ibge, ano, mes). La memoria no crece con el numero de archivos.
 
-    # Normalizar nombre de municipio
-    fire_df['municipio_normalizado'] = fire_df['Municipio'].apply(normalize_name)
+    Devuelve (monthly, unmatched): agregados mensuales y un dict
+    {nombre sin match: n registros}.
+    """
+    files = sorted(files if files is not None else DATA_RAW.glob("bdqueimadas_*.csv"))
+    print(f"Archivos encontrados: {len(files)}")
 
-    # Crear diccionario de matching
     mun_dict = dict(zip(municipalities['nome_normalizado'], municipalities['cod_ibge']))
+    memo = {}
+    unmatched = {}
+    monthly = None
+    n_total = n_estado = n_matched = 0
 
-    # Hacer matching
-    fire_df['cod_ibge'] = fire_df['municipio_normalizado'].map(mun_dict)
+    for f in files:
+        print(f"  Procesando: {f.name}")
+        try:
+            reader = pd.read_csv(f, encoding='utf-8', chunksize=chunksize,
+                                 usecols=['DataHora', 'Estado', 'Municipio', 'FRP'],
+                                 dtype={'Estado': 'category', 'Municipio': str})
+            for chunk in reader:
+                n_total += len(chunk)
+                chunk = chunk[chunk['Estado'] == estado]
+                n_estado += len(chunk)
+                if len(chunk) == 0:
+                    continue
+
+                cod = _match_codes(chunk['Municipio'].to_numpy(), mun_dict, memo)
+                ok = ~np.isnan(cod)
+                n_matched += int(ok.sum())
+                for name, n in chunk.loc[~ok, 'Municipio'].value_counts(dropna=False).items():
+                    unmatched[name] = unmatched.get(name, 0) + n
+
+                part = _aggregate_chunk(chunk[ok], cod[ok].astype(int))
+                monthly = part if monthly is None else _combine_monthly([monthly, part])
+        except Exception as e:
+            print(f"    Error: {e}")
 
-    # Verificar matching
-    matched = fire_df['cod_ibge'].notna().sum()
-    total = len(fire_df)
-    print(f"Matching exitoso: {matched:,} / {total:,} ({100*matched/total:.1f}%)")
+    print(f"\nRegistros totales: {n_total:,}")
+    print(f"Registros de Sao Paulo: {n_estado:,}")
+    if n_estado > 0:
+        print(f"Matching exitoso: {n_matched:,} / {n_estado:,} ({100*n_matched/n_estado:.1f}%)")
 
-    # Municipios no encontrados
-    not_matched = fire_df[fire_df['cod_ibge'].isna()]['Municipio'].unique()
-    if len(not_matched) > 0:
-        print(f"\nMunicipios sin match ({len(not_matched)}):")
-        for m in sorted(not_matched)[:10]:
+    if unmatched:
+        print(f"\nMunicipios sin match ({len(unmatched)}):")
+        names = sorted(str(m) for m in unmatched)
+        for m in names[:10]:
             print(f"  - {m}")
-        if len(not_matched) > 10:
-            print(f"  ... y {len(not_matched) - 10} mas")
-
-    # Filtrar registros con matching exitoso
-    fire_df = fire_df[fire_df['cod_ibge'].notna()].copy()
-    fire_df['cod_ibge'] = fire_df['cod_ibge'].astype(int).astype(str)
-
-    return fire_df
-
-def calculate_indicators(fire_df, municipalities):
-    """Calcula indicadores de riesgo de fuego por municipio."""
-
-    anos = sorted(fire_df['ano'].unique())
-    print(f"\nAnos disponibles: {anos}")
-
-    # Filtrar ventana 2010-2019
-    fire_df = fire_df[(fire_df['ano'] >= 2010) & (fire_df['ano'] <= 2019)]
-    print(f"Registros 2010-2019: {len(fire_df):,}")
-
-    # =========================================================================
-    # Indicadores principales (solicitados)
-    # =========================================================================
+        if len(names) > 10:
+            print(f"  ... y {len(names) - 10} mas")
+
+    if monthly is None:
+        return None, unmatched
+    monthly['cod_ibge'] = monthly['cod_ibge'].astype(str)
+    return monthly, unmatched
+
+
+# Meses de estacion seca (jun-oct) y pesos del indice compuesto
+DRY_SEASON_MONTHS = [6, 7, 8, 9, 10]
+RISK_WEIGHTS = {'incidence': 0.4, 'frp': 0.3, 'recurrence': 0.3}
+
+CUBE_FIELDS = ['n_registros', 'n_frp', 'frp_sum', 'frp_sumsq', 'frp_max']
+
+
+def build_fire_cube(monthly, municipalities):
+    """
+    Cubo denso municipio x año x mes (arrays NumPy indexados por la posicion
+    de cod_ibge en `municipalities`), construido en una sola pasada sobre los
+    agregados mensuales. Los municipios sin focos quedan en cero.
+
+    Devuelve dict: ids (cod_ibge como str), years, y un array (M, Y, 12) por
+    campo de CUBE_FIELDS (frp_max = NaN donde no hay FRP).
+    """
+    ids = municipalities['cod_ibge'].astype(str).to_numpy()
+    years = np.arange(monthly['ano'].min(), monthly['ano'].max() + 1)
+    shape = (len(ids), len(years), 12)
+
+    i = pd.Index(ids).get_indexer(monthly['cod_ibge'].astype(str))
+    keep = i >= 0
+    idx = (i[keep],
+           monthly['ano'].to_numpy()[keep] - years[0],
+           monthly['mes'].to_numpy()[keep] - 1)
+
+    cube = {'ids': ids, 'years': years}
+    for field in CUBE_FIELDS:
+        arr = np.full(shape, np.nan) if field == 'frp_max' else np.zeros(shape)
+        arr[idx] = monthly[field].to_numpy()[keep]  # (cod, ano, mes) es unico
+        cube[field] = arr
+    return cube
+
+
+def _window(cube, start, end):
+    sel = (cube['years'] >= start) & (cube['years'] <= end)
+    return {f: cube[f][:, sel] for f in CUBE_FIELDS}, cube['years'][sel]
+
+
+def _annual_arrays(win):
+    """Estadisticas anuales (M, Y) desde el cubo de una ventana."""
+    rows = win['n_registros'].sum(axis=2)
+    n = win['n_frp'].sum(axis=2)
+    frp_sum = win['frp_sum'].sum(axis=2)
+    frp_sumsq = win['frp_sumsq'].sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frp_mean = np.where(n > 0, frp_sum / n, np.nan)
+        # Desviacion estandar muestral (ddof=1) desde sumas y sumas de cuadrados
+        var = np.where(n > 1, (frp_sumsq - n * frp_mean ** 2) / (n - 1), np.nan)
+    frp_max = np.max(np.where(np.isnan(win['frp_max']), -np.inf, win['frp_max']), axis=2)
+    frp_max = np.where(np.isfinite(frp_max), frp_max, np.nan)
+    return {
+        'rows': rows, 'n_focos': n, 'frp_sum': frp_sum, 'frp_mean': frp_mean,
+        'frp_max': frp_max, 'frp_std': np.sqrt(np.clip(var, 0, None)),
+    }
+
+
+def longest_run(mask):
+    """Racha mas larga de True consecutivos por fila de una matriz booleana."""
+    counts = np.cumsum(mask, axis=1)
+    resets = np.maximum.accumulate(np.where(~mask, counts, 0), axis=1)
+    return (counts - resets).max(axis=1, initial=0)
+
+
+def annual_table(cube, start=2010, end=2019):
+    """Tabla anual por municipio (años con al menos un registro), como fire_annual."""
+    win, years = _window(cube, start, end)
+    ann = _annual_arrays(win)
+    m, y = np.nonzero(ann['rows'] > 0)
+    ann['n_focos'] = ann['n_focos'].astype(int)
+    return pd.DataFrame({
+        'cod_ibge': cube['ids'][m],
+        'ano': years[y],
+        **{k: ann[k][m, y] for k in ['n_focos', 'frp_sum', 'frp_mean', 'frp_max', 'frp_std']},
+    })
+
+
+def fire_indicators(cube, start=2010, end=2019):
+    """
+    Indicadores de fuego por municipio para la ventana [start, end],
+    calculados vectorialmente sobre el cubo. Solo incluye municipios con al
+    menos un registro en la ventana (el resto se completa en
+    `calculate_indicators`). Las medias/maximos/CV son sobre los años con
+    registros; la recurrencia es sobre todos los años de la ventana
+    (end - start + 1), aunque los datos no cubran la ventana completa.
+    """
+    win, years = _window(cube, start, end)
+    ann = _annual_arrays(win)
+    has_year = ann['rows'] > 0
+    n_years = has_year.sum(axis=1)
+    has_fire = n_years > 0
+
+    n_focos = np.where(has_year, ann['n_focos'], np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inc_mean = np.nanmean(n_focos, axis=1)
+        inc_std = np.nanstd(n_focos, axis=1, ddof=1)
+        frp_mean = np.nanmean(ann['frp_mean'], axis=1)
+        frp_max = np.nanmax(np.where(has_year, ann['frp_max'], np.nan), axis=1)
+        total_rows = win['n_registros'].sum(axis=(1, 2))
+        dry_rows = win['n_registros'][:, :, np.array(DRY_SEASON_MONTHS) - 1].sum(axis=(1, 2))
+        indicators = pd.DataFrame({
+            'cod_ibge': cube['ids'],
+            'fire_incidence_mean': inc_mean,
+            'fire_incidence_max': np.nanmax(n_focos, axis=1),
+            'fire_frp_mean': frp_mean,
+            'fire_frp_max': frp_max,
+            'fire_total_foci': np.nansum(n_focos, axis=1),
+            'fire_frp_total': ann['frp_sum'].sum(axis=1),
+            'fire_years_with_fire': n_years,
+            'fire_recurrence': n_years / float(end - start + 1),
+            'fire_cv': np.where(inc_mean != 0, inc_std / inc_mean, np.nan),
+            'fire_dry_season_pct': dry_rows / np.where(total_rows > 0, total_rows, np.nan),
+            'fire_max_consecutive_years': longest_run(has_year),
+        })[has_fire].reset_index(drop=True)
+    count_cols = ['fire_incidence_max', 'fire_total_foci', 'fire_max_consecutive_years']
+    indicators[count_cols] = indicators[count_cols].astype(int)
+
+    # Indice de riesgo compuesto 0-100 (frecuencia, intensidad, recurrencia)
+    norm = {}
+    for col in ['fire_incidence_mean', 'fire_frp_mean', 'fire_recurrence']:
+        max_val = indicators[col].max()
+        norm[col] = indicators[col] / max_val if max_val > 0 else 0
+    indicators['fire_recurrence_norm'] = norm['fire_recurrence']  # se conserva en el CSV
+    indicators['fire_risk_index'] = (
+        RISK_WEIGHTS['incidence'] * norm['fire_incidence_mean'] +
+        RISK_WEIGHTS['frp'] * norm['fire_frp_mean'] +
+        RISK_WEIGHTS['recurrence'] * indicators['fire_recurrence']
+    ) * 100
 
-    # Agregar por municipio y año
-    annual_stats = fire_df.groupby(['cod_ibge', 'ano']).agg(
-        n_focos=('FRP', 'count'),
-        frp_sum=('FRP', 'sum'),
-        frp_mean=('FRP', 'mean'),
-        frp_max=('FRP', 'max'),
-        frp_std=('FRP', 'std')
-    ).reset_index()
-
-    # Calcular estadisticas por municipio
-    indicators = annual_stats.groupby('cod_ibge').agg(
-        # 1) Incidencia media de focos (media de focos anuales)
-        fire_incidence_mean=('n_focos', 'mean'),
-        # 2) Incidencia maxima de focos (max anual)
-        fire_incidence_max=('n_focos', 'max'),
-        # 3) Intensidad media (FRP promedio)
-        fire_frp_mean=('frp_mean', 'mean'),
-        # 4) Intensidad maxima (FRP max)
-        fire_frp_max=('frp_max', 'max'),
-        # Adicionales
-        fire_total_foci=('n_focos', 'sum'),          # Total de focos 2010-2019
-        fire_frp_total=('frp_sum', 'sum'),           # FRP acumulado total
-        fire_years_with_fire=('n_focos', 'count'),   # Anos con al menos un foco
-    ).reset_index()
+    return indicators
 
-    # =========================================================================
-    # Indicadores adicionales (basados en literatura)
-    # =========================================================================
 
-    # 5) Recurrencia: proporcion de años con fuego (de 10 años posibles)
-    indicators['fire_recurrence'] = indicators['fire_years_with_fire'] / 10.0
+def indicators_by_window(cube, windows):
+    """
+    Indicadores para varias ventanas de años (analisis de sensibilidad).
+    `windows` es una lista de (start, end); devuelve tabla larga con las
+    columnas window_start/window_end.
+    """
+    out = []
+    for start, end in windows:
+        ind = fire_indicators(cube, start, end)
+        ind.insert(1, 'window_start', start)
+        ind.insert(2, 'window_end', end)
+        out.append(ind)
+    return pd.concat(out, ignore_index=True)
 
-    # 6) Coeficiente de variacion de focos (variabilidad interanual)
-    cv_stats = annual_stats.groupby('cod_ibge')['n_focos'].agg(['std', 'mean'])
-    cv_stats['fire_cv'] = cv_stats['std'] / cv_stats['mean'].replace(0, np.nan)
-    indicators = indicators.merge(
-        cv_stats[['fire_cv']].reset_index(),
-        on='cod_ibge',
-        how='left'
-    )
 
-    # 7) Estacionalidad: concentracion en meses de seca (jun-oct)
-    monthly_stats = fire_df.groupby(['cod_ibge', 'mes']).size().reset_index(name='n_focos')
-    dry_season = monthly_stats[monthly_stats['mes'].isin([6, 7, 8, 9, 10])]
-    dry_stats = dry_season.groupby('cod_ibge')['n_focos'].sum().reset_index(name='focos_seca')
-    total_stats = fire_df.groupby('cod_ibge').size().reset_index(name='focos_total')
-    seasonality = dry_stats.merge(total_stats, on='cod_ibge', how='outer')
-    seasonality['fire_dry_season_pct'] = (
-        seasonality['focos_seca'].fillna(0) /
-        seasonality['focos_total'].replace(0, np.nan)
-    )
-    indicators = indicators.merge(
-        seasonality[['cod_ibge', 'fire_dry_season_pct']],
-        on='cod_ibge',
-        how='left'
-    )
+def calculate_indicators(monthly, municipalities, start=2010, end=2019):
+    """Calcula indicadores de riesgo de fuego por municipio (via cubo municipio x año x mes)."""
 
-    # 8) Indice de persistencia: focos en años consecutivos
-    # (calculado como max racha de años consecutivos con fuego)
-    def max_consecutive_years(group):
-        years_with_fire = set(group['ano'].unique())
-        max_streak = 0
-        current_streak = 0
-        for y in range(2010, 2020):
-            if y in years_with_fire:
-                current_streak += 1
-                max_streak = max(max_streak, current_streak)
-            else:
-                current_streak = 0
-        return max_streak
-
-    persistence = fire_df.groupby('cod_ibge').apply(max_consecutive_years).reset_index()
-    persistence.columns = ['cod_ibge', 'fire_max_consecutive_years']
-    indicators = indicators.merge(persistence, on='cod_ibge', how='left')
-
-    # 9) Indice de riesgo compuesto (propuesta basada en literatura)
-    # Combina frecuencia, intensidad y recurrencia
-    # Normalizado 0-100
-    for col in ['fire_incidence_mean', 'fire_frp_mean', 'fire_recurrence']:
-        max_val = indicators[col].max()
-        if max_val > 0:
-            indicators[f'{col}_norm'] = indicators[col] / max_val
-        else:
-            indicators[f'{col}_norm'] = 0
+    anos = sorted(monthly['ano'].unique())
+    print(f"\nAnos disponibles: {anos}")
 
-    indicators['fire_risk_index'] = (
-        0.4 * indicators['fire_incidence_mean_norm'] +
-        0.3 * indicators['fire_frp_mean_norm'] +
-        0.3 * indicators['fire_recurrence']
-    ) * 100
+    cube = build_fire_cube(monthly, municipalities)
+    win, _ = _window(cube, start, end)
+    print(f"Registros {start}-{end}: {int(win['n_registros'].sum()):,}")
 
-    # Limpiar columnas temporales
-    indicators = indicators.drop(columns=[
-        'fire_incidence_mean_norm',
-        'fire_frp_mean_norm'
-    ])
+    indicators = fire_indicators(cube, start, end)
+    annual_stats = annual_table(cube, start, end)
 
     # =========================================================================
     # Completar con municipios sin focos
@@ -244,7 +337,55 @@ def calculate_indicators(fire_df, municipalities):
 
     return indicators, annual_stats
 
+def run_selfcheck():
+    """
+    Cubo sintetico con datos solo en 4 de los 5 años de la ventana: la
+    recurrencia y el indice de riesgo se calculan sobre los 5 años (como el
+    script original, que dividia por el numero de años posibles).
+    """
+    municipalities = pd.DataFrame({'cod_ibge': ['350010', '350020', '350030']})
+    rows = []
+    # 350010: fuego en 2011-2014 (falta 2010 en todo el dataset)
+    for ano in [2011, 2012, 2013, 2014]:
+        rows.append(('350010', ano, 7, 2, 2, 40.0, 800.0, 20.0))
+    # 350020: fuego solo en 2012 y 2014
+    for ano in [2012, 2014]:
+        rows.append(('350020', ano, 3, 1, 1, 10.0, 100.0, 10.0))
+    monthly = pd.DataFrame(rows, columns=['cod_ibge', 'ano', 'mes'] + CUBE_FIELDS)
+
+    cube = build_fire_cube(monthly, municipalities)
+    assert list(cube['years']) == [2011, 2012, 2013, 2014]
+    ind = fire_indicators(cube, 2010, 2014).set_index('cod_ibge')
+    assert np.allclose(ind['fire_recurrence'], [0.8, 0.4]), ind['fire_recurrence']
+
+    expected_risk = (RISK_WEIGHTS['incidence'] * ind['fire_incidence_mean'] / ind['fire_incidence_mean'].max() +
+                     RISK_WEIGHTS['frp'] * ind['fire_frp_mean'] / ind['fire_frp_mean'].max() +
+                     RISK_WEIGHTS['recurrence'] * np.array([0.8, 0.4])) * 100
+    assert np.allclose(ind['fire_risk_index'], expected_risk)
+    assert list(ind['fire_max_consecutive_years']) == [4, 1]
+    print(f"  [OK] ventana 2010-2014 con datos 2011-2014: recurrencia {list(ind['fire_recurrence'])}, "
+          f"riesgo {[round(v, 2) for v in ind['fire_risk_index']]}")
+
+    by_window = indicators_by_window(cube, [(2010, 2014), (2012, 2014)])
+    rec = by_window.set_index(['window_start', 'cod_ibge'])['fire_recurrence']
+    assert np.isclose(rec[(2010, '350010')], 0.8) and np.isclose(rec[(2012, '350010')], 1.0)
+    assert np.isclose(rec[(2012, '350020')], 2 / 3)
+    print("  [OK] indicators_by_window usa el largo de cada ventana")
+
+    full, _ = calculate_indicators(monthly, municipalities, 2010, 2014)
+    assert full.set_index('cod_ibge').loc['350030', 'fire_recurrence'] == 0
+    print("\nSELFCHECK OK")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Indicadores de riesgo de fuego (BDQueimadas)")
+    parser.add_argument("--selfcheck", action="store_true",
+                        help="Validar con datos sinteticos")
+    args = parser.parse_args()
+    if args.selfcheck:
+        run_selfcheck()
+        return
+
     print("=" * 70)
     print("Calculo de Indicadores de Riesgo de Fuego - BDQueimadas INPE")
     print(f"Fecha: {datetime.now()}")
@@ -255,21 +396,17 @@ def main():
     municipalities = load_municipalities()
     print(f"Municipios cargados: {len(municipalities)}")
 
-    # Cargar datos de focos
-    print("\nCargando datos de focos de calor...")
-    fire_df = load_fire_data()
+    # Leer focos por bloques, filtrar SP y agregar por municipio-año-mes
+    print("\nCargando datos de focos de calor (streaming)...")
+    monthly, _ = stream_fire_data(municipalities)
 
-    if fire_df is None:
+    if monthly is None:
         print("ERROR: No se pudieron cargar los datos")
         return
 
-    # Procesar datos
-    print("\nProcesando datos...")
-    fire_df = process_fire_data(fire_df, municipalities)
-
     # Calcular indicadores
     print("\nCalculando indicadores...")
-    indicators, annual_stats = calculate_indicators(fire_df, municipalities)
+    indicators, annual_stats = calculate_indicators(monthly, municipalities)
 
     # Guardar resultados
     print("\n" + "=" * 70)
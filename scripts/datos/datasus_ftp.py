@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+"""
+Gestor de descargas FTP de DATASUS (concurrente y reanudable)
+==============================================================
+
+Reemplaza el patron "una conexion, descargas en serie con time.sleep(0.5)"
+de download_sih_sim_datasus.py / download_datasus_direct.py:
+
+- Pool pequeño de sesiones FTP en paralelo (una por hilo de trabajo).
+- Reanudacion con REST: la descarga se escribe en <archivo>.part y, si se
+  corta, el siguiente intento continua desde el offset ya descargado.
+- Verificacion de tamaño (SIZE del servidor) y SHA-256 del archivo final.
+- Manifiesto persistente (JSON) con los archivos completos: una nueva
+  corrida salta los que ya estan y siguen coincidiendo con el manifiesto.
+- Indice de listado por directorio basado en conjuntos/dicts (busqueda
+  O(1), sin distinguir mayusculas/minusculas) en vez de recorrer nlst()
+  por cada archivo faltante.
+
+Uso:
+    from datasus_ftp import list_index, download_files
+
+    index = list_index(FTP_HOST, "/dissemin/publicos/SIM/CID10/DORES/")
+    jobs = [{'remote_dir': ..., 'name': index['DOSP2010.DBC'], 'local_path': ...}]
+    results = download_files(jobs, host=FTP_HOST, manifest_file=...)
+
+Verificacion local (servidor pyftpdlib en localhost, sin red):
+    python scripts/datos/datasus_ftp.py --selfcheck
+
+Autor: Science Team / Data Engineer
+"""
+
+import argparse
+import ftplib
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from queue import Queue, Empty
+
+# Forzar encoding UTF-8
+if sys.stdout.encoding != 'utf-8':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+    except:
+        pass
+
+FTP_HOST = "ftp.datasus.gov.br"
+FTP_TIMEOUT = 60
+N_SESSIONS = 3          # sesiones simultaneas (el FTP de DATASUS limita conexiones)
+MAX_RETRIES = 4
+BLOCKSIZE = 64 * 1024
+
+
+# =============================================================================
+# Conexion e indice de listados
+# =============================================================================
+
+def connect_ftp(host=FTP_HOST, port=21, user='', passwd='', timeout=FTP_TIMEOUT):
+    """Abre una sesion FTP (anonima por defecto) en modo binario."""
+    ftp = ftplib.FTP(timeout=timeout)
+    ftp.connect(host, port)
+    ftp.login(user, passwd)
+    ftp.voidcmd('TYPE I')
+    return ftp
+
+
+def list_index(host=FTP_HOST, remote_dir='/', port=21, user='', passwd='', ftp=None):
+    """
+    Indice del directorio remoto: {NOMBRE_EN_MAYUSCULAS: nombre_real}.
+    Una sola llamada nlst() por directorio; las busquedas posteriores son O(1).
+    """
+    own = ftp is None
+    ftp = ftp or connect_ftp(host, port, user, passwd)
+    try:
+        ftp.cwd(remote_dir)
+        return {os.path.basename(f).upper(): os.path.basename(f) for f in ftp.nlst()}
+    finally:
+        if own:
+            ftp.quit()
+
+
+def resolve_names(index, filenames):
+    """Nombres reales en el servidor para los `filenames` pedidos (los ausentes se omiten)."""
+    return [index[f.upper()] for f in filenames if f.upper() in index]
+
+
+# =============================================================================
+# Manifiesto
+# =============================================================================
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(manifest_file):
+    if manifest_file and Path(manifest_file).exists():
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest, manifest_file):
+    """Escritura atomica (archivo temporal + replace)."""
+    manifest_file = Path(manifest_file)
+    manifest_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_file.with_suffix(manifest_file.suffix + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, manifest_file)
+
+
+def _is_complete(entry, local_path):
+    """Archivo del manifiesto presente, con el mismo tamaño y el mismo SHA-256"""
+    if entry is None or not local_path.exists():
+        return False
+    if local_path.stat().st_size != entry['size']:
+        return False
+    return 'sha256' not in entry or file_sha256(local_path) == entry['sha256']
+
+
+# =============================================================================
+# Descarga
+# =============================================================================
+
+def _remote_size(ftp, name):
+    try:
+        return ftp.size(name)
+    except ftplib.all_errors:
+        return None
+
+
+def download_one(ftp, remote_dir, name, local_path, blocksize=BLOCKSIZE):
+    """
+    Descarga (o reanuda) un archivo con la sesion `ftp`. Escribe en .part y
+    usa REST <offset> si ya hay bytes descargados. Verifica el tamaño con
+    SIZE antes de renombrar. Devuelve (bytes transferidos, tamaño final).
+    """
+    local_path = Path(local_path)
+    part = local_path.with_name(local_path.name + '.part')
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+
+    ftp.cwd(remote_dir)
+    size = _remote_size(ftp, name)
+    offset = part.stat().st_size if part.exists() else 0
+    if size is not None and offset > size:
+        part.unlink()  # parcial inconsistente: empezar de cero
+        offset = 0
+
+    transferred = 0
+    if size is None or offset < size:
+        with open(part, 'ab') as f:
+            def write(block):
+                nonlocal transferred
+                f.write(block)
+                transferred += len(block)
+            ftp.retrbinary(f'RETR {name}', write, blocksize=blocksize,
+                           rest=offset if offset else None)
+
+    final_size = part.stat().st_size
+    if size is not None and final_size != size:
+        raise IOError(f"{name}: tamaño {final_size} != {size} del servidor")
+    os.replace(part, local_path)
+    return transferred, final_size
+
+
+def download_files(jobs, host=FTP_HOST, port=21, user='', passwd='',
+                   n_sessions=N_SESSIONS, manifest_file=None,
+                   max_retries=MAX_RETRIES, timeout=FTP_TIMEOUT, verbose=True):
+    """
+    Descarga una lista de trabajos en paralelo con un pool de sesiones FTP.
+
+    Cada trabajo es un dict con 'remote_dir', 'name' (nombre real en el
+    servidor, ver `resolve_names`) y 'local_path'. Los archivos presentes en
+    el manifiesto con el mismo tamaño y SHA-256 local se saltan; si un
+    archivo local existe pero no esta en el manifiesto, se compara con SIZE
+    del servidor.
+
+    Devuelve lista de dicts (mismo orden): name, local_path, status
+    ('ok' | 'skipped' | 'error'), bytes, seconds, attempts, error.
+    """
+    manifest = load_manifest(manifest_file)
+    lock = threading.Lock()
+    sessions = Queue()
+    n_sessions = max(1, min(n_sessions, len(jobs) or 1))
+
+    def get_session():
+        try:
+            return sessions.get_nowait()
+        except Empty:
+            return connect_ftp(host, port, user, passwd, timeout)
+
+    def drop_session(ftp):
+        try:
+            ftp.close()
+        except Exception:
+            pass
+
+    def record(job, size):
+        key = str(Path(job['local_path']).as_posix())
+        with lock:
+            manifest[key] = {
+                'remote': f"{job['remote_dir'].rstrip('/')}/{job['name']}",
+                'size': size,
+                'sha256': file_sha256(job['local_path']),
+                'completed': datetime.now().isoformat(timespec='seconds'),
+            }
+            if manifest_file:
+                save_manifest(manifest, manifest_file)
+
+    def run(job):
+        local_path = Path(job['local_path'])
+        key = str(local_path.as_posix())
+        result = {'name': job['name'], 'local_path': local_path, 'status': None,
+                  'bytes': 0, 'seconds': 0.0, 'attempts': 0, 'error': ''}
+
+        with lock:
+            entry = manifest.get(key)
+        if _is_complete(entry, local_path):
+            result['status'] = 'skipped'
+            return result
+
+        t0 = time.perf_counter()
+        for attempt in range(1, max_retries + 1):
+            result['attempts'] = attempt
+            ftp = None
+            try:
+                ftp = get_session()
+                if local_path.exists() and entry is None:
+                    ftp.cwd(job['remote_dir'])
+                    if _remote_size(ftp, job['name']) == local_path.stat().st_size:
+                        record(job, local_path.stat().st_size)
+                        sessions.put(ftp)
+                        result['status'] = 'skipped'
+                        return result
+                transferred, size = download_one(ftp, job['remote_dir'], job['name'], local_path)
+                record(job, size)
+                # La sesion vuelve al pool solo despues de record(): si este
+                # falla, el except la cierra sin que otro hilo la este usando
+                sessions.put(ftp)
+                result.update(status='ok', bytes=result['bytes'] + transferred)
+                break
+            except Exception as e:
+                if ftp is not None:
+                    drop_session(ftp)
+                result['error'] = f"{type(e).__name__}: {e}"
+                # Lo ya escrito en .part se conserva y el reintento reanuda (REST)
+                if attempt < max_retries:
+                    time.sleep(min(2 ** (attempt - 1), 8))
+        else:
+            result['status'] = 'error'
+        result['seconds'] = time.perf_counter() - t0
+
+        if verbose:
+            if result['status'] == 'ok':
+                print(f"    [OK] {job['name']} ({result['bytes'] / 1024 / 1024:.2f} MB, "
+                      f"{result['seconds']:.1f}s, intentos={result['attempts']})")
+            else:
+                print(f"    [ERROR] {job['name']}: {result['error']}")
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=n_sessions) as pool:
+            results = list(pool.map(run, jobs))
+    finally:
+        while not sessions.empty():
+            ftp = sessions.get_nowait()
+            try:
+                ftp.quit()
+            except Exception:
+                drop_session(ftp)
+    return results
+
+
+def summarize(results):
+    """Resumen (conteos por estado, bytes y throughput) de `download_files`."""
+    ok = [r for r in results if r['status'] == 'ok']
+    total_bytes = sum(r['bytes'] for r in ok)
+    busy = sum(r['seconds'] for r in ok)
+    return {
+        'ok': len(ok),
+        'skipped': sum(r['status'] == 'skipped' for r in results),
+        'error': sum(r['status'] == 'error' for r in results),
+        'bytes': total_bytes,
+        'mb_per_s_per_session': (total_bytes / 1024 / 1024 / busy) if busy > 0 else 0.0,
+    }
+
+
+# =============================================================================
+# Verificacion local con pyftpdlib
+# =============================================================================
+
+def _start_local_server(root, throttle_bps=None):
+    import logging
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler, ThrottledDTPHandler
+    from pyftpdlib.log import config_logging
+    from pyftpdlib.servers import ThreadedFTPServer
+
+    config_logging(level=logging.WARNING)
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_anonymous(str(root))
+    handler = type('Handler', (FTPHandler,), {})
+    handler.authorizer = authorizer
+    if throttle_bps:
+        dtp = type('DTP', (ThrottledDTPHandler,), {})
+        dtp.write_limit = throttle_bps  # servidor -> cliente (RETR)
+        handler.dtp_handler = dtp
+    server = ThreadedFTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'timeout': 0.1},
+                              daemon=True)
+    thread.start()
+    return server, server.address[1]
+
+
+def run_selfcheck(n_files=8, size_mb=2, throttle_mb=1):
+    """
+    Levanta un servidor FTP local (pyftpdlib, con limite de ancho de banda
+    por conexion) y verifica: descarga en paralelo vs 1 sesion, integridad
+    (SHA-256), reanudacion con REST desde un .part y salto por manifiesto.
+    """
+    import tempfile
+    import random
+
+    tmp = Path(tempfile.mkdtemp(prefix='datasus_ftp_'))
+    remote = tmp / 'remote' / 'dados'
+    remote.mkdir(parents=True)
+    rng = random.Random(42)
+    sources = {}
+    for i in range(n_files):
+        name = f"RDSP10{i + 1:02d}.dbc"
+        data = rng.randbytes(size_mb * 1024 * 1024)
+        (remote / name).write_bytes(data)
+        sources[name] = hashlib.sha256(data).hexdigest()
+
+    server, port = _start_local_server(tmp / 'remote', throttle_bps=throttle_mb * 1024 * 1024)
+    try:
+        index = list_index('127.0.0.1', '/dados', port=port)
+        wanted = [n.upper() for n in sources] + ['RDSP9999.DBC']
+        names = resolve_names(index, wanted)
+        assert len(names) == n_files, "indice de listado incompleto"
+
+        timings = {}
+        for n_sessions in [1, 4]:
+            local = tmp / f'local_{n_sessions}'
+            jobs = [{'remote_dir': '/dados', 'name': n, 'local_path': local / n} for n in names]
+            t0 = time.perf_counter()
+            results = download_files(jobs, host='127.0.0.1', port=port, n_sessions=n_sessions,
+                                     manifest_file=local / 'manifest.json', verbose=False)
+            timings[n_sessions] = time.perf_counter() - t0
+            assert all(r['status'] == 'ok' for r in results)
+            assert all(file_sha256(local / n) == sources[n] for n in names)
+            print(f"  [OK] {n_sessions} sesion(es): {timings[n_sessions]:.2f}s "
+                  f"({n_files * size_mb / timings[n_sessions]:.1f} MB/s)")
+
+        # Salto por manifiesto
+        results = download_files(jobs, host='127.0.0.1', port=port, n_sessions=4,
+                                 manifest_file=local / 'manifest.json', verbose=False)
+        assert all(r['status'] == 'skipped' for r in results)
+        print("  [OK] Segunda corrida: todos saltados por manifiesto")
+
+        # Archivo alterado con el mismo tamaño: el SHA-256 no coincide y se descarga
+        corrupted = local / names[1]
+        corrupted.write_bytes(bytes(corrupted.stat().st_size))
+        results = download_files(jobs[1:2], host='127.0.0.1', port=port,
+                                 manifest_file=local / 'manifest.json', verbose=False)
+        assert results[0]['status'] == 'ok'
+        assert file_sha256(corrupted) == sources[names[1]]
+        print("  [OK] Archivo alterado (mismo tamaño) detectado por SHA-256 y descargado")
+
+        # Reanudacion: dejar un .part con la mitad del archivo
+        name = names[0]
+        target = local / name
+        data = (remote / name).read_bytes()
+        target.unlink()
+        (local / (name + '.part')).write_bytes(data[:len(data) // 2])
+        manifest = load_manifest(local / 'manifest.json')
+        manifest.pop(str(target.as_posix()))
+        save_manifest(manifest, local / 'manifest.json')
+        results = download_files(jobs[:1], host='127.0.0.1', port=port,
+                                 manifest_file=local / 'manifest.json', verbose=False)
+        assert results[0]['status'] == 'ok'
+        assert results[0]['bytes'] == len(data) - len(data) // 2, "no reanudo desde el offset"
+        assert file_sha256(target) == sources[name]
+        print(f"  [OK] Reanudacion REST: transferidos {results[0]['bytes']:,} de {len(data):,} bytes")
+
+        print(f"\n  Speedup 4 sesiones vs 1: {timings[1] / timings[4]:.1f}x")
+    finally:
+        server.close_all()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestor de descargas FTP DATASUS")
+    parser.add_argument('--selfcheck', action='store_true',
+                        help="Verificar contra un servidor pyftpdlib local")
+    args = parser.parse_args()
+
+    if args.selfcheck:
+        print("=" * 70)
+        print("Verificacion local del gestor de descargas (pyftpdlib)")
+        print("=" * 70)
+        run_selfcheck()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+"""
+Lectura en streaming de archivos DBC/DBF de DATASUS (SIH, SIM, SINAN)
+=====================================================================
+
+Los scripts actuales cargan cada archivo completo como DataFrame
+(`read.dbc` en R, `sinan.download(files).to_dataframe()` en PySUS) y recien
+despues filtran São Paulo y agrupan por municipio y año. Una decada de
+archivos mensuales del SIH no cabe comoda en memoria.
+
+Este modulo:
+- Descomprime el DBC (PKWare implode) a un DBF temporal en disco
+  (`pyreaddbc` o `datasus-dbc`, opcionales; los .dbf se leen directo).
+- Recorre los registros del DBF en lotes de tamaño fijo (NumPy sobre el
+  buffer crudo), proyectando solo los campos necesarios.
+- Filtra por prefijo de municipio (UF 35) durante el recorrido y actualiza
+  contadores (municipio, año, causa) de forma incremental.
+- Procesa los archivos en paralelo (un proceso por archivo).
+
+Las reglas reproducen los scripts existentes:
+- SIH/SIM (scripts/R/calculate_heat_health_indicators.R): CID I* =
+  circulatorio, J* = respiratorio, T67 = calor; año tomado del nombre del
+  archivo (RDSP{AAMM}.dbc, DOSP{AAAA}.dbc). Salidas
+  health_heat_annual_SP_2010_2019.csv y health_heat_indicators_SP_2010_2019.csv.
+- SINAN (download_datasus_health.aggregate_by_municipality): casos por
+  ID_MUNICIP[:6] y año del archivo (DENGBR19.dbc) -> cases_{codigo}.
+
+Uso:
+    python scripts/datos/dbc_stream.py               # SIH + SIM -> CSVs salud-calor
+    python scripts/datos/dbc_stream.py --jobs 4
+    python scripts/datos/dbc_stream.py --selfcheck   # DBF sinteticos, sin red
+
+Autor: Science Team / Data Engineer
+"""
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Forzar encoding UTF-8
+if sys.stdout.encoding != 'utf-8':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+    except:
+        pass
+
+# Configuracion de paths
+PROJECT_ROOT = Path("C:/Users/arlex/Documents/Adrian David")
+DATA_RAW_SIH = PROJECT_ROOT / "data" / "raw" / "datasus" / "sih"
+DATA_RAW_SIM = PROJECT_ROOT / "data" / "raw" / "datasus" / "sim"
+DATA_PROCESSED = PROJECT_ROOT / "data" / "processed"
+
+YEARS = list(range(2010, 2020))
+UF_SP = "35"
+BATCH_SIZE = 100_000    # registros por lote
+PER_100K = 100000
+
+CATEGORIES = ['circulatorio', 'respiratorio', 'calor']
+
+
+# =============================================================================
+# Fuentes
+# =============================================================================
+
+def _year_sih(name):
+    # RDSP{AAMM}.dbc
+    year_2d = int(name[4:6])
+    return 2000 + year_2d if year_2d < 50 else 1900 + year_2d
+
+
+def _year_sim(name):
+    # DOSP{AAAA}.dbc
+    return int(name[4:8])
+
+
+def _year_sinan(name):
+    # DENGBR19.dbc / DENGSP19.dbc
+    return 2000 + int(name[6:8])
+
+
+# Campo de municipio, campo de causa (None = la causa es el agravo del
+# nombre del archivo) y año a partir del nombre del archivo.
+SOURCES = {
+    'SIH': {'mun': 'MUNIC_RES', 'cause': 'DIAG_PRINC', 'year': _year_sih, 'value': 'internacoes'},
+    'SIM': {'mun': 'CODMUNRES', 'cause': 'CAUSABAS', 'year': _year_sim, 'value': 'obitos'},
+    'SINAN': {'mun': 'ID_MUNICIP', 'cause': None, 'year': _year_sinan, 'value': 'cases'},
+}
+
+
+# =============================================================================
+# DBC -> DBF
+# =============================================================================
+
+def dbc_to_dbf(dbc_path, dbf_path):
+    """Descomprime un DBC a DBF (requiere pyreaddbc o datasus-dbc)."""
+    try:
+        from pyreaddbc import dbc2dbf
+        dbc2dbf(str(dbc_path), str(dbf_path))
+        return
+    except ImportError:
+        pass
+    try:
+        import datasus_dbc
+        datasus_dbc.decompress(str(dbc_path), str(dbf_path))
+        return
+    except ImportError:
+        pass
+    raise ImportError("Para leer .dbc instale pyreaddbc (pip install pyreaddbc) "
+                      "o datasus-dbc (pip install datasus-dbc)")
+
+
+# =============================================================================
+# DBF en lotes
+# =============================================================================
+
+def read_dbf_header(f):
+    """
+    Lee el encabezado de un DBF (dBase III). Devuelve
+    (n_registros, largo_encabezado, largo_registro, campos) con
+    campos = {nombre: (offset, largo, tipo)}.
+    """
+    head = f.read(32)
+    if len(head) < 32:
+        raise ValueError("archivo DBF vacio o truncado")
+    n_records, header_len, record_len = struct.unpack('<IHH', head[4:12])
+
+    fields = {}
+    offset = 1  # byte 0 de cada registro = marca de borrado
+    descriptors = f.read(header_len - 32)
+    for pos in range(0, len(descriptors) - 31, 32):
+        desc = descriptors[pos:pos + 32]
+        if desc[0] == 0x0D:
+            break
+        name = desc[:11].split(b'\x00')[0].decode('latin-1').strip()
+        ftype = chr(desc[11])
+        length = desc[16]
+        fields[name] = (offset, length, ftype)
+        offset += length
+    return n_records, header_len, record_len, fields
+
+
+def iter_dbf_batches(path, columns, batch_size=BATCH_SIZE):
+    """
+    Recorre un DBF en lotes de `batch_size` registros. Cada lote es un dict
+    {campo: array de bytes (dtype S) sin espacios} con solo `columns`
+    (los campos ausentes se omiten). Los registros borrados se descartan.
+    """
+    with open(path, 'rb') as f:
+        n_records, header_len, record_len, fields = read_dbf_header(f)
+        present = [c for c in columns if c in fields]
+        dtype = np.dtype({
+            'names': ['_deleted'] + present,
+            'formats': ['S1'] + [f'S{fields[c][1]}' for c in present],
+            'offsets': [0] + [fields[c][0] for c in present],
+            'itemsize': record_len,
+        })
+
+        f.seek(header_len)
+        remaining = n_records
+        while remaining > 0:
+            buf = f.read(min(batch_size, remaining) * record_len)
+            k = len(buf) // record_len
+            if k == 0:
+                break
+            remaining -= k
+            arr = np.frombuffer(buf, dtype=dtype, count=k)
+            keep = arr['_deleted'] != b'*'
+            yield {c: np.char.strip(arr[c][keep]) for c in present}
+
+
+# =============================================================================
+# Agregacion por archivo
+# =============================================================================
+
+def classify_cid(cid):
+    """
+    Categoria por CID-10 (vectorizado sobre un array de bytes): 0 = otros,
+    1 = circulatorio (I), 2 = respiratorio (J), 3 = calor (T67).
+    """
+    out = np.zeros(len(cid), dtype=np.int8)
+    valid = np.char.str_len(cid) >= 3
+    out[valid & np.char.startswith(cid, b'T67')] = 3
+    out[valid & np.char.startswith(cid, b'J')] = 2
+    out[valid & np.char.startswith(cid, b'I')] = 1
+    return out
+
+
+def aggregate_file(path, source, prefix=UF_SP, batch_size=BATCH_SIZE):
+    """
+    Cuenta registros por (cod_ibge, ano, categoria) en un archivo DBC/DBF
+    sin cargarlo completo. Devuelve dict con 'counts' (Counter) y
+    contadores de registros leidos / del prefijo / retenidos.
+    """
+    path = Path(path)
+    spec = SOURCES[source]
+    result = {'file': path.name, 'counts': Counter(), 'n_total': 0,
+              'n_uf': 0, 'n_kept': 0, 'error': '', 'time': 0.0}
+    t0 = time.perf_counter()
+    prefix_b = prefix.encode()
+
+    try:
+        year = spec['year'](path.name)
+        if spec['cause'] is None:
+            labels = {0: path.name[:4].upper()}
+        else:
+            labels = {i + 1: c for i, c in enumerate(CATEGORIES)}
+        columns = [spec['mun']] + ([spec['cause']] if spec['cause'] else [])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            if path.suffix.lower() == '.dbc':
+                dbf_path = Path(tmp) / (path.stem + '.dbf')
+                dbc_to_dbf(path, dbf_path)
+            else:
+                dbf_path = path
+
+            for batch in iter_dbf_batches(dbf_path, columns, batch_size):
+                if spec['mun'] not in batch:
+                    raise KeyError(f"campo {spec['mun']} no encontrado")
+                mun = batch[spec['mun']]
+                result['n_total'] += len(mun)
+
+                mask = np.char.startswith(mun, prefix_b)
+                result['n_uf'] += int(mask.sum())
+                if spec['cause'] is None:
+                    cat = np.zeros(int(mask.sum()), dtype=np.int8)
+                else:
+                    if spec['cause'] not in batch:
+                        raise KeyError(f"campo {spec['cause']} no encontrado")
+                    cat = classify_cid(batch[spec['cause']][mask])
+                mun = mun[mask]
+                if spec['cause'] is not None:
+                    mun, cat = mun[cat > 0], cat[cat > 0]
+                result['n_kept'] += len(mun)
+
+                # Municipio a 6 digitos; conteo en C sobre tuplas
+                result['counts'].update(zip(mun.astype('S6').tolist(), cat.tolist()))
+
+        result['counts'] = Counter({(m.decode('latin-1'), year, labels[c]): n
+                                    for (m, c), n in result['counts'].items()})
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['counts'] = Counter()
+
+    result['time'] = time.perf_counter() - t0
+    return result
+
+
+def aggregate_files(paths, source, n_jobs=None, prefix=UF_SP,
+                    batch_size=BATCH_SIZE, verbose=True):
+    """
+    Agrega una lista de archivos en paralelo (un proceso por archivo).
+    Devuelve (tabla larga, resultados por archivo). La tabla tiene
+    cod_ibge, ano, categoria_cid y la columna de conteo de la fuente
+    (internacoes / obitos / cases).
+    """
+    paths = sorted(Path(p) for p in paths)
+    value = SOURCES[source]['value']
+    if not paths:
+        return pd.DataFrame(columns=['cod_ibge', 'ano', 'categoria_cid', value]), []
+
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(paths)))
+    args = [(p, source, prefix, batch_size) for p in paths]
+    if n_jobs == 1:
+        results = [aggregate_file(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(aggregate_file, *zip(*args)))
+
+    total = Counter()
+    for r in results:
+        total.update(r['counts'])
+        if verbose:
+            if r['error']:
+                print(f"  [ERROR] {r['file']}: {r['error']}")
+            else:
+                print(f"  {r['file']}: {r['n_total']:,} registros, SP {r['n_uf']:,}, "
+                      f"retenidos {r['n_kept']:,} ({r['time']:.1f}s)")
+
+    df = pd.DataFrame([(m, y, c, n) for (m, y, c), n in total.items()],
+                      columns=['cod_ibge', 'ano', 'categoria_cid', value])
+    df = df.sort_values(['cod_ibge', 'ano', 'categoria_cid']).reset_index(drop=True)
+    return df, results
+
+
+# =============================================================================
+# Tablas finales
+# =============================================================================
+
+def sinan_cases(long, disease_code):
+    """Tabla larga SINAN -> formato de aggregate_by_municipality."""
+    df = long[long['categoria_cid'] == disease_code.upper()]
+    return pd.DataFrame({
+        'cod_ibge_6': df['cod_ibge'].to_numpy(),
+        'year': df['ano'].astype(int).to_numpy(),
+        f'cases_{disease_code.lower()}': df['cases'].astype(int).to_numpy(),
+    })
+
+
+def load_population():
+    """Poblacion larga (cod_ibge, ano, populacao) desde populacao_SP_2010_2019.csv."""
+    pop_file = DATA_PROCESSED / "populacao_SP_2010_2019.csv"
+    if not pop_file.exists():
+        return None
+    df = pd.read_csv(pop_file)
+    df['cod_ibge'] = df['cod_ibge'].astype(str)
+    pop_cols = [c for c in df.columns if c.startswith('pop_20')]
+    pop = df[['cod_ibge'] + pop_cols].melt(id_vars='cod_ibge', var_name='ano',
+                                           value_name='populacao')
+    pop['ano'] = pop['ano'].str.replace('pop_', '').astype(int)
+    return pop
+
+
+def heat_health_annual(sih, sim, municipalities, population=None, years=YEARS):
+    """
+    Dataset anual municipio x año (mismo orden y columnas que
+    calculate_heat_health_indicators.R): hosp_* y obit_* por categoria,
+    populacao e incidencias inc_* por 100,000 hab.
+    """
+    grid = pd.DataFrame({
+        'cod_ibge': np.tile(pd.Series(municipalities).astype(str).unique(), len(years)),
+        'ano': np.repeat(years, len(pd.Series(municipalities).unique())),
+    })
+
+    for long, value, tag in [(sih, 'internacoes', 'hosp'), (sim, 'obitos', 'obit')]:
+        cols = [f'{tag}_{c}' for c in CATEGORIES]
+        if long is None or long.empty:
+            for col in cols:
+                grid[col] = 0
+            continue
+        wide = long.pivot_table(index=['cod_ibge', 'ano'], columns='categoria_cid',
+                                values=value, aggfunc='sum', fill_value=0)
+        wide = wide.reindex(columns=CATEGORIES, fill_value=0)
+        wide.columns = cols
+        grid = grid.merge(wide.reset_index(), on=['cod_ibge', 'ano'], how='left')
+        grid[cols] = grid[cols].fillna(0).astype(int)
+
+    if population is not None:
+        grid = grid.merge(population, on=['cod_ibge', 'ano'], how='left')
+        pop = grid['populacao']
+        for tag in ['hosp', 'obit']:
+            for c in CATEGORIES:
+                grid[f'inc_{tag}_{c}'] = (grid[f'{tag}_{c}'] / pop * PER_100K).where(pop > 0)
+    return grid
+
+
+def heat_health_stats(annual):
+    """Media / maxima de incidencia y totales por municipio (como el script R)."""
+    short = {'circulatorio': 'circ', 'respiratorio': 'resp', 'calor': 'calor'}
+    g = annual.groupby('cod_ibge', sort=False)
+    out = {}
+    for tag in ['hosp', 'obit']:
+        for stat in ['mean', 'max']:
+            for c in CATEGORIES:
+                col = f'inc_{tag}_{c}'
+                if col in annual:
+                    name = f"inc_{tag}_{short[c]}_{'media' if stat == 'mean' else 'max'}"
+                    out[name] = getattr(g[col], stat)()
+    for tag in ['hosp', 'obit']:
+        for c in CATEGORIES:
+            out[f'total_{tag}_{short[c]}'] = g[f'{tag}_{c}'].sum()
+    stats = pd.DataFrame(out).replace([np.inf, -np.inf], np.nan)
+    return stats.reset_index()
+
+
+def build_heat_health(n_jobs=None, batch_size=BATCH_SIZE):
+    """SIH + SIM en streaming -> CSVs anual e indicadores de salud-calor."""
+    municipalities = pd.read_csv(DATA_PROCESSED / "municipios_regioes_SP.csv")['cod_ibge']
+    population = load_population()
+
+    longs = {}
+    for source, folder in [('SIH', DATA_RAW_SIH), ('SIM', DATA_RAW_SIM)]:
+        files = [p for p in folder.glob('*') if p.suffix.lower() in ('.dbc', '.dbf')]
+        print(f"\n{source}: {len(files)} archivos en {folder}")
+        longs[source], _ = aggregate_files(files, source, n_jobs=n_jobs, batch_size=batch_size)
+
+    annual = heat_health_annual(longs['SIH'], longs['SIM'], municipalities, population)
+    stats = heat_health_stats(annual)
+
+    annual_file = DATA_PROCESSED / "health_heat_annual_SP_2010_2019.csv"
+    stats_file = DATA_PROCESSED / "health_heat_indicators_SP_2010_2019.csv"
+    annual.to_csv(annual_file, index=False)
+    stats.to_csv(stats_file, index=False)
+    print(f"\n[OK] Datos anuales: {annual_file}")
+    print(f"[OK] Indicadores por municipio: {stats_file}")
+    return annual, stats
+
+
+# =============================================================================
+# Verificacion local
+# =============================================================================
+
+def write_dbf(path, fields, records):
+    """DBF minimo (campos C) para pruebas: fields = [(nombre, largo)]."""
+    record_len = 1 + sum(l for _, l in fields)
+    header_len = 32 + 32 * len(fields) + 1
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<BBBBIHH20x', 3, 124, 1, 1, len(records), header_len, record_len))
+        for name, length in fields:
+            f.write(struct.pack('<11sc4xB15x', name.encode(), b'C', length))
+        f.write(b'\r')
+        for deleted, values in records:
+            f.write(b'*' if deleted else b' ')
+            for (_, length), v in zip(fields, values):
+                f.write(v.encode('latin-1')[:length].ljust(length))
+        f.write(b'\x1a')
+
+
+def run_selfcheck(n_files=6, n_records=200_000, n_jobs=None):
+    """
+    Genera DBF sinteticos tipo SIH, compara el agregado en streaming con el
+    agregado del DataFrame completo (reglas del script R) y mide tiempos.
+    """
+    import shutil
+
+    print("=" * 60)
+    print("Verificacion: lectura DBF en streaming vs DataFrame completo")
+    print("=" * 60)
+    rng = np.random.default_rng(42)
+    tmp = Path(tempfile.mkdtemp(prefix='dbc_stream_'))
+    fields = [('N_AIH', 13), ('MUNIC_RES', 6), ('DIAG_PRINC', 4), ('VAL_TOT', 10)]
+    cids = np.array(['I219', 'J189', 'T670', 'A09', 'K359', 'I10', 'J45', 'T6', ''])
+    muns = np.array([f"35{i:04d}" for i in range(0, 100, 10)] + ['330455', '410690'])
+    try:
+        files = []
+        for i in range(n_files):
+            path = tmp / f"RDSP{10 + i:02d}01.dbf"
+            mun = rng.choice(muns, n_records)
+            cid = rng.choice(cids, n_records)
+            deleted = rng.random(n_records) < 0.01
+            write_dbf(path, fields, [(d, ('1', m, c, '12.5'))
+                                     for d, m, c in zip(deleted, mun, cid)])
+            files.append(path)
+
+        # Referencia: DataFrame completo por archivo
+        t0 = time.perf_counter()
+        parts = []
+        for path in files:
+            with open(path, 'rb') as f:
+                n, header_len, record_len, flds = read_dbf_header(f)
+                f.seek(header_len)
+                raw = f.read(n * record_len)
+            rows = [raw[k * record_len:(k + 1) * record_len].decode('latin-1') for k in range(n)]
+            df = pd.DataFrame({
+                'deleted': [r[0] == '*' for r in rows],
+                'MUNIC_RES': [r[14:20].strip() for r in rows],
+                'DIAG_PRINC': [r[20:24].strip() for r in rows],
+            })
+            df = df[~df['deleted'] & (df['MUNIC_RES'].str[:2] == UF_SP)]
+            cid = df['DIAG_PRINC']
+            ok = cid.str.len() >= 3
+            df['categoria_cid'] = np.select(
+                [ok & cid.str.startswith('I'), ok & cid.str.startswith('J'),
+                 ok & cid.str.startswith('T67')], CATEGORIES, 'outros')
+            df = df[df['categoria_cid'] != 'outros']
+            df['ano'] = _year_sih(path.name)
+            df['cod_ibge'] = df['MUNIC_RES'].str[:6]
+            parts.append(df.groupby(['cod_ibge', 'ano', 'categoria_cid']).size()
+                         .reset_index(name='internacoes'))
+        ref = (pd.concat(parts).groupby(['cod_ibge', 'ano', 'categoria_cid'])['internacoes']
+               .sum().reset_index())
+        t_ref = time.perf_counter() - t0
+
+        timings = {}
+        for jobs in sorted({1, n_jobs or os.cpu_count() or 1}):
+            t0 = time.perf_counter()
+            out, _ = aggregate_files(files, 'SIH', n_jobs=jobs, batch_size=50_000, verbose=False)
+            timings[jobs] = time.perf_counter() - t0
+            pd.testing.assert_frame_equal(out, ref, check_dtype=False)
+            print(f"  [OK] streaming, {jobs} proceso(s): {timings[jobs]:.2f}s")
+        print(f"  [OK] resultado identico a la referencia ({len(ref)} filas, "
+              f"{int(ref['internacoes'].sum()):,} internaciones)")
+        print(f"  Referencia DataFrame completo: {t_ref:.2f}s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agregacion en streaming de DBC/DBF de DATASUS")
+    parser.add_argument('--jobs', type=int, default=None, help="procesos en paralelo")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--selfcheck', action='store_true',
+                        help="verificacion con DBF sinteticos (sin red)")
+    args = parser.parse_args()
+
+    if args.selfcheck:
+        run_selfcheck(n_jobs=args.jobs)
+        return
+
+    print("=" * 70)
+    print("DATASUS - Agregacion SIH/SIM en streaming (salud-calor)")
+    print("=" * 70)
+    build_heat_health(n_jobs=args.jobs, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
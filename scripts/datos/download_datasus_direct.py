@@ -24,7 +24,6 @@ import numpy as np
 from pathlib import Path
 from datetime import datetime
 from io import StringIO
-import time
 
 # Forzar encoding UTF-8 para output
 if sys.stdout.encoding != 'utf-8':
@@ -106,68 +105,46 @@ def get_ftp_files_list():
         return []
 
 
-def download_sinan_file(disease_code: str, year: int, uf: str = "SP"):
-    """
-    Descarga un archivo especifico del SINAN via FTP
+SINAN_PATH = "/dissemin/publicos/SINAN/DADOS/FINAIS"
+MANIFEST_FILE = DATA_RAW / "download_manifest.json"
 
-    Args:
-        disease_code: DENG, LEPT, MALA, LEIV, LTAN
-        year: Ano (4 digitos)
-        uf: Unidad Federativa (SP)
+
+def download_sinan_files(disease_codes, years, uf: str = "SP"):
     """
-    import ftplib
-    from io import BytesIO
+    Descarga archivos del SINAN via FTP (gestor concurrente de datasus_ftp)
 
-    ftp_host = "ftp.datasus.gov.br"
+    Args:
+        disease_codes: lista de DENG, LEPT, MALA, LEIV, LTAN
+        years: Anos (4 digitos)
+        uf: Unidad Federativa (SP) o BR (nacional)
 
-    # Rutas segun tipo de enfermedad
-    paths = {
-        "DENG": "/dissemin/publicos/SINAN/DADOS/FINAIS",
-        "LEPT": "/dissemin/publicos/SINAN/DADOS/FINAIS",
-        "MALA": "/dissemin/publicos/SINAN/DADOS/FINAIS",
-        "LEIV": "/dissemin/publicos/SINAN/DADOS/FINAIS",
-        "LTAN": "/dissemin/publicos/SINAN/DADOS/FINAIS"
-    }
+    Un solo listado del directorio para todos los archivos; descargas en
+    paralelo, reanudables y registradas en el manifiesto.
+    """
+    from datasus_ftp import FTP_HOST, list_index, download_files, summarize
 
     # Formato del nombre de archivo: DENGSP10.dbc (DENG + UF + ano 2 digitos)
-    year_2d = str(year)[-2:]
-    filename = f"{disease_code}{uf}{year_2d}.dbc"
-
-    ftp_path = paths.get(disease_code, paths["DENG"])
-
-    print(f"  Buscando {filename}...", end=" ", flush=True)
+    wanted = [f"{code}{uf}{str(year)[-2:]}.dbc" for code in disease_codes for year in years]
 
     try:
-        ftp = ftplib.FTP(ftp_host, timeout=30)
-        ftp.login()
-        ftp.cwd(ftp_path)
-
-        # Verificar si existe el archivo
-        files = ftp.nlst()
+        index = list_index(FTP_HOST, SINAN_PATH)
+    except Exception as e:
+        print(f"  [ERROR] FTP: {str(e)[:60]}")
+        return []
 
-        if filename in files:
-            # Descargar archivo
-            buffer = BytesIO()
-            ftp.retrbinary(f"RETR {filename}", buffer.write)
-            buffer.seek(0)
-
-            # Guardar localmente
-            output_path = DATA_RAW / filename
-            with open(output_path, 'wb') as f:
-                f.write(buffer.read())
-
-            size_kb = output_path.stat().st_size / 1024
-            print(f"[OK] Descargado ({size_kb:.1f} KB)")
-            ftp.quit()
-            return output_path
+    jobs = []
+    for filename in wanted:
+        if filename.upper() in index:
+            name = index[filename.upper()]
+            jobs.append({'remote_dir': SINAN_PATH, 'name': name, 'local_path': DATA_RAW / name})
         else:
-            print(f"[NO] No encontrado")
-            ftp.quit()
-            return None
+            print(f"  Buscando {filename}... [NO] No encontrado")
 
-    except Exception as e:
-        print(f"[ERROR] {str(e)[:40]}")
-        return None
+    results = download_files(jobs, host=FTP_HOST, manifest_file=MANIFEST_FILE)
+    summary = summarize(results)
+    print(f"  Descargados: {summary['ok']} | ya completos: {summary['skipped']} | "
+          f"errores: {summary['error']}")
+    return [r['local_path'] for r in results if r['status'] in ('ok', 'skipped')]
 
 
 def create_aggregated_dataset_from_existing():
@@ -249,15 +226,11 @@ def main():
 
     # Metodo 2: Descargar archivos especificos
     print("\n[2/4] Intentando descarga de archivos SINAN...")
-    downloaded_files = []
-
     # Los archivos SINAN estan consolidados a nivel Brasil (BR), no por UF
-    for disease_code in ["DENG", "LEPT", "MALA", "LEIV", "LTAN"]:
-        for year in [2019, 2018, 2017, 2016, 2015, 2014, 2013, 2012, 2011, 2010]:
-            result = download_sinan_file(disease_code, year, "BR")  # BR = Brasil nacional
-            if result:
-                downloaded_files.append(result)
-            time.sleep(0.5)  # Pausa entre requests
+    downloaded_files = download_sinan_files(
+        ["DENG", "LEPT", "MALA", "LEIV", "LTAN"],
+        [2019, 2018, 2017, 2016, 2015, 2014, 2013, 2012, 2011, 2010],
+        "BR")  # BR = Brasil nacional
 
     # Metodo 3: Usar datos existentes
     print("\n[3/4] Verificando datos existentes en el proyecto...")
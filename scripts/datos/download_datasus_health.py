@@ -37,6 +37,7 @@ DATA_PROCESSED.mkdir(parents=True, exist_ok=True)
 
 # Código UF de São Paulo
 UF_SP = "35"
+UF_FILES = ("SP", "BR")  # archivos SINAN locales aceptados, en orden de preferencia
 YEARS = list(range(2010, 2020))  # 2010 a 2019
 
 # Enfermedades a descargar
@@ -152,6 +153,39 @@ def aggregate_by_municipality(df: pd.DataFrame, disease_code: str) -> pd.DataFra
 
     return agg
 
+def aggregate_local_dbc(disease_code: str, years: list, n_jobs: int = None) -> pd.DataFrame:
+    """
+    Agrega por municipio y año los archivos SINAN ya descargados en DATA_RAW
+    ({codigo}{BR|SP}{aa}.dbc, ver download_datasus_direct.py) leyendolos en
+    streaming (dbc_stream): sin cargar el archivo completo en memoria.
+
+    Returns:
+        DataFrame con el mismo formato que aggregate_by_municipality,
+        o vacio si no hay archivos locales
+    """
+    from dbc_stream import aggregate_files, sinan_cases
+
+    yy = {f"{year % 100:02d}" for year in years}
+    # Un archivo por año: si estan el de SP y el de BR se contarian dos veces
+    # los mismos registros de SP. Se prefiere SP (mas chico) y el .dbf ya
+    # descomprimido.
+    by_year = {}
+    for p in DATA_RAW.glob(f"{disease_code}*"):
+        stem = p.stem.upper()
+        uf, year_2d = stem[len(disease_code):-2], stem[-2:]
+        if p.suffix.lower() not in ('.dbc', '.dbf') or year_2d not in yy or uf not in UF_FILES:
+            continue
+        rank = (UF_FILES.index(uf), p.suffix.lower() != '.dbf')
+        if year_2d not in by_year or rank < by_year[year_2d][0]:
+            by_year[year_2d] = (rank, p)
+    files = [by_year[k][1] for k in sorted(by_year)]
+    if not files:
+        return pd.DataFrame()
+
+    print(f"\n{DISEASES[disease_code]} ({disease_code}): {len(files)} archivos locales")
+    long, _ = aggregate_files(files, 'SINAN', n_jobs=n_jobs, prefix=UF_SP)
+    return sinan_cases(long, disease_code)
+
 def calculate_incidence(df_cases: pd.DataFrame, df_pop: pd.DataFrame) -> pd.DataFrame:
     """
     Calcula la tasa de incidencia por 100,000 habitantes
@@ -175,7 +209,9 @@ def main():
     print("="*70)
 
     # Verificar instalación de PySUS
-    if not check_pysus_installed():
+    # Con archivos DBC locales no hace falta PySUS (lectura en streaming)
+    has_local = any(p.suffix.lower() == '.dbc' for p in DATA_RAW.glob('*'))
+    if not has_local and not check_pysus_installed():
         print("\n" + "="*70)
         print("INSTRUCCIONES PARA INSTALAR PYSUS")
         print("="*70)
@@ -199,6 +235,16 @@ def main():
     all_diseases = {}
 
     for disease_code, disease_name in DISEASES.items():
+        # Archivos DBC ya descargados: agregacion en streaming
+        try:
+            df_agg = aggregate_local_dbc(disease_code, YEARS)
+        except ImportError as e:
+            print(f"  {e}")
+            df_agg = pd.DataFrame()
+        if not df_agg.empty:
+            all_diseases[disease_code] = df_agg
+            continue
+
         try:
             df = download_disease_data(disease_code, YEARS)
             if not df.empty:
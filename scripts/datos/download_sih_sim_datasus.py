@@ -18,10 +18,10 @@ Fecha: 2026-01-23
 
 import os
 import sys
-import ftplib
 from pathlib import Path
 from datetime import datetime
-import time
+
+from datasus_ftp import list_index, resolve_names, download_files, summarize
 
 # Forzar encoding UTF-8
 if sys.stdout.encoding != 'utf-8':
@@ -56,43 +56,37 @@ YEARS = list(range(2010, 2020))
 UF = "SP"
 
 
-def connect_ftp():
-    """Conecta al FTP de DATASUS"""
-    print(f"Conectando a {FTP_HOST}...")
-    try:
-        ftp = ftplib.FTP(FTP_HOST, timeout=FTP_TIMEOUT)
-        ftp.login()  # Login anónimo
-        print(f"  [OK] Conectado exitosamente")
-        return ftp
-    except Exception as e:
-        print(f"  [ERROR] No se pudo conectar: {e}")
-        return None
+MANIFEST_FILE = PROJECT_ROOT / "data" / "raw" / "datasus" / "download_manifest.json"
 
 
-def list_files_in_path(ftp, path, pattern=None):
-    """Lista archivos en un directorio FTP"""
+def download_system(system, filenames, local_dir):
+    """
+    Descarga los `filenames` de un sistema (SIH/SIM) con el gestor
+    concurrente de datasus_ftp: un solo listado del directorio (indice sin
+    mayusculas/minusculas), sesiones en paralelo, reanudacion REST y
+    manifiesto de archivos completos.
+    """
+    print(f"Conectando a {FTP_HOST}...")
     try:
-        ftp.cwd(path)
-        files = ftp.nlst()
-        if pattern:
-            files = [f for f in files if pattern in f.upper()]
-        return files
+        index = list_index(FTP_HOST, FTP_PATHS[system])
     except Exception as e:
-        print(f"  [ERROR] No se pudo listar {path}: {e}")
+        print(f"  [ERROR] No se pudo listar {FTP_PATHS[system]}: {e}")
         return []
+    print(f"Directorio: {FTP_PATHS[system]}")
+    print(f"Total archivos en directorio: {len(index)}")
 
+    names = resolve_names(index, filenames)
+    print(f"\nArchivos de SP (2010-2019) encontrados: {len(names)}")
 
-def download_file(ftp, remote_path, local_path):
-    """Descarga un archivo del FTP"""
-    try:
-        with open(local_path, 'wb') as f:
-            ftp.retrbinary(f'RETR {remote_path}', f.write)
-        size_mb = local_path.stat().st_size / (1024 * 1024)
-        print(f"    [OK] {local_path.name} ({size_mb:.2f} MB)")
-        return True
-    except Exception as e:
-        print(f"    [ERROR] {remote_path}: {e}")
-        return False
+    jobs = [{'remote_dir': FTP_PATHS[system], 'name': n, 'local_path': local_dir / n}
+            for n in names]
+    results = download_files(jobs, host=FTP_HOST, timeout=FTP_TIMEOUT,
+                             manifest_file=MANIFEST_FILE)
+
+    summary = summarize(results)
+    print(f"  Descargados: {summary['ok']} | ya completos: {summary['skipped']} | "
+          f"errores: {summary['error']}")
+    return [r['local_path'] for r in results if r['status'] in ('ok', 'skipped')]
 
 
 def download_sih_files():
@@ -107,62 +101,10 @@ def download_sih_files():
     print("DESCARGA DE DATOS SIH (Hospitalizaciones)")
     print("=" * 70)
 
-    ftp = connect_ftp()
-    if not ftp:
-        return []
-
-    downloaded = []
-
-    try:
-        ftp.cwd(FTP_PATHS["SIH"])
-        print(f"Directorio: {FTP_PATHS['SIH']}")
-
-        # Listar todos los archivos disponibles
-        all_files = ftp.nlst()
-        print(f"Total archivos en directorio: {len(all_files)}")
-
-        # Filtrar archivos de SP para los años de interés
-        # Formato: RDSP{AAMM}.dbc donde AA = año (2 dígitos), MM = mes
-        files_to_download = []
-        for year in YEARS:
-            year_2d = str(year)[-2:]
-            for month in range(1, 13):
-                filename = f"RD{UF}{year_2d}{month:02d}.dbc"
-                if filename in all_files:
-                    files_to_download.append(filename)
-                else:
-                    # Verificar si existe con mayúsculas/minúsculas diferentes
-                    for f in all_files:
-                        if f.upper() == filename.upper():
-                            files_to_download.append(f)
-                            break
-
-        print(f"\nArchivos de SP (2010-2019) encontrados: {len(files_to_download)}")
-
-        # Verificar cuáles ya existen localmente
-        files_to_download_new = []
-        for f in files_to_download:
-            local_file = DATA_RAW_SIH / f
-            if not local_file.exists():
-                files_to_download_new.append(f)
-            else:
-                print(f"  [SKIP] {f} ya existe")
-                downloaded.append(local_file)
-
-        print(f"Archivos a descargar: {len(files_to_download_new)}")
-
-        # Descargar archivos nuevos
-        for i, filename in enumerate(files_to_download_new, 1):
-            print(f"\n  [{i}/{len(files_to_download_new)}] Descargando {filename}...", end="")
-            local_path = DATA_RAW_SIH / filename
-            if download_file(ftp, filename, local_path):
-                downloaded.append(local_path)
-            time.sleep(0.5)  # Pausa entre descargas
-
-    except Exception as e:
-        print(f"[ERROR] Error durante descarga SIH: {e}")
-    finally:
-        ftp.quit()
+    # Formato: RDSP{AAMM}.dbc donde AA = año (2 dígitos), MM = mes
+    filenames = [f"RD{UF}{str(year)[-2:]}{month:02d}.dbc"
+                 for year in YEARS for month in range(1, 13)]
+    downloaded = download_system("SIH", filenames, DATA_RAW_SIH)
 
     print(f"\n[RESUMEN SIH] Archivos descargados: {len(downloaded)}")
     return downloaded
@@ -180,60 +122,9 @@ def download_sim_files():
     print("DESCARGA DE DATOS SIM (Mortalidade)")
     print("=" * 70)
 
-    ftp = connect_ftp()
-    if not ftp:
-        return []
-
-    downloaded = []
-
-    try:
-        ftp.cwd(FTP_PATHS["SIM"])
-        print(f"Directorio: {FTP_PATHS['SIM']}")
-
-        # Listar todos los archivos disponibles
-        all_files = ftp.nlst()
-        print(f"Total archivos en directorio: {len(all_files)}")
-
-        # Filtrar archivos de SP para los años de interés
-        # Formato: DO{UF}{AAAA}.dbc donde AAAA = año completo
-        files_to_download = []
-        for year in YEARS:
-            filename = f"DO{UF}{year}.dbc"
-            if filename in all_files:
-                files_to_download.append(filename)
-            else:
-                # Buscar variaciones
-                for f in all_files:
-                    if f.upper() == filename.upper():
-                        files_to_download.append(f)
-                        break
-
-        print(f"\nArchivos de SP (2010-2019) encontrados: {len(files_to_download)}")
-
-        # Verificar cuáles ya existen localmente
-        files_to_download_new = []
-        for f in files_to_download:
-            local_file = DATA_RAW_SIM / f
-            if not local_file.exists():
-                files_to_download_new.append(f)
-            else:
-                print(f"  [SKIP] {f} ya existe")
-                downloaded.append(local_file)
-
-        print(f"Archivos a descargar: {len(files_to_download_new)}")
-
-        # Descargar archivos nuevos
-        for i, filename in enumerate(files_to_download_new, 1):
-            print(f"\n  [{i}/{len(files_to_download_new)}] Descargando {filename}...", end="")
-            local_path = DATA_RAW_SIM / filename
-            if download_file(ftp, filename, local_path):
-                downloaded.append(local_path)
-            time.sleep(0.5)
-
-    except Exception as e:
-        print(f"[ERROR] Error durante descarga SIM: {e}")
-    finally:
-        ftp.quit()
+    # Formato: DO{UF}{AAAA}.dbc donde AAAA = año completo
+    filenames = [f"DO{UF}{year}.dbc" for year in YEARS]
+    downloaded = download_system("SIM", filenames, DATA_RAW_SIM)
 
     print(f"\n[RESUMEN SIM] Archivos descargados: {len(downloaded)}")
     return downloaded
@@ -0,0 +1,525 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente SIDRA/IBGE con consultas en bloque, concurrencia y cache HTTP
+=====================================================================
+
+Reemplaza el camino alternativo de download_ibge_populacao.py, que hacia
+una peticion bloqueante por municipio y por año (645 x 10 ~ 6,450 llamadas
+en serie, con `except: continue`).
+
+Estrategia por niveles, de lo mas grueso a lo mas fino; cada nivel solo
+pide lo que el anterior no pudo traer:
+  1. Una sola consulta en bloque: todos los municipios de la UF, todos
+     los años (n6/in n3 35).
+  2. Una consulta por año.
+  3. Grupos de municipios (CHUNK_SIZE codigos por consulta) para los años
+     que faltan.
+  4. Municipio x año para las celdas que aun falten.
+
+Las peticiones de cada nivel corren concurrentes (asyncio + hilos, solo
+stdlib) con limite de concurrencia, limite de tasa (peticiones/s),
+reintentos con backoff exponencial (respeta Retry-After) y cache en disco:
+cada respuesta 200 se guarda por hash de la URL, de modo que una nueva
+corrida es instantanea y funciona sin red.
+
+Uso:
+    from ibge_sidra import fetch_population
+    df_long, stats = fetch_population(range(2010, 2020))
+
+Verificacion local (servidor HTTP stub en localhost, sin red):
+    python scripts/datos/ibge_sidra.py --selfcheck
+
+Autor: Science Team / Data Engineer
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# Forzar encoding UTF-8
+if sys.stdout.encoding != 'utf-8':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+    except:
+        pass
+
+SIDRA_URL = "https://apisidra.ibge.gov.br/values"
+LOCALIDADES_URL = "https://servicodados.ibge.gov.br/api/v1/localidades"
+CACHE_DIR = Path("outputs") / "cache" / "http"
+
+# Tabela 6579: Estimativa de população; variável 9324: população residente estimada
+POP_TABLE = '6579'
+POP_VARIABLE = '9324'
+UF_SP = '35'
+
+CONCURRENCY = 8         # peticiones simultaneas
+RATE = 5.0              # peticiones por segundo (todas las tareas)
+MAX_RETRIES = 4
+BACKOFF = 1.0           # segundos (se duplica en cada reintento)
+TIMEOUT = 60
+CHUNK_SIZE = 50         # municipios por consulta en el nivel 3
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+# =============================================================================
+# Cache HTTP en disco
+# =============================================================================
+
+def _cache_paths(cache_dir, url):
+    key = hashlib.sha256(url.encode()).hexdigest()
+    return Path(cache_dir) / f"{key}.body", Path(cache_dir) / f"{key}.json"
+
+
+def cache_get(cache_dir, url):
+    """Cuerpo de la respuesta en cache para `url` (bytes) o None."""
+    if cache_dir is None:
+        return None
+    body_file, meta_file = _cache_paths(cache_dir, url)
+    if body_file.exists() and meta_file.exists():
+        return body_file.read_bytes()
+    return None
+
+
+def cache_put(cache_dir, url, body):
+    """Guarda la respuesta (escritura atomica: .tmp + replace)."""
+    if cache_dir is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    body_file, meta_file = _cache_paths(cache_dir, url)
+    tmp = body_file.with_suffix('.tmp')
+    tmp.write_bytes(body)
+    os.replace(tmp, body_file)
+    meta = {'url': url, 'bytes': len(body), 'fetched_at': datetime.now().isoformat(timespec='seconds')}
+    meta_file.write_text(json.dumps(meta), encoding='utf-8')
+
+
+# =============================================================================
+# Peticiones concurrentes
+# =============================================================================
+
+def _http_get(url, timeout):
+    """GET bloqueante (corre en un hilo). Devuelve (status, cuerpo, Retry-After)."""
+    request = urllib.request.Request(url, headers={'Accept': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read(), None
+    except urllib.error.HTTPError as e:
+        return e.code, b'', e.headers.get('Retry-After')
+
+
+async def _wait_slot(ctx):
+    """Limitador de tasa global: reserva el siguiente turno libre."""
+    if not ctx['rate']:
+        return
+    loop = asyncio.get_running_loop()
+    async with ctx['lock']:
+        now = loop.time()
+        start = max(now, ctx['next_slot'])
+        ctx['next_slot'] = start + 1.0 / ctx['rate']
+    if start > now:
+        await asyncio.sleep(start - now)
+
+
+async def _fetch(url, ctx):
+    cached = cache_get(ctx['cache_dir'], url)
+    if cached is not None:
+        ctx['stats']['cache_hits'] += 1
+        return {'url': url, 'status': 'ok', 'body': cached, 'attempts': 0, 'error': ''}
+
+    error = ''
+    async with ctx['semaphore']:
+        for attempt in range(1, ctx['max_retries'] + 2):
+            await _wait_slot(ctx)
+            ctx['stats']['requests'] += 1
+            retry_after = None
+            try:
+                status, body, retry_after = await asyncio.to_thread(_http_get, url, ctx['timeout'])
+            except (urllib.error.URLError, socket.timeout, ConnectionError, OSError) as e:
+                status, body, error = None, b'', f"{type(e).__name__}: {e}"
+
+            if status == 200:
+                cache_put(ctx['cache_dir'], url, body)
+                return {'url': url, 'status': 'ok', 'body': body, 'attempts': attempt, 'error': ''}
+            if status is not None:
+                error = f"HTTP {status}"
+                if status not in RETRY_STATUS:
+                    break
+            if attempt > ctx['max_retries']:
+                break
+
+            ctx['stats']['retries'] += 1
+            delay = ctx['backoff'] * 2 ** (attempt - 1) * (1 + random.random() * 0.25)
+            if retry_after and str(retry_after).isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay)
+
+    ctx['stats']['failed'] += 1
+    return {'url': url, 'status': 'error', 'body': None, 'attempts': attempt, 'error': error}
+
+
+async def _fetch_all(urls, ctx):
+    # Un hilo por peticion simultanea (el executor por defecto depende de los nucleos)
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=ctx['concurrency']))
+    ctx['semaphore'] = asyncio.Semaphore(ctx['concurrency'])
+    ctx['lock'] = asyncio.Lock()
+    ctx['next_slot'] = 0.0
+    return await asyncio.gather(*[_fetch(u, ctx) for u in urls])
+
+
+def new_stats():
+    return {'requests': 0, 'retries': 0, 'cache_hits': 0, 'failed': 0}
+
+
+def fetch_urls(urls, cache_dir=CACHE_DIR, concurrency=CONCURRENCY, rate=RATE,
+               max_retries=MAX_RETRIES, backoff=BACKOFF, timeout=TIMEOUT, stats=None):
+    """
+    Descarga una lista de URLs en paralelo. Devuelve {url: resultado} con
+    status 'ok' | 'error', body (bytes), attempts y error. `stats` (dict de
+    new_stats) acumula peticiones de red, reintentos, aciertos de cache y
+    fallos.
+    """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    ctx = {
+        'cache_dir': cache_dir, 'concurrency': concurrency, 'rate': rate,
+        'max_retries': max_retries, 'backoff': backoff, 'timeout': timeout,
+        'stats': stats if stats is not None else new_stats(),
+    }
+    results = asyncio.run(_fetch_all(urls, ctx))
+    return {r['url']: r for r in results}
+
+
+# =============================================================================
+# SIDRA
+# =============================================================================
+
+def sidra_url(territory, periods, table=POP_TABLE, variable=POP_VARIABLE, base=SIDRA_URL):
+    """URL de la API SIDRA para municipios (n6) `territory` y años `periods`."""
+    territory = urllib.parse.quote(territory, safe=',')
+    periods = ','.join(str(p) for p in periods)
+    return f"{base}/t/{table}/n6/{territory}/v/{variable}/p/{periods}/f/a"
+
+
+def parse_sidra(body):
+    """
+    JSON de SIDRA -> DataFrame (cod_ibge, nome_municipio, year, population).
+    Las columnas D*C se identifican por la fila de encabezado. Valores '-'
+    (cero) o vacios -> 0; simbolos como '...' o 'X' se descartan.
+    """
+    data = json.loads(body)
+    columns = ['cod_ibge', 'nome_municipio', 'year', 'population']
+    if len(data) < 2:
+        return pd.DataFrame(columns=columns)
+
+    header = data[0]
+    dims = [k[:-1] for k in header if k.startswith('D') and k.endswith('C')]
+    year_dim = next((d for d in dims if header[f'{d}C'].startswith('Ano')), 'D2')
+    mun_dim = next((d for d in dims if header[f'{d}C'].startswith('Munic')), 'D1')
+
+    records = []
+    for row in data[1:]:
+        value = row.get('V')
+        try:
+            pop = int(value) if value and value != '-' else 0
+            records.append((row[f'{mun_dim}C'][:6], row[f'{mun_dim}N'].split(' - ')[0],
+                            int(row[f'{year_dim}C']), pop))
+        except (KeyError, ValueError):
+            continue
+    return pd.DataFrame(records, columns=columns)
+
+
+def list_municipalities(uf=UF_SP, base=LOCALIDADES_URL, **kwargs):
+    """Municipios de la UF (codigo IBGE de 7 digitos y nombre), con cache."""
+    url = f"{base}/estados/{uf}/municipios"
+    result = fetch_urls([url], **kwargs)[url]
+    if result['status'] != 'ok':
+        raise RuntimeError(f"No se pudo obtener la lista de municipios: {result['error']}")
+    return [(str(m['id']), m['nome']) for m in json.loads(result['body'])]
+
+
+def _collect(results, frames, used):
+    ok = 0
+    for r in results.values():
+        if r['status'] == 'ok':
+            df = parse_sidra(r['body'])
+            if not df.empty:
+                frames.append(df)
+                used.append(r['url'])
+                ok += 1
+    return ok
+
+
+def _assemble(frames, names=None):
+    if not frames:
+        return pd.DataFrame(columns=['cod_ibge', 'nome_municipio', 'year', 'population'])
+    df = (pd.concat(frames, ignore_index=True)
+          .drop_duplicates(['cod_ibge', 'year'])
+          .sort_values(['cod_ibge', 'year'])
+          .reset_index(drop=True))
+    if names:
+        df['nome_municipio'] = df['cod_ibge'].map(names).fillna(df['nome_municipio'])
+    return df
+
+
+def fetch_population(years, uf=UF_SP, sidra_base=SIDRA_URL, localidades_base=LOCALIDADES_URL,
+                     chunk_size=CHUNK_SIZE, verbose=True, **kwargs):
+    """
+    Poblacion estimada por municipio y año (formato largo). `kwargs` se
+    pasan a fetch_urls (cache_dir, concurrency, rate, max_retries, ...).
+    Devuelve (DataFrame cod_ibge/nome_municipio/year/population, stats),
+    con stats['levels'] = peticiones usadas por nivel.
+    """
+    years = list(years)
+    stats = kwargs.pop('stats', None) or new_stats()
+    stats['levels'] = {}
+    frames = []
+    cache_dir = kwargs.get('cache_dir', CACHE_DIR)
+
+    # Plan ya resuelto en una corrida anterior: solo lectura de cache
+    plan_key = hashlib.sha256(f"{uf}|{years}|{sidra_base}|{localidades_base}|{chunk_size}"
+                              .encode()).hexdigest()[:24]
+    plan_file = Path(cache_dir) / f"plan_{plan_key}.json" if cache_dir else None
+    if plan_file and plan_file.exists():
+        plan = json.loads(plan_file.read_text(encoding='utf-8'))
+        bodies = [cache_get(cache_dir, u) for u in plan['sidra']]
+        names_body = cache_get(cache_dir, plan['localidades']) if plan['localidades'] else b'[]'
+        if all(b is not None for b in bodies) and names_body is not None:
+            stats['cache_hits'] += len(bodies) + bool(plan['localidades'])
+            frames = [parse_sidra(b) for b in bodies]
+            names = {str(m['id'])[:6]: m['nome'] for m in json.loads(names_body)}
+            return _assemble(frames, names), stats
+
+    used = []
+    localidades_url = None
+
+    def log(msg):
+        if verbose:
+            print(msg)
+
+    def have():
+        if not frames:
+            return set()
+        df = pd.concat(frames)
+        return set(zip(df['cod_ibge'], df['year']))
+
+    # 1. Bloque unico
+    url = sidra_url(f"in n3 {uf}", years, base=sidra_base)
+    ok = _collect(fetch_urls([url], stats=stats, **kwargs), frames, used)
+    stats['levels']['bloque'] = 1
+    log(f"   Nivel 1 (bloque UF x {len(years)} años): {'OK' if ok else 'fallo'}")
+
+    # 2. Un año por consulta
+    got_years = {y for _, y in have()}
+    missing_years = [y for y in years if y not in got_years]
+    if missing_years:
+        urls = [sidra_url(f"in n3 {uf}", [y], base=sidra_base) for y in missing_years]
+        ok = _collect(fetch_urls(urls, stats=stats, **kwargs), frames, used)
+        stats['levels']['por_ano'] = len(urls)
+        log(f"   Nivel 2 (por año): {ok}/{len(urls)} consultas OK")
+
+    # 3 y 4. Grupos de municipios y celdas sueltas: se compara contra todas las
+    # celdas (municipio, año) esperadas segun la lista de municipios, asi
+    # tambien se recuperan celdas sueltas que faltan en un año ya obtenido.
+    municipalities = list_municipalities(uf, base=localidades_base, stats=stats, **kwargs)
+    localidades_url = f"{localidades_base}/estados/{uf}/municipios"
+    codes = [c for c, _ in municipalities]
+    got = have()
+    missing = [(c, y) for c in codes for y in years if (c[:6], y) not in got]
+
+    if missing:
+        by_year = {}
+        for c, y in missing:
+            by_year.setdefault(y, []).append(c)
+        urls = []
+        for y, cs in by_year.items():
+            for i in range(0, len(cs), chunk_size):
+                urls.append(sidra_url(','.join(cs[i:i + chunk_size]), [y], base=sidra_base))
+        ok = _collect(fetch_urls(urls, stats=stats, **kwargs), frames, used)
+        stats['levels']['grupos'] = len(urls)
+        log(f"   Nivel 3 (grupos de {chunk_size} municipios): {ok}/{len(urls)} consultas OK")
+
+        got = have()
+        missing = [(c, y) for c, y in missing if (c[:6], y) not in got]
+        if missing:
+            urls = [sidra_url(c, [y], base=sidra_base) for c, y in missing]
+            ok = _collect(fetch_urls(urls, stats=stats, **kwargs), frames, used)
+            stats['levels']['celdas'] = len(urls)
+            log(f"   Nivel 4 (municipio x año): {ok}/{len(urls)} consultas OK")
+            got = have()
+            missing = [(c, y) for c, y in missing if (c[:6], y) not in got]
+
+    df = _assemble(frames, {c[:6]: n for c, n in municipalities})
+
+    # Guardar el plan solo si esta completo (sin celdas faltantes)
+    complete = not missing and not df.empty
+    if plan_file and complete:
+        os.makedirs(cache_dir, exist_ok=True)
+        plan_file.write_text(json.dumps({'sidra': used, 'localidades': localidades_url}),
+                             encoding='utf-8')
+    return df, stats
+
+
+# =============================================================================
+# Verificacion local
+# =============================================================================
+
+def _start_stub_server(n_municipalities, years, latency=0.02, fail_bulk=True,
+                       fail_years=(), drop_cells=(), flaky_every=5):
+    """
+    Servidor HTTP stub con respuestas tipo SIDRA/localidades:
+    - la consulta en bloque devuelve 500 (si fail_bulk);
+    - los años de `fail_years` fallan a nivel UF (fuerza el nivel 3);
+    - las celdas (indice de municipio, año) de `drop_cells` faltan en las
+      respuestas a nivel UF (solo se obtienen por grupos o celdas);
+    - cada `flaky_every` peticiones una responde 503 (prueba reintentos).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    codes = [f"35{i:04d}{i % 10}" for i in range(1, n_municipalities + 1)]
+    truth = {(c, y): 1000 + int(c[2:6]) * 7 + (y - 2000) * 13 for c in codes for y in years}
+    dropped = {(codes[i], y) for i, y in drop_cells}
+    state = {'count': 0, 'lock': threading.Lock(), 'paths': []}
+    header = {'NC': 'Nível Territorial (Código)', 'NN': 'Nível Territorial',
+              'V': 'Valor', 'D1C': 'Município (Código)', 'D1N': 'Município',
+              'D2C': 'Ano (Código)', 'D2N': 'Ano',
+              'D3C': 'Variável (Código)', 'D3N': 'Variável'}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload=None):
+            body = json.dumps(payload).encode() if payload is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            time.sleep(latency)
+            with state['lock']:
+                state['count'] += 1
+                n = state['count']
+                state['paths'].append(self.path)
+            if flaky_every and n % flaky_every == 0:
+                return self._send(503)
+
+            path = urllib.parse.unquote(self.path)
+            if path.startswith('/localidades/estados/35/municipios'):
+                return self._send(200, [{'id': int(c), 'nome': f"Municipio {c}"} for c in codes])
+            if not path.startswith('/values/'):
+                return self._send(404)
+
+            parts = path.split('/')
+            territory = parts[parts.index('n6') + 1]
+            periods = [int(p) for p in parts[parts.index('p') + 1].split(',')]
+            if territory.startswith('in n3'):
+                if (fail_bulk and len(periods) > 1) or any(p in fail_years for p in periods):
+                    return self._send(500)
+                wanted, skip = codes, dropped
+            else:
+                wanted, skip = territory.split(','), set()
+            rows = [header] + [
+                {'NC': '6', 'NN': 'Município', 'V': str(truth[(c, y)]),
+                 'D1C': c, 'D1N': f"Municipio {c} - SP", 'D2C': str(y), 'D2N': str(y),
+                 'D3C': POP_VARIABLE, 'D3N': 'População residente estimada'}
+                for y in periods for c in wanted if (c, y) in truth and (c, y) not in skip]
+            return self._send(200, rows)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", truth, state
+
+
+def run_selfcheck(n_municipalities=120, years=range(2010, 2020)):
+    """
+    Verifica contra un stub local: respaldo por niveles, reintentos ante 503,
+    resultado igual al esperado, y segunda corrida sin red (solo cache).
+    """
+    import shutil
+    import tempfile
+
+    print("=" * 60)
+    print("Verificacion: cliente SIDRA contra servidor stub local")
+    print("=" * 60)
+    years = list(years)
+    tmp = Path(tempfile.mkdtemp(prefix='ibge_sidra_'))
+    server, base, truth, state = _start_stub_server(
+        n_municipalities, years, fail_years={2012, 2015})
+    kwargs = dict(sidra_base=f"{base}/values", localidades_base=f"{base}/localidades",
+                  cache_dir=tmp / 'http', concurrency=8, rate=200, backoff=0.05,
+                  chunk_size=25, verbose=False)
+    expected = {(c[:6], y): v for (c, y), v in truth.items()}
+    try:
+        t0 = time.perf_counter()
+        df, stats = fetch_population(years, **kwargs)
+        elapsed = time.perf_counter() - t0
+        got = {(c, y): p for c, y, p in zip(df['cod_ibge'], df['year'], df['population'])}
+        assert got == expected, "valores distintos a los del stub"
+        assert stats['retries'] > 0, "no se ejercitaron los reintentos"
+        print(f"  [OK] {len(df)} celdas correctas en {elapsed:.2f}s con "
+              f"{stats['requests']} peticiones ({stats['retries']} reintentos); "
+              f"por nivel: {stats['levels']}")
+        print(f"       (el camino anterior: {len(expected)} peticiones en serie)")
+
+        served = state['count']
+        t0 = time.perf_counter()
+        df2, stats2 = fetch_population(years, **kwargs)
+        elapsed = time.perf_counter() - t0
+        assert state['count'] == served and stats2['requests'] == 0, "la segunda corrida uso la red"
+        pd.testing.assert_frame_equal(df, df2)
+        print(f"  [OK] Segunda corrida solo desde cache: {stats2['cache_hits']} respuestas, "
+              f"0 peticiones, {elapsed:.3f}s")
+    finally:
+        server.shutdown()
+
+    # Todos los años presentes en el bloque, pero con celdas sueltas faltantes
+    server, base, truth, _ = _start_stub_server(
+        n_municipalities, years, fail_bulk=False, drop_cells={(3, years[0]), (7, years[-1])},
+        flaky_every=0)
+    kwargs.update(sidra_base=f"{base}/values", localidades_base=f"{base}/localidades",
+                  cache_dir=tmp / 'http_cells')
+    try:
+        df, stats_cells = fetch_population(years, **kwargs)
+        got = {(c, y): p for c, y, p in zip(df['cod_ibge'], df['year'], df['population'])}
+        assert got == expected, "no se recuperaron las celdas sueltas"
+        assert stats_cells['levels'].get('grupos') == 2, stats_cells['levels']
+        print(f"  [OK] Celdas sueltas faltantes recuperadas; por nivel: {stats_cells['levels']}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cliente SIDRA/IBGE con cache")
+    parser.add_argument('--selfcheck', action='store_true',
+                        help="verificacion contra servidor stub local (sin red)")
+    args = parser.parse_args()
+    if args.selfcheck:
+        run_selfcheck()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+# =============================================================================
+# Motor generico de indicadores de incidencia (municipio x año)
+# =============================================================================
+#
+# Reemplaza la logica repetida en los pipelines de diarrea, dengue /
+# leishmaniasis, salud-calor y fuego: a partir de una tabla larga de casos
+# (cod_ibge, year, outcome, cases) y una tabla larga de poblacion
+# (cod_ibge, year, population) construye un grid denso
+# municipio x año x outcome (arrays NumPy indexados por posicion) y calcula
+# para todos los outcomes a la vez:
+#
+#   - incidencia media y maxima (por 100,000 hab, o conteos si per=None)
+#   - casos totales
+#   - persistencia (años con casos)
+#   - tendencia (pendiente OLS de la incidencia por año)
+#   - coeficiente de variacion interanual
+#
+# Cada conjunto de indicadores (INDICATOR_SETS) declara su fuente, sus
+# outcomes, los nombres de columna y los archivos de salida; `main` escribe
+# todas las tablas en una sola corrida.
+#
+# Uso:
+#   python scripts/datos/incidence_indicators.py              # todos los conjuntos
+#   python scripts/datos/incidence_indicators.py --only heat  # solo algunos
+#
+# Autor: Science Team
+# Fecha: 2026-02
+# =============================================================================
+
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Configuracion de paths
+PROJECT_ROOT = Path("C:/Users/arlex/Documents/Adrian David")
+DATA_RAW = Path("G:/My Drive/Adrian David/Datos/to check health data + prompts for new data")
+DATA_PROCESSED = PROJECT_ROOT / "data" / "processed"
+
+YEARS = list(range(2010, 2020))
+PER_100K = 100000
+
+# Nombres de columna por defecto: {stat}_{outcome}
+DEFAULT_NAMES = {
+    'mean': 'incidence_mean_{o}',
+    'max': 'incidence_max_{o}',
+    'total': 'total_cases_{o}',
+    'persist': 'persist_{o}',
+    'trend': 'trend_{o}',
+    'cv': 'cv_{o}',
+}
+
+
+# =============================================================================
+# Carga comun
+# =============================================================================
+
+def load_municipalities():
+    """Carga lista de municipios de SP."""
+    mun_file = DATA_PROCESSED / "municipios_regioes_SP.csv"
+    df = pd.read_csv(mun_file)
+    df['cod_ibge'] = df['cod_ibge'].astype(str)
+    return df[['cod_ibge', 'nome_municipio']]
+
+
+def load_population():
+    """Poblacion en formato largo (cod_ibge, year, population)."""
+    pop_file = DATA_PROCESSED / "populacao_SP_2010_2019.csv"
+    df = pd.read_csv(pop_file)
+    df['cod_ibge'] = df['cod_ibge'].astype(str)
+
+    # Solo columnas pop_20XX (excluir pop_mean)
+    pop_cols = [c for c in df.columns if c.startswith('pop_20')]
+    pop_long = pd.melt(df[['cod_ibge'] + pop_cols], id_vars=['cod_ibge'],
+                       var_name='year', value_name='population')
+    pop_long['year'] = pop_long['year'].str.replace('pop_', '').astype(int)
+    return pop_long
+
+
+def wide_to_long(df, columns, id_col='cod_ibge', year_col='year'):
+    """
+    Tabla (cod_ibge, year, col1, col2, ...) -> formato largo
+    (cod_ibge, year, outcome, cases). `columns` mapea columna -> outcome.
+    """
+    long = df[[id_col, year_col] + list(columns)].melt(
+        id_vars=[id_col, year_col], var_name='outcome', value_name='cases')
+    long['outcome'] = long['outcome'].map(columns)
+    return long.rename(columns={id_col: 'cod_ibge', year_col: 'year'})
+
+
+# =============================================================================
+# Grid denso
+# =============================================================================
+
+def build_grid(cases, population, ids, years=YEARS, outcomes=None):
+    """
+    Grid denso a partir de tablas largas.
+
+    cases:      DataFrame (cod_ibge, year, outcome, cases)
+    population: DataFrame (cod_ibge, year, population) o None
+    ids:        orden de municipios (cod_ibge como str)
+
+    Devuelve dict con ids, years, outcomes, cases (M, Y, K; ausentes = 0)
+    y population (M, Y; ausentes = NaN).
+    """
+    ids = pd.Index(pd.Series(ids).astype(str).unique())
+    years = pd.Index(years)
+    outcomes = pd.Index(outcomes if outcomes is not None else pd.unique(cases['outcome']))
+
+    arr = np.zeros((len(ids), len(years), len(outcomes)))
+    i = ids.get_indexer(cases['cod_ibge'].astype(str))
+    j = years.get_indexer(cases['year'])
+    k = outcomes.get_indexer(cases['outcome'])
+    ok = (i >= 0) & (j >= 0) & (k >= 0)
+    values = pd.to_numeric(cases['cases'], errors='coerce').fillna(0).to_numpy()
+    np.add.at(arr, (i[ok], j[ok], k[ok]), values[ok])
+
+    pop = np.full((len(ids), len(years)), np.nan)
+    if population is not None:
+        i = ids.get_indexer(population['cod_ibge'].astype(str))
+        j = years.get_indexer(population['year'])
+        ok = (i >= 0) & (j >= 0)
+        pop[i[ok], j[ok]] = population['population'].to_numpy()[ok]
+
+    return {'ids': ids, 'years': years, 'outcomes': outcomes,
+            'cases': arr, 'population': pop}
+
+
+def incidence(grid, per=PER_100K, missing=0.0):
+    """
+    Incidencia (M, Y, K) = casos / poblacion * per. Donde la poblacion falta
+    o es 0 se usa `missing` (0 como en el script de diarrea, NaN como en los
+    scripts R). per=None devuelve los conteos.
+    """
+    if per is None:
+        return grid['cases'].copy()
+    pop = grid['population'][:, :, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(pop > 0, grid['cases'] / pop * per, missing)
+
+
+def grid_frame(grid, inc=None, case_names=None, inc_names=None):
+    """
+    Grid en formato largo-ancho: una fila por (cod_ibge, year) con columnas
+    de casos, poblacion e incidencia por outcome (orden municipio-año).
+    """
+    idx = pd.MultiIndex.from_product([grid['ids'], grid['years']], names=['cod_ibge', 'year'])
+    out = idx.to_frame(index=False)
+    n = len(out)
+    for k, o in enumerate(grid['outcomes']):
+        out[(case_names or {}).get(o, o)] = grid['cases'][:, :, k].reshape(n)
+    out['population'] = grid['population'].reshape(n)
+    if inc is not None:
+        for k, o in enumerate(grid['outcomes']):
+            out[(inc_names or {}).get(o, f'incidence_{o}')] = inc[:, :, k].reshape(n)
+    return out
+
+
+# =============================================================================
+# Indicadores
+# =============================================================================
+
+def trend_slope(values, years):
+    """Pendiente OLS por fila/outcome de values (M, Y, K) sobre años, ignorando NaN."""
+    x = np.asarray(years, dtype=float)[None, :, None]
+    valid = ~np.isnan(values)
+    n = valid.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = np.where(valid, x, 0).sum(axis=1, keepdims=True) / n
+        y_mean = np.nansum(values, axis=1, keepdims=True) / n
+        dx = np.where(valid, x - x_mean, 0)
+        dy = np.where(valid, values - y_mean, 0)
+        slope = (dx * dy).sum(axis=1) / (dx ** 2).sum(axis=1)
+    return np.where(n[:, 0] >= 2, slope, np.nan)
+
+
+def compute_indicators(grid, per=PER_100K, missing=0.0, names=None):
+    """
+    Indicadores por municipio para todos los outcomes del grid (vectorizado).
+    `names` mapea cada estadistica a una plantilla de columna con {o}
+    (por defecto DEFAULT_NAMES). Devuelve (indicators, incidencia M x Y x K).
+    """
+    names = {**DEFAULT_NAMES, **(names or {})}
+    inc = incidence(grid, per=per, missing=missing)
+    cases = grid['cases']
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inc_mean = np.nanmean(inc, axis=1)
+        inc_std = np.nanstd(inc, axis=1, ddof=1)
+        stats = {
+            # Media/maxima sin años validos -> 0 (como los scripts R)
+            'mean': np.nan_to_num(inc_mean, nan=0.0),
+            'max': np.nan_to_num(np.nanmax(np.where(np.isnan(inc), -np.inf, inc), axis=1),
+                                 nan=0.0, neginf=0.0),
+            'total': cases.sum(axis=1),
+            'persist': (cases > 0).sum(axis=1),
+            'trend': trend_slope(inc, grid['years']),
+            'cv': np.where(inc_mean > 0, inc_std / inc_mean, np.nan),
+        }
+
+    indicators = pd.DataFrame({'cod_ibge': grid['ids']})
+    for k, o in enumerate(grid['outcomes']):
+        for stat, template in names.items():
+            if template:
+                indicators[template.format(o=o)] = stats[stat][:, k]
+    return indicators, inc
+
+
+# =============================================================================
+# Conjuntos de indicadores
+# =============================================================================
+
+def load_diarrhea_cases():
+    """Diarrea (hospitalizaciones) desde health_sp_Ju.csv."""
+    df = pd.read_csv(DATA_RAW / "health_sp_Ju.csv").rename(columns={'COD': 'cod_ibge'})
+    df['cod_ibge'] = df['cod_ibge'].astype(str)
+    return wide_to_long(df, {'diarrhea': 'diarrhea'})
+
+
+def load_vector_borne_cases():
+    """Dengue, leptospirose, malaria y leishmaniose (visceral + tegumentar), casos provaveis."""
+    df = pd.read_csv(DATA_PROCESSED / "health_casos_provaveis_SP_2010_2019_regioes.csv")
+    prefixes = {'deng': 'dengue', 'lept': 'leptospirose', 'mala': 'malaria',
+                'leiv': 'leishmaniose', 'ltan': 'leishmaniose'}
+    cols = [c for c in df.columns if c[:4] in prefixes and c[-4:].isdigit()]
+    long = df[['cod_ibge'] + cols].melt(id_vars='cod_ibge', var_name='col', value_name='cases')
+    long['outcome'] = long['col'].str[:4].map(prefixes)
+    long['year'] = long['col'].str[-4:].astype(int)
+    # leiv + ltan se suman en el grid (np.add.at)
+    return long[['cod_ibge', 'year', 'outcome', 'cases']]
+
+
+def load_heat_health_cases():
+    """Hospitalizaciones y obitos (circulatorio, respiratorio, calor) del pipeline R."""
+    df = pd.read_csv(DATA_PROCESSED / "health_heat_annual_SP_2010_2019.csv")
+    cols = [c for c in df.columns
+            if c.startswith(('hosp_', 'obit_')) and not c.startswith('inc_')]
+    return wide_to_long(df, {c: c for c in cols}, year_col='ano')
+
+
+def load_fire_counts():
+    """Focos anuales por municipio (fire_annual)."""
+    df = pd.read_csv(DATA_PROCESSED / "fire_annual_SP_2010_2019.csv")
+    return wide_to_long(df, {'n_focos': 'fire'}, year_col='ano')
+
+
+INDICATOR_SETS = [
+    {
+        'name': 'diarrhea',
+        'loader': load_diarrhea_cases,
+        'per': PER_100K,
+        'missing': 0.0,
+        'names': {'mean': 'incidence_{o}_mean', 'max': 'incidence_{o}_max'},
+        'output': 'diarrhea_indicators_SP_2010_2019.csv',
+        'annual': 'diarrhea_annual_SP_2010_2019.csv',
+    },
+    {
+        'name': 'vector_borne',
+        'loader': load_vector_borne_cases,
+        'per': PER_100K,
+        'missing': np.nan,
+        'names': {},
+        'output': 'vector_borne_incidence_indicators_SP_2010_2019.csv',
+        'annual': None,
+    },
+    {
+        'name': 'heat',
+        'loader': load_heat_health_cases,
+        'per': PER_100K,
+        'missing': np.nan,
+        'names': {},
+        'output': 'health_heat_incidence_indicators_SP_2010_2019.csv',
+        'annual': None,
+    },
+    {
+        # Conteos de focos (sin poblacion): tendencia y CV interanual
+        'name': 'fire',
+        'loader': load_fire_counts,
+        'per': None,
+        'missing': np.nan,
+        'names': {'mean': 'fire_count_mean', 'max': 'fire_count_max',
+                  'total': None, 'persist': None,
+                  'trend': 'fire_trend', 'cv': 'fire_count_cv'},
+        'output': 'fire_trend_indicators_SP_2010_2019.csv',
+        'annual': None,
+    },
+]
+
+
+def run_set(spec, municipalities, population, years=YEARS):
+    """Calcula un conjunto de indicadores; devuelve (indicators, annual o None)."""
+    cases = spec['loader']()
+    grid = build_grid(cases, population if spec['per'] else None,
+                      municipalities['cod_ibge'], years=years)
+    indicators, inc = compute_indicators(grid, per=spec['per'], missing=spec['missing'],
+                                         names=spec['names'])
+    annual = grid_frame(grid, inc) if spec.get('annual') else None
+    return indicators, annual
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indicadores de incidencia por municipio")
+    parser.add_argument('--only', nargs='+', choices=[s['name'] for s in INDICATOR_SETS],
+                        help="Calcular solo estos conjuntos")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("Indicadores de incidencia (motor comun)")
+    print(f"Fecha: {datetime.now()}")
+    print("=" * 70)
+
+    municipalities = load_municipalities()
+    population = load_population()
+    print(f"Municipios SP: {len(municipalities)} | Poblacion: {len(population)} registros")
+
+    for spec in INDICATOR_SETS:
+        if args.only and spec['name'] not in args.only:
+            continue
+        print(f"\n--- {spec['name']} ---")
+        try:
+            indicators, annual = run_set(spec, municipalities, population)
+        except FileNotFoundError as e:
+            print(f"  [SKIP] {e}")
+            continue
+
+        out_file = DATA_PROCESSED / spec['output']
+        indicators.to_csv(out_file, index=False)
+        print(f"  Indicadores: {out_file} ({len(indicators)} municipios, "
+              f"{len(indicators.columns) - 1} columnas)")
+        if annual is not None:
+            annual_file = DATA_PROCESSED / spec['annual']
+            annual.to_csv(annual_file, index=False)
+            print(f"  Datos anuales: {annual_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+# =============================================================================
+# Constructor incremental del dataset integrado (municipios_integrado)
+# =============================================================================
+#
+# Reemplaza el esquema "un script por version" (create_integrated_dataset_v9.py
+# -> v10 -> ...). Cada fuente de indicadores se registra en SOURCES con su
+# archivo, su cargador y las columnas que produce (clave: cod_ibge). El
+# constructor:
+#
+#   - Calcula una huella por fuente (SHA-256 del archivo + cargador + opciones)
+#     y vuelve a integrar solo las fuentes cuya huella cambio.
+#   - Reemplaza en su lugar las columnas de la fuente (mismo orden); las
+#     columnas nuevas se agregan al final y las que la fuente dejo de
+#     producir se eliminan. Las columnas sin fuente registrada son la base
+#     (v8) y no se tocan.
+#   - Escribe el manifiesto de linaje columna -> fuente -> huella
+#     (municipios_integrado_lineage.json) y la tabla en CSV y Parquet.
+#
+# Agregar un indicador = agregar una entrada a SOURCES.
+#
+# Uso:
+#   python scripts/datos/integrated_dataset.py                 # integra lo que cambio
+#   python scripts/datos/integrated_dataset.py --force fire    # re-integrar una fuente
+#   python scripts/datos/integrated_dataset.py --lineage       # columnas y su origen
+#
+# Autor: Science Team
+# =============================================================================
+
+import argparse
+import hashlib
+import json
+from pathlib import Path
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+PROJECT_ROOT = Path("C:/Users/arlex/Documents/Adrian David")
+OUTPUTS = PROJECT_ROOT / "outputs"
+DATA_PROCESSED = PROJECT_ROOT / "data" / "processed"
+
+DATASET_CSV = OUTPUTS / "dataset" / "municipios_integrado.csv"
+DATASET_PARQUET = OUTPUTS / "dataset" / "municipios_integrado.parquet"
+LINEAGE_FILE = OUTPUTS / "dataset" / "municipios_integrado_lineage.json"
+
+BASE = 'base'
+
+
+# =============================================================================
+# Cargadores
+# =============================================================================
+
+def _normalize_ids(df):
+    """cod_ibge como str de 6 digitos (GEE exporta cd_mun con 7, como int)."""
+    if 'cd_mun' in df.columns:
+        df = df.rename(columns={'cd_mun': 'cod_ibge'})
+    df['cod_ibge'] = df['cod_ibge'].astype(str).str[:6]
+    return df
+
+
+def load_indicator_csv(path, rename=None, drop=(), columns=None):
+    """CSV de indicadores por municipio (cod_ibge + columnas)."""
+    df = _normalize_ids(pd.read_csv(path))
+    df = df.drop(columns=[c for c in drop if c in df.columns])
+    if rename:
+        df = df.rename(columns=rename)
+    if columns:
+        df = df[['cod_ibge'] + [c for c in columns if c in df.columns]]
+    return df
+
+
+def load_gee_csv(path, columns=None):
+    """CSV exportado por Google Earth Engine (sin nm_mun, system:index ni .geo)."""
+    return load_indicator_csv(path, drop=('nm_mun', 'system:index', '.geo'), columns=columns)
+
+
+# Indicadores de salud-calor (dbc_stream / calculate_heat_health_indicators.R)
+# con los nombres del dataset integrado: inc_hosp_circ_media -> health_hosp_circ_mean, ...
+HEALTH_HEAT_RENAME = {
+    f"{prefix}{tag}_{cause}{suffix}": f"health_{out_prefix}{'death' if tag == 'obit' else tag}_"
+                                      f"{'heat' if cause == 'calor' else cause}{out_suffix}"
+    for tag in ['hosp', 'obit']
+    for cause in ['circ', 'resp', 'calor']
+    for prefix, suffix, out_prefix, out_suffix in [('inc_', '_media', '', '_mean'),
+                                                   ('inc_', '_max', '', '_max'),
+                                                   ('total_', '', 'total_', '')]
+}
+
+
+# =============================================================================
+# Fuentes registradas (orden = orden de las columnas nuevas)
+# =============================================================================
+
+SOURCES = [
+    {
+        'name': 'fire',
+        'file': DATA_PROCESSED / "fire_indicators_SP_2010_2019.csv",
+        'loader': load_indicator_csv,
+        'options': {'drop': ['fire_recurrence_norm']},
+    },
+    {
+        'name': 'health_heat',
+        'file': DATA_PROCESSED / "health_heat_indicators_SP_2010_2019.csv",
+        'loader': load_indicator_csv,
+        'options': {'rename': HEALTH_HEAT_RENAME},
+    },
+    {
+        'name': 'diarrhea',
+        'file': DATA_PROCESSED / "diarrhea_indicators_SP_2010_2019.csv",
+        'loader': load_indicator_csv,
+        'options': {},
+    },
+    {
+        # gee_extract_heat_stress_xavier.js -> Google Drive -> data/processed/
+        'name': 'heat_stress_xavier',
+        'file': DATA_PROCESSED / "heat_stress_xavier_sp_2010_2019.csv",
+        'loader': load_gee_csv,
+        'options': {},
+    },
+    {
+        # gee_extract_modis_lst.js -> Google Drive -> data/processed/
+        'name': 'modis_lst',
+        'file': DATA_PROCESSED / "modis_lst_sp_2010_2019.csv",
+        'loader': load_gee_csv,
+        'options': {'columns': ['lst_day_mean', 'lst_night_mean', 'lst_day_p95',
+                                'lst_day_sd', 'lst_amplitude']},
+    },
+]
+
+
+# =============================================================================
+# Huellas y linaje
+# =============================================================================
+
+def source_fingerprint(source):
+    """SHA-256 del archivo de la fuente + nombre del cargador + opciones."""
+    h = hashlib.sha256()
+    h.update(source['loader'].__name__.encode())
+    h.update(json.dumps(source['options'], sort_keys=True, default=str).encode())
+    with open(source['file'], 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def column_hash(series):
+    return hashlib.sha256(pd.util.hash_pandas_object(series, index=False).values.tobytes()).hexdigest()[:16]
+
+
+def load_lineage(path=LINEAGE_FILE):
+    if Path(path).exists():
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return {'sources': {}, 'columns': {}}
+
+
+def load_table(csv_file=DATASET_CSV, parquet_file=DATASET_PARQUET):
+    """Tabla integrada actual: Parquet si esta al dia con el CSV, si no CSV."""
+    csv_file, parquet_file = Path(csv_file), Path(parquet_file)
+    if (HAS_PARQUET and parquet_file.exists()
+            and (not csv_file.exists() or parquet_file.stat().st_mtime >= csv_file.stat().st_mtime)):
+        df = pd.read_parquet(parquet_file)
+    else:
+        df = pd.read_csv(csv_file)
+    df['cod_ibge'] = df['cod_ibge'].astype(str)
+    return df
+
+
+# =============================================================================
+# Construccion incremental
+# =============================================================================
+
+def apply_source(df, new, old_columns=()):
+    """
+    Integra `new` (cod_ibge + columnas) en `df` por cod_ibge (left join):
+    reemplaza en su lugar las columnas existentes, agrega las nuevas al
+    final y elimina las de `old_columns` que la fuente ya no produce.
+    """
+    new = new.drop_duplicates('cod_ibge')
+    cols = [c for c in new.columns if c != 'cod_ibge']
+    aligned = df[['cod_ibge']].merge(new, on='cod_ibge', how='left')
+    df = df.drop(columns=[c for c in old_columns if c not in cols and c in df.columns])
+    for col in cols:
+        df[col] = aligned[col].to_numpy()
+    return df, cols
+
+
+def build(sources=SOURCES, csv_file=DATASET_CSV, parquet_file=DATASET_PARQUET,
+          lineage_file=LINEAGE_FILE, force=(), verbose=True):
+    """
+    Actualiza la tabla integrada. Devuelve (df, lineage, cambiadas) donde
+    `cambiadas` es la lista de fuentes re-integradas. Si ninguna fuente
+    cambio y las salidas existen, no se reescribe nada.
+    """
+    df = load_table(csv_file, parquet_file)
+    n_rows = len(df)
+    lineage = load_lineage(lineage_file)
+    changed = []
+
+    def log(msg):
+        if verbose:
+            print(msg)
+
+    for source in sources:
+        name = source['name']
+        previous = lineage['sources'].get(name)
+        if not Path(source['file']).exists():
+            log(f"  {name}: ADVERTENCIA, no se encontro {source['file']} (se mantiene lo anterior)")
+            continue
+
+        fingerprint = source_fingerprint(source)
+        if (name not in force and previous and previous['hash'] == fingerprint
+                and all(c in df.columns for c in previous['columns'])):
+            log(f"  {name}: al dia ({len(previous['columns'])} columnas)")
+            continue
+
+        new = source['loader'](source['file'], **source['options'])
+        old_columns = previous['columns'] if previous else []
+        existed = set(df.columns)
+        df, cols = apply_source(df, new, old_columns)
+        matched = df['cod_ibge'].isin(new['cod_ibge']).sum()
+        lineage['sources'][name] = {
+            'hash': fingerprint,
+            'file': str(source['file']),
+            'columns': cols,
+            'updated': datetime.now().isoformat(timespec='seconds'),
+        }
+        changed.append(name)
+        n_new = len([c for c in cols if c not in existed])
+        log(f"  {name}: integrada ({len(cols)} columnas, {n_new} nuevas, "
+            f"{matched}/{n_rows} municipios con datos)")
+
+    assert len(df) == n_rows, "ERROR: Se perdieron municipios en el merge"
+
+    outputs_ok = Path(csv_file).exists() and Path(lineage_file).exists() and \
+        (not HAS_PARQUET or Path(parquet_file).exists())
+    if not changed and outputs_ok:
+        log("\nSin cambios: dataset integrado al dia")
+        return df, lineage, changed
+
+    # Linaje por columna: fuente, huella de la fuente y huella de los valores
+    owner = {c: name for name, s in lineage['sources'].items() for c in s['columns']}
+    lineage['columns'] = {
+        col: {
+            'source': owner.get(col, BASE),
+            'source_hash': lineage['sources'][owner[col]]['hash'][:16] if col in owner else None,
+            'hash': column_hash(df[col]),
+        }
+        for col in df.columns
+    }
+    lineage['rows'] = n_rows
+    lineage['built'] = datetime.now().isoformat(timespec='seconds')
+
+    Path(csv_file).parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(csv_file, index=False)
+    if HAS_PARQUET:
+        df.to_parquet(parquet_file, index=False)
+    else:
+        log("  ADVERTENCIA: pyarrow no instalado, no se escribe Parquet")
+    with open(lineage_file, 'w', encoding='utf-8') as f:
+        json.dump(lineage, f, indent=2, ensure_ascii=False)
+    log(f"\nArchivo guardado: {csv_file}")
+    if HAS_PARQUET:
+        log(f"Archivo guardado: {parquet_file}")
+    log(f"Linaje: {lineage_file}")
+    return df, lineage, changed
+
+
+def print_lineage(lineage_file=LINEAGE_FILE):
+    lineage = load_lineage(lineage_file)
+    by_source = {}
+    for col, info in lineage['columns'].items():
+        by_source.setdefault(info['source'], []).append(col)
+    for source, cols in by_source.items():
+        meta = lineage['sources'].get(source, {})
+        print(f"\n{source} ({len(cols)} columnas) {meta.get('file', '')}")
+        print(f"  hash: {meta.get('hash', '-')[:16]}  actualizado: {meta.get('updated', '-')}")
+        print("  " + ", ".join(cols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Constructor incremental del dataset integrado")
+    parser.add_argument('--force', nargs='+', default=[], metavar='FUENTE',
+                        help="re-integrar estas fuentes aunque no cambien")
+    parser.add_argument('--lineage', action='store_true', help="mostrar el linaje y salir")
+    args = parser.parse_args()
+
+    if args.lineage:
+        print_lineage()
+        return
+
+    print("=" * 70)
+    print("Dataset integrado - construccion incremental")
+    print(f"Fecha: {datetime.now()}")
+    print("=" * 70)
+    unknown = set(args.force) - {s['name'] for s in SOURCES}
+    if unknown:
+        parser.error(f"fuentes desconocidas: {sorted(unknown)}")
+
+    df, lineage, changed = build(force=args.force)
+    print(f"\nDimensiones: {len(df)} municipios x {len(df.columns)} variables")
+    print(f"Fuentes re-integradas: {', '.join(changed) if changed else 'ninguna'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""
+Cache compartida de geometrias de municipios de SP (GeoParquet)
+===============================================================
+Cada script de mapas hacia `gpd.read_file(SHP_PATH)` sobre el shapefile IBGE,
+luego `to_crs(...)` y a veces `simplify(...)`. Este modulo guarda copias
+GeoParquet ya proyectadas (EPSG:4326 y un CRS metrico) y ya simplificadas a
+varias tolerancias, identificadas por el hash del shapefile de origen, y
+expone una unica funcion:
+
+    from geometry_cache import load_sp_geometry
+
+    gdf = load_sp_geometry()                       # CRS original (SIRGAS 2000)
+    gdf = load_sp_geometry(crs=4326)               # WGS84 (folium / web)
+    gdf = load_sp_geometry(crs=4326, tolerance=500)  # simplificado a 500 m
+
+Todas las variantes incluyen `cod_ibge` (int, 6 digitos, como el CSV
+integrado). La tolerancia siempre esta en metros: se simplifica en el CRS
+metrico y despues se reproyecta. Se usa `shapely.coverage_simplify`
+(shapely >= 2.1) para que los municipios vecinos sigan compartiendo bordes;
+si no esta disponible, `simplify(preserve_topology=True)`.
+
+Hash del origen: SHA-256 de .shp/.shx/.dbf/.prj/.cpg, memorizado por
+(tamaño, mtime) en un indice JSON, de modo que abrir un mapa solo lee el
+GeoParquet de la variante pedida. Dentro de un proceso, las variantes ya
+leidas se devuelven desde memoria (copia).
+
+Uso:
+    python scripts/utils/geometry_cache.py --build   # precalcular todas las variantes
+    python scripts/utils/geometry_cache.py --info
+
+Autor: Science Team
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
+SHP_PATH = os.path.join(BASE_DIR, "data/geo/ibge_sp/SP_Municipios_2022.shp")
+CACHE_DIR = os.path.join(BASE_DIR, "outputs", "cache", "geometry")
+
+CRS_WGS84 = 4326
+CRS_METRIC = 5880  # SIRGAS 2000 / Brazil Polyconic (metros)
+
+# Variantes precalculadas: CRS (None = original del shapefile) x tolerancia (m)
+CRS_LIST = [None, CRS_WGS84, CRS_METRIC]
+TOLERANCES = [None, 100, 500, 1000]
+
+SIDECARS = ['.shp', '.shx', '.dbf', '.prj', '.cpg']
+INDEX_FILE = 'index.json'
+
+_MEMORY_CACHE = {}
+
+
+# ============================================================
+# HASH DEL ORIGEN
+# ============================================================
+
+def _source_files(shp_path):
+    stem = os.path.splitext(shp_path)[0]
+    return [stem + ext for ext in SIDECARS if os.path.exists(stem + ext)]
+
+
+def _load_index(cache_dir):
+    path = os.path.join(cache_dir, INDEX_FILE)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def _save_index(cache_dir, index):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = os.path.join(cache_dir, INDEX_FILE + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, os.path.join(cache_dir, INDEX_FILE))
+
+
+def source_hash(shp_path=SHP_PATH, cache_dir=CACHE_DIR):
+    """
+    SHA-256 del shapefile y sus archivos asociados. Solo se recalcula si
+    cambia el tamaño o el mtime de alguno (firma guardada en index.json).
+    """
+    files = _source_files(shp_path)
+    if not files:
+        raise FileNotFoundError(f"No se encontro el shapefile: {shp_path}")
+    signature = [[os.path.basename(p), os.path.getsize(p), os.path.getmtime(p)] for p in files]
+
+    index = _load_index(cache_dir)
+    key = os.path.abspath(shp_path)
+    entry = index.get(key)
+    if entry and entry['signature'] == signature:
+        return entry['hash']
+
+    h = hashlib.sha256()
+    for path in files:
+        h.update(os.path.basename(path).lower().encode())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    digest = h.hexdigest()[:16]
+    index[key] = {'signature': signature, 'hash': digest}
+    _save_index(cache_dir, index)
+    return digest
+
+
+# ============================================================
+# VARIANTES
+# ============================================================
+
+def _crs_key(crs):
+    """None -> 'native'; 4326 / 'EPSG:4326' -> 4326."""
+    if crs is None:
+        return None
+    if isinstance(crs, str) and crs.upper().startswith('EPSG:'):
+        return int(crs.split(':')[1])
+    return int(crs)
+
+
+def _variant_file(cache_dir, digest, crs, tolerance):
+    crs_tag = 'native' if crs is None else f"epsg{crs}"
+    tol_tag = 'full' if not tolerance else f"s{int(tolerance)}m"
+    return os.path.join(cache_dir, f"sp_municipios_{digest}_{crs_tag}_{tol_tag}.parquet")
+
+
+def read_source(shp_path=SHP_PATH):
+    """Lee el shapefile IBGE y agrega cod_ibge de 6 digitos (int)."""
+    import geopandas as gpd
+    gdf = gpd.read_file(shp_path)
+    if 'CD_MUN' in gdf.columns:
+        code_col = 'CD_MUN'
+    elif 'codigo_ibge' in gdf.columns:
+        code_col = 'codigo_ibge'
+    else:
+        candidates = [c for c in gdf.columns if 'cod' in c.lower() or 'ibge' in c.lower()]
+        if not candidates:
+            raise ValueError(f"No se encontro columna de codigo IBGE en {shp_path}")
+        code_col = candidates[0]
+    gdf['cod_ibge'] = gdf[code_col].astype(str).str[:6].astype(int)
+    return gdf
+
+
+def _simplify(gdf, tolerance):
+    """Simplifica (en metros, CRS metrico) conservando bordes compartidos si es posible."""
+    import shapely
+    metric = gdf.to_crs(epsg=CRS_METRIC)
+    geoms = metric.geometry.values
+    if hasattr(shapely, 'coverage_simplify'):
+        simplified = shapely.coverage_simplify(geoms, tolerance)
+    else:
+        simplified = shapely.simplify(geoms, tolerance, preserve_topology=True)
+    return metric.set_geometry(simplified, crs=metric.crs)
+
+
+def make_variant(source, crs=None, tolerance=None):
+    """Variante (crs, tolerancia) a partir del GeoDataFrame original."""
+    gdf = _simplify(source, tolerance) if tolerance else source
+    if crs is None:
+        return gdf.to_crs(source.crs) if tolerance else gdf.copy()
+    return gdf.to_crs(epsg=crs)
+
+
+def build_cache(shp_path=SHP_PATH, cache_dir=CACHE_DIR, crs_list=CRS_LIST,
+                tolerances=TOLERANCES, source=None, verbose=True):
+    """Escribe las variantes GeoParquet que falten. Devuelve {(crs, tol): archivo}."""
+    digest = source_hash(shp_path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    files = {}
+    for crs in crs_list:
+        crs = _crs_key(crs)
+        for tol in tolerances:
+            path = _variant_file(cache_dir, digest, crs, tol)
+            files[(crs, tol)] = path
+            if os.path.exists(path):
+                continue
+            if source is None:
+                source = read_source(shp_path)
+            t0 = time.perf_counter()
+            variant = make_variant(source, crs, tol)
+            tmp = path + '.tmp'
+            variant.to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+            if verbose:
+                print(f"  [CACHE] {os.path.basename(path)} ({time.perf_counter() - t0:.2f}s)")
+    return files
+
+
+def load_sp_geometry(crs=None, tolerance=None, shp_path=SHP_PATH, cache_dir=CACHE_DIR):
+    """
+    Municipios de SP como GeoDataFrame (con cod_ibge int de 6 digitos).
+
+    crs:       None (CRS original), EPSG int o 'EPSG:xxxx'
+    tolerance: None (sin simplificar) o tolerancia de simplificacion en metros
+
+    La primera llamada sin cache lee el shapefile una vez y escribe todas
+    las variantes estandar (CRS_LIST x TOLERANCES); las siguientes solo leen
+    el GeoParquet pedido. Sin pyarrow se lee el shapefile directamente.
+    """
+    import geopandas as gpd
+
+    crs = _crs_key(crs)
+    tolerance = tolerance or None
+    digest = source_hash(shp_path, cache_dir)
+    key = (digest, crs, tolerance)
+    if key in _MEMORY_CACHE:
+        return _MEMORY_CACHE[key].copy()
+
+    path = _variant_file(cache_dir, digest, crs, tolerance)
+    try:
+        if not os.path.exists(path):
+            standard = crs in CRS_LIST and tolerance in TOLERANCES
+            build_cache(shp_path, cache_dir,
+                        crs_list=CRS_LIST if standard else [crs],
+                        tolerances=TOLERANCES if standard else [tolerance])
+        gdf = gpd.read_parquet(path)
+    except ImportError:
+        print("  [WARN] pyarrow no instalado: sin cache GeoParquet")
+        gdf = make_variant(read_source(shp_path), crs, tolerance)
+
+    _MEMORY_CACHE[key] = gdf
+    return gdf.copy()
+
+
+def clear_cache():
+    """Vacia la cache en memoria."""
+    _MEMORY_CACHE.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache GeoParquet de municipios de SP")
+    parser.add_argument('--build', action='store_true', help="precalcular todas las variantes")
+    parser.add_argument('--info', action='store_true', help="listar variantes en cache")
+    parser.add_argument('--shp', default=SHP_PATH)
+    args = parser.parse_args()
+
+    if args.build:
+        t0 = time.perf_counter()
+        build_cache(args.shp)
+        print(f"Cache lista en {time.perf_counter() - t0:.1f}s: {CACHE_DIR}")
+    if args.info or not args.build:
+        digest = source_hash(args.shp)
+        print(f"Shapefile: {args.shp} (hash {digest})")
+        for crs in CRS_LIST:
+            for tol in TOLERANCES:
+                path = _variant_file(CACHE_DIR, digest, crs, tol)
+                size = f"{os.path.getsize(path) / 1e6:.1f} MB" if os.path.exists(path) else "-"
+                print(f"  crs={crs or 'native':<7} tol={tol or 0:>5} m  {size}")
+
+
+if __name__ == '__main__':
+    main()
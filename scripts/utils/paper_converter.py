@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+"""
+Servicio de conversion de papers PDF -> Markdown (incremental y en paralelo)
+===========================================================================
+
+Motor comun de convert_papers_to_md.py y watch_papers_daily.py.
+
+- Cada paper se identifica por el SHA-256 de su contenido, guardado en un
+  manifiesto junto a los Markdown (markdown/.papers_manifest.json). Un PDF
+  renombrado no se vuelve a convertir (solo se renombra su .md) y un PDF
+  editado con el mismo nombre si se reconvierte. El hash solo se recalcula
+  si cambian tamano o fecha del archivo.
+- Los PDFs nuevos o modificados se convierten en procesos separados, con
+  timeout por tarea: un PDF que cuelga pymupdf4llm se termina y se reintenta
+  con el metodo basico, sin bloquear al resto.
+- Los PDFs grandes (> LARGE_FILE_MB) se dividen en rangos de CHUNK_PAGES
+  paginas que se convierten en paralelo y se unen en orden.
+- _INDEX.md se genera a partir del manifiesto, sin volver a leer los .md, y
+  solo cuando algo cambio.
+
+Primera ejecucion sobre una carpeta ya convertida: un .md existente con el
+nombre esperado y mas reciente que su PDF se adopta sin reconvertir.
+
+Uso:
+    from paper_converter import convert_papers
+    resumen = convert_papers(PAPERS_DIR, OUTPUT_DIR, n_jobs=4)
+
+    python paper_converter.py --selfcheck
+
+Dependencias:
+    pip install pymupdf pymupdf4llm   (pymupdf4llm opcional)
+
+Autor: Science Team
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+import multiprocessing as mp
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import pymupdf4llm
+except ImportError:
+    pymupdf4llm = None
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+MANIFEST_NAME = ".papers_manifest.json"
+INDEX_NAME = "_INDEX.md"
+MANIFEST_VERSION = 1
+
+LARGE_FILE_MB = 10      # Mas de 10MB = archivo grande -> rangos de paginas
+CHUNK_PAGES = 40        # Paginas por tarea en archivos grandes
+DEFAULT_TIMEOUT = 600   # Segundos por tarea (archivo o rango)
+
+
+# =============================================================================
+# UTILIDADES
+# =============================================================================
+
+def sanitize_filename(filename: str) -> str:
+    """Limpia el nombre del archivo para usarlo como título."""
+    name = Path(filename).stem
+    name = re.sub(r'[^\w\s\-_]', ' ', name)
+    name = re.sub(r'\s+', ' ', name).strip()
+    return name
+
+
+def get_output_filename(pdf_path: Path) -> str:
+    """Genera el nombre del archivo de salida."""
+    return sanitize_filename(Path(pdf_path).name) + ".md"
+
+
+def file_hash(path: Path, block_size: int = 1 << 20) -> str:
+    """SHA-256 del contenido del archivo."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def md_header(pdf_name: str) -> str:
+    """Encabezado con metadata de cada Markdown."""
+    return f"""# {sanitize_filename(pdf_name)}
+
+> **Archivo original**: `{pdf_name}`
+> **Convertido**: {datetime.now().strftime('%Y-%m-%d %H:%M')}
+> **Science Team** - Dr. Adrian David González Chaves
+
+---
+
+"""
+
+
+def load_manifest(output_dir: Path) -> dict:
+    """Lee el manifiesto ({'version', 'papers': {hash: entrada}})."""
+    path = Path(output_dir) / MANIFEST_NAME
+    if path.exists():
+        try:
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+    return {"version": MANIFEST_VERSION, "papers": {}}
+
+
+def save_manifest(output_dir: Path, manifest: dict):
+    """Escritura atomica del manifiesto."""
+    path = Path(output_dir) / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# =============================================================================
+# EXTRACCIÓN (se ejecuta en los procesos hijos)
+# =============================================================================
+
+def extract_text_basic(pdf_path: str, pages=None) -> str:
+    """Extracción básica de texto con PyMuPDF (pages: indices 0-based)."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(pdf_path)
+    text_parts = []
+    for page_num in (pages if pages is not None else range(len(doc))):
+        text = doc[page_num].get_text("text")
+        if text.strip():
+            text_parts.append(f"\n## Página {page_num + 1}\n\n{text}")
+    doc.close()
+    return "\n".join(text_parts)
+
+
+def extract_text_advanced(pdf_path: str, pages=None) -> str:
+    """Extracción avanzada con pymupdf4llm (mejor formato Markdown)."""
+    return pymupdf4llm.to_markdown(pdf_path, pages=pages, show_progress=False)
+
+
+EXTRACTORS = {
+    "basic": extract_text_basic,
+    "advanced": extract_text_advanced,
+}
+
+
+def _worker(conn, pdf_path, method, pages):
+    """Proceso hijo: extrae el texto y lo devuelve por el pipe."""
+    try:
+        try:
+            text = EXTRACTORS[method](pdf_path, pages)
+            used = method
+        except Exception as e:
+            if method == "basic":
+                raise
+            text = extract_text_basic(pdf_path, pages)
+            used = f"basic ({type(e).__name__} en {method})"
+        conn.send(("ok", text, used))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}", method))
+    finally:
+        conn.close()
+
+
+def run_tasks(tasks, n_jobs=None, timeout=DEFAULT_TIMEOUT, log=print):
+    """
+    Ejecuta tareas de extraccion, cada una en su propio proceso, con como
+    maximo n_jobs a la vez. Una tarea que supera `timeout` se termina y se
+    reintenta una vez con el metodo basico.
+
+    tasks: lista de dicts {'id', 'pdf', 'method', 'pages'}.
+    Devuelve {id: (status, texto_o_error, metodo)}.
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    ctx = mp.get_context("spawn")
+    pending = list(tasks)
+    running = {}
+    results = {}
+
+    while pending or running:
+        while pending and len(running) < n_jobs:
+            task = pending.pop(0)
+            recv, send = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_worker, args=(send, task["pdf"], task["method"], task["pages"]),
+                               daemon=True)
+            proc.start()
+            send.close()
+            running[task["id"]] = (task, proc, recv, time.monotonic() + timeout)
+
+        done = []
+        for task_id, (task, proc, recv, deadline) in running.items():
+            if recv.poll():
+                try:
+                    results[task_id] = recv.recv()
+                except EOFError:
+                    results[task_id] = ("error", "el proceso termino sin resultado", task["method"])
+                done.append(task_id)
+            elif not proc.is_alive() and not recv.poll():
+                results[task_id] = ("error", f"el proceso termino (codigo {proc.exitcode})", task["method"])
+                done.append(task_id)
+            elif time.monotonic() > deadline:
+                proc.terminate()
+                if task["method"] != "basic":
+                    log(f"  [TIMEOUT] {Path(task['pdf']).name} ({timeout}s), reintento con metodo basico")
+                    pending.append({**task, "method": "basic"})
+                else:
+                    results[task_id] = ("error", f"timeout ({timeout}s)", task["method"])
+                done.append(task_id)
+
+        for task_id in done:
+            _, proc, recv, _ = running.pop(task_id)
+            recv.close()
+            proc.join(timeout=5)
+        if running and not done:
+            time.sleep(0.05)
+
+    return results
+
+
+# =============================================================================
+# PLAN INCREMENTAL
+# =============================================================================
+
+def scan_papers(papers_dir: Path, manifest: dict, only=None) -> dict:
+    """
+    {nombre_pdf: hash} de los PDFs de la carpeta. Reutiliza el hash del
+    manifiesto si tamano y fecha no cambiaron.
+    """
+    by_name = {e["pdf"]: (h, e) for h, e in manifest["papers"].items()}
+    hashes = {}
+    for pdf in sorted(Path(papers_dir).glob("*.pdf")):
+        if only is not None and pdf.name not in only:
+            continue
+        st = pdf.stat()
+        known = by_name.get(pdf.name)
+        if known and known[1].get("size") == st.st_size and known[1].get("mtime") == st.st_mtime:
+            hashes[pdf.name] = known[0]
+        else:
+            hashes[pdf.name] = file_hash(pdf)
+    return hashes
+
+
+def plan_conversion(papers_dir: Path, output_dir: Path, manifest: dict, force=False,
+                    adopt_existing=False, only=None) -> dict:
+    """
+    Compara la carpeta con el manifiesto.
+
+    Devuelve {'convert': [pdf], 'rename': [(hash, pdf)], 'adopt': [pdf],
+              'unchanged': [pdf], 'duplicates': [pdf], 'removed': [hash], 'hashes'}.
+    """
+    papers = manifest["papers"]
+    hashes = scan_papers(papers_dir, manifest, only)
+    plan = {"convert": [], "rename": [], "adopt": [], "unchanged": [],
+            "duplicates": [], "removed": [], "hashes": hashes}
+    seen = set()
+
+    for name, h in hashes.items():
+        pdf = Path(papers_dir) / name
+        if h in seen:
+            plan["duplicates"].append(pdf)
+            continue
+        seen.add(h)
+        entry = papers.get(h)
+        md_path = Path(output_dir) / get_output_filename(pdf)
+
+        if force:
+            plan["convert"].append(pdf)
+        elif entry and (Path(output_dir) / entry["md"]).exists():
+            if entry["pdf"] == name:
+                plan["unchanged"].append(pdf)
+            else:
+                plan["rename"].append((h, pdf))
+        elif md_path.exists() and (adopt_existing or md_path.stat().st_mtime >= pdf.stat().st_mtime) \
+                and not any(e["pdf"] == name for e in papers.values()):
+            plan["adopt"].append(pdf)
+        else:
+            plan["convert"].append(pdf)
+
+    if only is None:
+        # Un PDF editado conserva el nombre: su hash anterior se reemplaza al convertir
+        plan["removed"] = [h for h, e in papers.items() if h not in seen and e["pdf"] not in hashes]
+    return plan
+
+
+def _page_count(pdf: Path) -> int:
+    import fitz  # PyMuPDF
+    with fitz.open(str(pdf)) as doc:
+        return len(doc)
+
+
+def build_tasks(pdfs, use_advanced=True, chunk_pages=CHUNK_PAGES, large_mb=LARGE_FILE_MB):
+    """Una tarea por PDF, o una por rango de paginas en los PDFs grandes."""
+    method = "advanced" if use_advanced and pymupdf4llm is not None else "basic"
+    tasks, layout = [], {}
+    for pdf in pdfs:
+        size_mb = pdf.stat().st_size / (1024 * 1024)
+        n_pages = _page_count(pdf) if size_mb > large_mb else None
+        if n_pages and n_pages > chunk_pages:
+            ids = []
+            for start in range(0, n_pages, chunk_pages):
+                task_id = f"{pdf.name}#{start}"
+                tasks.append({"id": task_id, "pdf": str(pdf), "method": method,
+                              "pages": list(range(start, min(start + chunk_pages, n_pages)))})
+                ids.append(task_id)
+            layout[pdf.name] = (ids, n_pages)
+        else:
+            tasks.append({"id": pdf.name, "pdf": str(pdf), "method": method, "pages": None})
+            layout[pdf.name] = ([pdf.name], n_pages)
+    return tasks, layout
+
+
+# =============================================================================
+# ÍNDICE
+# =============================================================================
+
+def write_index(output_dir: Path, manifest: dict, generator: str = "paper_converter.py"):
+    """Genera _INDEX.md desde el manifiesto (sin leer los .md)."""
+    entries = sorted(manifest["papers"].values(), key=lambda e: e["md"])
+    if not entries:
+        return None
+
+    lines = [
+        "# Índice de Papers - Science Team",
+        "",
+        "> Generado automáticamente",
+        "> Dr. Adrian David González Chaves",
+        f"> Última actualización: {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+        "",
+        f"## Papers Disponibles ({len(entries)} archivos)",
+        "",
+        "| # | Paper | Archivo |",
+        "|---|-------|---------|",
+    ]
+    for i, entry in enumerate(entries, 1):
+        name = Path(entry["md"]).stem
+        lines.append(f"| {i} | {name[:60]}{'...' if len(name) > 60 else ''} | [{entry['md']}]({entry['md']}) |")
+    lines += ["", "", "---", "", f"*Generado por `{generator}`*", ""]
+
+    index_path = Path(output_dir) / INDEX_NAME
+    index_path.write_text("\n".join(lines), encoding="utf-8")
+    return index_path
+
+
+# =============================================================================
+# SERVICIO
+# =============================================================================
+
+def _rename_md(output_dir: Path, entry: dict, pdf: Path) -> str:
+    """Renombra el .md de un PDF renombrado y actualiza su encabezado."""
+    old_path = Path(output_dir) / entry["md"]
+    new_name = get_output_filename(pdf)
+    text = old_path.read_text(encoding="utf-8")
+    old_title = sanitize_filename(entry["pdf"])
+    text = text.replace(f"# {old_title}\n", f"# {sanitize_filename(pdf.name)}\n", 1)
+    text = text.replace(f"`{entry['pdf']}`", f"`{pdf.name}`", 1)
+    new_path = Path(output_dir) / new_name
+    new_path.write_text(text, encoding="utf-8")
+    if old_path != new_path:
+        old_path.unlink()
+    return new_name
+
+
+def _entry(pdf: Path, md_name: str, method: str, pages=None) -> dict:
+    st = pdf.stat()
+    return {"pdf": pdf.name, "md": md_name, "size": st.st_size, "mtime": st.st_mtime,
+            "pages": pages, "method": method, "converted": datetime.now().isoformat(timespec="seconds")}
+
+
+def convert_papers(papers_dir, output_dir, use_advanced=True, n_jobs=None, timeout=DEFAULT_TIMEOUT,
+                   force=False, adopt_existing=False, only=None, chunk_pages=CHUNK_PAGES,
+                   large_mb=LARGE_FILE_MB, index_generator="paper_converter.py", log=print) -> dict:
+    """
+    Convierte los PDFs nuevos o modificados de papers_dir a output_dir.
+
+    Args:
+        use_advanced: pymupdf4llm si esta instalado (si no, metodo basico)
+        n_jobs: procesos simultaneos (por defecto, nucleos disponibles)
+        timeout: segundos maximos por tarea (archivo o rango de paginas)
+        force: reconvertir todo
+        adopt_existing: aceptar cualquier .md existente sin comparar fechas
+        only: conjunto de nombres de PDF a considerar (modo archivo unico)
+        chunk_pages, large_mb: rangos de paginas para PDFs de mas de large_mb MB
+
+    Returns:
+        dict con listas de nombres .md: converted, renamed, adopted, removed,
+        y errors [(pdf, mensaje)], unchanged (int) y seconds.
+    """
+    papers_dir, output_dir = Path(papers_dir), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+
+    manifest = load_manifest(output_dir)
+    papers = manifest["papers"]
+    plan = plan_conversion(papers_dir, output_dir, manifest, force, adopt_existing, only)
+    hashes = plan["hashes"]
+    summary = {"converted": [], "renamed": [], "adopted": [], "removed": [], "errors": [],
+               "unchanged": len(plan["unchanged"])}
+
+    for pdf in plan["duplicates"]:
+        log(f"  [DUP] {pdf.name}: mismo contenido que otro PDF, se omite")
+
+    for h, pdf in plan["rename"]:
+        new_md = _rename_md(output_dir, papers[h], pdf)
+        log(f"  [REN] {papers[h]['pdf']} -> {pdf.name}")
+        papers[h] = {**papers[h], **_entry(pdf, new_md, papers[h]["method"], papers[h].get("pages")),
+                     "converted": papers[h]["converted"]}
+        summary["renamed"].append(new_md)
+
+    for pdf in plan["adopt"]:
+        md_name = get_output_filename(pdf)
+        papers[hashes[pdf.name]] = _entry(pdf, md_name, "existente")
+        summary["adopted"].append(md_name)
+
+    for h in plan["removed"]:
+        entry = papers.pop(h)
+        log(f"  [DEL] {entry['pdf']} ya no esta en la carpeta (se conserva {entry['md']})")
+        summary["removed"].append(entry["md"])
+
+    if plan["convert"]:
+        tasks, layout = build_tasks(plan["convert"], use_advanced, chunk_pages, large_mb)
+        log(f"Convirtiendo {len(plan['convert'])} PDFs ({len(tasks)} tareas, "
+            f"{n_jobs or os.cpu_count()} procesos, timeout {timeout}s)...")
+        results = run_tasks(tasks, n_jobs, timeout, log)
+
+        for pdf in plan["convert"]:
+            ids, n_pages = layout[pdf.name]
+            parts = [results[i] for i in ids]
+            failed = [p[1] for p in parts if p[0] != "ok"]
+            text = "\n".join(p[1] for p in parts if p[0] == "ok")
+            if failed or not text.strip():
+                message = failed[0] if failed else "PDF vacío o sin texto extraíble"
+                summary["errors"].append((pdf.name, message))
+                log(f"  [ERROR] {pdf.name}: {message}")
+                continue
+
+            md_name = get_output_filename(pdf)
+            (output_dir / md_name).write_text(md_header(pdf.name) + text, encoding="utf-8")
+            # Un PDF editado deja su hash anterior en el manifiesto
+            for old in [k for k, e in papers.items() if e["pdf"] == pdf.name]:
+                del papers[old]
+            methods = sorted({p[2] for p in parts})
+            papers[hashes[pdf.name]] = _entry(pdf, md_name, ", ".join(methods), n_pages)
+            summary["converted"].append(md_name)
+            log(f"  [OK] {md_name}" + (f" ({len(ids)} rangos)" if len(ids) > 1 else ""))
+
+    changed = any(summary[k] for k in ("converted", "renamed", "adopted", "removed"))
+    if changed or not (output_dir / MANIFEST_NAME).exists():
+        save_manifest(output_dir, manifest)
+    if changed or not (output_dir / INDEX_NAME).exists():
+        write_index(output_dir, manifest, index_generator)
+
+    summary["seconds"] = round(time.perf_counter() - t0, 2)
+    return summary
+
+
+# =============================================================================
+# AUTOCOMPROBACIÓN
+# =============================================================================
+
+def _make_pdf(path: Path, pages: int, tag: str):
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"{tag} page {i + 1}\nSome text about dilution effect.")
+    doc.save(str(path))
+    doc.close()
+
+
+def run_selfcheck():
+    """PDFs sinteticos: nuevo, renombrado, editado, grande por rangos, indice."""
+    import shutil
+    import tempfile
+
+    tmp = Path(tempfile.mkdtemp(prefix="papers_selfcheck_"))
+    papers, out = tmp / "papers", tmp / "markdown"
+    papers.mkdir()
+    quiet = lambda *a: None
+    try:
+        _make_pdf(papers / "Smith 2020.pdf", 3, "smith")
+        _make_pdf(papers / "Big book.pdf", 25, "big")
+        _make_pdf(papers / "Jones 2021.pdf", 2, "jones")
+
+        # Rangos de 10 paginas para el "libro" (umbral de tamano a 0 MB)
+        s = convert_papers(papers, out, use_advanced=False, n_jobs=2, chunk_pages=10, large_mb=0,
+                           log=quiet)
+        assert sorted(s["converted"]) == ["Big book.md", "Jones 2021.md", "Smith 2020.md"], s
+        big = (out / "Big book.md").read_text(encoding="utf-8")
+        positions = [big.index(f"## Página {p}\n") for p in range(1, 26)]
+        assert positions == sorted(positions), "rangos fuera de orden"
+        print(f"  [OK] 3 PDFs convertidos (libro en 3 rangos) en {s['seconds']}s")
+
+        s = convert_papers(papers, out, use_advanced=False, log=quiet)
+        assert not s["converted"] and s["unchanged"] == 3, s
+        print("  [OK] Segunda corrida: nada que convertir")
+
+        (papers / "Smith 2020.pdf").rename(papers / "Smith et al 2020.pdf")
+        s = convert_papers(papers, out, use_advanced=False, log=quiet)
+        assert s["renamed"] == ["Smith et al 2020.md"] and not s["converted"], s
+        assert not (out / "Smith 2020.md").exists()
+        assert "`Smith et al 2020.pdf`" in (out / "Smith et al 2020.md").read_text(encoding="utf-8")
+        print("  [OK] PDF renombrado: .md renombrado sin reconvertir")
+
+        time.sleep(0.01)
+        _make_pdf(papers / "Jones 2021.pdf", 4, "jones-v2")
+        s = convert_papers(papers, out, use_advanced=False, log=quiet)
+        assert s["converted"] == ["Jones 2021.md"], s
+        assert "jones-v2 page 4" in (out / "Jones 2021.md").read_text(encoding="utf-8")
+        assert len(load_manifest(out)["papers"]) == 3
+        print("  [OK] PDF editado con el mismo nombre: reconvertido")
+
+        index = (out / INDEX_NAME).read_text(encoding="utf-8")
+        assert "(3 archivos)" in index and "Smith et al 2020.md" in index
+        print("  [OK] _INDEX.md desde el manifiesto")
+
+        # Migracion: carpeta convertida sin manifiesto -> se adopta
+        (out / MANIFEST_NAME).unlink()
+        s = convert_papers(papers, out, use_advanced=False, log=quiet)
+        assert len(s["adopted"]) == 3 and not s["converted"], s
+        print("  [OK] .md existentes adoptados sin reconvertir")
+
+        if pymupdf4llm is not None:
+            s = convert_papers(papers, out, force=True, n_jobs=2, log=quiet)
+            assert len(s["converted"]) == 3 and not s["errors"], s
+            print(f"  [OK] pymupdf4llm: 3 PDFs en {s['seconds']}s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print("Autocomprobación OK")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Servicio de conversion de papers a Markdown")
+    parser.add_argument("--selfcheck", action="store_true", help="prueba con PDFs sinteticos")
+    args = parser.parse_args()
+    if args.selfcheck:
+        run_selfcheck()
+    else:
+        parser.print_help()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Búsqueda de texto completo en los papers convertidos a Markdown
+===============================================================
+
+Índice invertido SQLite FTS5 sobre la carpeta markdown/ generada por
+convert_papers_to_md.py / watch_papers_daily.py. Consultas con ranking BM25
+(título con más peso que el cuerpo), frases exactas y fragmentos con el
+término resaltado.
+
+- La base vive en outputs/cache/papers/ (disco local: SQLite no se lleva bien
+  con carpetas sincronizadas de Google Drive).
+- Actualización incremental: solo se reindexan los .md cuyo tamaño o fecha
+  cambió y se borran los que ya no existen. watch_papers_daily la llama tras
+  cada conversión.
+- Tokenizador unicode61 sin acentos: "polinização" encuentra "polinizacao".
+
+Uso:
+    python paper_search.py update
+    python paper_search.py buscar "dilution effect"            (frase exacta)
+    python paper_search.py buscar "dilution effect" --any      (todos los términos)
+    python paper_search.py buscar 'UAI NEAR(governance, 10)'   (sintaxis FTS5)
+    python paper_search.py benchmark [--docs 300 --words 20000 | --dir markdown/]
+    python paper_search.py --selfcheck
+
+Autor: Science Team
+"""
+
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Configurar encoding para Windows
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+    sys.stderr.reconfigure(encoding='utf-8', errors='replace')
+
+BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
+DB_PATH = os.path.join(BASE_DIR, "outputs", "cache", "papers", "papers_search.db")
+DEFAULT_MD_DIR = Path(r"G:\My Drive\Adrian David\Papers\markdown")
+
+SKIP_FILES = {"_INDEX.md"}
+TITLE_WEIGHT = 10.0
+SNIPPET_TOKENS = 16
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    md    TEXT PRIMARY KEY,
+    size  INTEGER,
+    mtime REAL,
+    rowid_fts INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, body,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+def connect(db_path=DB_PATH):
+    """Abre (y crea si hace falta) la base del índice."""
+    if db_path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA)
+    except sqlite3.OperationalError as e:
+        conn.close()
+        raise RuntimeError(f"SQLite sin soporte FTS5 ({sqlite3.sqlite_version}): {e}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def _read_md(path: Path):
+    """(título, cuerpo) de un .md de paper_converter (encabezado fuera del cuerpo)."""
+    text = path.read_text(encoding="utf-8", errors="replace")
+    title = path.stem
+    first = text.split("\n", 1)[0]
+    if first.startswith("# "):
+        title = first[2:].strip()
+    # El encabezado termina en la primera línea '---'
+    head, sep, body = text.partition("\n---\n")
+    if not sep or len(head) > 2000:
+        body = text
+    return title, body
+
+
+def update_index(md_dir=DEFAULT_MD_DIR, db_path=DB_PATH, log=print) -> dict:
+    """
+    Sincroniza el índice con la carpeta de Markdown.
+
+    Solo lee los .md nuevos o con tamaño/fecha distintos; los que ya no están
+    se eliminan. Devuelve {'added', 'updated', 'removed', 'unchanged', 'seconds'}.
+    """
+    t0 = time.perf_counter()
+    md_dir = Path(md_dir)
+    files = {p.name: p for p in md_dir.glob("*.md") if p.name not in SKIP_FILES}
+
+    conn = connect(db_path)
+    known = {md: (size, mtime, rid) for md, size, mtime, rid
+             in conn.execute("SELECT md, size, mtime, rowid_fts FROM docs")}
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+    with conn:
+        for md in set(known) - set(files):
+            conn.execute("DELETE FROM papers_fts WHERE rowid = ?", (known[md][2],))
+            conn.execute("DELETE FROM docs WHERE md = ?", (md,))
+            stats["removed"] += 1
+
+        for md, path in sorted(files.items()):
+            st = path.stat()
+            old = known.get(md)
+            if old and old[0] == st.st_size and old[1] == st.st_mtime:
+                stats["unchanged"] += 1
+                continue
+            title, body = _read_md(path)
+            if old:
+                conn.execute("DELETE FROM papers_fts WHERE rowid = ?", (old[2],))
+            rid = conn.execute("INSERT INTO papers_fts (title, body) VALUES (?, ?)", (title, body)).lastrowid
+            conn.execute("INSERT OR REPLACE INTO docs (md, size, mtime, rowid_fts) VALUES (?, ?, ?, ?)",
+                         (md, st.st_size, st.st_mtime, rid))
+            stats["updated" if old else "added"] += 1
+
+    if stats["added"] + stats["updated"] + stats["removed"] > 20:
+        conn.execute("INSERT INTO papers_fts(papers_fts) VALUES ('optimize')")
+        conn.commit()
+    conn.close()
+
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    if log:
+        log(f"Índice de búsqueda: +{stats['added']} nuevos, {stats['updated']} actualizados, "
+            f"-{stats['removed']} eliminados, {stats['unchanged']} sin cambios ({stats['seconds']}s)")
+    return stats
+
+
+_FTS_SYNTAX = re.compile(r'["*()^:]|\b(AND|OR|NOT|NEAR)\b')
+
+
+def build_query(query: str, phrase: bool = True) -> str:
+    """
+    Texto del usuario -> expresión MATCH de FTS5.
+
+    Si ya trae sintaxis FTS5 (comillas, AND/OR/NOT/NEAR, *, columnas) se usa
+    tal cual; si no, frase exacta (phrase=True) o todos los términos.
+    """
+    if _FTS_SYNTAX.search(query):
+        return query
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return '""'
+    if phrase:
+        return '"' + " ".join(terms) + '"'
+    return " ".join(f'"{t}"' for t in terms)
+
+
+def search(query: str, limit: int = 10, phrase: bool = True, db_path=DB_PATH, conn=None) -> list:
+    """
+    Papers ordenados por BM25 (más relevante primero).
+
+    Devuelve [{'md', 'title', 'score', 'snippet'}]; el fragmento marca los
+    términos con [ ].
+    """
+    own = conn is None
+    conn = conn or connect(db_path)
+    # Primero el ranking (barato) y luego los fragmentos solo de los `limit` mejores
+    sql = f"""
+        WITH top AS (
+            SELECT rowid, bm25(papers_fts, {TITLE_WEIGHT}, 1.0) AS score
+            FROM papers_fts WHERE papers_fts MATCH :q
+            ORDER BY score LIMIT :limit
+        )
+        SELECT d.md, f.title, top.score,
+               snippet(papers_fts, 1, '[', ']', ' … ', {SNIPPET_TOKENS})
+        FROM top
+        JOIN papers_fts f ON f.rowid = top.rowid
+        JOIN docs d ON d.rowid_fts = top.rowid
+        WHERE papers_fts MATCH :q
+        ORDER BY top.score
+    """
+    try:
+        rows = conn.execute(sql, {"q": build_query(query, phrase), "limit": limit}).fetchall()
+    except sqlite3.OperationalError:
+        # Sintaxis FTS5 inválida: buscar los términos literalmente
+        rows = conn.execute(sql, {"q": build_query(re.sub(r"\W+", " ", query), phrase),
+                                  "limit": limit}).fetchall()
+    finally:
+        if own:
+            conn.close()
+    return [{"md": md, "title": title, "score": round(-score, 3),
+             "snippet": " ".join(snip.split())} for md, title, score, snip in rows]
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def _synthetic_corpus(out_dir: Path, n_docs: int, words: int, seed: int = 42):
+    """Markdown sintéticos con vocabulario tipo Zipf y frases plantadas."""
+    import random
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(20000)]
+    weights = [1 / (i + 1) for i in range(len(vocab))]
+    planted = ["dilution effect", "UAI", "pollination deficit", "urban adaptation index"]
+    for d in range(n_docs):
+        body = rng.choices(vocab, weights, k=words)
+        for phrase in planted:
+            if rng.random() < 0.2:
+                pos = rng.randrange(len(body))
+                body[pos:pos] = phrase.split()
+        (out_dir / f"Paper {d:04d}.md").write_text(
+            f"# Paper {d:04d}\n\n> **Archivo original**: `Paper {d:04d}.pdf`\n\n---\n\n" + " ".join(body),
+            encoding="utf-8")
+
+
+def benchmark(md_dir=None, n_docs=300, words=20000, queries=None, repeat=20):
+    """
+    Tiempo de construcción completa, de actualización incremental (1 .md
+    cambiado) y de consulta (mediana de `repeat` corridas por consulta).
+    Sin md_dir usa un corpus sintético; la base siempre es temporal.
+    """
+    import shutil
+    import tempfile
+
+    tmp = Path(tempfile.mkdtemp(prefix="papers_search_bench_"))
+    try:
+        if md_dir is None:
+            md_dir = tmp / "md"
+            md_dir.mkdir()
+            _synthetic_corpus(md_dir, n_docs, words)
+        md_dir = Path(md_dir)
+        db = str(tmp / "bench.db")
+        files = sorted(p for p in md_dir.glob("*.md") if p.name not in SKIP_FILES)
+        size_mb = sum(p.stat().st_size for p in files) / 1e6
+
+        build = update_index(md_dir, db, log=None)
+        print(f"Corpus: {len(files)} .md, {size_mb:.1f} MB")
+        print(f"Construcción completa: {build['seconds']:.2f}s "
+              f"({size_mb / max(build['seconds'], 1e-9):.1f} MB/s), "
+              f"base {os.path.getsize(db) / 1e6:.1f} MB")
+
+        noop = update_index(md_dir, db, log=None)
+        print(f"Actualización sin cambios: {noop['seconds'] * 1000:.1f} ms")
+
+        if md_dir.parent == tmp:
+            files[0].write_text(files[0].read_text(encoding="utf-8") + "\nnew dilution effect text",
+                                encoding="utf-8")
+            one = update_index(md_dir, db, log=None)
+            print(f"Actualización incremental (1 .md): {one['seconds'] * 1000:.1f} ms")
+
+        queries = queries or ["dilution effect", "UAI", "pollination deficit", "term5 term9"]
+        conn = connect(db)
+        print(f"\n{'Consulta':<28} {'Resultados':>10} {'Mediana ms':>11}")
+        for q in queries:
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                results = search(q, limit=10, conn=conn)
+                times.append((time.perf_counter() - t0) * 1000)
+            print(f"{q:<28} {len(results):>10} {statistics.median(times):>11.2f}")
+        conn.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def run_selfcheck():
+    """Corpus pequeño: ranking, frase exacta, acentos, incremental, borrado."""
+    import tempfile
+    import shutil
+
+    tmp = Path(tempfile.mkdtemp(prefix="papers_search_check_"))
+    try:
+        md, db = tmp / "md", str(tmp / "s.db")
+        md.mkdir()
+        (md / "A.md").write_text("# Dilution effect review\n\n---\n\nThe dilution effect in hosts. "
+                                 "Dilution effect again.", encoding="utf-8")
+        (md / "B.md").write_text("# Other\n\n---\n\nEffect of dilution on UAI and polinização.", encoding="utf-8")
+        (md / "_INDEX.md").write_text("dilution effect", encoding="utf-8")
+        s = update_index(md, db, log=None)
+        assert s["added"] == 2, s
+
+        res = search("dilution effect", db_path=db)
+        assert [r["md"] for r in res] == ["A.md"], res
+        assert "[dilution effect]" in res[0]["snippet"].lower(), res
+        res = search("dilution effect", phrase=False, db_path=db)
+        assert [r["md"] for r in res] == ["A.md", "B.md"], res
+        assert [r["md"] for r in search("polinizacao", db_path=db)] == ["B.md"]
+        assert [r["md"] for r in search("uai", db_path=db)] == ["B.md"]
+        assert search("(broken", db_path=db) == []
+        print("  [OK] Ranking BM25, frase exacta, acentos y sintaxis inválida")
+
+        assert update_index(md, db, log=None)["unchanged"] == 2
+        time.sleep(0.01)
+        (md / "B.md").write_text("# Other\n\n---\n\nNothing relevant now.", encoding="utf-8")
+        (md / "A.md").unlink()
+        s = update_index(md, db, log=None)
+        assert (s["updated"], s["removed"]) == (1, 1), s
+        assert search("dilution", db_path=db) == []
+        print("  [OK] Actualización incremental y borrado")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print("Autocomprobación OK")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Búsqueda de texto completo en los papers")
+    parser.add_argument("--db", default=DB_PATH, help="base SQLite del índice")
+    parser.add_argument("--selfcheck", action="store_true", help="prueba con un corpus mínimo")
+    sub = parser.add_subparsers(dest="cmd")
+
+    p = sub.add_parser("update", help="actualizar el índice con la carpeta de Markdown")
+    p.add_argument("--dir", default=str(DEFAULT_MD_DIR), help="carpeta con los .md")
+
+    p = sub.add_parser("buscar", help="buscar en el índice")
+    p.add_argument("query")
+    p.add_argument("-n", "--limit", type=int, default=10)
+    p.add_argument("--any", action="store_true", help="todos los términos, en cualquier orden")
+
+    p = sub.add_parser("benchmark", help="tiempos de construcción y de consulta")
+    p.add_argument("--dir", default=None, help="corpus real (por defecto, sintético)")
+    p.add_argument("--docs", type=int, default=300)
+    p.add_argument("--words", type=int, default=20000)
+
+    args = parser.parse_args()
+
+    if args.selfcheck:
+        run_selfcheck()
+    elif args.cmd == "update":
+        update_index(args.dir, args.db)
+    elif args.cmd == "buscar":
+        t0 = time.perf_counter()
+        results = search(args.query, args.limit, phrase=not args.any, db_path=args.db)
+        ms = (time.perf_counter() - t0) * 1000
+        for i, r in enumerate(results, 1):
+            print(f"{i:>2}. {r['title']}  ({r['score']})")
+            print(f"    {r['md']}")
+            print(f"    {r['snippet']}\n")
+        print(f"{len(results)} resultados en {ms:.1f} ms")
+    elif args.cmd == "benchmark":
+        benchmark(args.dir, args.docs, args.words)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
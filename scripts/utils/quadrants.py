@@ -0,0 +1,34 @@
+"""
+Clasificacion por cuadrantes / bivariada (motor compartido con la API del workshop)
+==================================================================================
+El motor vive en terrarisk-workshop/backend/core/quadrants.py para que la
+imagen Docker del backend sea autocontenida; este modulo lo expone a los
+scripts de analisis y visualizacion con el patron habitual de utils:
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+    from quadrants import classify
+
+    res = classify(df, [{'name': 'gob_vuln', 'var_x': 'idx_gobernanza_100',
+                         'var_y': 'idx_vulnerabilidad', 'high_x_good': True,
+                         'high_y_good': False, 'scheme': 'dashboard'}])
+    df['cuadrante'] = res['quadrants']['gob_vuln']
+
+Autor: Science Team
+"""
+
+import importlib.util
+import os
+
+_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..",
+                       "terrarisk-workshop", "backend", "core", "quadrants.py")
+
+_spec = importlib.util.spec_from_file_location("terrarisk_quadrants", _ENGINE)
+_engine = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_engine)
+
+QUADRANT_SCHEMES = _engine.QUADRANT_SCHEMES
+METHODS = _engine.METHODS
+dataset_hash = _engine.dataset_hash
+split_classes = _engine.split_classes
+classify = _engine.classify
+clear_cache = _engine.clear_cache
@@ -0,0 +1,675 @@
+#!/usr/bin/env python
+"""
+Orquestador del pipeline datos -> analisis -> visualizacion -> presentaciones
+==============================================================================
+Cada etapa declara sus archivos de entrada y salida. El orquestador:
+
+- Calcula una huella (SHA-256) con el codigo del script (y de los modulos
+  locales que importa, p. ej. moderation_scan o geometry_cache; una etapa
+  puede sumar archivos con 'code': [...]) + el contenido de sus entradas.
+  Si la huella coincide con la ultima ejecucion exitosa y todas las salidas
+  existen, la etapa se salta.
+- Deduce las dependencias entre etapas a partir de entradas/salidas (DAG).
+- Ejecuta en paralelo las etapas independientes (un proceso por script).
+  Una etapa que termina sin reescribir sus salidas declaradas se marca como
+  fallida (salvo 'keeps_outputs': True en scripts con cache propio).
+- Escribe un reporte de tiempos por etapa (CSV).
+
+Como la huella de una etapa se calcula recien cuando sus dependencias
+terminaron, un cambio de una linea en un CSV solo re-ejecuta las etapas
+aguas abajo que efectivamente leen ese archivo (y solo si la salida
+intermedia cambio).
+
+Uso:
+    python scripts/utils/run_pipeline.py                  # Ejecutar todo lo desactualizado
+    python scripts/utils/run_pipeline.py --dry-run        # Solo mostrar que se ejecutaria
+    python scripts/utils/run_pipeline.py --jobs 4         # Etapas en paralelo
+    python scripts/utils/run_pipeline.py --only h2 h3     # Solo esas etapas (+ sus dependencias)
+    python scripts/utils/run_pipeline.py --force fire     # Forzar re-ejecucion de una etapa
+    python scripts/utils/run_pipeline.py --list           # Listar etapas y dependencias
+
+Autor: Science Team
+"""
+
+import argparse
+import ast
+import csv
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from glob import glob
+from pathlib import Path
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+# Datos crudos fuera del repositorio (Google Drive)
+DATA_RAW_EXTERNAL = "G:/My Drive/Adrian David/Datos/to check health data + prompts for new data"
+
+PIPELINE_DIR = PROJECT_ROOT / "outputs" / "pipeline"
+STATE_FILE = PIPELINE_DIR / "pipeline_state.json"
+REPORT_FILE = PIPELINE_DIR / "pipeline_timing.csv"
+
+DATASET = "outputs/dataset/municipios_integrado.csv"
+
+# Tolerancia (s) al comparar mtimes de salidas con el inicio de la etapa
+# (resolucion de mtime de algunos sistemas de archivos)
+MTIME_SLACK = 2.0
+
+# Etapas del pipeline. Las rutas relativas son respecto a PROJECT_ROOT;
+# se aceptan comodines (glob) y rutas absolutas.
+STAGES = [
+    # --- datos ---
+    {
+        'name': 'fire',
+        'script': 'scripts/datos/calculate_fire_indicators.py',
+        'inputs': [f'{DATA_RAW_EXTERNAL}/bdqueimadas_*.csv',
+                   'data/processed/municipios_regioes_SP.csv'],
+        'outputs': ['data/processed/fire_indicators_SP_2010_2019.csv',
+                    'data/processed/fire_annual_SP_2010_2019.csv'],
+    },
+    {
+        # SIH + SIM en streaming (reemplaza calculate_heat_health_indicators.R)
+        'name': 'heat_health',
+        'script': 'scripts/datos/dbc_stream.py',
+        'inputs': ['data/raw/datasus/sih/*.dbc',
+                   'data/raw/datasus/sim/*.dbc',
+                   'data/processed/populacao_SP_2010_2019.csv',
+                   'data/processed/municipios_regioes_SP.csv'],
+        'outputs': ['data/processed/health_heat_annual_SP_2010_2019.csv',
+                    'data/processed/health_heat_indicators_SP_2010_2019.csv'],
+    },
+    {
+        # Motor comun: diarrea, vectoriales, salud-calor y tendencia de focos
+        'name': 'incidence',
+        'script': 'scripts/datos/incidence_indicators.py',
+        'inputs': [f'{DATA_RAW_EXTERNAL}/health_sp_Ju.csv',
+                   'data/processed/health_casos_provaveis_SP_2010_2019_regioes.csv',
+                   'data/processed/health_heat_annual_SP_2010_2019.csv',
+                   'data/processed/fire_annual_SP_2010_2019.csv',
+                   'data/processed/populacao_SP_2010_2019.csv',
+                   'data/processed/municipios_regioes_SP.csv'],
+        'outputs': ['data/processed/diarrhea_indicators_SP_2010_2019.csv',
+                    'data/processed/diarrhea_annual_SP_2010_2019.csv',
+                    'data/processed/vector_borne_incidence_indicators_SP_2010_2019.csv',
+                    'data/processed/health_heat_incidence_indicators_SP_2010_2019.csv',
+                    'data/processed/fire_trend_indicators_SP_2010_2019.csv'],
+    },
+    {
+        # Actualiza el dataset integrado en el mismo archivo (solo las
+        # fuentes que cambiaron; ver SOURCES en integrated_dataset.py). Si
+        # solo cambio el codigo puede no reescribir nada.
+        'name': 'integrated',
+        'keeps_outputs': True,
+        'script': 'scripts/datos/integrated_dataset.py',
+        'inputs': [DATASET,
+                   'data/processed/fire_indicators_SP_2010_2019.csv',
+                   'data/processed/health_heat_indicators_SP_2010_2019.csv',
+                   'data/processed/diarrhea_indicators_SP_2010_2019.csv',
+                   'data/processed/heat_stress_xavier_sp_2010_2019.csv',
+                   'data/processed/modis_lst_sp_2010_2019.csv'],
+        'outputs': [DATASET,
+                    'outputs/dataset/municipios_integrado.parquet',
+                    'outputs/dataset/municipios_integrado_lineage.json'],
+    },
+    # --- analisis ---
+    {
+        'name': 'h1_sem',
+        'script': 'scripts/analisis/analisis_h1_nexus_sem.py',
+        'inputs': [DATASET],
+        'outputs': ['outputs/modelos/h1_1_correlations.csv',
+                    'outputs/modelos/h1_2_mediation.csv',
+                    'outputs/modelos/h1_3_moderation.csv',
+                    'outputs/modelos/h1_4_sem_paths.csv'],
+    },
+    {
+        'name': 'h1_model_selection',
+        'script': 'scripts/analisis/analisis_h1_model_selection.py',
+        'inputs': [DATASET],
+        'outputs': ['outputs/modelos/h1_model_selection_all.csv',
+                    'outputs/modelos/h1_model_selection_best.csv',
+                    'outputs/modelos/h1_governance_all_dimensions.csv'],
+    },
+    {
+        'name': 'h1_gobernanza',
+        'script': 'scripts/analisis/analisis_h1_gobernanza_predictors.py',
+        'inputs': [DATASET],
+        'outputs': ['outputs/h1_gobernanza/h1_all_models.csv',
+                    'outputs/h1_gobernanza/h1_best_by_dimension.csv'],
+    },
+    {
+        'name': 'h2',
+        'script': 'scripts/analisis/analisis_h2_vulnerabilidad_interaccion.py',
+        'inputs': [DATASET],
+        'outputs': ['outputs/h2_vulnerabilidad/h2_interactions.csv'],
+    },
+    {
+        'name': 'h3',
+        'script': 'scripts/analisis/analisis_h3_clima_salud_interaccion.py',
+        'inputs': [DATASET],
+        'outputs': ['outputs/h3_clima_salud/h3_interactions.csv',
+                    'outputs/h3_clima_salud/h3_theory_pairs.csv'],
+    },
+    {
+        'name': 'h3_heat',
+        'script': 'scripts/analisis/analisis_h3_heat_stress_v2.py',
+        'inputs': [DATASET],
+        'outputs': ['outputs/h3_1_correlaciones.csv',
+                    'outputs/h3_2_mediacion_serial.csv',
+                    'outputs/h3_3_moderacion.csv',
+                    'outputs/h3_4_gobernanza_paths.csv'],
+    },
+    {
+        'name': 'h4',
+        'script': 'scripts/analisis/analisis_h4_salud_predictors.py',
+        'inputs': [DATASET],
+        'outputs': ['outputs/h4_salud/h4_all_models.csv',
+                    'outputs/h4_salud/h4_best_predictors.csv'],
+    },
+    {
+        'name': 'h5',
+        'script': 'scripts/analisis/analisis_h5_clima_predictors.py',
+        'inputs': [DATASET],
+        'outputs': ['outputs/h5_clima/h5_all_models.csv',
+                    'outputs/h5_clima/h5_best_predictors.csv',
+                    'outputs/h5_clima/h5_interactions.csv'],
+    },
+    {
+        'name': 'h6',
+        'script': 'scripts/visualizacion/sintesis_h6_metadata.py',
+        'inputs': [DATASET],
+        'outputs': ['outputs/h6_sintesis/h6_variable_table.csv'],
+    },
+    # --- visualizacion ---
+    {
+        'name': 'h1_figuras',
+        'keeps_outputs': True,  # cache propio: salta figuras sin cambios
+        'script': 'scripts/visualizacion/sintesis_h1_figuras_mapas.py',
+        'inputs': [DATASET,
+                   'outputs/modelos/h1_1_correlations.csv',
+                   'outputs/modelos/h1_2_mediation.csv',
+                   'outputs/modelos/h1_3_moderation.csv',
+                   'outputs/modelos/h1_4_sem_paths.csv',
+                   'data/geo/ibge_sp/SP_Municipios_2022.*'],
+        'outputs': ['outputs/figures/h1_FIG1_causal_panel.png',
+                    'outputs/figures/h1_FIG2_heatmap_biodiv_health.png',
+                    'outputs/figures/h1_FIG3_forest_plot_sem.png'],
+    },
+    {
+        'name': 'cuadrantes',
+        'script': 'scripts/analisis/analisis_cuadrantes_4combinaciones.py',
+        'inputs': [DATASET, 'data/geo/ibge_sp/SP_Municipios_2022.*'],
+        'outputs': ['outputs/clasificacion/analisis_cuadrantes_4combinaciones.csv'],
+    },
+    {
+        'name': 'workshop_layers',
+        'keeps_outputs': True,  # cache propio: salta figuras sin cambios
+        'script': 'scripts/visualizacion/create_workshop_layers.py',
+        'inputs': [DATASET, 'data/geo/ibge_sp/SP_Municipios_2022.*'],
+        'outputs': ['outputs/figures/workshop_layers'],
+    },
+    {
+        'name': 'bivariate_maps',
+        'keeps_outputs': True,  # cache propio: salta figuras sin cambios
+        'script': 'scripts/visualizacion/create_bivariate_maps_EN.py',
+        'inputs': [DATASET, 'data/geo/ibge_sp/SP_Municipios_2022.*'],
+        'outputs': ['outputs/figures/workshop_layers/bivariate_Governance_vs_Vulnerability_EN.png',
+                    'outputs/figures/workshop_layers/bivariate_ClimateRisk_vs_Vulnerability_EN.png'],
+    },
+    # --- presentaciones ---
+    {
+        'name': 'deck_day2',
+        'keeps_outputs': True,  # deck_builder salta si las fuentes no cambiaron
+        'script': 'presentaciones/02_02/create_workshop_pptx_v2.py',
+        'inputs': ['outputs/figures/h1_*.png'],
+        'outputs': ['presentaciones/02_02/Workshop_SEMIL_USP_Day2_v2_con_mapas.pptx'],
+    },
+]
+
+
+# ============================================================
+# HASHING
+# ============================================================
+
+def resolve(pattern):
+    """Devuelve la ruta absoluta (como str) de un patron relativo a PROJECT_ROOT."""
+    path = Path(pattern)
+    if not path.is_absolute():
+        path = PROJECT_ROOT / path
+    return str(path)
+
+
+def expand_inputs(patterns):
+    """Expande comodines y directorios a una lista ordenada de archivos existentes."""
+    files = set()
+    for pattern in patterns:
+        full = resolve(pattern)
+        for match in glob(full):
+            if os.path.isdir(match):
+                for root, _, names in os.walk(match):
+                    files.update(os.path.join(root, n) for n in names)
+            else:
+                files.add(match)
+    return sorted(files)
+
+
+def hash_file(path, memo):
+    """
+    SHA-256 de un archivo, leido por bloques.
+    `memo` evita re-hashear archivos grandes cuyo tamano y mtime no cambiaron.
+    """
+    st = os.stat(path)
+    key = f"{st.st_size}:{st.st_mtime_ns}"
+    cached = memo.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    memo[path] = (key, digest)
+    return digest
+
+
+def _search_dirs(tree, script_dir):
+    """
+    Carpetas donde el script busca modulos: la suya y las que agrega con
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "utils")).
+    """
+    dirs = [script_dir]
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr == 'insert' and ast.unparse(node.func.value) == 'sys.path'
+                and len(node.args) == 2):
+            parts = [n.value for n in ast.walk(node.args[1])
+                     if isinstance(n, ast.Constant) and isinstance(n.value, str)]
+            path = os.path.normpath(os.path.join(script_dir, *parts))
+            if path not in dirs:
+                dirs.append(path)
+    return dirs
+
+
+def code_files(script, memo=None):
+    """
+    Script + modulos locales que importa (transitivamente), p. ej.
+    moderation_scan, sem_runner o geometry_cache. Solo se siguen imports que
+    resuelven a un .py en la carpeta del script o en las que agrega a sys.path.
+    """
+    memo = {} if memo is None else memo
+    if script in memo:
+        return memo[script]
+    memo[script] = [script]  # corta ciclos
+    files = {script}
+    if script.endswith('.py') and os.path.exists(script):
+        with open(script, encoding='utf-8', errors='replace') as f:
+            try:
+                tree = ast.parse(f.read())
+            except SyntaxError:
+                tree = None
+        if tree is not None:
+            names = set()
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Import):
+                    names.update(a.name.split('.')[0] for a in node.names)
+                elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                    names.add(node.module.split('.')[0])
+            dirs = _search_dirs(tree, os.path.dirname(script))
+            for name in names:
+                for d in dirs:
+                    path = os.path.join(d, f"{name}.py")
+                    if os.path.exists(path):
+                        files.update(code_files(path, memo))
+                        break
+    memo[script] = sorted(files)
+    return memo[script]
+
+
+def stage_fingerprint(stage, memo):
+    """Huella de la etapa: codigo del script y sus modulos locales + contenido de las entradas."""
+    own_outputs = {resolve(p) for p in stage['outputs']}
+    h = hashlib.sha256()
+    script = resolve(stage['script'])
+    code = code_files(script) + [resolve(p) for p in stage.get('code', [])]
+    for path in code:
+        rel = os.path.relpath(path, PROJECT_ROOT)
+        h.update(f"{rel}\0{hash_file(path, memo)}\n".encode())
+    for path in expand_inputs(stage['inputs']):
+        # Las etapas que reescriben su propia entrada (in-place) no pueden
+        # incluirla en la huella: cambiaria en cada ejecucion.
+        if path in own_outputs:
+            continue
+        rel = os.path.relpath(path, PROJECT_ROOT)
+        h.update(f"{rel}\0{hash_file(path, memo)}\n".encode())
+    return h.hexdigest()
+
+
+def outputs_exist(stage):
+    return all(glob(resolve(p)) for p in stage['outputs'])
+
+
+# ============================================================
+# DAG
+# ============================================================
+
+def build_dependencies(stages):
+    """
+    Deduce dependencias: una etapa depende de las que producen alguna de sus
+    entradas. Devuelve {nombre: set(nombres de dependencias)}.
+    """
+    producers = {}
+    for stage in stages:
+        for out in stage['outputs']:
+            producers[resolve(out)] = stage['name']
+
+    deps = {}
+    for stage in stages:
+        stage_deps = set()
+        for pattern in stage['inputs']:
+            full = resolve(pattern)
+            for out_path, producer in producers.items():
+                if producer == stage['name']:
+                    continue
+                if (out_path == full
+                        or out_path.startswith(full.rstrip('/\\') + os.sep)
+                        or Path(out_path).match(full)):
+                    stage_deps.add(producer)
+        deps[stage['name']] = stage_deps
+
+    check_acyclic(deps)
+    return deps
+
+
+def check_acyclic(deps):
+    visiting, done = set(), set()
+
+    def visit(name, path):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Ciclo en el pipeline: {' -> '.join(path + [name])}")
+        visiting.add(name)
+        for dep in deps[name]:
+            visit(dep, path + [name])
+        visiting.discard(name)
+        done.add(name)
+
+    for name in deps:
+        visit(name, [])
+
+
+def select_stages(deps, only):
+    """Etapas pedidas con --only mas todas sus dependencias (transitivas)."""
+    if not only:
+        return set(deps)
+    unknown = set(only) - set(deps)
+    if unknown:
+        raise ValueError(f"Etapas desconocidas: {', '.join(sorted(unknown))}")
+    selected, stack = set(), list(only)
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(deps[name])
+    return selected
+
+
+# ============================================================
+# STATE
+# ============================================================
+
+def load_state():
+    if STATE_FILE.exists():
+        with open(STATE_FILE, encoding='utf-8') as f:
+            state = json.load(f)
+    else:
+        state = {}
+    state.setdefault('stages', {})
+    state.setdefault('hash_memo', {})
+    return state
+
+
+def save_state(state):
+    PIPELINE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, STATE_FILE)
+
+
+# ============================================================
+# EXECUTION
+# ============================================================
+
+def stale_outputs(stage, since):
+    """
+    Salidas declaradas que no se escribieron desde `since` (time.time()).
+    Para un directorio basta con que se haya escrito algun archivo dentro.
+    """
+    stale = []
+    for pattern in stage['outputs']:
+        files = expand_inputs([pattern])
+        if not any(os.stat(f).st_mtime >= since - MTIME_SLACK for f in files):
+            stale.append(pattern)
+    return stale
+
+
+def run_stage(stage):
+    """
+    Ejecuta el script de una etapa en un proceso aparte. Devuelve (ok, segundos, log).
+
+    La etapa falla si el script termina con error o si no reescribio alguna
+    de sus salidas declaradas (salvo 'keeps_outputs': True, para scripts
+    incrementales que pueden dejarlas intactas si no hay nada que cambiar).
+    """
+    since = time.time()
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, resolve(stage['script'])],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+    )
+    elapsed = time.perf_counter() - start
+    ok, log = proc.returncode == 0, proc.stdout + proc.stderr
+    if ok and not stage.get('keeps_outputs'):
+        stale = stale_outputs(stage, since)
+        if stale:
+            ok = False
+            log += f"\n[pipeline] Salidas declaradas no escritas en esta ejecucion: {', '.join(stale)}\n"
+    return ok, elapsed, log
+
+
+def write_log(name, log):
+    log_dir = PIPELINE_DIR / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    with open(log_dir / f"{name}.log", 'w', encoding='utf-8') as f:
+        f.write(log)
+
+
+def run_pipeline(stages=STAGES, jobs=None, only=None, force=(), dry_run=False):
+    """
+    Ejecuta el pipeline. Devuelve la lista de registros de tiempo por etapa.
+
+    Cada registro: stage, status (run | skipped | failed | blocked | would_run),
+    seconds, fingerprint, started.
+    """
+    by_name = {s['name']: s for s in stages}
+    deps = build_dependencies(stages)
+    selected = select_stages(deps, only)
+    force = set(force)
+    jobs = jobs or min(4, os.cpu_count() or 1)
+
+    state = load_state()
+    memo = {k: tuple(v) for k, v in state['hash_memo'].items()}
+    records = {}
+    pending = {name for name in deps if name in selected}
+    running = {}
+
+    def ready(name):
+        return all(d in records or d not in selected for d in deps[name])
+
+    def blocked(name):
+        return any(records.get(d, {}).get('status') in ('failed', 'blocked') for d in deps[name])
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            # Despachar todas las etapas cuyas dependencias terminaron
+            for name in sorted(n for n in pending if ready(n)):
+                pending.discard(name)
+                stage = by_name[name]
+                started = datetime.now().isoformat(timespec='seconds')
+
+                if blocked(name):
+                    records[name] = {'stage': name, 'status': 'blocked', 'seconds': 0.0,
+                                     'fingerprint': '', 'started': started}
+                    print(f"  [BLOCKED] {name}")
+                    continue
+
+                t0 = time.perf_counter()
+                fingerprint = stage_fingerprint(stage, memo)
+                hash_seconds = time.perf_counter() - t0
+                previous = state['stages'].get(name, {}).get('fingerprint')
+
+                if name not in force and previous == fingerprint and outputs_exist(stage):
+                    records[name] = {'stage': name, 'status': 'skipped',
+                                     'seconds': round(hash_seconds, 3),
+                                     'fingerprint': fingerprint, 'started': started}
+                    print(f"  [SKIP]    {name} (al dia)")
+                    continue
+
+                if dry_run:
+                    # En modo dry-run se asume que la etapa cambiaria sus salidas
+                    records[name] = {'stage': name, 'status': 'would_run', 'seconds': 0.0,
+                                     'fingerprint': fingerprint, 'started': started}
+                    print(f"  [RUN?]    {name}")
+                    continue
+
+                print(f"  [RUN]     {name} -> {stage['script']}")
+                future = pool.submit(run_stage, stage)
+                running[future] = (name, fingerprint, started)
+
+            if not running:
+                if pending and not any(ready(n) for n in pending):
+                    raise RuntimeError(f"Etapas sin poder ejecutarse: {sorted(pending)}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, fingerprint, started = running.pop(future)
+                ok, elapsed, log = future.result()
+                write_log(name, log)
+                status = 'run' if ok else 'failed'
+                records[name] = {'stage': name, 'status': status,
+                                 'seconds': round(elapsed, 3),
+                                 'fingerprint': fingerprint, 'started': started}
+                print(f"  [{'OK' if ok else 'FAIL':7s}] {name} ({elapsed:.1f}s)")
+                if ok:
+                    state['stages'][name] = {'fingerprint': fingerprint,
+                                             'finished': datetime.now().isoformat(timespec='seconds'),
+                                             'seconds': round(elapsed, 3)}
+                    state['hash_memo'] = memo
+                    save_state(state)
+
+    state['hash_memo'] = memo
+    if not dry_run:
+        save_state(state)
+        write_report(list(records.values()))
+    return list(records.values())
+
+
+def write_report(records):
+    PIPELINE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(REPORT_FILE, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['stage', 'status', 'seconds', 'fingerprint', 'started'])
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def print_stages(stages=STAGES):
+    deps = build_dependencies(stages)
+    for stage in stages:
+        after = ', '.join(sorted(deps[stage['name']])) or '-'
+        print(f"  {stage['name']:20s} {stage['script']}")
+        print(f"  {'':20s} depende de: {after}")
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ejecuta el pipeline del proyecto saltando las etapas al dia"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=None,
+        help="Etapas en paralelo (default: min(4, CPUs))"
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        help="Ejecutar solo estas etapas (y sus dependencias)"
+    )
+    parser.add_argument(
+        "--force", "-f",
+        nargs="+",
+        default=[],
+        help="Forzar la re-ejecucion de estas etapas"
+    )
+    parser.add_argument(
+        "--dry-run", "-n",
+        action="store_true",
+        help="Mostrar que etapas se ejecutarian, sin ejecutarlas"
+    )
+    parser.add_argument(
+        "--list", "-l",
+        action="store_true",
+        help="Listar las etapas y sus dependencias"
+    )
+    args = parser.parse_args()
+
+    if args.list:
+        print_stages()
+        return
+
+    print("=" * 70)
+    print("PIPELINE SCIENCE TEAM")
+    print(f"Fecha: {datetime.now()}")
+    print("=" * 70)
+
+    t0 = time.perf_counter()
+    records = run_pipeline(jobs=args.jobs, only=args.only, force=args.force,
+                           dry_run=args.dry_run)
+    total = time.perf_counter() - t0
+
+    print("\n" + "=" * 70)
+    print("RESUMEN")
+    print("=" * 70)
+    for status in ('run', 'skipped', 'would_run', 'failed', 'blocked'):
+        n = sum(r['status'] == status for r in records)
+        if n:
+            print(f"  {status:10s}: {n}")
+    print(f"  Tiempo total: {total:.1f}s")
+    if not args.dry_run:
+        print(f"  Reporte de tiempos: {REPORT_FILE}")
+
+    if any(r['status'] == 'failed' for r in records):
+        print(f"  Logs de error en: {PIPELINE_DIR / 'logs'}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,15 @@ Uso desde línea de comandos:
     python transcribe_audio.py "ruta/al/audio.ogg"
     python transcribe_audio.py "ruta/al/audio.mp3" --model medium
     python transcribe_audio.py "ruta/al/audio.wav" --language en
+    python transcribe_audio.py grabaciones/*.m4a --jobs 4 --srt   # lote
+
+Grabaciones largas: el audio se corta en silencios en bloques de ~5 min con
+1 s de solapamiento, los bloques se transcriben en procesos paralelos (cada
+proceso carga el modelo una sola vez: el pool se reutiliza en modo lote y
+entre llamadas a transcribe_audio) y los tiempos se vuelven a unir. Cada
+bloque terminado queda en outputs/cache/transcribe/, así que si el proceso
+se interrumpe se retoma desde el último bloque. Al final se informa el
+factor de tiempo real (RTF = tiempo de proceso / duración).
 
 Uso como módulo:
     from transcribe_audio import transcribe_audio
@@ -26,18 +35,263 @@ Requisitos:
 """
 
 import argparse
+import atexit
+import hashlib
+import json
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
+
 # Agregar ffmpeg al PATH (configuración específica para esta máquina)
 ffmpeg_path = r"C:\Users\arlex\AppData\Local\Microsoft\WinGet\Packages\Gyan.FFmpeg_Microsoft.Winget.Source_8wekyb3d8bbwe\ffmpeg-8.0.1-full_build\bin"
 if os.path.exists(ffmpeg_path):
     os.environ["PATH"] = ffmpeg_path + os.pathsep + os.environ.get("PATH", "")
 
+BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
+CHECKPOINT_DIR = os.path.join(BASE_DIR, "outputs", "cache", "transcribe")
+
+SAMPLE_RATE = 16000      # Whisper trabaja a 16 kHz mono
+CHUNK_S = 300            # Duración objetivo de cada bloque
+SEARCH_S = 30            # Ventana (+/-) para buscar el silencio alrededor del corte
+OVERLAP_S = 1.0          # Solapamiento a cada lado del corte
+FRAME_S = 0.03           # Tramas para la energía
+AUDIO_EXTENSIONS = {".ogg", ".mp3", ".wav", ".m4a", ".opus", ".flac", ".mp4", ".webm", ".aac"}
+
+
+# =============================================================================
+# CORTES EN SILENCIOS Y UNIÓN DE SEGMENTOS
+# =============================================================================
+
+def find_cuts(audio: np.ndarray, sr: int = SAMPLE_RATE, chunk_s: float = CHUNK_S,
+              search_s: float = SEARCH_S) -> list:
+    """
+    Posiciones de corte (muestras), de 0 a len(audio). Cada corte se pone en
+    el tramo más silencioso (energía suavizada ~0.5 s) a +/- search_s del
+    objetivo de chunk_s segundos. La ventana se limita a la mitad del paso,
+    así cada bloque dura al menos chunk_s / 2 y cada corte avanza.
+    """
+    n = len(audio)
+    frame = int(sr * FRAME_S)
+    n_frames = n // frame
+    if n_frames == 0 or n <= sr * chunk_s * 1.5:
+        return [0, n]
+
+    rms = np.sqrt(np.mean(audio[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    width = max(1, int(0.5 / FRAME_S))
+    smooth = np.convolve(rms, np.ones(width) / width, mode="same")
+
+    cuts = [0]
+    step = max(int(chunk_s / FRAME_S), 2)
+    search = min(int(search_s / FRAME_S), step // 2)
+    while n - cuts[-1] > sr * chunk_s * 1.5:
+        last = cuts[-1] // frame
+        target = last + step
+        lo, hi = max(target - search, last + 1), min(target + search, n_frames)
+        if hi <= lo:
+            break
+        cut = int(lo + np.argmin(smooth[lo:hi])) * frame
+        if cut <= cuts[-1]:
+            break
+        cuts.append(cut)
+    cuts.append(n)
+    return cuts
+
+
+def make_chunks(cuts: list, n: int, sr: int = SAMPLE_RATE, overlap_s: float = OVERLAP_S) -> list:
+    """Bloques con su zona propia (core) y la zona transcrita con solapamiento (span)."""
+    ov = int(overlap_s * sr)
+    return [{"i": i, "core": (a, b), "span": (max(0, a - ov), min(n, b + ov))}
+            for i, (a, b) in enumerate(zip(cuts[:-1], cuts[1:]))]
+
+
+def stitch(chunks: list, results: dict, sr: int = SAMPLE_RATE) -> list:
+    """
+    Une los segmentos (tiempos ya absolutos) de todos los bloques. En el
+    solapamiento se queda el segmento cuyo punto medio cae en la zona propia
+    del bloque, así cada frase aparece una sola vez.
+    """
+    segments = []
+    for chunk in chunks:
+        a, b = chunk["core"][0] / sr, chunk["core"][1] / sr
+        last = chunk["i"] == len(chunks) - 1
+        for seg in results[chunk["i"]]:
+            mid = (seg["start"] + seg["end"]) / 2
+            if a <= mid < b or (last and mid >= a):
+                segments.append(seg)
+    return sorted(segments, key=lambda s: s["start"])
+
+
+# =============================================================================
+# PROCESOS DE TRANSCRIPCIÓN (un modelo por proceso)
+# =============================================================================
+
+_MODEL = None
+_MODEL_NAME = None
+_POOLS = {}  # (modelo, procesos) -> pool compartido entre llamadas
+
+
+def _init_worker(model_name: str, threads: int = None):
+    """Carga el modelo una vez por proceso."""
+    global _MODEL, _MODEL_NAME
+    import whisper
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    if _MODEL is None or _MODEL_NAME != model_name:
+        _MODEL = whisper.load_model(model_name)
+        _MODEL_NAME = model_name
+
+
+def _transcribe_chunk(i: int, samples: np.ndarray, offset_s: float, language: str, checkpoint: str):
+    """Transcribe un bloque y guarda su checkpoint (segmentos con tiempos absolutos)."""
+    t0 = time.perf_counter()
+    result = _MODEL.transcribe(samples, language=language, fp16=False,
+                               condition_on_previous_text=True, verbose=None)
+    segments = [{"start": round(offset_s + s["start"], 3), "end": round(offset_s + s["end"], 3),
+                 "text": s["text"].strip()} for s in result["segments"]]
+    tmp = checkpoint + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(segments, f, ensure_ascii=False)
+    os.replace(tmp, checkpoint)
+    return i, segments, time.perf_counter() - t0
+
+
+def default_jobs() -> int:
+    """Procesos por defecto: la mitad de los núcleos (cada modelo usa varios hilos), máximo 4."""
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+
+def make_pool(model_name: str, n_jobs: int = None) -> ProcessPoolExecutor:
+    """Pool de procesos con el modelo ya cargado en cada uno (reutilizable entre archivos)."""
+    n_jobs = n_jobs or default_jobs()
+    threads = max(1, (os.cpu_count() or 1) // n_jobs)
+    return ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                               initargs=(model_name, threads))
+
+
+def shared_pool(model_name: str, n_jobs: int = None) -> ProcessPoolExecutor:
+    """
+    Pool del módulo para (modelo, procesos): se crea la primera vez que hace
+    falta y se reutiliza en las llamadas siguientes, así el modelo se carga
+    una sola vez por proceso aunque se transcriban muchos archivos.
+    """
+    key = (model_name, n_jobs or default_jobs())
+    if key not in _POOLS:
+        if not _POOLS:
+            atexit.register(shutdown_pools)
+        _POOLS[key] = make_pool(*key)
+    return _POOLS[key]
+
+
+def shutdown_pools() -> None:
+    """Cierra los pools compartidos (se llama también al salir)."""
+    while _POOLS:
+        _, pool = _POOLS.popitem()
+        pool.shutdown(cancel_futures=True)
+
+
+def _file_key(audio_path: str, model_name: str, language: str, chunk_s: float) -> str:
+    h = hashlib.sha256(f"{model_name}|{language}|{chunk_s}|{OVERLAP_S}".encode())
+    with open(audio_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def transcribe_long(audio_path: str, model_name: str = "small", language: str = "es",
+                    n_jobs: int = None, chunk_s: float = CHUNK_S, resume: bool = True,
+                    pool: ProcessPoolExecutor = None, checkpoint_dir: str = CHECKPOINT_DIR,
+                    log=print) -> dict:
+    """
+    Transcribe una grabación larga por bloques en paralelo, con checkpoints.
+
+    Sin `pool`, los archivos de varios bloques usan el pool compartido del
+    módulo (`shared_pool`), que se reutiliza entre llamadas.
+
+    Returns:
+        dict con text, segments [{start, end, text}], duration, seconds, rtf,
+        chunks y resumed (bloques recuperados del checkpoint)
+    """
+    import whisper
+
+    t0 = time.perf_counter()
+    ckpt = os.path.join(checkpoint_dir, f"{Path(audio_path).stem[:40]}_{_file_key(audio_path, model_name, language, chunk_s)}")
+    os.makedirs(ckpt, exist_ok=True)
+
+    audio = whisper.load_audio(audio_path)
+    duration = len(audio) / SAMPLE_RATE
+    chunks = make_chunks(find_cuts(audio, SAMPLE_RATE, chunk_s), len(audio))
+
+    results = {}
+    if resume:
+        for chunk in chunks:
+            path = os.path.join(ckpt, f"chunk_{chunk['i']:04d}.json")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    results[chunk["i"]] = json.load(f)
+    resumed = len(results)
+    todo = [c for c in chunks if c["i"] not in results]
+    log(f"  {duration / 60:.1f} min de audio, {len(chunks)} bloques"
+        + (f" ({resumed} ya transcritos)" if resumed else ""))
+
+    def args(chunk):
+        a, b = chunk["span"]
+        return (chunk["i"], audio[a:b], a / SAMPLE_RATE, language,
+                os.path.join(ckpt, f"chunk_{chunk['i']:04d}.json"))
+
+    if todo:
+        n_jobs = n_jobs or default_jobs()
+        futures = []
+        if pool is None and (n_jobs == 1 or len(todo) == 1):
+            _init_worker(model_name)
+            done = (_transcribe_chunk(*args(c)) for c in todo)
+        else:
+            executor = pool or shared_pool(model_name, n_jobs)
+            futures = [executor.submit(_transcribe_chunk, *args(c)) for c in todo]
+            done = (f.result() for f in futures)
+        try:
+            for i, segments, secs in done:
+                results[i] = segments
+                log(f"    bloque {i + 1}/{len(chunks)}: {len(segments)} segmentos ({secs:.0f}s)")
+        finally:
+            # Si se interrumpe, no dejar bloques pendientes en el pool (compartido)
+            for f in futures:
+                f.cancel()
+
+    segments = stitch(chunks, results)
+    seconds = time.perf_counter() - t0
+    rtf = seconds / duration if duration else 0.0
+    log(f"  RTF {rtf:.3f} ({1 / rtf if rtf else 0:.1f}x tiempo real) en {seconds:.0f}s")
+    return {
+        "text": " ".join(s["text"] for s in segments),
+        "segments": segments,
+        "duration": duration,
+        "seconds": seconds,
+        "rtf": rtf,
+        "chunks": len(chunks),
+        "resumed": resumed,
+    }
+
+
+def write_srt(segments: list, output_path: str) -> None:
+    """Guarda los segmentos como subtítulos SRT."""
+    def ts(t):
+        ms = int(round(t * 1000))
+        return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        for k, seg in enumerate(segments, 1):
+            f.write(f"{k}\n{ts(seg['start'])} --> {ts(seg['end'])}\n{seg['text']}\n\n")
+
+
 
 def transcribe_audio(audio_path: str, model_name: str = "small", language: str = "es",
-                     output_dir: str = None) -> str:
+                     output_dir: str = None, n_jobs: int = None, chunk_s: float = CHUNK_S,
+                     resume: bool = True, pool: ProcessPoolExecutor = None) -> str:
     """
     Transcribe un archivo de audio usando Whisper.
 
@@ -46,12 +300,16 @@ def transcribe_audio(audio_path: str, model_name: str = "small", language: str =
         model_name: Nombre del modelo Whisper (tiny, base, small, medium, large)
         language: Código de idioma (es, en, pt, etc.)
         output_dir: Directorio para guardar la transcripción (opcional)
+        n_jobs: Procesos en paralelo para los bloques (default: default_jobs())
+        chunk_s: Duración objetivo de cada bloque en segundos
+        resume: Retomar desde los bloques ya transcritos
+        pool: Pool propio (make_pool); por defecto el compartido del módulo
 
     Returns:
         Texto transcrito
     """
     try:
-        import whisper
+        import whisper  # noqa: F401
     except ImportError:
         print("Error: Whisper no está instalado.")
         print("Instala con: pip install openai-whisper")
@@ -62,13 +320,11 @@ def transcribe_audio(audio_path: str, model_name: str = "small", language: str =
         print(f"Error: No se encontró el archivo: {audio_path}")
         sys.exit(1)
 
-    print(f"Cargando modelo '{model_name}'...")
-    model = whisper.load_model(model_name)
-
     print(f"Transcribiendo: {audio_path}")
-    print(f"Idioma: {language}")
+    print(f"Modelo: {model_name} | Idioma: {language}")
 
-    result = model.transcribe(audio_path, language=language)
+    result = transcribe_long(audio_path, model_name, language, n_jobs=n_jobs,
+                             chunk_s=chunk_s, resume=resume, pool=pool)
     text = result["text"]
 
     # Guardar transcripción si se especificó directorio
@@ -100,13 +356,14 @@ Ejemplos:
     python transcribe_audio.py "audio.wav" -l en              # Transcribir en inglés
     python transcribe_audio.py "audio.ogg" -o salida.txt      # Guardar en archivo específico
     python transcribe_audio.py "audio.ogg" -p                 # Solo mostrar, no guardar
+    python transcribe_audio.py grabaciones/ -j 4 --srt        # Lote: carpeta o varios archivos
         """
     )
 
     parser.add_argument(
         "audio_file",
-        nargs="?",  # Hacer opcional para modo batch
-        help="Ruta al archivo de audio a transcribir"
+        nargs="*",  # Varios archivos o carpetas = modo batch
+        help="Ruta(s) al archivo de audio a transcribir (o carpetas)"
     )
 
     parser.add_argument(
@@ -138,6 +395,30 @@ Ejemplos:
         help="Solo imprimir, no guardar archivo"
     )
 
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int, default=None,
+        help=f"Procesos en paralelo (default: {default_jobs()})"
+    )
+
+    parser.add_argument(
+        "--chunk",
+        type=float, default=CHUNK_S,
+        help=f"Duración objetivo de cada bloque en segundos (default: {CHUNK_S})"
+    )
+
+    parser.add_argument(
+        "--srt",
+        action="store_true",
+        help="Guardar también subtítulos .srt con los tiempos"
+    )
+
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Ignorar los bloques ya transcritos (checkpoints)"
+    )
+
     args = parser.parse_args()
 
     # Si no se proporciona archivo, mostrar ayuda
@@ -145,40 +426,73 @@ Ejemplos:
         parser.print_help()
         sys.exit(0)
 
-    # Determinar directorio de salida
-    output_dir = args.output_dir if args.output_dir else (
-        os.path.dirname(args.audio_file) if not args.print_only else None
-    )
-
-    # Transcribir
-    text = transcribe_audio(
-        args.audio_file,
-        args.model,
-        args.language,
-        output_dir=None  # Manejamos el guardado aquí
-    )
-
-    # Mostrar resultado
-    print("\n" + "="*60)
-    print("TRANSCRIPCIÓN:")
-    print("="*60)
-    print(text)
-    print("="*60 + "\n")
-
-    # Guardar si no es print-only
-    if not args.print_only:
-        if args.output:
-            output_path = args.output
+    # Expandir carpetas (modo batch)
+    audio_files = []
+    for item in args.audio_file:
+        if os.path.isdir(item):
+            audio_files += sorted(str(p) for p in Path(item).iterdir()
+                                  if p.suffix.lower() in AUDIO_EXTENSIONS)
         else:
-            audio_path = Path(args.audio_file)
-            if args.output_dir:
-                output_path = os.path.join(args.output_dir, audio_path.stem + ".txt")
-            else:
-                output_path = str(audio_path.with_suffix(".txt"))
+            audio_files.append(item)
 
-        save_transcription(text, output_path)
+    missing = [f for f in audio_files if not os.path.exists(f)]
+    if missing:
+        print(f"Error: No se encontró el archivo: {missing[0]}")
+        sys.exit(1)
 
-    return text
+    try:
+        import whisper  # noqa: F401
+    except ImportError:
+        print("Error: Whisper no está instalado.")
+        print("Instala con: pip install openai-whisper")
+        sys.exit(1)
+
+    # Un solo pool para todo el lote (shared_pool): cada proceso carga el modelo una vez
+    n_jobs = args.jobs or default_jobs()
+    total_audio = total_time = 0.0
+    texts = []
+    try:
+        for k, audio_file in enumerate(audio_files, 1):
+            print(f"\n[{k}/{len(audio_files)}] Transcribiendo: {audio_file}")
+            print(f"Modelo: {args.model} | Idioma: {args.language}")
+            result = transcribe_long(audio_file, args.model, args.language, n_jobs=n_jobs,
+                                     chunk_s=args.chunk, resume=not args.no_resume)
+            text = result["text"]
+            texts.append(text)
+            total_audio += result["duration"]
+            total_time += result["seconds"]
+
+            if len(audio_files) == 1:
+                # Mostrar resultado
+                print("\n" + "="*60)
+                print("TRANSCRIPCIÓN:")
+                print("="*60)
+                print(text)
+                print("="*60 + "\n")
+
+            # Guardar si no es print-only
+            if not args.print_only:
+                audio_path = Path(audio_file)
+                if args.output and len(audio_files) == 1:
+                    output_path = args.output
+                elif args.output_dir:
+                    output_path = os.path.join(args.output_dir, audio_path.stem + ".txt")
+                else:
+                    output_path = str(audio_path.with_suffix(".txt"))
+
+                save_transcription(text, output_path)
+                if args.srt:
+                    srt_path = os.path.splitext(output_path)[0] + ".srt"
+                    write_srt(result["segments"], srt_path)
+                    print(f"Subtítulos guardados en: {srt_path}")
+    finally:
+        shutdown_pools()
+
+    if len(audio_files) > 1 and total_audio:
+        print(f"\nLote: {len(audio_files)} archivos, {total_audio / 60:.1f} min de audio en "
+              f"{total_time / 60:.1f} min (RTF {total_time / total_audio:.3f})")
+
+    return texts[0] if len(texts) == 1 else texts
 
 
 if __name__ == "__main__":
@@ -4,6 +4,11 @@ Mapas Bivariados en Inglés - Workshop
 1) Governance vs Vulnerability (Governance on Y axis)
 2) Climate Risk vs Vulnerability (Vulnerability on Y axis)
 
+Rendered through map_renderer (process pool, unchanged maps are skipped).
+
+Uso:
+    python create_bivariate_maps_EN.py [--jobs N] [--force]
+
 Autor: Science Team
 Fecha: 2026-02-03
 """
@@ -12,27 +17,17 @@ import sys
 sys.stdout.reconfigure(encoding='utf-8')
 
 import pandas as pd
-import geopandas as gpd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from matplotlib.patches import Patch
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from map_renderer import render_specs, assign_quadrants, quadrant_stats
+
 # Configuración
 BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
 CSV_PATH = os.path.join(BASE_DIR, "outputs/dataset/municipios_integrado.csv")
 SHP_PATH = os.path.join(BASE_DIR, "data/geo/ibge_sp/SP_Municipios_2022.shp")
 OUTPUT_DIR = os.path.join(BASE_DIR, "outputs/figures/workshop_layers")
 
-# Cargar datos
-print("Loading data...")
-df = pd.read_csv(CSV_PATH)
-gdf = gpd.read_file(SHP_PATH)
-gdf['cod_ibge'] = gdf['CD_MUN'].astype(str).str[:6].astype(int)
-
-print(f"Dataset: {len(df)} municipalities")
-
 # Colores para cuadrantes
 COLORS = {
     'Q1_Optimal': '#2ecc71',    # Verde
@@ -63,129 +58,67 @@ ANALYSES = [
     },
 ]
 
-def assign_quadrant(row, var_x, var_y, median_x, median_y, high_x_good, high_y_good):
-    """Assign quadrant based on median splits"""
-    x_high = row[var_x] >= median_x
-    y_high = row[var_y] >= median_y
-
-    # Determine if current position is "good" for each axis
-    x_good = not x_high if not high_x_good else x_high
-    y_good = y_high if high_y_good else not y_high
-
-    if x_good and y_good:
-        return 'Q1_Optimal'
-    elif not x_good and y_good:
-        return 'Q2_Risk'
-    elif not x_good and not y_good:
-        return 'Q3_Critical'
-    else:  # x_good and not y_good
-        return 'Q4_Potential'
-
-# Generar los 2 mapas
-for config in ANALYSES:
-    print(f"\n{'='*60}")
-    print(f"ANALYSIS: {config['label_x']} vs {config['label_y']}")
-    print(f"{'='*60}")
-
-    var_x = config['var_x']
-    var_y = config['var_y']
-
-    # Calcular medianas
-    median_x = df[var_x].median()
-    median_y = df[var_y].median()
+def build_specs():
+    """Una spec de cuadrantes (mapa + dispersion) por analisis."""
+    return [{
+        'kind': 'quadrants',
+        'var_x': config['var_x'],
+        'var_y': config['var_y'],
+        'label_x': config['label_x'],
+        'label_y': config['label_y'],
+        'high_x_good': config['high_x_good'],
+        'high_y_good': config['high_y_good'],
+        'palette': COLORS,
+        'dpi': 200,
+        'output': os.path.join(OUTPUT_DIR, f"bivariate_{config['name']}_EN.png"),
+    } for config in ANALYSES]
+
+
+def print_stats(df, config):
+    """Medianas y tabla por cuadrante (calculo barato, se hace siempre)."""
+    var_x, var_y = config['var_x'], config['var_y']
+    quadrant, median_x, median_y = assign_quadrants(df, var_x, var_y,
+                                                    config['high_x_good'], config['high_y_good'])
+    stats = quadrant_stats(df, quadrant, var_x, var_y)
 
     print(f"Median {config['label_x']}: {median_x:.2f}")
     print(f"Median {config['label_y']}: {median_y:.2f}")
-
-    # Asignar cuadrantes
-    col_name = f"quadrant_{config['name']}"
-    df[col_name] = df.apply(
-        lambda row: assign_quadrant(
-            row, var_x, var_y, median_x, median_y,
-            config['high_x_good'], config['high_y_good']
-        ),
-        axis=1
-    )
-
-    # Estadísticas por cuadrante
-    stats = df.groupby(col_name).agg({
-        'cod_ibge': 'count',
-        'population': 'sum',
-        var_x: 'mean',
-        var_y: 'mean'
-    }).rename(columns={'cod_ibge': 'n_mun', 'population': 'total_pop'})
-
-    stats['pct_mun'] = (stats['n_mun'] / stats['n_mun'].sum() * 100).round(1)
-    stats['pct_pop'] = (stats['total_pop'] / stats['total_pop'].sum() * 100).round(1)
-
-    # Reordenar
-    order = ['Q1_Optimal', 'Q2_Risk', 'Q3_Critical', 'Q4_Potential']
-    stats = stats.reindex([q for q in order if q in stats.index])
-
     print(f"\n{'Quadrant':<15} {'N Mun':>8} {'%Mun':>7} {'Population':>15} {'%Pop':>7}")
     print('-'*60)
-    for q in order:
-        if q in stats.index:
-            row = stats.loc[q]
-            print(f"{q:<15} {row['n_mun']:>8.0f} {row['pct_mun']:>6.1f}% {row['total_pop']:>15,.0f} {row['pct_pop']:>6.1f}%")
-
-    # Merge con geometrías
-    merged = gdf.merge(df[['cod_ibge', col_name]], on='cod_ibge', how='left')
-
-    # Crear figura
-    fig, axes = plt.subplots(1, 2, figsize=(16, 8))
-
-    # === MAPA ===
-    ax1 = axes[0]
-    for q, color in COLORS.items():
-        subset = merged[merged[col_name] == q]
-        if len(subset) > 0:
-            subset.plot(ax=ax1, color=color, edgecolor='white', linewidth=0.2)
-
-    ax1.axis('off')
-    ax1.set_title(f"{config['label_x']} vs {config['label_y']}\nQuadrants (n=645 municipalities)",
-                  fontsize=12, fontweight='bold')
-
-    # Leyenda con estadísticas
-    legend_elements = []
-    for q in order:
-        if q in stats.index:
-            n = stats.loc[q, 'n_mun']
-            pct_pop = stats.loc[q, 'pct_pop']
-            label = q.replace('_', ' ')
-            legend_elements.append(
-                Patch(facecolor=COLORS[q],
-                      label=f"{label} ({n:.0f} mun, {pct_pop:.1f}% pop)")
-            )
-    ax1.legend(handles=legend_elements, loc='lower left', fontsize=9)
-
-    # === SCATTER PLOT ===
-    ax2 = axes[1]
-    for q, color in COLORS.items():
-        subset = df[df[col_name] == q]
-        if len(subset) > 0:
-            ax2.scatter(subset[var_x], subset[var_y], c=color, alpha=0.6, s=20,
-                       label=q.replace('_', ' '))
-
-    # Líneas de medianas
-    ax2.axvline(median_x, color='black', linestyle='--', linewidth=1, alpha=0.7)
-    ax2.axhline(median_y, color='black', linestyle='--', linewidth=1, alpha=0.7)
-
-    ax2.set_xlabel(config['label_x'], fontsize=11)
-    ax2.set_ylabel(config['label_y'], fontsize=11)
-    ax2.set_title(f"Distribution of Municipalities\nLines = medians", fontsize=12, fontweight='bold')
-    ax2.legend(loc='best', fontsize=8)
-
-    plt.tight_layout()
-
-    # Guardar
-    filename = f"bivariate_{config['name']}_EN.png"
-    filepath = os.path.join(OUTPUT_DIR, filename)
-    plt.savefig(filepath, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
-
-    print(f"\n[SAVED] {filename}")
-
-print("\n" + "="*60)
-print("COMPLETED - 2 bivariate maps saved")
-print("="*60)
+    for q, row in stats.iterrows():
+        print(f"{q:<15} {row['n_mun']:>8.0f} {row['pct_mun']:>6.1f}% {row['total_pop']:>15,.0f} {row['pct_pop']:>6.1f}%")
+
+
+def main(n_jobs=None, force=False):
+    # Cargar datos
+    print("Loading data...")
+    df = pd.read_csv(CSV_PATH)
+    print(f"Dataset: {len(df)} municipalities")
+
+    for config in ANALYSES:
+        print(f"\n{'='*60}")
+        print(f"ANALYSIS: {config['label_x']} vs {config['label_y']}")
+        print(f"{'='*60}")
+        print_stats(df, config)
+
+    print()
+    specs = build_specs()
+    results = render_specs(specs, df, geometry={'shp_path': SHP_PATH}, n_jobs=n_jobs, force=force)
+    for res in results:
+        if res['status'] == 'rendered':
+            print(f"[SAVED] {os.path.basename(res['output'])}")
+        elif res['status'] == 'skipped':
+            print(f"[UNCHANGED] {os.path.basename(res['output'])}")
+
+    print("\n" + "="*60)
+    print(f"COMPLETED - {len(specs)} bivariate maps")
+    print("="*60)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Bivariate quadrant maps (EN)")
+    parser.add_argument('--jobs', type=int, default=None, help="rendering processes")
+    parser.add_argument('--force', action='store_true', help="re-render everything")
+    args = parser.parse_args()
+    main(n_jobs=args.jobs, force=args.force)
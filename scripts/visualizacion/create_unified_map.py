@@ -1,17 +1,23 @@
 """
 Mapa unificado con selector de capas para Workshop SEMIL-USP
-Todas las 6 variables en un solo mapa con control de capas
+Todas las 6 variables en un solo mapa con control de capas.
+Por defecto las capas comparten un archivo de geometria externo (folium_light).
 
 Autor: Adrian David / AP Digital
 Fecha: 2026-01-23
 """
 
-import geopandas as gpd
 import pandas as pd
 import folium
 from branca.colormap import LinearColormap
 from branca.element import Element
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from geometry_cache import load_sp_geometry
+from folium_light import export_geometry, add_shared_layers, layer_values
 
 # Rutas
 BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
@@ -76,18 +82,13 @@ def cargar_datos():
     """Carga y hace merge de shapefile con datos municipales"""
     print("Cargando datos...")
 
-    gdf = gpd.read_file(SHAPEFILE_PATH)
+    # Geometrias ya en WGS84 (cache GeoParquet, con cod_ibge de 6 digitos)
+    gdf = load_sp_geometry(crs=4326, shp_path=SHAPEFILE_PATH)
     df = pd.read_csv(CSV_PATH)
 
-    # Ajustar codigos IBGE
-    gdf['cod_ibge'] = gdf['CD_MUN'].astype(str).str[:6].astype(int)
-
     # Merge
     gdf_merged = gdf.merge(df, on='cod_ibge', how='left')
 
-    # Convertir a WGS84
-    gdf_merged = gdf_merged.to_crs(epsg=4326)
-
     print(f"  {len(gdf_merged)} municipios cargados")
     return gdf_merged
 
@@ -105,8 +106,14 @@ def crear_colormap(values, invert=False):
     return LinearColormap(colors=colors, vmin=vmin, vmax=vmax)
 
 
-def crear_mapa_unificado(gdf):
-    """Crea mapa con todas las capas y selector"""
+def crear_mapa_unificado(gdf, geo=None):
+    """
+    Crea mapa con todas las capas y selector.
+
+    Con `geo` (folium_light.export_geometry) las 6 capas comparten un unico
+    archivo de geometria y se colorean en el navegador; sin `geo` cada capa
+    incrusta su propio GeoJSON (modo anterior).
+    """
 
     # Centro de Sao Paulo
     center = [-22.5, -48.5]
@@ -120,6 +127,7 @@ def crear_mapa_unificado(gdf):
 
     # Crear cada capa
     colormaps = {}
+    capas_livianas = []
 
     for config in CAPAS_CONFIG:
         variable = config['variable']
@@ -136,6 +144,18 @@ def crear_mapa_unificado(gdf):
         colormap = crear_colormap(gdf_valid[variable], invert=invert)
         colormaps[variable] = colormap
 
+        if geo is not None:
+            capas_livianas.append({
+                'name': nombre,
+                'values': layer_values(geo, gdf, variable),
+                'colormap': colormap,
+                'label': f'{nombre}:',
+                'show': show,
+                'name_label': 'Municipio:',
+                'nodata': {'fillColor': '#cccccc', 'color': '#333333', 'weight': 0.5, 'fillOpacity': 0.7},
+            })
+            continue
+
         # Funcion de estilo
         def style_function(feature, var=variable, cm=colormap):
             value = feature['properties'].get(var)
@@ -179,8 +199,12 @@ def crear_mapa_unificado(gdf):
 
         fg.add_to(m)
 
+    if geo is not None:
+        add_shared_layers(m, geo, capas_livianas, collapsed=False)
+
     # Agregar control de capas
-    folium.LayerControl(collapsed=False).add_to(m)
+    if geo is None:
+        folium.LayerControl(collapsed=False).add_to(m)
 
     # Agregar titulo
     title_html = '''
@@ -237,7 +261,7 @@ def crear_mapa_unificado(gdf):
     return m
 
 
-def main():
+def main(inline=False):
     print("=" * 60)
     print("MAPA UNIFICADO CON SELECTOR DE CAPAS")
     print("=" * 60)
@@ -245,9 +269,12 @@ def main():
     # Cargar datos
     gdf = cargar_datos()
 
+    # Geometria compartida con los demas mapas del workshop (salvo --inline)
+    geo = None if inline else export_geometry(OUTPUT_DIR)
+
     # Crear mapa
     print("\nCreando mapa unificado...")
-    m = crear_mapa_unificado(gdf)
+    m = crear_mapa_unificado(gdf, geo=geo)
 
     # Guardar
     output_path = os.path.join(OUTPUT_DIR, "mapa_unificado_capas.html")
@@ -261,4 +288,9 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Mapa unificado con selector de capas")
+    parser.add_argument('--inline', action='store_true',
+                        help="incrustar el GeoJSON completo en cada capa (modo anterior)")
+    args = parser.parse_args()
+    main(inline=args.inline)
@@ -1,7 +1,11 @@
 """
 Workshop Layers - 16 mapas con 3 niveles (Bajo, Medio, Alto)
 ============================================================
-Genera mapas para cada variable del pool del workshop.
+Genera mapas para cada variable del pool del workshop (en paralelo, via
+map_renderer; los mapas sin cambios se saltan).
+
+Uso:
+    python create_workshop_layers.py [--jobs N] [--force]
 
 Autor: Science Team
 Fecha: 2026-02-03
@@ -11,28 +15,17 @@ import sys
 sys.stdout.reconfigure(encoding='utf-8')
 
 import pandas as pd
-import geopandas as gpd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from matplotlib.patches import Patch
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from map_renderer import render_specs
+
 # Configuración
 BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
 CSV_PATH = os.path.join(BASE_DIR, "outputs/dataset/municipios_integrado.csv")
 SHP_PATH = os.path.join(BASE_DIR, "data/geo/ibge_sp/SP_Municipios_2022.shp")
 OUTPUT_DIR = os.path.join(BASE_DIR, "outputs/figures/workshop_layers")
 
-# Cargar datos
-print("Cargando datos...")
-df = pd.read_csv(CSV_PATH)
-gdf = gpd.read_file(SHP_PATH)
-gdf['cod_ibge'] = gdf['CD_MUN'].astype(str).str[:6].astype(int)
-
-print(f"Dataset: {len(df)} municipios")
-print(f"Shapefile: {len(gdf)} geometrias")
-
 # Definición de las 16 variables del workshop
 VARIABLES = [
     {
@@ -181,120 +174,58 @@ VARIABLES = [
     },
 ]
 
-# Colores para los 3 niveles
-def get_colors(high_is_good):
-    if high_is_good is True:
-        # Alto = bueno (verde), Bajo = malo (rojo)
-        return {
-            'Low': '#e74c3c',    # Rojo
-            'Medium': '#f1c40f', # Amarillo
-            'High': '#27ae60',   # Verde
-        }
-    elif high_is_good is False:
-        # Alto = malo (rojo), Bajo = bueno (verde)
-        return {
-            'Low': '#27ae60',    # Verde
-            'Medium': '#f1c40f', # Amarillo
-            'High': '#e74c3c',   # Rojo
-        }
-    else:
-        # Neutral (azul scale)
-        return {
-            'Low': '#3498db',    # Azul claro
-            'Medium': '#2980b9', # Azul medio
-            'High': '#1a5276',   # Azul oscuro
-        }
-
-def classify_terciles(series):
-    """Clasifica en terciles: Low, Medium, High"""
-    q33 = series.quantile(0.333)
-    q66 = series.quantile(0.666)
-
-    def classify(val):
-        if pd.isna(val):
-            return None
-        elif val <= q33:
-            return 'Low'
-        elif val <= q66:
-            return 'Medium'
-        else:
-            return 'High'
-
-    return series.apply(classify), q33, q66
-
-# Generar mapas
-print(f"\nGenerando {len(VARIABLES)} mapas...")
-print("=" * 60)
-
-for var in VARIABLES:
-    col = var['column']
-
-    # Verificar que la columna existe
-    if col not in df.columns:
-        print(f"[SKIP] {var['id']:02d}. {var['name']} - columna '{col}' no encontrada")
-        continue
-
-    # Clasificar en terciles
-    df[f'{col}_level'], q33, q66 = classify_terciles(df[col])
-
-    # Merge con geometrías
-    merged = gdf.merge(
-        df[['cod_ibge', col, f'{col}_level']],
-        on='cod_ibge',
-        how='left'
-    )
-
-    # Colores
-    colors = get_colors(var['high_is_good'])
-
-    # Crear figura
-    fig, ax = plt.subplots(1, 1, figsize=(12, 10))
-
-    # Dibujar mapa por nivel
-    for level in ['Low', 'Medium', 'High']:
-        subset = merged[merged[f'{col}_level'] == level]
-        if len(subset) > 0:
-            subset.plot(ax=ax, color=colors[level], edgecolor='white', linewidth=0.3)
-
-    # Municipios sin datos (gris)
-    no_data = merged[merged[f'{col}_level'].isna()]
-    if len(no_data) > 0:
-        no_data.plot(ax=ax, color='#bdc3c7', edgecolor='white', linewidth=0.3)
-
-    ax.axis('off')
-
-    # Título
-    ax.set_title(f"{var['id']:02d}. {var['title_en']}\n{var['title_es']}",
-                 fontsize=14, fontweight='bold', pad=20)
-
-    # Estadísticas
-    counts = df[f'{col}_level'].value_counts()
-    low_n = counts.get('Low', 0)
-    med_n = counts.get('Medium', 0)
-    high_n = counts.get('High', 0)
-
-    # Leyenda
-    legend_elements = [
-        Patch(facecolor=colors['Low'], label=f"Low (n={low_n}) ≤ {q33:.2f}"),
-        Patch(facecolor=colors['Medium'], label=f"Medium (n={med_n}) {q33:.2f} - {q66:.2f}"),
-        Patch(facecolor=colors['High'], label=f"High (n={high_n}) > {q66:.2f}"),
-    ]
-    ax.legend(handles=legend_elements, loc='lower left', fontsize=10,
-              title="Level (Terciles)", title_fontsize=11)
-
-    # Fuente
-    ax.text(0.99, 0.01, f"Source: {var['source']}", transform=ax.transAxes,
-            fontsize=8, ha='right', va='bottom', style='italic', color='gray')
-
-    # Guardar
-    filename = f"{var['id']:02d}_{var['name']}.png"
-    filepath = os.path.join(OUTPUT_DIR, filename)
-    plt.savefig(filepath, dpi=150, bbox_inches='tight', facecolor='white')
-    plt.close()
-
-    print(f"[OK] {var['id']:02d}. {var['name']}")
-    print(f"     Low: {low_n} | Medium: {med_n} | High: {high_n}")
-
-print("=" * 60)
-print(f"\n[COMPLETADO] {len(VARIABLES)} mapas guardados en:")
-print(f"  {OUTPUT_DIR}")
+def build_specs(df):
+    """Una spec de terciles por variable presente en el dataset."""
+    specs = []
+    for var in VARIABLES:
+        col = var['column']
+        if col not in df.columns:
+            print(f"[SKIP] {var['id']:02d}. {var['name']} - columna '{col}' no encontrada")
+            continue
+        specs.append({
+            'kind': 'terciles',
+            'column': col,
+            'high_is_good': var['high_is_good'],
+            'title': f"{var['id']:02d}. {var['title_en']}\n{var['title_es']}",
+            'source': var['source'],
+            'dpi': 150,
+            'output': os.path.join(OUTPUT_DIR, f"{var['id']:02d}_{var['name']}.png"),
+            'var': var,
+        })
+    return specs
+
+
+def main(n_jobs=None, force=False):
+    # Cargar datos
+    print("Cargando datos...")
+    df = pd.read_csv(CSV_PATH)
+    print(f"Dataset: {len(df)} municipios")
+
+    # Generar mapas (geometria compartida por proceso, specs sin cambios se saltan)
+    specs = build_specs(df)
+    print(f"\nGenerando {len(specs)} mapas...")
+    print("=" * 60)
+    results = render_specs(specs, df, geometry={'shp_path': SHP_PATH}, n_jobs=n_jobs, force=force)
+
+    for spec, res in zip(specs, results):
+        var = spec['var']
+        if res['status'] == 'error':
+            continue
+        tag = 'OK' if res['status'] == 'rendered' else 'SIN CAMBIOS'
+        print(f"[{tag}] {var['id']:02d}. {var['name']}")
+        if res['info']:
+            info = res['info']
+            print(f"     Low: {info['Low']} | Medium: {info['Medium']} | High: {info['High']}")
+
+    print("=" * 60)
+    print(f"\n[COMPLETADO] {len(specs)} mapas en:")
+    print(f"  {OUTPUT_DIR}")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Capas del workshop (terciles)")
+    parser.add_argument('--jobs', type=int, default=None, help="procesos de renderizado")
+    parser.add_argument('--force', action='store_true', help="re-renderizar todo")
+    args = parser.parse_args()
+    main(n_jobs=args.jobs, force=args.force)
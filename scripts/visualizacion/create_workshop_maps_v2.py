@@ -22,17 +22,25 @@ Mapas nuevos (10):
   15_porcentaje_rural (pct_rural)
   16_mortalidad_infantil (mort_infantil)
 
+Por defecto los HTML referencian un archivo de geometria compartido
+(folium_light); --inline vuelve a incrustar el GeoJSON completo.
+
 Autor: Science Team / AP Digital
 Fecha: 2026-01-26
 """
 
-import geopandas as gpd
 import pandas as pd
 import folium
 from branca.colormap import LinearColormap
 import os
+import sys
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from geometry_cache import load_sp_geometry
+from folium_light import export_geometry, add_shared_layers, layer_values
+
 # Rutas de archivos
 BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
 SHAPEFILE_PATH = os.path.join(BASE_DIR, "data/geo/ibge_sp/SP_Municipios_2022.shp")
@@ -140,15 +148,12 @@ MAPAS_CONFIG = {
 
 def cargar_datos():
     """Carga y hace merge de shapefile con datos municipales"""
-    print("Cargando shapefile...")
-    gdf = gpd.read_file(SHAPEFILE_PATH)
+    print("Cargando geometrias (cache, WGS84)...")
+    gdf = load_sp_geometry(crs=4326, shp_path=SHAPEFILE_PATH)
 
     print("Cargando datos municipales (v8)...")
     df = pd.read_csv(CSV_PATH)
 
-    # Ajustar códigos IBGE
-    gdf['cod_ibge'] = gdf['CD_MUN'].astype(str).str[:6].astype(int)
-
     print(f"Shapefile: {len(gdf)} municipios")
     print(f"Datos: {len(df)} municipios")
 
@@ -157,9 +162,6 @@ def cargar_datos():
     municipios_con_datos = gdf_merged.dropna(subset=['Municipio']).shape[0]
     print(f"Municipios con datos: {municipios_con_datos}")
 
-    # Convertir a WGS84 para folium
-    gdf_merged = gdf_merged.to_crs(epsg=4326)
-
     return gdf_merged
 
 
@@ -187,8 +189,14 @@ def crear_colormap(values, invert=None):
     )
 
 
-def crear_mapa(gdf, config, nombre_archivo):
-    """Crea un mapa choropleth interactivo con folium"""
+def crear_mapa(gdf, config, nombre_archivo, output_dir=OUTPUT_DIR, geo=None):
+    """
+    Crea un mapa choropleth interactivo con folium.
+
+    Con `geo` (folium_light.export_geometry) el HTML referencia la geometria
+    compartida y solo lleva los valores de la variable; sin `geo` incrusta
+    el GeoJSON completo (modo anterior).
+    """
     variable = config['variable']
     titulo = config['titulo']
     titulo_en = config['titulo_en']
@@ -218,61 +226,70 @@ def crear_mapa(gdf, config, nombre_archivo):
     # Crear colormap
     colormap = crear_colormap(gdf_valid[variable], invert=invert)
 
-    # Estilizar polígonos
-    def style_function(feature):
-        value = feature['properties'].get(variable)
-        if value is None or (isinstance(value, float) and np.isnan(value)):
+    if geo is not None:
+        add_shared_layers(m, geo, [{
+            'name': titulo_en,
+            'values': layer_values(geo, gdf, variable),
+            'colormap': colormap,
+            'label': f'{titulo_en}:',
+            'highlight': {'fillColor': '#ffffff', 'color': '#000000', 'weight': 2, 'fillOpacity': 0.9},
+        }])
+    else:
+        # Estilizar polígonos
+        def style_function(feature):
+            value = feature['properties'].get(variable)
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                return {
+                    'fillColor': '#cccccc',
+                    'color': '#666666',
+                    'weight': 0.5,
+                    'fillOpacity': 0.3
+                }
             return {
-                'fillColor': '#cccccc',
-                'color': '#666666',
+                'fillColor': colormap(value),
+                'color': '#333333',
                 'weight': 0.5,
-                'fillOpacity': 0.3
+                'fillOpacity': 0.7
             }
-        return {
-            'fillColor': colormap(value),
-            'color': '#333333',
-            'weight': 0.5,
-            'fillOpacity': 0.7
-        }
-
-    def highlight_function(feature):
-        return {
-            'fillColor': '#ffffff',
-            'color': '#000000',
-            'weight': 2,
-            'fillOpacity': 0.9
-        }
-
-    # Tooltip
-    tooltip = folium.GeoJsonTooltip(
-        fields=['NM_MUN', variable],
-        aliases=['Municipality:', f'{titulo_en}:'],
-        localize=True,
-        sticky=True,
-        style="""
-            background-color: white;
-            border: 2px solid #333;
-            border-radius: 5px;
-            padding: 10px;
-            font-family: Arial;
-            font-size: 12px;
-        """
-    )
 
-    # Preparar GeoJSON
-    cols_to_keep = ['NM_MUN', 'Municipio', variable, 'geometry']
-    cols_available = [c for c in cols_to_keep if c in gdf.columns]
-    gdf_json = gdf[cols_available].copy()
-
-    # Agregar capa GeoJSON
-    geojson_layer = folium.GeoJson(
-        gdf_json.__geo_interface__,
-        name=titulo_en,
-        style_function=style_function,
-        highlight_function=highlight_function,
-        tooltip=tooltip
-    )
-    geojson_layer.add_to(m)
+        def highlight_function(feature):
+            return {
+                'fillColor': '#ffffff',
+                'color': '#000000',
+                'weight': 2,
+                'fillOpacity': 0.9
+            }
+
+        # Tooltip
+        tooltip = folium.GeoJsonTooltip(
+            fields=['NM_MUN', variable],
+            aliases=['Municipality:', f'{titulo_en}:'],
+            localize=True,
+            sticky=True,
+            style="""
+                background-color: white;
+                border: 2px solid #333;
+                border-radius: 5px;
+                padding: 10px;
+                font-family: Arial;
+                font-size: 12px;
+            """
+        )
+
+        # Preparar GeoJSON
+        cols_to_keep = ['NM_MUN', 'Municipio', variable, 'geometry']
+        cols_available = [c for c in cols_to_keep if c in gdf.columns]
+        gdf_json = gdf[cols_available].copy()
+
+        # Agregar capa GeoJSON
+        geojson_layer = folium.GeoJson(
+            gdf_json.__geo_interface__,
+            name=titulo_en,
+            style_function=style_function,
+            highlight_function=highlight_function,
+            tooltip=tooltip
+        )
+        geojson_layer.add_to(m)
 
     # Colormap al mapa
     colormap.caption = f'{titulo_en} ({unidad})'
@@ -297,17 +314,18 @@ def crear_mapa(gdf, config, nombre_archivo):
     '''
     m.get_root().html.add_child(folium.Element(title_html))
 
-    folium.LayerControl().add_to(m)
+    if geo is None:
+        folium.LayerControl().add_to(m)
 
     # Guardar HTML
-    output_path = os.path.join(OUTPUT_DIR, f"{nombre_archivo}.html")
+    output_path = os.path.join(output_dir, f"{nombre_archivo}.html")
     m.save(output_path)
     print(f"  [OK] Saved: {output_path}")
 
     return output_path
 
 
-def main():
+def main(inline=False):
     print("=" * 60)
     print("WORKSHOP MAPS v2 - 10 ADDITIONAL HEAT-MAPS")
     print("=" * 60)
@@ -315,12 +333,15 @@ def main():
     print("\n1. Loading data...")
     gdf = cargar_datos()
 
+    # Geometria compartida (simplificada, cuantizada) salvo en modo --inline
+    geo = None if inline else export_geometry(OUTPUT_DIR)
+
     print("\n2. Generating maps...")
     mapas_generados = []
 
     for nombre, config in MAPAS_CONFIG.items():
         print(f"\n  Processing: {config['titulo_en']} ({config['variable']})")
-        output = crear_mapa(gdf, config, nombre)
+        output = crear_mapa(gdf, config, nombre, geo=geo)
         if output:
             mapas_generados.append({
                 'nombre': nombre,
@@ -344,4 +365,9 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Workshop maps v2 (folium)")
+    parser.add_argument('--inline', action='store_true',
+                        help="incrustar la geometria completa en cada HTML (modo anterior)")
+    args = parser.parse_args()
+    main(inline=args.inline)
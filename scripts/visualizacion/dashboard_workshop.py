@@ -8,12 +8,16 @@ Autor: Science Team / Dr. Adrian David González Chaves
 """
 
 import os
+import sys
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+from quadrants import classify
+
 # Configuración de rutas
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_PATH = os.path.join(BASE_DIR, "outputs", "municipios_integrado_v5.csv")
@@ -33,24 +37,12 @@ df = pd.read_csv(DATA_PATH)
 def clasificar_municipios(df):
     """Clasifica municipios en cuadrantes basados en gobernanza y vulnerabilidad."""
 
-    # Calcular medianas
-    med_gob = df['idx_gobernanza'].median()
-    med_vuln = df['idx_vulnerabilidad'].median()
-
-    def asignar_cuadrante(row):
-        alta_gob = row['idx_gobernanza'] >= med_gob
-        alta_vuln = row['idx_vulnerabilidad'] >= med_vuln
-
-        if alta_gob and not alta_vuln:
-            return "Q1_Modelo"
-        elif not alta_gob and not alta_vuln:
-            return "Q2_Conservar"
-        elif not alta_gob and alta_vuln:
-            return "Q3_Vulnerable"  # PRIORIDAD
-        else:
-            return "Q4_Desarrollo"
-
-    df['cuadrante'] = df.apply(asignar_cuadrante, axis=1)
+    # Mediana de cada eje: alta gobernanza y baja vulnerabilidad son "buenas"
+    # Q1_Modelo, Q2_Conservar, Q3_Vulnerable (PRIORIDAD), Q4_Desarrollo
+    res = classify(df, [{'name': 'cuadrante', 'var_x': 'idx_gobernanza',
+                         'var_y': 'idx_vulnerabilidad', 'high_x_good': True,
+                         'high_y_good': False, 'scheme': 'dashboard'}])
+    df['cuadrante'] = res['quadrants']['cuadrante']
     return df
 
 df = clasificar_municipios(df)
@@ -1,19 +1,40 @@
 """
-Script para exportar mapas HTML a PNG usando Selenium
+Script para exportar los mapas del workshop a PNG/SVG
 Workshop SEMIL-USP
 
+Dos modos:
+  static (por defecto)  Renderiza los mismos coropleticos (capas 01-06 del mapa
+                        unificado y 07-16 de create_workshop_maps_v2, mismas
+                        paletas lineales) directamente desde la geometria en
+                        cache con map_renderer: en paralelo, sin navegador y
+                        sin tiles. PNG o SVG segun --format.
+  html                  Captura los HTML con un pool de Chrome headless
+                        (Selenium). Cada captura espera el evento load, las
+                        capas de folium_light y los tiles, en lugar de un
+                        sleep fijo.
+
+Uso:
+    python export_maps_to_png.py [--format png|svg] [--jobs N] [--force]
+    python export_maps_to_png.py --mode html [--browsers N]
+
 Autor: Adrian David / AP Digital
 Fecha: 2026-01-23
 """
 
 import os
+import sys
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Rutas
+BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
+CSV_PATH = os.path.join(BASE_DIR, "outputs/dataset/municipios_integrado.csv")
+SHAPEFILE_PATH = os.path.join(BASE_DIR, "data/geo/ibge_sp/SP_Municipios_2022.shp")
 INPUT_DIR = r"G:\My Drive\Adrian David\Forthe_worshop\mapas_workshop"
 OUTPUT_DIR = r"G:\My Drive\Adrian David\Forthe_worshop\mapas_workshop\png"
 
@@ -27,8 +48,84 @@ MAPAS = [
     "06_deficit_polinizacion"
 ]
 
+# Geometria para el modo estatico: WGS84 (mismo aspecto que los mapas web) y
+# simplificada a 100 m, por debajo de un pixel a 150 dpi para el estado completo
+STATIC_GEOMETRY = {'crs': 4326, 'tolerance': 100, 'shp_path': SHAPEFILE_PATH}
+STATIC_DPI = 150
+
+# Condicion de "mapa listo" en el navegador: documento cargado, capas de
+# folium_light construidas (si las hay) y todas las imagenes (tiles) completas
+READY_JS = """
+return document.readyState === 'complete'
+    && (typeof window.TerraRiskGeo === 'undefined' || window.terrariskLayersReady === true)
+    && Array.prototype.every.call(document.images, function(img) { return img.complete; });
+"""
+
+
+# ============================================================
+# MODO ESTATICO (sin navegador)
+# ============================================================
+
+def _palette(invert):
+    """Colores de la escala lineal, tomados de create_workshop_maps_v2.crear_colormap."""
+    from create_workshop_maps_v2 import crear_colormap
+    from folium_light import colormap_spec
+    return colormap_spec(crear_colormap(pd.Series([0.0, 1.0]), invert=invert))['colors']
+
+
+def static_specs(fmt='png', output_dir=OUTPUT_DIR):
+    """Specs 'continuous' de map_renderer para los 16 mapas del workshop."""
+    from create_unified_map import CAPAS_CONFIG
+    from create_workshop_maps_v2 import MAPAS_CONFIG
+
+    source = "Workshop SEMIL-USP | Data: {n} municipalities"
+    specs = []
+    # 01-06: mismas capas que el mapa unificado, con los nombres de archivo de MAPAS
+    for nombre, config in zip(MAPAS, CAPAS_CONFIG):
+        specs.append({
+            'kind': 'continuous',
+            'column': config['variable'],
+            'colors': _palette(config['invert']),
+            'title': f"{config['nombre']}\n{config['descripcion']}",
+            'legend_title': config['descripcion'],
+            'source': source,
+            'dpi': STATIC_DPI,
+            'output': os.path.join(output_dir, f"{nombre}.{fmt}"),
+        })
+    for nombre, config in MAPAS_CONFIG.items():
+        specs.append({
+            'kind': 'continuous',
+            'column': config['variable'],
+            'colors': _palette(config['invert_colors']),
+            'title': f"{config['titulo_en']}\n{config['descripcion_en']}",
+            'legend_title': f"{config['titulo_en']} ({config['unidad']})",
+            'source': source,
+            'dpi': STATIC_DPI,
+            'output': os.path.join(output_dir, f"{nombre}.{fmt}"),
+        })
+    return specs
+
+
+def export_static(fmt='png', n_jobs=None, force=False, output_dir=OUTPUT_DIR):
+    """Renderiza los mapas a PNG/SVG desde la geometria en cache (map_renderer)."""
+    from map_renderer import render_specs
+
+    df = pd.read_csv(CSV_PATH)
+    specs = [s for s in static_specs(fmt, output_dir) if s['column'] in df.columns]
+    results = render_specs(specs, df, geometry=STATIC_GEOMETRY, n_jobs=n_jobs, force=force)
+    return [r['output'] for r in results if r['status'] in ('rendered', 'skipped')]
+
+
+# ============================================================
+# MODO HTML (pool de navegadores)
+# ============================================================
+
 def setup_driver():
     """Configura el driver de Chrome en modo headless"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--no-sandbox")
@@ -36,14 +133,18 @@ def setup_driver():
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--window-size=1920,1080")
 
-    # Usar webdriver-manager para obtener el driver automáticamente
-    service = Service(ChromeDriverManager().install())
+    # Selenium >= 4.6 resuelve el driver solo (Selenium Manager); webdriver-manager es opcional
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        service = Service(ChromeDriverManager().install())
+    except ImportError:
+        service = Service()
     driver = webdriver.Chrome(service=service, options=chrome_options)
 
     return driver
 
 
-def capture_map(driver, html_path, png_path, wait_time=5):
+def capture_map(driver, html_path, png_path, timeout=30, settle=0.3):
     """
     Captura un mapa HTML como PNG
 
@@ -51,14 +152,23 @@ def capture_map(driver, html_path, png_path, wait_time=5):
         driver: Selenium WebDriver
         html_path: Ruta al archivo HTML
         png_path: Ruta de salida para el PNG
-        wait_time: Segundos a esperar para que cargue el mapa
+        timeout: Segundos maximos de espera hasta que el mapa este listo
+        settle: Pausa corta tras la condicion de listo (animaciones de Leaflet)
     """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
     # Cargar el HTML
     file_url = f"file:///{html_path.replace(os.sep, '/')}"
     driver.get(file_url)
 
-    # Esperar a que cargue el mapa (los tiles de fondo)
-    time.sleep(wait_time)
+    # Esperar a que el mapa este listo (no un sleep fijo)
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+            lambda d: d.execute_script(READY_JS))
+    except TimeoutException:
+        print(f"  [WARN] {os.path.basename(html_path)}: no quedo listo en {timeout}s, se captura igual")
+    time.sleep(settle)
 
     # Tomar screenshot
     driver.save_screenshot(png_path)
@@ -66,48 +176,85 @@ def capture_map(driver, html_path, png_path, wait_time=5):
     return png_path
 
 
-def main():
+class BrowserPool:
+    """Pool de drivers de Chrome reutilizados entre capturas (uno por hilo)."""
+
+    def __init__(self, size=2):
+        self.size = size
+        self._drivers = queue.Queue()
+        self._all = []
+
+    def __enter__(self):
+        with ThreadPoolExecutor(max_workers=self.size) as pool:
+            for driver in pool.map(lambda _: setup_driver(), range(self.size)):
+                self._all.append(driver)
+                self._drivers.put(driver)
+        return self
+
+    def __exit__(self, *exc):
+        for driver in self._all:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def capture(self, html_path, png_path, **kwargs):
+        driver = self._drivers.get()
+        try:
+            return capture_map(driver, html_path, png_path, **kwargs)
+        finally:
+            self._drivers.put(driver)
+
+
+def export_html(nombres=MAPAS, browsers=2):
+    """Captura los HTML con un pool de navegadores."""
+    jobs = []
+    for nombre in nombres:
+        html_path = os.path.join(INPUT_DIR, f"{nombre}.html")
+        if not os.path.exists(html_path):
+            print(f"  [WARN] No encontrado: {html_path}")
+            continue
+        jobs.append((html_path, os.path.join(OUTPUT_DIR, f"{nombre}.png")))
+    if not jobs:
+        return []
+
+    print(f"\nConfigurando {min(browsers, len(jobs))} Chrome WebDriver...")
+    with BrowserPool(min(browsers, len(jobs))) as pool:
+        print("[OK] Drivers configurados")
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            futures = [executor.submit(pool.capture, html, png) for html, png in jobs]
+            imagenes = []
+            for (html, _), future in zip(jobs, futures):
+                imagenes.append(future.result())
+                print(f"  [OK] {os.path.basename(html)}")
+    return imagenes
+
+
+def main(mode='static', fmt='png', n_jobs=None, browsers=2, force=False):
     """Función principal"""
     print("=" * 60)
-    print("EXPORTADOR DE MAPAS A PNG")
+    print(f"EXPORTADOR DE MAPAS ({mode.upper()})")
     print("=" * 60)
 
     # Crear carpeta de salida
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     print(f"\nCarpeta de salida: {OUTPUT_DIR}")
 
-    # Configurar driver
-    print("\nConfigurando Chrome WebDriver...")
-    driver = setup_driver()
-    print("[OK] Driver configurado")
-
-    # Procesar cada mapa
-    print("\nGenerando imagenes PNG...")
-    imagenes_generadas = []
-
-    try:
-        for nombre in MAPAS:
-            html_path = os.path.join(INPUT_DIR, f"{nombre}.html")
-            png_path = os.path.join(OUTPUT_DIR, f"{nombre}.png")
-
-            if not os.path.exists(html_path):
-                print(f"  [WARN] No encontrado: {html_path}")
-                continue
-
-            print(f"  Procesando: {nombre}...", end=" ", flush=True)
-            capture_map(driver, html_path, png_path)
-            print("[OK]")
-            imagenes_generadas.append(png_path)
-
-    finally:
-        # Cerrar driver
-        driver.quit()
+    t0 = time.perf_counter()
+    if mode == 'static':
+        print("\nRenderizando mapas desde la geometria en cache...")
+        imagenes_generadas = export_static(fmt, n_jobs=n_jobs, force=force)
+        total = len(static_specs(fmt))
+    else:
+        print("\nGenerando imagenes PNG desde los HTML...")
+        imagenes_generadas = export_html(MAPAS, browsers=browsers)
+        total = len(MAPAS)
 
     # Resumen
     print("\n" + "=" * 60)
     print("RESUMEN")
     print("=" * 60)
-    print(f"Imagenes generadas: {len(imagenes_generadas)}/{len(MAPAS)}")
+    print(f"Imagenes generadas: {len(imagenes_generadas)}/{total} en {time.perf_counter() - t0:.1f}s")
     print(f"Ubicacion: {OUTPUT_DIR}")
     print("\nArchivos creados:")
     for img in imagenes_generadas:
@@ -117,4 +264,13 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Exportar mapas del workshop a imagen")
+    parser.add_argument('--mode', choices=['static', 'html'], default='static',
+                        help="static: render directo sin navegador; html: captura con Chrome")
+    parser.add_argument('--format', choices=['png', 'svg'], default='png', help="solo modo static")
+    parser.add_argument('--jobs', type=int, default=None, help="procesos de render (static)")
+    parser.add_argument('--browsers', type=int, default=2, help="navegadores en paralelo (html)")
+    parser.add_argument('--force', action='store_true', help="re-renderizar aunque no haya cambios")
+    args = parser.parse_args()
+    main(mode=args.mode, fmt=args.format, n_jobs=args.jobs, browsers=args.browsers, force=args.force)
@@ -0,0 +1,494 @@
+"""
+Mapas folium livianos: geometria compartida (TopoJSON) + valores por capa
+=========================================================================
+`create_workshop_maps_v2.py` y `create_unified_map.py` incrustaban el
+`__geo_interface__` completo (sin simplificar) en cada HTML, una vez por
+capa en el mapa unificado. Este modulo:
+
+- Escribe UN archivo de geometria por (shapefile, tolerancia, cuantizacion):
+  TopoJSON con arcos compartidos entre municipios vecinos, coordenadas
+  cuantizadas y codificadas en delta. Se guarda como `.topo.js`
+  (`window.SP_TOPOLOGY = {...}`) para que funcione abriendo el HTML desde
+  disco (file://), donde `fetch()` de un JSON local esta bloqueado.
+- Cada mapa HTML referencia ese archivo con <script src>, lleva solo los
+  valores de cada capa como arreglos alineados al orden de la geometria y
+  colorea en el navegador (misma interpolacion lineal que branca).
+  Las capas ocultas se construyen recien cuando se activan.
+
+Uso (desde los scripts de mapas):
+    from folium_light import export_geometry, add_shared_layers, layer_values
+    geo = export_geometry(OUTPUT_DIR)
+    add_shared_layers(m, geo, [{'name': ..., 'values': layer_values(geo, df, var),
+                                'colormap': colormap, 'label': ...}])
+
+Comparacion de tamaño (y tiempo de carga si hay Selenium + Chrome):
+    python scripts/visualizacion/folium_light.py --compare [--synthetic]
+
+Autor: Science Team
+"""
+
+import sys
+import os
+
+import hashlib
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from branca.element import Element, MacroElement
+from jinja2 import Template
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+
+BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
+SHP_PATH = os.path.join(BASE_DIR, "data/geo/ibge_sp/SP_Municipios_2022.shp")
+
+GEOMETRY_TOLERANCE = 100   # metros (variante precalculada en geometry_cache)
+QUANTIZATION = 100000      # ~10 m sobre la extension del estado
+VALUE_DIGITS = 6           # cifras significativas de los valores por capa
+TOPOLOGY_VAR = 'SP_TOPOLOGY'
+
+
+# ============================================================
+# TOPOLOGIA (arcos compartidos, cuantizados, delta)
+# ============================================================
+
+def _rings(geom):
+    """Polygon/MultiPolygon -> lista de poligonos, cada uno lista de anillos (arrays Nx2)."""
+    polys = getattr(geom, 'geoms', [geom])
+    return [[np.asarray(p.exterior.coords)[:, :2]] +
+            [np.asarray(r.coords)[:, :2] for r in p.interiors] for p in polys]
+
+
+def _quantize_ring(coords, x0, y0, kx, ky):
+    """Cuantiza un anillo cerrado y elimina puntos consecutivos repetidos (sin cierre)."""
+    q = np.column_stack([np.round((coords[:, 0] - x0) / kx),
+                         np.round((coords[:, 1] - y0) / ky)]).astype(np.int64)
+    keep = np.ones(len(q), dtype=bool)
+    keep[1:] = np.any(q[1:] != q[:-1], axis=1)
+    q = q[keep]
+    if len(q) > 1 and (q[0] == q[-1]).all():
+        q = q[:-1]
+    return [tuple(p) for p in q.tolist()]
+
+
+def build_topology(geoms, properties, quantization=QUANTIZATION):
+    """
+    TopoJSON (dict) de una coleccion de Polygon/MultiPolygon.
+
+    Los anillos se cortan en los puntos donde cambia la vecindad (juntas),
+    y los tramos repetidos entre municipios vecinos se guardan una sola vez
+    (indice negativo ~i = arco recorrido al reves).
+    """
+    bounds = np.array([g.bounds for g in geoms])
+    x0, y0 = bounds[:, 0].min(), bounds[:, 1].min()
+    x1, y1 = bounds[:, 2].max(), bounds[:, 3].max()
+    kx = (x1 - x0) / (quantization - 1) or 1.0
+    ky = (y1 - y0) / (quantization - 1) or 1.0
+
+    shapes = [[[_quantize_ring(r, x0, y0, kx, ky) for r in poly] for poly in _rings(g)]
+              for g in geoms]
+
+    # Juntas: puntos visitados con vecinos (anterior, siguiente) distintos
+    seen, junctions = {}, set()
+    for shape in shapes:
+        for poly in shape:
+            for ring in poly:
+                n = len(ring)
+                for i, p in enumerate(ring):
+                    nb = (ring[i - 1], ring[(i + 1) % n])
+                    prev = seen.get(p)
+                    if prev is None:
+                        seen[p] = nb
+                    elif prev != nb and prev != nb[::-1]:
+                        junctions.add(p)
+
+    arcs, index = [], {}
+
+    def add_arc(points):
+        key = tuple(points)
+        if key in index:
+            return index[key]
+        rkey = key[::-1]
+        if rkey in index:
+            return ~index[rkey]
+        index[key] = len(arcs)
+        arcs.append(points)
+        return index[key]
+
+    def ring_arcs(ring):
+        cuts = [i for i, p in enumerate(ring) if p in junctions]
+        if not cuts:
+            # Anillo sin juntas (isla o enclave): forma canonica para reconocerlo al reves
+            start = min(range(len(ring)), key=ring.__getitem__)
+            fwd = ring[start:] + ring[:start]
+            rev = fwd[:1] + fwd[:0:-1]
+            key_fwd, key_rev = tuple(fwd + fwd[:1]), tuple(rev + rev[:1])
+            if key_rev in index and key_fwd not in index:
+                return [~index[key_rev]]
+            return [add_arc(list(key_fwd))]
+        rot = ring[cuts[0]:] + ring[:cuts[0]] + [ring[cuts[0]]]
+        out, last = [], 0
+        for i in range(1, len(rot)):
+            if rot[i] in junctions:
+                out.append(add_arc(rot[last:i + 1]))
+                last = i
+        return out
+
+    objects = []
+    for shape, props in zip(shapes, properties):
+        polys = [[ring_arcs(r) for r in poly if len(r) >= 3] for poly in shape]
+        polys = [p for p in polys if p]
+        if len(polys) == 1:
+            obj = {'type': 'Polygon', 'arcs': polys[0]}
+        elif polys:
+            obj = {'type': 'MultiPolygon', 'arcs': polys}
+        else:
+            obj = {'type': None}
+        obj['properties'] = props
+        objects.append(obj)
+
+    encoded = []
+    for arc in arcs:
+        a = np.asarray(arc, dtype=np.int64)
+        encoded.append(np.vstack([a[:1], np.diff(a, axis=0)]).tolist())
+
+    return {
+        'type': 'Topology',
+        'transform': {'scale': [kx, ky], 'translate': [x0, y0]},
+        'objects': {'municipios': {'type': 'GeometryCollection', 'geometries': objects}},
+        'arcs': encoded,
+    }
+
+
+def decode_topology(topo):
+    """Inverso de build_topology (para verificacion): lista de [poligonos [anillos Nx2]]."""
+    sx, sy = topo['transform']['scale']
+    tx, ty = topo['transform']['translate']
+    arcs = []
+    for arc in topo['arcs']:
+        a = np.cumsum(np.asarray(arc, dtype=np.int64), axis=0)
+        arcs.append(np.column_stack([a[:, 0] * sx + tx, a[:, 1] * sy + ty]))
+
+    def ring(idx):
+        parts = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in idx]
+        return np.vstack([parts[0]] + [p[1:] for p in parts[1:]])
+
+    out = []
+    for obj in topo['objects']['municipios']['geometries']:
+        polys = [obj['arcs']] if obj['type'] == 'Polygon' else obj.get('arcs') or []
+        out.append([[ring(r) for r in poly] for poly in polys])
+    return out
+
+
+# ============================================================
+# ARCHIVO DE GEOMETRIA COMPARTIDO
+# ============================================================
+
+def _name_column(gdf):
+    return next((c for c in ['NM_MUN', 'Municipio', 'nome'] if c in gdf.columns), None)
+
+
+def export_geometry(out_dir, tolerance=GEOMETRY_TOLERANCE, quantization=QUANTIZATION,
+                    shp_path=SHP_PATH, gdf=None, verbose=True):
+    """
+    Escribe (si no existe) el archivo de geometria compartido en `out_dir`.
+    Devuelve {'file': nombre relativo, 'ids': cod_ibge en orden, 'names': nombres}.
+
+    gdf: GeoDataFrame en EPSG:4326 ya simplificado; por defecto la variante
+    (crs=4326, tolerance) de geometry_cache.
+    """
+    if gdf is None:
+        from geometry_cache import load_sp_geometry, source_hash
+        gdf = load_sp_geometry(crs=4326, tolerance=tolerance, shp_path=shp_path)
+        tag = f"{source_hash(shp_path)}_s{int(tolerance or 0)}m_q{int(quantization)}"
+    else:
+        h = hashlib.sha256(b''.join(gdf.geometry.to_wkb()))
+        h.update(pd.util.hash_pandas_object(gdf.drop(columns='geometry'), index=False).values.tobytes())
+        tag = f"{h.hexdigest()[:16]}_q{int(quantization)}"
+
+    name_col = _name_column(gdf)
+    ids = gdf['cod_ibge'].astype(int).to_numpy()
+    names = gdf[name_col].astype(str).tolist() if name_col else [str(i) for i in ids]
+
+    filename = f"sp_municipios_{tag}.topo.js"
+    path = os.path.join(out_dir, filename)
+    if not os.path.exists(path):
+        t0 = time.perf_counter()
+        props = [{'id': int(i), 'name': n} for i, n in zip(ids, names)]
+        topo = build_topology(list(gdf.geometry.values), props, quantization)
+        os.makedirs(out_dir, exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(f"window.{TOPOLOGY_VAR} = ")
+            json.dump(topo, f, separators=(',', ':'), ensure_ascii=False)
+            f.write(";\n")
+        os.replace(tmp, path)
+        if verbose:
+            print(f"  [GEO] {filename}: {len(topo['arcs'])} arcos, "
+                  f"{os.path.getsize(path) / 1e6:.2f} MB ({time.perf_counter() - t0:.1f}s)")
+    return {'file': filename, 'ids': ids, 'names': names}
+
+
+def layer_values(geo, df, variable, digits=VALUE_DIGITS):
+    """Valores de `variable` alineados al orden de la geometria (None = sin dato)."""
+    values = (df.drop_duplicates('cod_ibge')
+                .assign(cod_ibge=lambda d: d['cod_ibge'].astype(int))
+                .set_index('cod_ibge')[variable]
+                .reindex(geo['ids']))
+    return [None if pd.isna(v) else float(f"{v:.{digits}g}") for v in values]
+
+
+def colormap_spec(colormap):
+    """branca LinearColormap -> {'index': [...], 'colors': ['#rrggbb', ...]} para el navegador."""
+    colors = ['#%02x%02x%02x' % tuple(int(round(c * 255)) for c in rgba[:3])
+              for rgba in colormap.colors]
+    return {'index': [float(v) for v in colormap.index], 'colors': colors}
+
+
+# ============================================================
+# CAPAS EN EL NAVEGADOR
+# ============================================================
+
+_HELPERS_JS = """
+window.TerraRiskGeo = window.TerraRiskGeo || (function() {
+    var cache = null;
+    function decode(topo) {
+        var t = topo.transform, sx = t.scale[0], sy = t.scale[1], tx = t.translate[0], ty = t.translate[1];
+        var arcs = topo.arcs.map(function(arc) {
+            var x = 0, y = 0;
+            return arc.map(function(p) { x += p[0]; y += p[1]; return [x * sx + tx, y * sy + ty]; });
+        });
+        function ring(idx) {
+            var pts = [];
+            idx.forEach(function(i, k) {
+                var a = i < 0 ? arcs[~i].slice().reverse() : arcs[i];
+                pts = pts.concat(k > 0 ? a.slice(1) : a);
+            });
+            return pts;
+        }
+        return topo.objects.municipios.geometries.map(function(o, i) {
+            var geometry = null;
+            if (o.type === 'Polygon') geometry = {type: 'Polygon', coordinates: o.arcs.map(ring)};
+            else if (o.type === 'MultiPolygon') geometry = {type: 'MultiPolygon',
+                coordinates: o.arcs.map(function(p) { return p.map(ring); })};
+            var props = {id: o.properties.id, name: o.properties.name, i: i};
+            return {type: 'Feature', properties: props, geometry: geometry};
+        });
+    }
+    function features() {
+        if (!cache) cache = decode(window.%(var)s);
+        return cache;
+    }
+    function colormap(spec) {
+        var idx = spec.index, rgb = spec.colors.map(function(c) {
+            return [parseInt(c.substr(1, 2), 16), parseInt(c.substr(3, 2), 16), parseInt(c.substr(5, 2), 16)];
+        });
+        function hex(v) { return ('0' + Math.floor(v + 1e-9).toString(16)).slice(-2); }
+        return function(v) {
+            if (v <= idx[0]) return spec.colors[0];
+            if (v >= idx[idx.length - 1]) return spec.colors[idx.length - 1];
+            var k = 0;
+            while (v > idx[k + 1]) k++;
+            var f = (v - idx[k]) / (idx[k + 1] - idx[k]);
+            return '#' + [0, 1, 2].map(function(c) { return hex(rgb[k][c] + f * (rgb[k + 1][c] - rgb[k][c])); }).join('');
+        };
+    }
+    return {features: features, colormap: colormap};
+})();
+""" % {'var': TOPOLOGY_VAR}
+
+
+class SharedGeometryLayers(MacroElement):
+    """Capas coropleticas sobre la geometria compartida (coloreadas en el navegador)."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var layers = {{ this.layers_json }};
+            var renderer = L.canvas();
+            var overlays = {};
+            function build(cfg) {
+                var cm = TerraRiskGeo.colormap(cfg.colormap);
+                var geo = L.geoJson(TerraRiskGeo.features(), {
+                    renderer: renderer,
+                    style: function(f) {
+                        var v = cfg.values[f.properties.i];
+                        if (v === null) return cfg.nodata;
+                        return {fillColor: cm(v), color: cfg.color, weight: cfg.weight,
+                                fillOpacity: cfg.fillOpacity};
+                    },
+                    onEachFeature: function(f, layer) {
+                        var v = cfg.values[f.properties.i];
+                        layer.bindTooltip('<b>' + cfg.name_label + '</b> ' + f.properties.name +
+                            '<br><b>' + cfg.label + '</b> ' + (v === null ? '-' : v.toLocaleString()),
+                            {sticky: true});
+                        if (cfg.highlight) {
+                            layer.on('mouseover', function() { layer.setStyle(cfg.highlight); });
+                            layer.on('mouseout', function() { geo.resetStyle(layer); });
+                        }
+                    }
+                });
+                return geo;
+            }
+            layers.forEach(function(cfg) {
+                var group = L.layerGroup();
+                group.on('add', function() { if (!group.getLayers().length) group.addLayer(build(cfg)); });
+                overlays[cfg.name] = group;
+                if (cfg.show) group.addTo(map);
+            });
+            {% if this.control %}
+            L.control.layers(null, overlays, {collapsed: {{ this.collapsed }}}).addTo(map);
+            {% endif %}
+            window.terrariskLayersReady = true;
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, layers, control=True, collapsed=True):
+        super().__init__()
+        self._name = 'SharedGeometryLayers'
+        self.layers_json = json.dumps(layers, separators=(',', ':'), ensure_ascii=False)
+        self.control = control
+        self.collapsed = 'true' if collapsed else 'false'
+
+
+LAYER_DEFAULTS = {
+    'show': True,
+    'color': '#333333',
+    'weight': 0.5,
+    'fillOpacity': 0.7,
+    'nodata': {'fillColor': '#cccccc', 'color': '#666666', 'weight': 0.5, 'fillOpacity': 0.3},
+    'highlight': None,
+    'name_label': 'Municipality:',
+}
+
+
+def add_shared_layers(m, geo, layers, control=True, collapsed=True):
+    """
+    Agrega al mapa folium `m` la referencia al archivo de geometria y las capas.
+
+    layers: dicts con name, values (layer_values), colormap (branca LinearColormap),
+            label (texto del tooltip) y opcionalmente show, color, weight,
+            fillOpacity, nodata, highlight, name_label.
+    """
+    root = m.get_root()
+    root.header.add_child(Element(f'<script src="{geo["file"]}"></script>'), name='sp_topology')
+    root.header.add_child(Element(f'<script>{_HELPERS_JS}</script>'), name='terrarisk_geo')
+    specs = []
+    for layer in layers:
+        spec = {**LAYER_DEFAULTS, **layer}
+        spec['colormap'] = colormap_spec(layer['colormap'])
+        specs.append(spec)
+    SharedGeometryLayers(specs, control=control, collapsed=collapsed).add_to(m)
+    return m
+
+
+# ============================================================
+# COMPARACION (tamaño y tiempo de carga)
+# ============================================================
+
+def synthetic_geodata(n=645, seed=0):
+    """Municipios sinteticos (Voronoi densificado sobre el rectangulo de SP) + datos."""
+    import geopandas as gpd
+    import shapely
+    rng = np.random.default_rng(seed)
+    box = shapely.box(-53.1, -25.3, -44.2, -19.8)
+    pts = shapely.multipoints(np.column_stack([rng.uniform(-53.1, -44.2, n),
+                                               rng.uniform(-25.3, -19.8, n)]))
+    cells = [shapely.segmentize(c.intersection(box), 0.003)
+             for c in shapely.voronoi_polygons(pts, extend_to=box).geoms]
+    ids = 350000 + np.arange(len(cells)) * 10
+    gdf = gpd.GeoDataFrame({'cod_ibge': ids, 'NM_MUN': [f"Municipio {i}" for i in range(len(cells))]},
+                           geometry=cells, crs=4326)
+    df = pd.DataFrame({'cod_ibge': ids, 'Municipio': gdf['NM_MUN']})
+    return gdf, df, rng
+
+
+def measure_load_time(html_path, timeout=60):
+    """Tiempo hasta el evento load (ms) en Chrome headless; None sin Selenium/Chrome."""
+    try:
+        from export_maps_to_png import setup_driver
+    except ImportError:
+        return None
+    try:
+        driver = setup_driver()
+    except Exception:
+        return None
+    try:
+        driver.set_page_load_timeout(timeout)
+        driver.get(f"file:///{os.path.abspath(html_path).replace(os.sep, '/')}")
+        return driver.execute_script(
+            "var t = performance.timing; return t.loadEventEnd - t.navigationStart;")
+    finally:
+        driver.quit()
+
+
+def compare(out_dir, synthetic=False):
+    """Genera los mapas de ambos scripts en modo inline y liviano y reporta tamaños."""
+    import create_workshop_maps_v2 as v2
+    import create_unified_map as unified
+
+    if synthetic:
+        gdf, df, rng = synthetic_geodata()
+        for var in ({c['variable'] for c in v2.MAPAS_CONFIG.values()} |
+                    {c['variable'] for c in unified.CAPAS_CONFIG}):
+            df[var] = rng.gamma(2.0, 10.0, len(df))
+            df.loc[rng.choice(len(df), 10, replace=False), var] = np.nan
+        geo_kwargs = {'gdf': gdf}
+        gdf_merged = gdf.merge(df, on='cod_ibge', how='left')
+    else:
+        gdf_merged = v2.cargar_datos()
+        geo_kwargs = {}
+
+    rows = []
+    for mode in ['inline', 'light']:
+        mode_dir = os.path.join(out_dir, mode)
+        os.makedirs(mode_dir, exist_ok=True)
+        geo = export_geometry(mode_dir, **geo_kwargs) if mode == 'light' else None
+        t0 = time.perf_counter()
+        paths = []
+        for nombre, config in v2.MAPAS_CONFIG.items():
+            paths.append(v2.crear_mapa(gdf_merged, config, nombre, output_dir=mode_dir,
+                                       geo=geo))
+        m = unified.crear_mapa_unificado(gdf_merged, geo=geo)
+        paths.append(os.path.join(mode_dir, "mapa_unificado_capas.html"))
+        m.save(paths[-1])
+        build_time = time.perf_counter() - t0
+        paths = [p for p in paths if p]
+        html = sum(os.path.getsize(p) for p in paths)
+        shared = os.path.getsize(os.path.join(mode_dir, geo['file'])) if geo else 0
+        rows.append({
+            'modo': mode,
+            'html_total_MB': round(html / 1e6, 2),
+            'html_medio_KB': round(html / len(paths) / 1e3, 1),
+            'unificado_KB': round(os.path.getsize(paths[-1]) / 1e3, 1),
+            'geometria_KB': round(shared / 1e3, 1),
+            'total_MB': round((html + shared) / 1e6, 2),
+            'generacion_s': round(build_time, 1),
+            'carga_unificado_ms': measure_load_time(paths[-1]),
+        })
+    report = pd.DataFrame(rows).set_index('modo')
+    print("\n" + report.to_string())
+    return report
+
+
+def main():
+    import argparse
+    import tempfile
+    parser = argparse.ArgumentParser(description="Mapas folium con geometria compartida")
+    parser.add_argument('--compare', action='store_true',
+                        help="comparar tamaño/carga: geometria incrustada vs compartida")
+    parser.add_argument('--synthetic', action='store_true', help="usar municipios sinteticos")
+    parser.add_argument('--out', default=None, help="carpeta de salida de la comparacion")
+    args = parser.parse_args()
+    if args.compare:
+        compare(args.out or tempfile.mkdtemp(prefix='folium_light_'), synthetic=args.synthetic)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,578 @@
+"""
+Renderizado en paralelo de mapas coropleticos y figuras (matplotlib, Agg)
+=========================================================================
+`create_workshop_layers.py`, `create_bivariate_maps_EN.py` y
+`sintesis_h1_figuras_mapas.py` generaban sus figuras una por una, cada mapa
+con varios `GeoDataFrame.plot` (uno por clase) que vuelven a convertir las
+geometrias en cada llamada.
+
+Este modulo recibe una lista de specs declarativas y:
+- Carga la geometria una sola vez por proceso (cache GeoParquet de
+  geometry_cache) y la convierte una vez a trayectorias de matplotlib; cada
+  mapa es un solo PathCollection sobre esas trayectorias, con colores por
+  municipio.
+- Renderiza en un pool de procesos con backend Agg.
+- Calcula un hash por figura (spec + datos usados + geometria + version) y
+  salta las que no cambiaron y cuyo archivo existe (manifiesto JSON).
+
+Tipos de spec ('kind'):
+    terciles    una variable en 3 niveles (Low/Medium/High), como las capas del workshop
+    continuous  una variable con paleta lineal (mismas escalas que los mapas folium)
+    quadrants   dos variables partidas por la mediana + panel de dispersion
+    bivariate   mapa bivariado 3x3 (terciles x terciles)
+    call        figura no cartografica: func(*args) guarda `output` (func a nivel de modulo)
+
+Uso:
+    from map_renderer import render_specs
+    results = render_specs(specs, df, geometry={'crs': None}, n_jobs=4)
+
+Verificacion (geometria sintetica, sin shapefile):
+    python scripts/visualizacion/map_renderer.py --selfcheck
+
+Autor: Science Team
+"""
+
+import sys
+import os
+
+import hashlib
+import inspect
+import json
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.cm import ScalarMappable
+from matplotlib.collections import PathCollection
+from matplotlib.colors import LinearSegmentedColormap, Normalize, to_rgba
+from matplotlib.patches import Patch
+from matplotlib.path import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+from quadrants import classify
+
+BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
+MANIFEST_FILE = os.path.join(BASE_DIR, "outputs", "cache", "render", "manifest.json")
+
+RENDERER_VERSION = 1
+NO_DATA_COLOR = '#bdc3c7'
+
+QUADRANT_COLORS = {
+    'Q1_Optimal': '#2ecc71',    # Verde
+    'Q2_Risk': '#f1c40f',       # Amarillo
+    'Q3_Critical': '#e74c3c',   # Rojo
+    'Q4_Potential': '#e67e22',  # Naranja
+}
+
+BIVARIATE_COLORS = [
+    # Filas: Y (bajo -> alto); columnas: X (bajo -> alto)
+    ['#e8e8e8', '#b5c0da', '#6c83b5'],
+    ['#dfb0d6', '#a5add3', '#5698b9'],
+    ['#be64ac', '#8c62aa', '#3b4994'],
+]
+
+_STATE = {}
+
+
+# ============================================================
+# CLASIFICACIONES
+# ============================================================
+
+def tercile_colors(high_is_good):
+    """Colores Low/Medium/High: verde = bueno, rojo = malo, azul si es neutral."""
+    if high_is_good is True:
+        return {'Low': '#e74c3c', 'Medium': '#f1c40f', 'High': '#27ae60'}
+    if high_is_good is False:
+        return {'Low': '#27ae60', 'Medium': '#f1c40f', 'High': '#e74c3c'}
+    return {'Low': '#3498db', 'Medium': '#2980b9', 'High': '#1a5276'}
+
+
+def classify_terciles(series):
+    """Clasifica en terciles: Low, Medium, High (None si falta el valor)."""
+    q33 = series.quantile(0.333)
+    q66 = series.quantile(0.666)
+    levels = np.select([series <= q33, series <= q66, series > q66],
+                       ['Low', 'Medium', 'High'], default=None)
+    return pd.Series(levels, index=series.index, dtype=object), q33, q66
+
+
+def assign_quadrants(df, var_x, var_y, high_x_good, high_y_good):
+    """Cuadrantes por mediana (Q1 optimo ... Q4 potencial). Devuelve (serie, med_x, med_y)."""
+    res = classify(df, [{'name': 'quadrant', 'var_x': var_x, 'var_y': var_y,
+                         'high_x_good': high_x_good, 'high_y_good': high_y_good,
+                         'scheme': 'optimal_en'}])
+    thresholds = res['thresholds']
+    return res['quadrants']['quadrant'], thresholds[var_x][0], thresholds[var_y][0]
+
+
+def quadrant_stats(df, quadrant, var_x, var_y):
+    """N municipios, poblacion y medias por cuadrante (mismo formato que el script original)."""
+    tmp = df.assign(_q=quadrant)
+    stats = tmp.groupby('_q').agg({
+        'cod_ibge': 'count',
+        'population': 'sum',
+        var_x: 'mean',
+        var_y: 'mean'
+    }).rename(columns={'cod_ibge': 'n_mun', 'population': 'total_pop'})
+    stats['pct_mun'] = (stats['n_mun'] / stats['n_mun'].sum() * 100).round(1)
+    stats['pct_pop'] = (stats['total_pop'] / stats['total_pop'].sum() * 100).round(1)
+    return stats.reindex([q for q in QUADRANT_COLORS if q in stats.index])
+
+
+# ============================================================
+# GEOMETRIA -> TRAYECTORIAS (una vez por proceso)
+# ============================================================
+
+def _polygon_path(geom):
+    """Polygon/MultiPolygon (shapely) -> una Path compuesta (anillos cerrados)."""
+    polys = getattr(geom, 'geoms', [geom])
+    rings = []
+    for poly in polys:
+        rings.append(Path(np.asarray(poly.exterior.coords)[:, :2], closed=True))
+        rings.extend(Path(np.asarray(r.coords)[:, :2], closed=True) for r in poly.interiors)
+    return Path.make_compound_path(*rings)
+
+
+def geometry_from_gdf(gdf):
+    """Estado de geometria compartido: ids, trayectorias, limites y aspecto."""
+    paths = [_polygon_path(g) if g is not None and not g.is_empty else Path(np.zeros((1, 2)))
+             for g in gdf.geometry.values]
+    minx, miny, maxx, maxy = gdf.total_bounds
+    if gdf.crs is not None and gdf.crs.is_geographic:
+        aspect = 1 / np.cos(np.deg2rad((miny + maxy) / 2))
+    else:
+        aspect = 'equal'
+    return {'ids': np.asarray(gdf['cod_ibge']), 'paths': paths, 'aspect': aspect}
+
+
+def synthetic_geometry(n_side=25):
+    """Reticula de cuadrados (n_side x n_side) con ids tipo cod_ibge, para pruebas."""
+    paths, ids = [], []
+    for i in range(n_side):
+        for j in range(n_side):
+            paths.append(Path([(j, i), (j + 1, i), (j + 1, i + 1), (j, i + 1), (j, i)], closed=True))
+            ids.append(350000 + i * n_side + j)
+    return {'ids': np.array(ids), 'paths': paths, 'aspect': 'equal'}
+
+
+def geometry_key(geometry):
+    if geometry is None:
+        return 'none'
+    if 'synthetic' in geometry:
+        return f"synthetic-{geometry['synthetic']}"
+    from geometry_cache import SHP_PATH, source_hash
+    shp_path = geometry.get('shp_path', SHP_PATH)
+    return f"{source_hash(shp_path)}-{geometry.get('crs')}-{geometry.get('tolerance')}"
+
+
+def _load_geometry(geometry):
+    if geometry is None:
+        return None
+    if 'synthetic' in geometry:
+        return synthetic_geometry(geometry['synthetic'])
+    from geometry_cache import SHP_PATH, load_sp_geometry
+    gdf = load_sp_geometry(crs=geometry.get('crs'), tolerance=geometry.get('tolerance'),
+                           shp_path=geometry.get('shp_path', SHP_PATH))
+    return geometry_from_gdf(gdf)
+
+
+def _init_worker(data, geometry):
+    _STATE['data'] = data
+    _STATE['geometry_opts'] = geometry
+    _STATE['geometry'] = None
+
+
+def _geometry():
+    if _STATE.get('geometry') is None:
+        _STATE['geometry'] = _load_geometry(_STATE['geometry_opts'])
+    return _STATE['geometry']
+
+
+def _aligned(data, geom, columns):
+    """Datos reordenados segun la geometria (left join por cod_ibge)."""
+    return data.drop_duplicates('cod_ibge').set_index('cod_ibge')[columns].reindex(geom['ids'])
+
+
+def _draw(ax, geom, facecolors, edgecolors='white', linewidth=0.3):
+    coll = PathCollection(geom['paths'], facecolors=facecolors, edgecolors=edgecolors,
+                          linewidths=linewidth)
+    ax.add_collection(coll, autolim=True)
+    ax.autoscale_view()
+    ax.set_aspect(geom['aspect'])
+    return coll
+
+
+# ============================================================
+# FIGURAS
+# ============================================================
+
+def draw_terciles(spec, data, geom):
+    col = spec['column']
+    levels, q33, q66 = classify_terciles(data[col])
+    colors = spec.get('palette') or tercile_colors(spec.get('high_is_good'))
+    by_id = pd.Series(levels.to_numpy(), index=data['cod_ibge']).groupby(level=0).first()
+    geo_levels = by_id.reindex(geom['ids'])
+    facecolors = [colors.get(l, NO_DATA_COLOR) if isinstance(l, str) else NO_DATA_COLOR
+                  for l in geo_levels]
+
+    fig, ax = plt.subplots(1, 1, figsize=spec.get('figsize', (12, 10)))
+    _draw(ax, geom, facecolors)
+    ax.axis('off')
+    ax.set_title(spec['title'], fontsize=14, fontweight='bold', pad=20)
+
+    counts = levels.value_counts()
+    low_n, med_n, high_n = (counts.get(k, 0) for k in ['Low', 'Medium', 'High'])
+    legend_elements = [
+        Patch(facecolor=colors['Low'], label=f"Low (n={low_n}) \u2264 {q33:.2f}"),
+        Patch(facecolor=colors['Medium'], label=f"Medium (n={med_n}) {q33:.2f} - {q66:.2f}"),
+        Patch(facecolor=colors['High'], label=f"High (n={high_n}) > {q66:.2f}"),
+    ]
+    ax.legend(handles=legend_elements, loc='lower left', fontsize=10,
+              title=spec.get('legend_title', "Level (Terciles)"), title_fontsize=11)
+    if spec.get('source'):
+        ax.text(0.99, 0.01, f"Source: {spec['source']}", transform=ax.transAxes,
+                fontsize=8, ha='right', va='bottom', style='italic', color='gray')
+    return fig, {'Low': int(low_n), 'Medium': int(med_n), 'High': int(high_n)}
+
+
+def draw_quadrants(spec, data, geom):
+    var_x, var_y = spec['var_x'], spec['var_y']
+    label_x, label_y = spec['label_x'], spec['label_y']
+    quadrant, median_x, median_y = assign_quadrants(data, var_x, var_y,
+                                                    spec['high_x_good'], spec['high_y_good'])
+    stats = quadrant_stats(data, quadrant, var_x, var_y)
+    colors = spec.get('palette') or QUADRANT_COLORS
+
+    by_id = pd.Series(quadrant.to_numpy(), index=data['cod_ibge']).groupby(level=0).first()
+    geo_q = by_id.reindex(geom['ids'])
+    facecolors = [colors.get(q, 'none') if isinstance(q, str) else 'none' for q in geo_q]
+
+    fig, axes = plt.subplots(1, 2, figsize=spec.get('figsize', (16, 8)))
+    ax1 = axes[0]
+    _draw(ax1, geom, facecolors, linewidth=0.2)
+    ax1.axis('off')
+    ax1.set_title(f"{label_x} vs {label_y}\nQuadrants (n=645 municipalities)",
+                  fontsize=12, fontweight='bold')
+    legend_elements = [
+        Patch(facecolor=colors[q],
+              label=f"{q.replace('_', ' ')} ({stats.loc[q, 'n_mun']:.0f} mun, "
+                    f"{stats.loc[q, 'pct_pop']:.1f}% pop)")
+        for q in stats.index
+    ]
+    ax1.legend(handles=legend_elements, loc='lower left', fontsize=9)
+
+    ax2 = axes[1]
+    for q, color in colors.items():
+        subset = data[quadrant == q]
+        if len(subset) > 0:
+            ax2.scatter(subset[var_x], subset[var_y], c=color, alpha=0.6, s=20,
+                        label=q.replace('_', ' '))
+    ax2.axvline(median_x, color='black', linestyle='--', linewidth=1, alpha=0.7)
+    ax2.axhline(median_y, color='black', linestyle='--', linewidth=1, alpha=0.7)
+    ax2.set_xlabel(label_x, fontsize=11)
+    ax2.set_ylabel(label_y, fontsize=11)
+    ax2.set_title("Distribution of Municipalities\nLines = medians", fontsize=12, fontweight='bold')
+    ax2.legend(loc='best', fontsize=8)
+    plt.tight_layout()
+    return fig, {'median_x': median_x, 'median_y': median_y, 'stats': stats}
+
+
+def draw_bivariate(spec, data, geom):
+    var_x, var_y = spec['var_x'], spec['var_y']
+    colors_3x3 = spec.get('palette') or BIVARIATE_COLORS
+    aligned = _aligned(data, geom, [var_x, var_y])
+    valid = aligned.dropna()
+    terciles = classify(valid, [{'name': 'bi', 'var_x': var_x, 'var_y': var_y}],
+                        method='tercile')['quadrants']
+    cat_x, cat_y = terciles['bi_x'], terciles['bi_y']
+    valid_mask = aligned.notna().all(axis=1).to_numpy()
+
+    facecolors = np.full(len(aligned), '#f0f0f0', dtype=object)
+    edgecolors = np.full(len(aligned), '#cccccc', dtype=object)
+    facecolors[valid_mask] = [colors_3x3[y][x] for x, y in zip(cat_x, cat_y)]
+    edgecolors[valid_mask] = '#666666'
+
+    fig, ax = plt.subplots(1, 1, figsize=spec.get('figsize', (14, 12)))
+    _draw(ax, geom, list(facecolors), list(edgecolors))
+    ax.set_axis_off()
+    ax.set_title(spec['title'], fontsize=15, fontweight='bold', pad=20, color='#2c3e50')
+
+    legend_ax = fig.add_axes([0.12, 0.08, 0.15, 0.15])
+    for i in range(3):
+        for j in range(3):
+            legend_ax.add_patch(plt.Rectangle((j, i), 1, 1, facecolor=colors_3x3[i][j],
+                                              edgecolor='white', linewidth=1))
+    legend_ax.set_xlim(0, 3)
+    legend_ax.set_ylim(0, 3)
+    legend_ax.set_xlabel(f"{spec['label_x']} \u2192", fontsize=10, fontweight='bold')
+    legend_ax.set_ylabel(f"{spec['label_y']} \u2192", fontsize=10, fontweight='bold')
+    legend_ax.set_xticks([0.5, 1.5, 2.5])
+    legend_ax.set_xticklabels(['Low', 'Med', 'High'], fontsize=8)
+    legend_ax.set_yticks([0.5, 1.5, 2.5])
+    legend_ax.set_yticklabels(['Low', 'Med', 'High'], fontsize=8)
+    legend_ax.set_aspect('equal')
+
+    if spec.get('footer'):
+        fig.text(0.5, 0.02, spec['footer'].format(n=int(valid_mask.sum())),
+                 ha='center', fontsize=9, color='#95a5a6')
+    return fig, {'n_valid': int(valid_mask.sum())}
+
+
+def draw_continuous(spec, data, geom):
+    col = spec['column']
+    values = _aligned(data, geom, [col])[col].to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    vmin = spec.get('vmin', np.nanmin(values))
+    vmax = spec.get('vmax', np.nanmax(values))
+    cmap = LinearSegmentedColormap.from_list(col, spec['colors'])
+    norm = Normalize(vmin=vmin, vmax=vmax)
+
+    facecolors = np.tile(to_rgba(spec.get('nodata', '#cccccc')), (len(values), 1))
+    facecolors[valid] = cmap(norm(values[valid]))
+
+    fig, ax = plt.subplots(1, 1, figsize=spec.get('figsize', (12, 10)))
+    _draw(ax, geom, facecolors, edgecolors=spec.get('edgecolor', '#333333'), linewidth=0.2)
+    ax.axis('off')
+    ax.set_title(spec['title'], fontsize=14, fontweight='bold', pad=20)
+    cbar = fig.colorbar(ScalarMappable(norm=norm, cmap=cmap), ax=ax, orientation='horizontal',
+                        fraction=0.04, pad=0.02, shrink=0.6)
+    cbar.set_label(spec.get('legend_title', ''), fontsize=10)
+    if spec.get('source'):
+        ax.text(0.99, 0.01, spec['source'].format(n=int(valid.sum())), transform=ax.transAxes,
+                fontsize=8, ha='right', va='bottom', style='italic', color='gray')
+    return fig, {'n_valid': int(valid.sum()), 'vmin': float(vmin), 'vmax': float(vmax)}
+
+
+DRAWERS = {
+    'terciles': draw_terciles,
+    'continuous': draw_continuous,
+    'quadrants': draw_quadrants,
+    'bivariate': draw_bivariate,
+}
+
+
+def spec_columns(spec):
+    """Columnas del DataFrame que usa una spec (para el hash y para enviar a los workers)."""
+    if spec['kind'] in ('terciles', 'continuous'):
+        return [spec['column']]
+    if spec['kind'] == 'quadrants':
+        return [spec['var_x'], spec['var_y'], 'population']
+    if spec['kind'] == 'bivariate':
+        return [spec['var_x'], spec['var_y']]
+    return []
+
+
+def _render_one(spec):
+    t0 = time.perf_counter()
+    result = {'output': spec['output'], 'status': 'rendered', 'info': None, 'error': '', 'time': 0.0}
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(spec['output'])), exist_ok=True)
+        if spec['kind'] == 'call':
+            spec['func'](*spec.get('args', ()), **spec.get('kwargs', {}))
+        else:
+            fig, info = DRAWERS[spec['kind']](spec, _STATE['data'], _geometry())
+            # Formato segun la extension (.png rasterizado con Agg, .svg vectorial)
+            fig.savefig(spec['output'], dpi=spec.get('dpi', 150), bbox_inches='tight',
+                        facecolor='white')
+            plt.close(fig)
+            result['info'] = info
+    except Exception as e:
+        plt.close('all')
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['time'] = time.perf_counter() - t0
+    return result
+
+
+# ============================================================
+# HASH Y MANIFIESTO
+# ============================================================
+
+def spec_hash(spec, data, geo_key):
+    """Hash de la figura: spec + columnas usadas + geometria + version del renderer."""
+    h = hashlib.sha256(f"v{RENDERER_VERSION}|{geo_key}|".encode())
+    if spec['kind'] == 'call':
+        func = spec['func']
+        h.update(f"{func.__module__}.{func.__qualname__}".encode())
+        h.update(inspect.getsource(func).encode())
+        h.update(pickle.dumps((spec.get('args', ()), spec.get('kwargs', {})), protocol=4))
+        h.update(spec['output'].encode())
+        return h.hexdigest()
+    public = {k: v for k, v in spec.items() if not callable(v)}
+    h.update(json.dumps(public, sort_keys=True, default=str).encode())
+    cols = ['cod_ibge'] + [c for c in spec_columns(spec) if c in data.columns]
+    h.update(pd.util.hash_pandas_object(data[cols], index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def _load_manifest(path):
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def _save_manifest(path, manifest):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ============================================================
+# API
+# ============================================================
+
+def render_specs(specs, data=None, geometry=None, n_jobs=None,
+                 manifest_file=MANIFEST_FILE, force=False, verbose=True):
+    """
+    Renderiza una lista de specs. Devuelve una lista de resultados (mismo
+    orden) con output, status ('rendered' | 'skipped' | 'error'), info
+    (resumen de la clasificacion), error y time.
+
+    data:     DataFrame con cod_ibge y las columnas usadas por las specs
+    geometry: dict para geometry_cache.load_sp_geometry ({'crs': 4326,
+              'tolerance': None, 'shp_path': ...}); None si solo hay 'call'
+    """
+    specs = list(specs)
+    manifest = _load_manifest(manifest_file)
+    geo_key = geometry_key(geometry) if any(s['kind'] != 'call' for s in specs) else 'none'
+
+    if data is not None:
+        used = ['cod_ibge'] + sorted({c for s in specs for c in spec_columns(s) if c in data.columns})
+        data = data[used].copy()
+        data['cod_ibge'] = data['cod_ibge'].astype(int)
+
+    results = [None] * len(specs)
+    hashes, pending = {}, []
+    for i, spec in enumerate(specs):
+        key = os.path.abspath(spec['output'])
+        hashes[i] = spec_hash(spec, data, geo_key)
+        if not force and manifest.get(key) == hashes[i] and os.path.exists(spec['output']):
+            results[i] = {'output': spec['output'], 'status': 'skipped', 'info': None,
+                          'error': '', 'time': 0.0}
+        else:
+            pending.append(i)
+
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(pending) or 1))
+    if pending and n_jobs == 1:
+        _init_worker(data, geometry)
+        done = [_render_one(specs[i]) for i in pending]
+    elif pending:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(data, geometry)) as pool:
+            done = list(pool.map(_render_one, [specs[i] for i in pending]))
+    else:
+        done = []
+
+    for i, res in zip(pending, done):
+        results[i] = res
+        if res['status'] == 'rendered':
+            manifest[os.path.abspath(specs[i]['output'])] = hashes[i]
+    if done:
+        _save_manifest(manifest_file, manifest)
+
+    if verbose:
+        n = {s: sum(r['status'] == s for r in results) for s in ['rendered', 'skipped', 'error']}
+        print(f"  Figuras: {n['rendered']} renderizadas, {n['skipped']} sin cambios, "
+              f"{n['error']} con error ({n_jobs} proceso(s))")
+        for r in results:
+            if r['status'] == 'error':
+                print(f"  [ERROR] {os.path.basename(r['output'])}: {r['error']}")
+    return results
+
+
+# ============================================================
+# VERIFICACION
+# ============================================================
+
+def run_selfcheck(n_maps=12, n_side=25, n_jobs=None):
+    """
+    Geometria sintetica: compara serie vs pool (PNG identicos), y que una
+    segunda corrida salte todo y un cambio de datos re-renderice solo lo afectado.
+    """
+    import shutil
+    import tempfile
+
+    print("=" * 60)
+    print("Verificacion: renderer de mapas (geometria sintetica)")
+    print("=" * 60)
+    rng = np.random.default_rng(0)
+    n = n_side * n_side
+    data = pd.DataFrame({'cod_ibge': 350000 + np.arange(n),
+                         'population': rng.integers(1000, 100000, n)})
+    for k in range(n_maps):
+        data[f'v{k}'] = rng.normal(size=n)
+    data.loc[rng.choice(n, 20, replace=False), 'v0'] = np.nan
+
+    tmp = tempfile.mkdtemp(prefix='map_renderer_')
+    geometry = {'synthetic': n_side}
+
+    def make_specs(folder):
+        specs = []
+        for k in range(n_maps):
+            kind = ['terciles', 'quadrants', 'bivariate', 'continuous'][k % 4]
+            spec = {'kind': kind, 'output': os.path.join(tmp, folder, f"map_{k:02d}_{kind}.png"),
+                    'dpi': 80, 'title': f"Variable {k}"}
+            if kind == 'terciles':
+                spec.update(column=f'v{k}', high_is_good=bool(k % 2), source='sintetico')
+            elif kind == 'continuous':
+                spec.update(column=f'v{k}', colors=['#1a9850', '#fee08b', '#d73027'],
+                            legend_title='indice', source='N = {n}')
+            else:
+                spec.update(var_x=f'v{k}', var_y=f'v{(k + 1) % n_maps}', label_x='X', label_y='Y',
+                            high_x_good=True, high_y_good=False, footer='N = {n}')
+            specs.append(spec)
+        return specs
+
+    try:
+        timings = {}
+        for jobs, folder in [(1, 'serial'), (n_jobs or os.cpu_count() or 1, 'pool')]:
+            manifest = os.path.join(tmp, folder, 'manifest.json')
+            t0 = time.perf_counter()
+            res = render_specs(make_specs(folder), data, geometry, n_jobs=jobs,
+                               manifest_file=manifest, verbose=False)
+            timings[folder] = time.perf_counter() - t0
+            assert all(r['status'] == 'rendered' for r in res), [r['error'] for r in res]
+            print(f"  [OK] {n_maps} mapas, {jobs} proceso(s): {timings[folder]:.2f}s")
+
+        for k in range(n_maps):
+            a = open(make_specs('serial')[k]['output'], 'rb').read()
+            b = open(make_specs('pool')[k]['output'], 'rb').read()
+            assert a == b, f"PNG distinto serie/pool: mapa {k}"
+        print("  [OK] PNG identicos entre serie y pool")
+
+        manifest = os.path.join(tmp, 'pool', 'manifest.json')
+        t0 = time.perf_counter()
+        res = render_specs(make_specs('pool'), data, geometry, manifest_file=manifest, verbose=False)
+        assert all(r['status'] == 'skipped' for r in res)
+        print(f"  [OK] Segunda corrida: todo saltado ({time.perf_counter() - t0:.2f}s)")
+
+        data.loc[0, 'v3'] += 10
+        res = render_specs(make_specs('pool'), data, geometry, manifest_file=manifest, verbose=False)
+        changed = [os.path.basename(r['output']) for r in res if r['status'] == 'rendered']
+        print(f"  [OK] Cambio en v3: re-renderizadas {changed}")
+        assert changed == ['map_02_bivariate.png', 'map_03_continuous.png']
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return timings
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Renderizado de mapas en paralelo")
+    parser.add_argument('--selfcheck', action='store_true')
+    parser.add_argument('--jobs', type=int, default=None)
+    args = parser.parse_args()
+    if args.selfcheck:
+        run_selfcheck(n_jobs=args.jobs)
+    else:
+        parser.print_help()
@@ -29,9 +29,11 @@ import matplotlib.patches as mpatches
 from matplotlib.patches import FancyArrowPatch
 import matplotlib.gridspec as gridspec
 from matplotlib.colors import ListedColormap, BoundaryNorm
-import geopandas as gpd
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from map_renderer import render_specs
+
 # Rutas
 BASE_DIR = r"C:\Users\arlex\Documents\Adrian David"
 CSV_PATH = os.path.join(BASE_DIR, "outputs/dataset/municipios_integrado.csv")
@@ -77,14 +79,6 @@ def load_data():
     return df, corr, med, mod, sem
 
 
-def load_geodata(df):
-    gdf = gpd.read_file(SHAPEFILE_PATH)
-    gdf['cod_ibge'] = gdf['CD_MUN'].astype(str).str[:6].astype(int)
-    gdf = gdf.merge(df, on='cod_ibge', how='left')
-    gdf = gdf.to_crs(epsg=4326)
-    return gdf
-
-
 # ============================================================
 # FIGURA 1: Panel Resumen Causal con coeficientes SEM
 # ============================================================
@@ -508,67 +502,30 @@ def create_bivariate_colormap():
     return colors_3x3
 
 
-def bivariate_map(gdf, var_x, var_y, label_x, label_y, title, filename):
-    """Create a bivariate choropleth map"""
-    valid = gdf[[var_x, var_y, 'geometry']].dropna(subset=[var_x, var_y]).copy()
-
-    # Classify into terciles
-    valid['cat_x'] = pd.qcut(valid[var_x], 3, labels=[0, 1, 2]).astype(int)
-    valid['cat_y'] = pd.qcut(valid[var_y], 3, labels=[0, 1, 2]).astype(int)
-
-    colors_3x3 = create_bivariate_colormap()
-
-    # Assign colors
-    valid['biv_color'] = valid.apply(lambda r: colors_3x3[r['cat_y']][r['cat_x']], axis=1)
-
-    fig, ax = plt.subplots(1, 1, figsize=(14, 12))
-
-    # Plot municipalities without data in gray
-    gdf_nodata = gdf[~gdf.index.isin(valid.index)]
-    if len(gdf_nodata) > 0:
-        gdf_nodata.plot(ax=ax, color='#f0f0f0', edgecolor='#cccccc', linewidth=0.3)
-
-    # Plot bivariate colors
-    for color_val in valid['biv_color'].unique():
-        subset = valid[valid['biv_color'] == color_val]
-        subset.plot(ax=ax, color=color_val, edgecolor='#666666', linewidth=0.3)
-
-    ax.set_axis_off()
-    ax.set_title(title, fontsize=15, fontweight='bold', pad=20, color='#2c3e50')
+def bivariate_map(var_x, var_y, label_x, label_y, title, filename):
+    """Spec de mapa bivariado 3x3 (terciles x terciles) para map_renderer"""
+    return {
+        'kind': 'bivariate',
+        'var_x': var_x, 'var_y': var_y,
+        'label_x': label_x, 'label_y': label_y,
+        'title': title,
+        'palette': create_bivariate_colormap(),
+        'footer': 'N = {n} municipalities | State of S\u00e3o Paulo, Brazil | Workshop SEMIL-USP 2026',
+        'dpi': 200,
+        'output': os.path.join(OUTPUT_DIR, filename),
+    }
 
-    # Add bivariate legend
-    legend_ax = fig.add_axes([0.12, 0.08, 0.15, 0.15])
-    for i in range(3):
-        for j in range(3):
-            rect = plt.Rectangle((j, i), 1, 1, facecolor=colors_3x3[i][j],
-                                  edgecolor='white', linewidth=1)
-            legend_ax.add_patch(rect)
 
-    legend_ax.set_xlim(0, 3)
-    legend_ax.set_ylim(0, 3)
-    legend_ax.set_xlabel(f'{label_x} \u2192', fontsize=10, fontweight='bold')
-    legend_ax.set_ylabel(f'{label_y} \u2192', fontsize=10, fontweight='bold')
-    legend_ax.set_xticks([0.5, 1.5, 2.5])
-    legend_ax.set_xticklabels(['Low', 'Med', 'High'], fontsize=8)
-    legend_ax.set_yticks([0.5, 1.5, 2.5])
-    legend_ax.set_yticklabels(['Low', 'Med', 'High'], fontsize=8)
-    legend_ax.set_aspect('equal')
-
-    # Source text
-    fig.text(0.5, 0.02, f'N = {len(valid)} municipalities | State of S\u00e3o Paulo, Brazil | Workshop SEMIL-USP 2026',
-             ha='center', fontsize=9, color='#95a5a6')
-
-    path = os.path.join(OUTPUT_DIR, filename)
-    fig.savefig(path, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
-    print(f"  [OK] {path}")
-    return path
+def figure_spec(func, *args, filename):
+    """Spec para una figura no cartografica (la funcion guarda su propio PNG)"""
+    return {'kind': 'call', 'func': func, 'args': args,
+            'output': os.path.join(OUTPUT_DIR, filename)}
 
 
 # ============================================================
 # MAIN
 # ============================================================
-def main():
+def main(n_jobs=None, force=False):
     print("=" * 60)
     print("SYNTHESIS H1: 5 FIGURES + 3 BIVARIATE MAPS")
     print("=" * 60)
@@ -576,47 +533,38 @@ def main():
     print("\n1. Loading data...")
     df, corr, med, mod, sem = load_data()
 
-    print("\n2. Generating 5 main figures...")
-    print("\n  FIG 1: Causal panel (SEM dengue)")
-    fig1_causal_panel(sem)
-
-    print("  FIG 2: Heatmap Biodiv x Health")
-    fig2_heatmap_biodiv_health(corr)
-
-    print("  FIG 3: Forest plot SEM by disease")
-    fig3_forest_plot_sem(sem)
-
-    print("  FIG 4: Modulation panel (4 moderators)")
-    fig4_modulation_panel(df)
-
-    print("  FIG 5: Mediation diagram")
-    fig5_mediation_diagram(med)
-
-    print("\n3. Loading geodata for maps...")
-    gdf = load_geodata(df)
-
-    print("\n4. Generating 3 bivariate maps...")
-
-    print("\n  MAP 1: Biodiversity x Disease Burden")
-    bivariate_map(gdf,
-                  var_x='forest_cover', var_y='idx_carga_enfermedad',
-                  label_x='Forest Cover', label_y='Disease Burden',
-                  title='Biodiversity-Health Nexus:\nForest Cover vs. Disease Burden Index',
-                  filename='h1_MAP1_bivariate_forest_disease.png')
-
-    print("  MAP 2: Social Vulnerability x Climate Risk")
-    bivariate_map(gdf,
-                  var_x='idx_vulnerabilidad', var_y='idx_clima',
-                  label_x='Social Vulnerability', label_y='Climate Risk',
-                  title='Climate Justice:\nSocial Vulnerability vs. Climate Risk Index',
-                  filename='h1_MAP2_bivariate_vuln_climate.png')
-
-    print("  MAP 3: Governance x Pollination Deficit")
-    bivariate_map(gdf,
-                  var_x='idx_gobernanza_100', var_y='pol_deficit',
-                  label_x='Governance', label_y='Pollination Deficit',
-                  title='Governance-Ecosystem Services Nexus:\nGovernance Index vs. Pollination Deficit',
-                  filename='h1_MAP3_bivariate_governance_poldef.png')
+    print("\n2. Rendering 5 main figures + 3 bivariate maps (parallel)...")
+    specs = [
+        # FIG 1: Causal panel (SEM dengue)
+        figure_spec(fig1_causal_panel, sem, filename='h1_FIG1_causal_panel.png'),
+        # FIG 2: Heatmap Biodiv x Health
+        figure_spec(fig2_heatmap_biodiv_health, corr, filename='h1_FIG2_heatmap_biodiv_health.png'),
+        # FIG 3: Forest plot SEM by disease
+        figure_spec(fig3_forest_plot_sem, sem, filename='h1_FIG3_forest_plot_sem.png'),
+        # FIG 4: Modulation panel (4 moderators)
+        figure_spec(fig4_modulation_panel, df, filename='h1_FIG4_modulation_panel.png'),
+        # FIG 5: Mediation diagram
+        figure_spec(fig5_mediation_diagram, med, filename='h1_FIG5_mediation_diagram.png'),
+        # MAP 1: Biodiversity x Disease Burden
+        bivariate_map(var_x='forest_cover', var_y='idx_carga_enfermedad',
+                      label_x='Forest Cover', label_y='Disease Burden',
+                      title='Biodiversity-Health Nexus:\nForest Cover vs. Disease Burden Index',
+                      filename='h1_MAP1_bivariate_forest_disease.png'),
+        # MAP 2: Social Vulnerability x Climate Risk
+        bivariate_map(var_x='idx_vulnerabilidad', var_y='idx_clima',
+                      label_x='Social Vulnerability', label_y='Climate Risk',
+                      title='Climate Justice:\nSocial Vulnerability vs. Climate Risk Index',
+                      filename='h1_MAP2_bivariate_vuln_climate.png'),
+        # MAP 3: Governance x Pollination Deficit
+        bivariate_map(var_x='idx_gobernanza_100', var_y='pol_deficit',
+                      label_x='Governance', label_y='Pollination Deficit',
+                      title='Governance-Ecosystem Services Nexus:\nGovernance Index vs. Pollination Deficit',
+                      filename='h1_MAP3_bivariate_governance_poldef.png'),
+    ]
+    results = render_specs(specs, df, geometry={'crs': 4326, 'shp_path': SHAPEFILE_PATH},
+                           n_jobs=n_jobs, force=force)
+    for res in results:
+        print(f"  [{res['status'].upper()}] {os.path.basename(res['output'])}")
 
     print("\n" + "=" * 60)
     print("DONE: 5 figures + 3 maps generated")
@@ -625,4 +573,9 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="H1 synthesis figures and bivariate maps")
+    parser.add_argument('--jobs', type=int, default=None, help="rendering processes")
+    parser.add_argument('--force', action='store_true', help="re-render everything")
+    args = parser.parse_args()
+    main(n_jobs=args.jobs, force=args.force)
@@ -6,10 +6,36 @@ import os
 from fastapi import APIRouter, HTTPException, Query
 import pandas as pd
 
-from core.config import DATA_DIR
+from core.config import DATA_DIR, LAYERS_CONFIG, QUADRANT_PAIRS
+from core.quadrants import classify, METHODS, QUADRANT_SCHEMES
 
 router = APIRouter()
 
+# Variable name mapping (frontend names to CSV column names)
+VARIABLE_MAPPING = {
+    'UAI_Crisk': 'UAI_Crisk',
+    'gobernanza_100': 'idx_gobernanza_100',
+    'biodiversity': 'idx_biodiv',
+    'forest_cover': 'forest_cover',
+    'natural_habitat': 'forest_cover',  # Using forest_cover as proxy
+    'pollination_deficit': 'pol_deficit',
+    'fire_risk_index': 'fire_risk_index',
+    'flooding_risk': 'flooding_risks',
+    'hydric_stress_r': 'hydric_stress_risk',
+    'dengue': 'incidence_mean_dengue',
+    'leishmaniose': 'incidence_mean_leishmaniose',
+    'incidence_diarr': 'incidence_diarrhea_mean',
+    'death_circ_mean': 'health_death_circ_mean',
+    'hosp_resp_mean': 'health_hosp_resp_mean',
+    'vulnerabilidad': 'idx_vulnerabilidad',
+    'pct_pobreza': 'pct_pobreza',
+    'pct_rural': 'pct_rural',
+    'pct_preta': 'pct_preta',
+}
+
+# Layer direction by frontend variable: only "negative" scales are worse when high
+HIGH_IS_GOOD = {l["variable"]: l["colorScale"] != "negative" for l in LAYERS_CONFIG}
+
 # Load municipality data on startup
 _municipalities_df = None
 _municipalities_list = None
@@ -105,29 +131,8 @@ async def get_choropleth_data(variable: str):
     if not code_col:
         raise HTTPException(status_code=500, detail="Formato de datos incorrecto")
 
-    # Variable name mapping (frontend names to CSV column names)
-    variable_mapping = {
-        'UAI_Crisk': 'UAI_Crisk',
-        'gobernanza_100': 'idx_gobernanza_100',
-        'biodiversity': 'idx_biodiv',
-        'forest_cover': 'forest_cover',
-        'natural_habitat': 'forest_cover',  # Using forest_cover as proxy
-        'pollination_deficit': 'pol_deficit',
-        'fire_risk_index': 'fire_risk_index',
-        'flooding_risk': 'flooding_risks',
-        'hydric_stress_r': 'hydric_stress_risk',
-        'dengue': 'incidence_mean_dengue',
-        'leishmaniose': 'incidence_mean_leishmaniose',
-        'incidence_diarr': 'incidence_diarrhea_mean',
-        'death_circ_mean': 'health_death_circ_mean',
-        'hosp_resp_mean': 'health_hosp_resp_mean',
-        'vulnerabilidad': 'idx_vulnerabilidad',
-        'pct_pobreza': 'pct_pobreza',
-        'pct_rural': 'pct_rural',
-        'pct_preta': 'pct_preta',
-    }
 
-    col_name = variable_mapping.get(variable, variable)
+    col_name = VARIABLE_MAPPING.get(variable, variable)
 
     if col_name not in df.columns:
         raise HTTPException(status_code=404, detail=f"Variable '{variable}' no encontrada")
@@ -163,6 +168,74 @@ async def get_choropleth_data(variable: str):
     }
 
 
+@router.get("/quadrants")
+async def get_quadrants(
+    x: str | None = Query(None, description="Variable X (frontend name or CSV column)"),
+    y: str | None = Query(None, description="Variable Y (frontend name or CSV column)"),
+    method: str = Query("median", description="median (2x2 quadrants) or tercile (3x3 bivariate)"),
+    scheme: str = Query("optimal_en", description="Quadrant labels for a custom x/y pair"),
+):
+    """
+    Quadrant / bivariate classes for all municipalities in one call.
+
+    Without x/y, returns the default pairs in QUADRANT_PAIRS. With x/y, a
+    single pair "custom" whose direction comes from the layer colorScale.
+    """
+    df = get_municipalities_df()
+
+    if df.empty:
+        raise HTTPException(status_code=404, detail="Datos no disponibles")
+    if method not in METHODS:
+        raise HTTPException(status_code=400, detail=f"Metodo '{method}' no valido")
+    if scheme not in QUADRANT_SCHEMES:
+        raise HTTPException(status_code=400, detail=f"Esquema '{scheme}' no valido")
+
+    code_col = next((c for c in ['cod_ibge', 'CD_MUN', 'codigo'] if c in df.columns), None)
+    name_col = next((c for c in ['Municipio', 'nome', 'NM_MUN', 'municipio', 'name'] if c in df.columns), None)
+
+    if not code_col:
+        raise HTTPException(status_code=500, detail="Formato de datos incorrecto")
+
+    if x or y:
+        if not (x and y):
+            raise HTTPException(status_code=400, detail="Se requieren x e y")
+        pairs = [{
+            "name": "custom",
+            "var_x": VARIABLE_MAPPING.get(x, x),
+            "var_y": VARIABLE_MAPPING.get(y, y),
+            "high_x_good": HIGH_IS_GOOD.get(x, True),
+            "high_y_good": HIGH_IS_GOOD.get(y, True),
+            "scheme": scheme,
+        }]
+    else:
+        pairs = QUADRANT_PAIRS
+
+    missing = [v for p in pairs for v in (p["var_x"], p["var_y"]) if v not in df.columns]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Variable '{missing[0]}' no encontrada")
+
+    result = classify(df, pairs, method=method)
+    classes = result["quadrants"]
+
+    # One column per pair: quadrant label (median) or bivariate class 0-8 (tercile)
+    suffix = "" if method == "median" else "_bivariate"
+    columns = [f"{p['name']}{suffix}" for p in pairs]
+    values = classes[columns].to_numpy().tolist()
+    codes = df[code_col].astype(str).tolist()
+    names = df[name_col].tolist() if name_col else [None] * len(df)
+
+    return {
+        "method": method,
+        "pairs": pairs,
+        "thresholds": result["thresholds"],
+        "municipalities": [
+            {"code": code, "name": name,
+             "quadrants": {p["name"]: v for p, v in zip(pairs, row)}}
+            for code, name, row in zip(codes, names, values)
+        ],
+    }
+
+
 @router.get("/{code}")
 async def get_municipality_by_code(code: str):
     """Get full municipality data by code"""
@@ -9,6 +9,7 @@ from pydantic import BaseModel
 import pandas as pd
 
 from core.config import DATA_DIR
+from core.quadrants import classify
 from core.pearc_actions import (
     get_actions_list,
     get_actions_for_risks,
@@ -186,6 +187,17 @@ async def get_workshop_municipalities():
         code_col = data["code_col"]
         var_mapping = data["variable_mapping"]
 
+        # Quadrant computed from the data (medians over all 645 municipalities),
+        # next to the curated workshop quadrant
+        full = get_full_data()
+        computed = classify(full["df"], [{
+            "name": "quadrant",
+            "var_x": var_mapping["governance_general"],
+            "var_y": var_mapping["biodiversity"],
+            "scheme": "workshop"
+        }])["quadrants"]["quadrant"]
+        computed_by_name = dict(zip(full["df"][name_col], computed))
+
         results = []
 
         for workshop_muni in WORKSHOP_MUNICIPALITIES:
@@ -236,6 +248,7 @@ async def get_workshop_municipalities():
                 "name": name,
                 "quadrant": quadrant,
                 "description": descriptions.get(quadrant, ""),
+                "computedQuadrant": computed_by_name.get(name),
                 "riskSummary": risk_summary
             })
 
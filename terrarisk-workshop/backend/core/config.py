@@ -207,3 +207,32 @@ LAYERS_CONFIG = [
         "isFree": False
     },
 ]
+
+# Default variable pairs for /api/municipalities/quadrants (CSV columns).
+# "scheme" selects the quadrant labels used by each product (core.quadrants)
+QUADRANT_PAIRS = [
+    {
+        "name": "governance_vulnerability",
+        "var_x": "idx_gobernanza",
+        "var_y": "idx_vulnerabilidad",
+        "high_x_good": True,
+        "high_y_good": False,
+        "scheme": "dashboard"
+    },
+    {
+        "name": "governance_biodiversity",
+        "var_x": "idx_gobernanza_100",
+        "var_y": "idx_biodiv",
+        "high_x_good": True,
+        "high_y_good": True,
+        "scheme": "workshop"
+    },
+    {
+        "name": "climate_vulnerability",
+        "var_x": "idx_clima",
+        "var_y": "idx_vulnerabilidad",
+        "high_x_good": False,
+        "high_y_good": False,
+        "scheme": "optimal_en"
+    },
+]
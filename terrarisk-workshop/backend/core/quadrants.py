@@ -0,0 +1,132 @@
+"""
+TerraRisk Workshop - Quadrant / bivariate classification engine
+
+Median (2x2) or tercile (3x3) splits for any number of variable pairs at
+once, vectorized with NumPy. Used by the workshop API and, through
+scripts/utils/quadrants.py, by the analysis scripts, dashboards and maps.
+
+Each pair is a dict:
+    {"name": "gov_vuln", "var_x": "idx_gobernanza_100", "var_y": "idx_vulnerabilidad",
+     "high_x_good": True, "high_y_good": False, "scheme": "dashboard"}
+
+Rules (same as the previous row-wise implementations):
+- median: x >= median is "high"; a missing value is never "high".
+- tercile: class = number of tercile cut points strictly below the value
+  (0 = low, 1 = medium, 2 = high, like pd.qcut); missing values get -1.
+- quadrant: (x_good, y_good) mapped to a label through a named scheme,
+  because the existing products number the mixed quadrants differently.
+
+This module only depends on numpy/pandas (no FastAPI, no core.config), so
+the scripts can import it directly.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# (x_good, y_good) -> label
+QUADRANT_SCHEMES = {
+    # create_bivariate_maps_EN / map_renderer
+    "optimal_en": {(1, 1): "Q1_Optimal", (0, 1): "Q2_Risk", (0, 0): "Q3_Critical", (1, 0): "Q4_Potential"},
+    # analisis_cuadrantes_4combinaciones
+    "optimo_es": {(1, 1): "Q1_Optimo", (1, 0): "Q2_Riesgo", (0, 0): "Q3_Critico", (0, 1): "Q4_Potencial"},
+    # dashboard_workshop (gobernanza vs vulnerabilidad)
+    "dashboard": {(1, 1): "Q1_Modelo", (0, 1): "Q2_Conservar", (0, 0): "Q3_Vulnerable", (1, 0): "Q4_Desarrollo"},
+    # workshop API (gobernanza vs biodiversidad)
+    "workshop": {(1, 1): "Q1", (1, 0): "Q2", (0, 1): "Q3", (0, 0): "Q4"},
+}
+
+METHODS = {"median": (0.5,), "tercile": (1 / 3, 2 / 3)}
+
+_CACHE = OrderedDict()
+_CACHE_SIZE = 32
+
+
+def dataset_hash(df: pd.DataFrame, columns: list[str]) -> str:
+    """Content hash of the columns used (index included)."""
+    h = hashlib.sha256(json.dumps(columns).encode())
+    h.update(pd.util.hash_pandas_object(df[columns], index=True).values.tobytes())
+    return h.hexdigest()[:16]
+
+
+def split_classes(values: np.ndarray, method: str = "median", quantiles=None):
+    """
+    Classes for every column of `values` (n x k) at once.
+
+    Returns (classes, thresholds): int8 array n x k and an array of cut
+    points (len(quantiles) x k). median -> 0/1, tercile -> 0/1/2, NaN -> -1
+    (median: NaN -> 0, like the `>=` comparison it replaces).
+    """
+    values = np.asarray(values, dtype=float)
+    q = tuple(quantiles) if quantiles is not None else METHODS[method]
+    missing = np.isnan(values)
+    with np.errstate(invalid="ignore"):
+        thresholds = np.nanquantile(values, q, axis=0).reshape(len(q), -1)
+        if method == "median" and quantiles is None:
+            classes = (values >= thresholds[0]).astype(np.int8)
+        else:
+            classes = (values[:, :, None] > thresholds.T[None, :, :]).sum(axis=2).astype(np.int8)
+            classes[missing] = -1
+    return classes, thresholds
+
+
+def classify(df: pd.DataFrame, pairs: list[dict], method: str = "median", quantiles=None,
+             use_cache: bool = True) -> dict:
+    """
+    Classify all municipalities for all pairs.
+
+    Returns a dict:
+        quadrants   DataFrame (df.index) with, per pair: <name> (quadrant label,
+                    median method only), <name>_x / <name>_y (classes) and
+                    <name>_bivariate (3 * y_class + x_class, tercile method only)
+        thresholds  {variable: [cut points]}
+        key         dataset/pairs hash used as cache key
+    """
+    variables = list(dict.fromkeys(v for p in pairs for v in (p["var_x"], p["var_y"])))
+    key = hashlib.sha256(json.dumps([dataset_hash(df, variables), method, quantiles, pairs],
+                                    sort_keys=True, default=str).encode()).hexdigest()[:16]
+    if use_cache and key in _CACHE:
+        _CACHE.move_to_end(key)
+        cached = _CACHE[key]
+        return {**cached, "quadrants": cached["quadrants"].copy()}
+
+    X = df[variables].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    classes, thresholds = split_classes(X, method, quantiles)
+    col = {v: i for i, v in enumerate(variables)}
+
+    out = {}
+    for pair in pairs:
+        name = pair["name"]
+        cx, cy = classes[:, col[pair["var_x"]]], classes[:, col[pair["var_y"]]]
+        out[f"{name}_x"] = cx
+        out[f"{name}_y"] = cy
+        if method == "median" and quantiles is None:
+            x_good = cx == 1 if pair.get("high_x_good", True) else cx == 0
+            y_good = cy == 1 if pair.get("high_y_good", True) else cy == 0
+            scheme = QUADRANT_SCHEMES[pair.get("scheme", "optimal_en")]
+            labels = np.array([scheme[(0, 0)], scheme[(0, 1)], scheme[(1, 0)], scheme[(1, 1)]],
+                              dtype=object)
+            out[name] = labels[x_good.astype(int) * 2 + y_good.astype(int)]
+        else:
+            valid = (cx >= 0) & (cy >= 0)
+            out[f"{name}_bivariate"] = np.where(valid, cy.astype(int) * 3 + cx, -1)
+
+    result = {
+        "quadrants": pd.DataFrame(out, index=df.index),
+        "thresholds": {v: thresholds[:, i].tolist() for v, i in col.items()},
+        "key": key,
+    }
+    if use_cache:
+        _CACHE[key] = result
+        while len(_CACHE) > _CACHE_SIZE:
+            _CACHE.popitem(last=False)
+        result = {**result, "quadrants": result["quadrants"].copy()}
+    return result
+
+
+def clear_cache():
+    """Empty the in-memory result cache."""
+    _CACHE.clear()